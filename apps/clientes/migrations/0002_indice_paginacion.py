@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['freelancer', 'nombre', 'id'], name='cliente_freelancer_nombre_idx'),
+        ),
+    ]
@@ -88,6 +88,12 @@ class Cliente(models.Model):
 
     class Meta:
         unique_together = ('freelancer', 'email')
+        indexes = [
+            # Listado paginado por cursor de cada freelancer (apps/setup/paginacion.py)
+            models.Index(fields=['freelancer', 'nombre', 'id'], name='cliente_freelancer_nombre_idx'),
+            # Clientes activos/inactivos del freelancer (listado y selector del dashboard)
+            models.Index(fields=['freelancer', 'estado'], name='cliente_freelancer_estado_idx'),
+        ]
         verbose_name = 'Cliente'
         verbose_name_plural = 'Clientes'
 
@@ -0,0 +1,101 @@
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from apps.proyectos.models import Proyecto
+from apps.facturas.models import ResumenMensual
+from .models import Cliente
+
+"""
+Totales de facturación por cliente y ranking de los mejores clientes.
+
+anotar_totales() añade los totales como subconsultas correlacionadas sobre ResumenMensual, una
+por medida y sin JOIN, así que no se multiplican filas y en un listado paginado solo se calculan
+para la página. ranking_clientes() agrupa ResumenMensual por cliente y anota solo los N primeros.
+Las medidas están en MEDIDAS.
+"""
+
+ESTADOS_PENDIENTES = ['pendiente', 'parcial', 'vencida']
+
+# medida: (campo de ResumenMensual, condición sobre sus filas)
+MEDIDAS = {
+    'facturado': ('facturado', ~Q(estado='anulada')),
+    'cobrado': ('cobrado', ~Q(estado='anulada')),
+    'pendiente': ('pendiente', Q(estado__in=ESTADOS_PENDIENTES)),
+}
+
+
+def _suma_cliente(medida, año=None):
+    campo, condicion = MEDIDAS[medida]
+    filas = ResumenMensual.objects.filter(condicion, cliente=OuterRef('pk'))
+    if año is not None:
+        filas = filas.filter(año=año)
+    subconsulta = filas.values('cliente').annotate(total=Sum(campo)).values('total')
+    return Coalesce(
+        Subquery(subconsulta, output_field=DecimalField(max_digits=14, decimal_places=2)),
+        Value(Decimal('0')),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def anotar_totales(clientes, año=None):
+    """
+    Args:
+        clientes (QuerySet): clientes a anotar (ya filtrados por freelancer).
+        año (int): solo las facturas emitidas ese año, o None para todas.
+
+    Returns:
+        QuerySet: los mismos clientes con total_facturado, total_cobrado, total_pendiente
+        y num_proyectos.
+    """
+    proyectos = Proyecto.objects.filter(
+        cliente=OuterRef('pk')
+    ).values('cliente').annotate(total=Count('pk')).values('total')
+    return clientes.annotate(
+        total_facturado=_suma_cliente('facturado', año),
+        total_cobrado=_suma_cliente('cobrado', año),
+        total_pendiente=_suma_cliente('pendiente', año),
+        num_proyectos=Coalesce(Subquery(proyectos, output_field=IntegerField()), Value(0)),
+    )
+
+
+def ranking_clientes(freelancer, medida='facturado', limite=5, año=None):
+    """
+    Los mejores clientes del freelancer según una medida, de mayor a menor.
+
+    Si hay menos de 'limite' clientes con facturas se completa con el resto por orden
+    alfabético (con totales a cero), como hacía el ranking del dashboard.
+
+    Args:
+        freelancer (Usuario): el freelancer.
+        medida (str): 'facturado', 'cobrado' o 'pendiente'.
+        limite (int): número de clientes.
+        año (int): solo las facturas emitidas ese año, o None para todas.
+
+    Returns:
+        list: clientes anotados con anotar_totales().
+
+    Raises:
+        ValueError: Si la medida no existe.
+    """
+    if medida not in MEDIDAS:
+        raise ValueError(f'Medida desconocida: {medida}. Opciones: {", ".join(MEDIDAS)}')
+
+    campo, condicion = MEDIDAS[medida]
+    filas = ResumenMensual.objects.filter(condicion, freelancer=freelancer)
+    if año is not None:
+        filas = filas.filter(año=año)
+    ids = list(
+        filas.values('cliente_id').annotate(total=Sum(campo))
+        .filter(total__gt=0).order_by('-total', 'cliente_id')
+        .values_list('cliente_id', flat=True)[:limite]
+    )
+
+    clientes = Cliente.objects.filter(freelancer=freelancer)
+    posicion = {pk: i for i, pk in enumerate(ids)}
+    ranking = sorted(anotar_totales(clientes.filter(pk__in=ids), año), key=lambda c: posicion[c.pk])
+    if len(ranking) < limite:
+        resto = clientes.exclude(pk__in=ids).order_by('nombre', 'id')[:limite - len(ranking)]
+        ranking.extend(anotar_totales(resto, año))
+    return ranking
@@ -1,3 +1,123 @@
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+from django.http import QueryDict
 from django.test import TestCase
+from django.urls import reverse
+
+from apps.facturas.models import Factura
+from apps.presupuestos.tests import asignar_permisos_grupos
+from apps.setup.generador import generar
+from apps.setup.paginacion import codificar_cursor, paginar
+from .models import Cliente
+from .ranking import anotar_totales, ranking_clientes
+
+
+class ClientesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        asignar_permisos_grupos()
+        cls.freelancer, cls.otro = generar('clientes', freelancers=2, clientes=30, facturas=120, semilla=11)
+        cls.suyo = Cliente.objects.filter(freelancer=cls.freelancer).first()
+        cls.ajeno = Cliente.objects.filter(freelancer=cls.otro).first()
+
+    def setUp(self):
+        self.client.force_login(self.freelancer)
+
+    def paginas(self, url):
+        """Recorre el listado con los enlaces Siguiente y devuelve los ids de cada página."""
+        paginas = []
+        while url:
+            respuesta = self.client.get(url)
+            paginas.append([cliente.pk for cliente in respuesta.context['clientes']])
+            siguiente = respuesta.context['pagina'].siguiente_url
+            url = reverse('cliente_list') + siguiente if siguiente else None
+        return paginas
+
+    def test_solo_el_propietario_ve_el_detalle(self):
+        self.assertEqual(self.client.get(reverse('cliente_detail', args=[self.suyo.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('cliente_detail', args=[self.ajeno.pk])).status_code, 403)
+        self.assertEqual(self.client.get(reverse('cliente_detail', args=[0])).status_code, 404)
+
+    def test_no_se_puede_borrar_un_cliente_ajeno(self):
+        respuesta = self.client.post(reverse('cliente_delete', args=[self.ajeno.pk]))
+        self.assertEqual(respuesta.status_code, 403)
+        self.assertTrue(Cliente.objects.filter(pk=self.ajeno.pk).exists())
+
+    def test_paginas_por_cursor(self):
+        paginas = self.paginas(reverse('cliente_list'))
+        esperados = list(
+            Cliente.objects.filter(freelancer=self.freelancer).order_by('nombre', 'id').values_list('pk', flat=True)
+        )
+        self.assertEqual([len(pagina) for pagina in paginas], [25, 5])
+        self.assertEqual(sum(paginas, []), esperados)
+
+        # Desde la última página, Anterior lleva a la primera
+        primera = self.client.get(reverse('cliente_list'))
+        ultima = self.client.get(reverse('cliente_list') + primera.context['pagina'].siguiente_url)
+        anterior = self.client.get(reverse('cliente_list') + ultima.context['pagina'].anterior_url)
+        self.assertEqual([cliente.pk for cliente in anterior.context['clientes']], paginas[0])
+
+    def test_los_filtros_se_conservan_al_paginar(self):
+        paginas = self.paginas(reverse('cliente_list') + '?estado=activo')
+        activos = Cliente.objects.filter(freelancer=self.freelancer, estado=True).order_by('nombre', 'id')
+        self.assertEqual(sum(paginas, []), list(activos.values_list('pk', flat=True)))
+
+    def test_un_cursor_manipulado_lleva_a_la_primera_pagina(self):
+        primera = self.client.get(reverse('cliente_list'))
+        manipulada = self.client.get(reverse('cliente_list') + '?despues=no-es-un-cursor')
+        self.assertEqual(list(manipulada.context['clientes']), list(primera.context['clientes']))
+
+    def test_un_cursor_con_valores_de_otro_tipo_lleva_a_la_primera_pagina(self):
+        primera = [cliente.pk for cliente in self.client.get(reverse('cliente_list')).context['clientes']]
+        for valores in (['Acme', 'x'], [None, 1], [{'a': 1}, 2], ['Acme', True], ['Acme']):
+            for parametro in ('despues', 'antes'):
+                with self.subTest(valores=valores, parametro=parametro):
+                    respuesta = self.client.get(reverse('cliente_list'), {parametro: codificar_cursor(valores)})
+                    self.assertEqual([cliente.pk for cliente in respuesta.context['clientes']], primera)
+        # Las fechas de la clave de las facturas también se validan
+        for valores in (['abc', 1], ['2026-01-01', 'x'], [None, 1], [{'a': 1}, 2]):
+            with self.subTest(valores=valores):
+                parametros = QueryDict(mutable=True)
+                parametros['despues'] = codificar_cursor(valores)
+                pagina = paginar(Factura.objects.all(), ('-fecha_emision', '-id'), 25, parametros)
+                self.assertIsNone(pagina.anterior_url)
+
+    def test_buscar_despues_de_editar(self):
+        self.suyo.email = 'facturacion@ejemplo-nuevo.test'
+        self.suyo.save()
+        respuesta = self.client.get(reverse('cliente_list'), {'busqueda': 'ejemplo-nuevo'})
+        self.assertEqual([cliente.pk for cliente in respuesta.context['clientes']], [self.suyo.pk])
+        # Los clientes del otro freelancer no aparecen aunque coincidan
+        respuesta = self.client.get(reverse('cliente_list'), {'busqueda': self.ajeno.email})
+        self.assertEqual(list(respuesta.context['clientes']), [])
+
+    def test_totales_iguales_a_sumar_las_facturas(self):
+        cero = Decimal('0')
+        for cliente in anotar_totales(Cliente.objects.filter(freelancer=self.freelancer)):
+            facturas = Factura.objects.filter(presupuesto__proyecto__cliente=cliente)
+            esperado = facturas.aggregate(
+                facturado=Sum('total_con_impuestos', filter=~Q(estado='anulada'), default=cero),
+                cobrado=Sum('total_pagado', filter=~Q(estado='anulada'), default=cero),
+                pendiente=Sum(
+                    'saldo_pendiente', filter=Q(estado__in=['pendiente', 'parcial', 'vencida']), default=cero,
+                ),
+            )
+            self.assertEqual(
+                (cliente.total_facturado, cliente.total_cobrado, cliente.total_pendiente),
+                (esperado['facturado'], esperado['cobrado'], esperado['pendiente']),
+            )
+            self.assertEqual(cliente.num_proyectos, cliente.proyectos.count())
+
+    def test_ranking(self):
+        ranking = ranking_clientes(self.freelancer, 'facturado', limite=5)
+        totales = sorted(
+            (cliente.total_facturado for cliente in anotar_totales(Cliente.objects.filter(freelancer=self.freelancer))),
+            reverse=True,
+        )
+        self.assertEqual([cliente.total_facturado for cliente in ranking], totales[:5])
 
-# Create your tests here.
+    def test_ranking_con_una_medida_desconocida(self):
+        with self.assertRaises(ValueError):
+            ranking_clientes(self.freelancer, 'beneficio')
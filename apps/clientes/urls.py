@@ -1,10 +1,11 @@
 from django.urls import path
+from apps.setup.asincrono import elegir_vista
 from . import views
 
 urlpatterns = [
-    path('', views.ClienteListView.as_view(), name='cliente_list'),
+    path('', elegir_vista(views.ClienteListView.as_view(), views.ClienteListAsyncView.as_view()), name='cliente_list'),
     path('crear/', views.ClienteCreateView.as_view(), name='cliente_create'),
-    path('<int:pk>/', views.ClienteDetailView.as_view(), name='cliente_detail'),
+    path('<int:pk>/', elegir_vista(views.ClienteDetailView.as_view(), views.ClienteDetailAsyncView.as_view()), name='cliente_detail'),
     path('<int:pk>/editar/', views.ClienteUpdateView.as_view(), name='cliente_update'),
     path('<int:pk>/eliminar/', views.ClienteDeleteView.as_view(), name='cliente_delete'),
 ]
\ No newline at end of file
@@ -1,29 +1,34 @@
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy
-from django.db.models import Q
 from .models import Cliente
 from .forms import ClienteForm
+from .ranking import anotar_totales
+from apps.setup.busqueda import ids_coincidentes
+from apps.setup.asincrono import LecturaAsincronaMixin
+from apps.setup.limite_consultas import LimiteConsultasMixin
 from apps.setup.mixins import FreelancerPropietarioMixin
+from apps.setup.paginacion import PaginacionKeysetMixin
 
 
-class ClienteListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class ClienteListView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, PaginacionKeysetMixin, ListView):
     """
     Vista para listar los clientes del freelancer autenticado.
 
     Solo muestra los clientes del freelancer propietario.
-    Permite buscar por nombre, email o estado mediante Q objects.
+    Permite buscar por nombre o email y filtrar por estado.
     """
+    limite_consultas = 7
     model = Cliente
     template_name = 'apps/clientes/cliente_list.html'
     context_object_name = 'clientes'
     permission_required = 'clientes.view_cliente'
+    orden_paginacion = ('nombre', 'id')
 
     def get_queryset(self):
         """
         Filtra los clientes del freelancer autenticado.
-        Permite buscar por nombre o email y filtrar por estado
-        usando Q objects para combinar condiciones.
+        Permite buscar por nombre o email (apps/setup/busqueda.py) y filtrar por estado.
         """
         queryset = Cliente.objects.filter(freelancer=self.request.user)
 
@@ -31,17 +36,17 @@ class ClienteListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
         estado = self.request.GET.get('estado', '')
 
         if busqueda:
-            # Q objects: busca por nombre O email y además filtra por freelancer
-            queryset = queryset.filter(
-                Q(nombre__icontains=busqueda) | Q(email__icontains=busqueda)
-            )
+            # Busca en el índice del buscador global (nombre, email, teléfono y dirección)
+            # en lugar de hacer icontains sobre cada campo
+            queryset = queryset.filter(pk__in=ids_coincidentes(self.request.user, 'cliente', busqueda))
 
         if estado == 'activo':
             queryset = queryset.filter(estado=True)
         elif estado == 'inactivo':
             queryset = queryset.filter(estado=False)
 
-        return queryset
+        # Totales de facturación con subconsultas: solo se calculan para las filas de la página
+        return anotar_totales(queryset)
 
     def get_context_data(self, **kwargs):
         """
@@ -54,26 +59,43 @@ class ClienteListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
         return context
 
 
-class ClienteDetailView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, DetailView):
+class ClienteDetailView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, DetailView):
     """
     Vista para ver el detalle de un cliente.
 
     Aplica FreelancerPropietarioMixin para que solo el freelancer
     propietario pueda acceder al detalle de sus clientes.
     """
+    limite_consultas = 10
     model = Cliente
     template_name = 'apps/clientes/cliente_detail.html'
     context_object_name = 'cliente'
     permission_required = 'clientes.view_cliente'
 
+    def get_queryset(self):
+        """
+        Añade los totales de facturación del cliente (ranking.anotar_totales)
+        en la misma consulta que comprueba la propiedad.
+        """
+        return anotar_totales(super().get_queryset())
+
+
+class ClienteListAsyncView(LecturaAsincronaMixin, ClienteListView):
+    """ClienteListView para el perfil ASGI (apps/setup/asincrono.py)."""
+
+
+class ClienteDetailAsyncView(LecturaAsincronaMixin, ClienteDetailView):
+    """ClienteDetailView para el perfil ASGI (apps/setup/asincrono.py)."""
+
 
-class ClienteCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
+class ClienteCreateView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, CreateView):
     """
     Vista para crear un nuevo cliente.
 
     Asigna automáticamente el freelancer autenticado como propietario
     y pasa el freelancer al formulario para validar duplicados de email.
     """
+    limite_consultas = {'GET': 7, 'POST': 9}
     model = Cliente
     form_class = ClienteForm
     template_name = 'apps/clientes/cliente_form.html'
@@ -99,7 +121,7 @@ class ClienteCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView)
         return super().form_valid(form)
 
 
-class ClienteUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, UpdateView):
+class ClienteUpdateView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, UpdateView):
     """
     Vista para editar un cliente existente.
 
@@ -107,6 +129,8 @@ class ClienteUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerP
     propietario pueda editar sus clientes.
     Pasa el freelancer al formulario para validar duplicados de email.
     """
+    # El POST no se limita: renombrar reindexa en el buscador todo lo que depende del objeto, por lotes
+    limite_consultas = {'GET': 9}
     model = Cliente
     form_class = ClienteForm
     template_name = 'apps/clientes/cliente_form.html'
@@ -127,7 +151,7 @@ class ClienteUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerP
         return super().form_valid(form)
 
 
-class ClienteDeleteView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, DeleteView):
+class ClienteDeleteView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, DeleteView):
     """
     Vista para eliminar un cliente.
 
@@ -139,6 +163,7 @@ class ClienteDeleteView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerP
     Django impedirá el borrado si el cliente tiene proyectos asociados,
     mostrando un error controlado.
     """
+    limite_consultas = {'GET': 11, 'POST': 11}
     model = Cliente
     template_name = 'apps/clientes/cliente_confirm_delete.html'
     success_url = reverse_lazy('cliente_list')
@@ -1,5 +1,21 @@
 from django.contrib import admin
-from .models import Factura
+from .models import Factura, Pago, TrabajoPDF, ResumenMensual
+
+
+class PagoInline(admin.TabularInline):
+    """
+    Muestra los pagos de la factura en su misma pantalla del admin.
+
+    Es de solo lectura: los pagos se registran con Factura.registrar_pago()
+    para que total_pagado y el estado de la factura se mantengan coherentes.
+    """
+    model = Pago
+    extra = 0
+    can_delete = False
+    readonly_fields = ('fecha', 'cantidad', 'metodo', 'notas')
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Factura)
@@ -28,9 +44,12 @@ class FacturaAdmin(admin.ModelAdmin):
     readonly_fields = (
         'numero_serie',
         'total_pagado',
-        'pagos'
+        'total_con_impuestos',
+        'saldo_pendiente',
     )
 
+    inlines = (PagoInline,)
+
     fieldsets = (
         ('Clave Foranea', {
             'fields': ('presupuesto',),
@@ -42,6 +61,34 @@ class FacturaAdmin(admin.ModelAdmin):
             'fields': ('fecha_emision', 'fecha_vencimiento'),
         }),
         ('Estado y pagos', {
-            'fields': ('estado', 'total_pagado', 'pagos'),
+            'fields': ('estado', 'total_con_impuestos', 'total_pagado', 'saldo_pendiente'),
         }),
-    )
\ No newline at end of file
+    )
+
+@admin.register(TrabajoPDF)
+class TrabajoPDFAdmin(admin.ModelAdmin):
+    """
+    Solo para consultar: los trabajos los crea y actualiza apps/facturas/trabajos_pdf.py.
+    """
+
+    list_display = ('id', 'factura', 'usuario', 'estado', 'intentos', 'creado', 'actualizado')
+    list_filter = ('estado',)
+    readonly_fields = ('id', 'factura', 'usuario', 'huella', 'estado', 'intentos', 'error', 'creado', 'actualizado')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(ResumenMensual)
+class ResumenMensualAdmin(admin.ModelAdmin):
+    """
+    Solo para consultar: las filas las mantiene apps/facturas/resumen.py y se
+    recalculan con python manage.py reconstruir_resumen.
+    """
+
+    list_display = ('freelancer', 'cliente', 'año', 'mes', 'estado', 'facturado', 'cobrado', 'pendiente', 'num_facturas')
+    list_filter = ('estado', 'año')
+    readonly_fields = ('freelancer', 'cliente', 'año', 'mes', 'estado', 'facturado', 'cobrado', 'pendiente', 'num_facturas')
+
+    def has_add_permission(self, request):
+        return False
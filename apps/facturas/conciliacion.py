@@ -0,0 +1,567 @@
+import csv
+import hashlib
+import io
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from xml.etree import ElementTree
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from apps.setup.busqueda import normalizar
+from apps.usuarios.cache_dashboard import invalidar_dashboard
+from .models import Factura, Pago
+from .resumen import cambios_resumen
+
+"""
+Importación de extractos bancarios y conciliación de los cobros con las facturas abiertas.
+
+leer_extracto() lee un CSV o un CAMT.053 y conciliar() busca cada abono en las facturas abiertas
+del freelancer, cargadas con una consulta: primero por los números de serie citados (una factura,
+o varias si el importe es la suma exacta), después por el importe pendiente, desempatando por el
+nombre del cliente. Lo demás va a revisión con el motivo. Los cobros se aplican por lotes en una
+transacción y cada movimiento guarda su huella en Pago.referencia_extracto, que es única.
+
+Ejemplo:
+    with open('extracto.xml', 'rb') as fichero:
+        resultado = conciliar(freelancer, leer_extracto(fichero, 'extracto.xml'))
+"""
+
+# Estados en los que una factura puede recibir cobros
+ESTADOS_ABIERTOS = ('pendiente', 'parcial', 'vencida')
+
+# Filas por bulk_create / bulk_update y facturas por cambios_resumen()
+LOTE = 2000
+
+# 2026-015, 2026/15, 2026 - 0015...: ejercicio y número, como formatear_numero_serie()
+PATRON_NUMERO = re.compile(r'(?<!\d)(20\d{2})\s*[-/]\s*(\d{1,6})(?!\d)')
+
+# Nombres de columna aceptados en el CSV (ya normalizados)
+COLUMNAS_CSV = {
+    'fecha': ('fecha', 'fecha operacion', 'fecha valor', 'date', 'booking date'),
+    'importe': ('importe', 'cantidad', 'amount'),
+    'concepto': ('concepto', 'descripcion', 'description', 'detalle'),
+    'referencia': ('referencia', 'reference', 'ref'),
+}
+FORMATOS_FECHA = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d/%m/%y')
+
+
+class ExtractoInvalido(Exception):
+    """El fichero no es un extracto que se pueda leer (formato o columnas desconocidos)."""
+
+
+@dataclass
+class LineaExtracto:
+    """Un movimiento del extracto. importe es negativo en los cargos."""
+    numero: int
+    fecha: date
+    importe: Decimal
+    concepto: str = ''
+    referencia: str = ''
+    referencia_banco: str = ''
+
+    def huella(self, propietario, repeticion=0):
+        """
+        Identificador estable del movimiento para no importarlo dos veces: un hash de la
+        referencia del banco o, si no la trae, de fecha, importe, concepto y referencia.
+
+        Args:
+            propietario (int): id del freelancer; las referencias del banco solo son únicas
+                dentro de una cuenta, así que dos freelancers pueden compartirlas.
+            repeticion (int): distingue movimientos idénticos dentro del mismo extracto (dos
+                transferencias iguales el mismo día).
+
+        Returns:
+            str: la huella, de menos de 64 caracteres.
+        """
+        if self.referencia_banco:
+            datos = f'banco|{self.referencia_banco}|{repeticion}'
+        else:
+            datos = f'{self.fecha.isoformat()}|{self.importe}|{self.concepto}|{self.referencia}|{repeticion}'
+        return f'{propietario}:' + hashlib.sha256(datos.encode('utf-8')).hexdigest()[:40]
+
+
+@dataclass
+class FacturaAbierta:
+    pk: int
+    numero_serie: str
+    total: Decimal
+    pagado: Decimal
+    estado: str
+    cliente: str
+
+    @property
+    def pendiente(self):
+        return self.total - self.pagado
+
+
+@dataclass
+class Cobro:
+    """Parte de un movimiento que se aplica a una factura."""
+    linea: LineaExtracto
+    factura: FacturaAbierta
+    cantidad: Decimal
+    motivo: str
+
+
+@dataclass
+class Revision:
+    """Movimiento que no se ha podido conciliar solo."""
+    linea: LineaExtracto
+    motivo: str
+    candidatas: list = field(default_factory=list)
+
+
+@dataclass
+class ResultadoConciliacion:
+    cobros: list = field(default_factory=list)
+    revision: list = field(default_factory=list)
+    ignoradas: int = 0
+    ya_importadas: int = 0
+    aplicado: bool = False
+
+    @property
+    def conciliadas(self):
+        """Número de movimientos conciliados (un movimiento puede pagar varias facturas)."""
+        return len({id(cobro.linea) for cobro in self.cobros})
+
+    @property
+    def importe_conciliado(self):
+        return sum((cobro.cantidad for cobro in self.cobros), Decimal('0'))
+
+
+# ---------------------------------------------------------------
+# LECTURA DE EXTRACTOS
+# ---------------------------------------------------------------
+
+def leer_importe(texto):
+    """
+    Convierte un importe escrito a la española o a la inglesa en Decimal.
+
+    Ejemplo:
+        leer_importe('1.234,56')   # Decimal('1234.56')
+        leer_importe('-1,234.56')  # Decimal('-1234.56')
+
+    Raises:
+        ValueError: Si no es un importe.
+    """
+    limpio = re.sub(r'[^\d,.\-+]', '', str(texto))
+    if ',' in limpio and '.' in limpio:
+        # El separador decimal es el último que aparece
+        if limpio.rfind(',') > limpio.rfind('.'):
+            limpio = limpio.replace('.', '').replace(',', '.')
+        else:
+            limpio = limpio.replace(',', '')
+    elif ',' in limpio:
+        limpio = limpio.replace(',', '.')
+    try:
+        return Decimal(limpio).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'Importe no válido: {texto!r}')
+
+
+def leer_fecha(texto):
+    """
+    Raises:
+        ValueError: Si la fecha no tiene ninguno de los FORMATOS_FECHA (o es ISO con hora).
+    """
+    texto = str(texto).strip()
+    for formato in FORMATOS_FECHA:
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            pass
+    try:
+        return datetime.fromisoformat(texto).date()
+    except ValueError:
+        raise ValueError(f'Fecha no válida: {texto!r}')
+
+
+def leer_csv(fichero):
+    """
+    Lee un extracto en CSV. La primera fila es la cabecera; el separador (; o ,) se detecta solo.
+
+    Args:
+        fichero: fichero abierto en binario o en texto.
+
+    Yields:
+        LineaExtracto: cada movimiento. Las filas ilegibles se devuelven con importe None
+        para que acaben en el informe de revisión.
+
+    Raises:
+        ExtractoInvalido: Si faltan las columnas de fecha o importe.
+    """
+    texto = io.TextIOWrapper(fichero, encoding='utf-8-sig', newline='') if _es_binario(fichero) else fichero
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=';,\t')
+    except csv.Error:
+        dialecto = csv.excel
+    lector = csv.reader(texto, dialecto)
+
+    cabecera = [normalizar(nombre) for nombre in next(lector, [])]
+    columnas = {}
+    for campo, nombres in COLUMNAS_CSV.items():
+        for posicion, nombre in enumerate(cabecera):
+            if nombre in nombres:
+                columnas[campo] = posicion
+                break
+    if 'fecha' not in columnas or 'importe' not in columnas:
+        raise ExtractoInvalido('El CSV debe tener columnas de fecha e importe en la primera fila.')
+
+    def celda(fila, campo):
+        posicion = columnas.get(campo)
+        return fila[posicion].strip() if posicion is not None and posicion < len(fila) else ''
+
+    for numero, fila in enumerate(lector, start=2):
+        if not any(fila):
+            continue
+        linea = LineaExtracto(
+            numero=numero, fecha=None, importe=None,
+            concepto=celda(fila, 'concepto'), referencia=celda(fila, 'referencia'),
+        )
+        try:
+            linea.fecha = leer_fecha(celda(fila, 'fecha'))
+            linea.importe = leer_importe(celda(fila, 'importe'))
+        except ValueError:
+            pass
+        yield linea
+
+
+def _etiqueta(elemento):
+    # '{urn:iso:std:iso:20022:tech:xsd:camt.053.001.02}Ntry' -> 'Ntry'
+    return elemento.tag.rsplit('}', 1)[-1]
+
+
+def _hijo(elemento, *ruta):
+    """Busca un descendiente por la ruta de etiquetas sin tener en cuenta el espacio de nombres."""
+    for nombre in ruta:
+        if elemento is None:
+            return None
+        elemento = next((hijo for hijo in elemento if _etiqueta(hijo) == nombre), None)
+    return elemento
+
+
+def _texto(elemento, *ruta):
+    encontrado = _hijo(elemento, *ruta)
+    return (encontrado.text or '').strip() if encontrado is not None else ''
+
+
+def _textos(elemento, nombre):
+    return [(hijo.text or '').strip() for hijo in elemento.iter() if _etiqueta(hijo) == nombre and hijo.text]
+
+
+def leer_camt053(fichero):
+    """
+    Lee un extracto CAMT.053 (BkToCstmrStmt). Cada apunte (Ntry) es un movimiento; si agrupa
+    varias transacciones (NtryDtls/TxDtls) con importe propio, cada una es un movimiento.
+
+    Args:
+        fichero: fichero abierto en binario.
+
+    Yields:
+        LineaExtracto: cada movimiento; los cargos (CdtDbtInd = DBIT) con importe negativo.
+
+    Raises:
+        ExtractoInvalido: Si el XML está mal formado.
+    """
+    numero = 0
+    try:
+        for _, elemento in ElementTree.iterparse(fichero, events=('end',)):
+            if _etiqueta(elemento) != 'Ntry':
+                continue
+            signo = -1 if _texto(elemento, 'CdtDbtInd') == 'DBIT' else 1
+            fecha_texto = (_texto(elemento, 'BookgDt', 'Dt') or _texto(elemento, 'BookgDt', 'DtTm')
+                           or _texto(elemento, 'ValDt', 'Dt'))
+            adicional = _texto(elemento, 'AddtlNtryInf')
+            referencia_banco = _texto(elemento, 'AcctSvcrRef')
+
+            detalles = _hijo(elemento, 'NtryDtls')
+            transacciones = [
+                tx for tx in (detalles if detalles is not None else []) if _etiqueta(tx) == 'TxDtls'
+            ]
+            con_importe = [
+                tx for tx in transacciones
+                if _hijo(tx, 'Amt') is not None or _hijo(tx, 'AmtDtls', 'TxAmt', 'Amt') is not None
+            ]
+            partes = con_importe if len(con_importe) > 1 else [None]
+
+            for posicion, tx in enumerate(partes):
+                numero += 1
+                origen = tx if tx is not None else elemento
+                importe = (_texto(origen, 'Amt') or _texto(origen, 'AmtDtls', 'TxAmt', 'Amt')
+                           or _texto(elemento, 'Amt'))
+                conceptos = _textos(origen, 'Ustrd')
+                referencia = (_texto(origen, 'RmtInf', 'Strd', 'CdtrRefInf', 'Ref')
+                              or next(iter(_textos(origen, 'Ref')), '') or next(iter(_textos(origen, 'EndToEndId')), ''))
+                if referencia == 'NOTPROVIDED':
+                    referencia = ''
+                propia = _texto(tx, 'Refs', 'AcctSvcrRef') if tx is not None else ''
+                linea = LineaExtracto(
+                    numero=numero, fecha=None, importe=None,
+                    concepto=' '.join(conceptos + ([adicional] if adicional and tx is None else [])),
+                    referencia=referencia,
+                    referencia_banco=propia or (
+                        f'{referencia_banco}/{posicion}' if referencia_banco and tx is not None else referencia_banco
+                    ),
+                )
+                try:
+                    linea.fecha = leer_fecha(fecha_texto)
+                    linea.importe = signo * leer_importe(importe)
+                except ValueError:
+                    pass
+                yield linea
+            # Libera el apunte ya leído: la memoria no crece con el tamaño del extracto
+            elemento.clear()
+    except ElementTree.ParseError as e:
+        raise ExtractoInvalido(f'El XML del extracto no es válido: {e}')
+
+
+def _es_binario(fichero):
+    return not isinstance(fichero, io.TextIOBase)
+
+
+def leer_extracto(fichero, nombre=''):
+    """
+    Lee un extracto en CSV o CAMT.053 según la extensión del nombre o, si no la tiene, según
+    su primer carácter ('<' es XML).
+
+    Returns:
+        list: las LineaExtracto del fichero.
+
+    Raises:
+        ExtractoInvalido: Si no se puede leer.
+    """
+    extension = nombre.lower().rsplit('.', 1)[-1] if '.' in nombre else ''
+    if not extension:
+        inicio = fichero.read(64)
+        fichero.seek(0)
+        if isinstance(inicio, bytes):
+            inicio = inicio.decode('utf-8', 'ignore')
+        extension = 'xml' if inicio.lstrip('﻿ \r\n\t').startswith('<') else 'csv'
+    if extension == 'xml':
+        return list(leer_camt053(fichero))
+    return list(leer_csv(fichero))
+
+
+# ---------------------------------------------------------------
+# CONCILIACIÓN
+# ---------------------------------------------------------------
+
+def numeros_citados(texto):
+    """
+    Returns:
+        list: números de serie con el formato de formatear_numero_serie() que aparecen en el texto.
+
+    Ejemplo:
+        numeros_citados('Pago fras 2026/15 y 2026-016')   # ['2026-015', '2026-016']
+    """
+    return [f'{año}-{int(numero):03d}' for año, numero in PATRON_NUMERO.findall(texto or '')]
+
+
+class IndiceFacturas:
+    """
+    Facturas abiertas de un freelancer en memoria, por número de serie y por importe pendiente.
+    Se construye con una sola consulta.
+    """
+
+    def __init__(self, freelancer, bloquear=False):
+        facturas = Factura.objects.filter(
+            presupuesto__proyecto__freelancer=freelancer, estado__in=ESTADOS_ABIERTOS
+        )
+        if bloquear:
+            facturas = facturas.select_for_update(of=('self',))
+        filas = facturas.values_list(
+            'pk', 'numero_serie', 'total_con_impuestos', 'total_pagado', 'estado',
+            'presupuesto__proyecto__cliente__nombre',
+        )
+        self.por_numero = {}
+        self.por_importe = defaultdict(list)
+        for pk, numero_serie, total, pagado, estado, cliente in filas:
+            factura = FacturaAbierta(pk, numero_serie, total, pagado, estado, normalizar(cliente))
+            self.por_numero[numero_serie] = factura
+            if factura.pendiente > 0:
+                self.por_importe[factura.pendiente].append(factura)
+
+    def cobrar(self, factura, cantidad):
+        """Descuenta la cantidad de lo pendiente de la factura y la mueve en el índice por importe."""
+        self.por_importe[factura.pendiente].remove(factura)
+        factura.pagado += cantidad
+        if factura.pendiente > 0:
+            self.por_importe[factura.pendiente].append(factura)
+
+
+def _conciliar_linea(linea, indice):
+    """
+    Returns:
+        tuple: (lista de Cobro, Revision o None).
+    """
+    citados = list(dict.fromkeys(numeros_citados(f'{linea.referencia} {linea.concepto}')))
+    if citados:
+        abiertas = [indice.por_numero[n] for n in citados if n in indice.por_numero]
+        abiertas = [factura for factura in abiertas if factura.pendiente > 0]
+        if not abiertas:
+            return [], Revision(linea, 'Cita facturas que no están pendientes de cobro', citados)
+        if len(abiertas) == 1:
+            factura = abiertas[0]
+            if linea.importe > factura.pendiente:
+                return [], Revision(
+                    linea, f'El importe supera lo pendiente de {factura.numero_serie} ({factura.pendiente})',
+                    [factura.numero_serie],
+                )
+            return [Cobro(linea, factura, linea.importe, 'número de serie')], None
+        if linea.importe == sum(factura.pendiente for factura in abiertas):
+            return [Cobro(linea, factura, factura.pendiente, 'varias facturas') for factura in abiertas], None
+        return [], Revision(
+            linea, 'Cita varias facturas y el importe no es la suma de lo pendiente',
+            [factura.numero_serie for factura in abiertas],
+        )
+
+    candidatas = indice.por_importe.get(linea.importe, [])
+    if len(candidatas) > 1:
+        concepto = normalizar(linea.concepto)
+        del_cliente = [factura for factura in candidatas if factura.cliente and factura.cliente in concepto]
+        if len(del_cliente) == 1:
+            return [Cobro(linea, del_cliente[0], linea.importe, 'importe y cliente')], None
+        return [], Revision(
+            linea, f'{len(candidatas)} facturas pendientes por ese importe',
+            [factura.numero_serie for factura in candidatas[:10]],
+        )
+    if candidatas:
+        return [Cobro(linea, candidatas[0], linea.importe, 'importe')], None
+    return [], Revision(linea, 'Ninguna factura pendiente por ese importe')
+
+
+def conciliar(freelancer, lineas, aplicar=True, metodo='transferencia'):
+    """
+    Concilia los movimientos con las facturas abiertas del freelancer y, con aplicar, registra
+    los cobros. Todo se hace en una transacción: si algo falla no se registra ningún cobro.
+
+    Args:
+        freelancer (Usuario): dueño de las facturas.
+        lineas (iterable): LineaExtracto leídas con leer_extracto().
+        aplicar (bool): registrar los cobros; con False solo se calcula el resultado (simulación).
+        metodo (str): método de los pagos creados (Pago.METODOS).
+
+    Returns:
+        ResultadoConciliacion: cobros, movimientos para revisar, ignorados y ya importados.
+    """
+    lineas = list(lineas)
+
+    # Huellas de los movimientos: repetición para los idénticos dentro del mismo extracto
+    vistas = defaultdict(int)
+    huellas = {}
+    for linea in lineas:
+        if linea.importe is not None and linea.fecha is not None:
+            clave = linea.huella(freelancer.pk)
+            huellas[id(linea)] = linea.huella(freelancer.pk, vistas[clave])
+            vistas[clave] += 1
+
+    try:
+        return _conciliar(freelancer, lineas, huellas, aplicar, metodo)
+    except IntegrityError:
+        # Otra importación del mismo extracto ha insertado los pagos a la vez (referencia_extracto
+        # es única): se concilia de nuevo y sus movimientos salen como ya importados
+        return _conciliar(freelancer, lineas, huellas, aplicar, metodo)
+
+
+def _importadas(huellas):
+    """
+    Returns:
+        set: las huellas que ya están en Pago.referencia_extracto.
+    """
+    importadas = set()
+    lista = list(huellas)
+    for inicio in range(0, len(lista), LOTE):
+        importadas.update(Pago.objects.filter(
+            referencia_extracto__in=lista[inicio:inicio + LOTE]
+        ).values_list('referencia_extracto', flat=True))
+    return importadas
+
+
+def _conciliar(freelancer, lineas, huellas, aplicar, metodo):
+    resultado = ResultadoConciliacion()
+    with transaction.atomic():
+        # Primero se bloquean las facturas: una importación simultánea espera aquí a que termine
+        # la otra y después ya ve sus pagos
+        indice = IndiceFacturas(freelancer, bloquear=aplicar)
+        importadas = _importadas(huellas.values())
+        for linea in lineas:
+            if linea.importe is None or linea.fecha is None:
+                resultado.revision.append(Revision(linea, 'No se ha podido leer la fecha o el importe'))
+                continue
+            if linea.importe <= 0:
+                resultado.ignoradas += 1
+                continue
+            if huellas[id(linea)] in importadas:
+                resultado.ya_importadas += 1
+                continue
+            cobros, revision = _conciliar_linea(linea, indice)
+            for cobro in cobros:
+                indice.cobrar(cobro.factura, cobro.cantidad)
+            resultado.cobros.extend(cobros)
+            if revision is not None:
+                resultado.revision.append(revision)
+
+        if aplicar and resultado.cobros:
+            _aplicar(freelancer, resultado.cobros, huellas, metodo)
+            resultado.aplicado = True
+    return resultado
+
+
+def _aplicar(freelancer, cobros, huellas, metodo):
+    """Inserta los pagos y actualiza las facturas cobradas con escrituras por lotes."""
+    partes = defaultdict(int)
+    pagos = []
+    for cobro in cobros:
+        huella = huellas[id(cobro.linea)]
+        # Un movimiento que paga varias facturas crea un pago por factura, con huellas distintas
+        partes[huella] += 1
+        pagos.append(Pago(
+            factura_id=cobro.factura.pk, fecha=cobro.linea.fecha, cantidad=cobro.cantidad, metodo=metodo,
+            notas=f'Extracto: {cobro.linea.concepto}'.strip()[:500],
+            referencia_extracto=huella if partes[huella] == 1 else f'{huella[:60]}#{partes[huella]}',
+        ))
+    Pago.objects.bulk_create(pagos, batch_size=LOTE)
+
+    # Mismo criterio que registrar_pago(): pagada si se ha cubierto el total, si no parcial.
+    # Las que quedan pagadas (casi todas) se actualizan con un UPDATE por lote; las parciales,
+    # cada una con su total, con bulk_update
+    facturas = {cobro.factura.pk: cobro.factura for cobro in cobros}
+    pagadas = [pk for pk, factura in facturas.items() if factura.pendiente <= 0]
+    parciales = [
+        Factura(pk=pk, total_pagado=factura.pagado, estado='parcial')
+        for pk, factura in facturas.items() if factura.pendiente > 0
+    ]
+    with cambios_resumen(facturas):
+        for inicio in range(0, len(pagadas), LOTE):
+            Factura.objects.filter(pk__in=pagadas[inicio:inicio + LOTE]).update(
+                total_pagado=F('total_con_impuestos'), estado='pagada'
+            )
+        Factura.objects.bulk_update(parciales, ['total_pagado', 'estado'], batch_size=LOTE)
+
+    # bulk_create y bulk_update no lanzan las señales que invalidan la caché del dashboard
+    transaction.on_commit(lambda: invalidar_dashboard(freelancer.pk))
+
+
+def escribir_informe(resultado, salida):
+    """
+    Escribe en CSV (separado por ;) los movimientos para revisar, con su motivo y candidatas.
+
+    Args:
+        resultado (ResultadoConciliacion): el resultado de conciliar().
+        salida: fichero de texto abierto para escribir.
+    """
+    writer = csv.writer(salida, delimiter=';')
+    writer.writerow(['Línea', 'Fecha', 'Importe', 'Concepto', 'Referencia', 'Motivo', 'Facturas candidatas'])
+    for revision in resultado.revision:
+        linea = revision.linea
+        writer.writerow([
+            linea.numero, linea.fecha.isoformat() if linea.fecha else '',
+            linea.importe if linea.importe is not None else '', linea.concepto, linea.referencia,
+            revision.motivo, ', '.join(revision.candidatas),
+        ])
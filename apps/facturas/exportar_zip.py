@@ -0,0 +1,143 @@
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from apps.setup.fechas import filtro_año
+from apps.setup.roles import es_freelancer, es_cliente
+
+from .pdf_cache import obtener_cache_pdf, huella_factura
+from .render_pdf import renderizar_pdf
+from .trabajos_pdf import facturas_para_pdf, html_factura
+
+"""
+Exportación en un ZIP de los PDF de muchas facturas a la vez.
+
+Los PDF que están en la caché se añaden tal cual y el resto se encargan al pool de procesos (como
+mucho EN_VUELO por proceso) y se añaden según terminan. El ZIP se escribe sobre BufferZip y se va
+enviando por trozos, así que la memoria no depende del número de facturas. Los PDF que fallan se
+listan en un ERRORES.txt al final del ZIP.
+"""
+
+# PDF encargados a la vez por cada proceso del pool
+EN_VUELO = 2
+
+
+def facturas_filtradas(usuario, estado=None, año=None, cliente=None):
+    """
+    Facturas visibles para el usuario con los mismos filtros que FacturaListView,
+    más el año de emisión y el cliente.
+
+    Args:
+        usuario (Usuario): freelancer (ve sus facturas) o cliente (ve las suyas).
+        estado (str): estado de la factura, o None para todos.
+        año (int): año de fecha_emision, o None para todos.
+        cliente (int): id del Cliente, o None para todos.
+
+    Returns:
+        QuerySet: facturas con las relaciones del PDF ya cargadas.
+    """
+    qs = facturas_para_pdf()
+    if es_freelancer(usuario):
+        qs = qs.filter(presupuesto__proyecto__freelancer=usuario)
+    elif es_cliente(usuario):
+        qs = qs.filter(presupuesto__proyecto__cliente__usuario_cliente=usuario)
+    else:
+        qs = qs.none()
+
+    if estado:
+        qs = qs.filter(estado=estado)
+    if año:
+        qs = qs.filter(**filtro_año('fecha_emision', año))
+    if cliente:
+        qs = qs.filter(presupuesto__proyecto__cliente_id=cliente)
+    return qs.order_by('fecha_emision', 'id')
+
+
+class BufferZip:
+    """
+    Pseudo-fichero para zipfile.ZipFile: acumula lo escrito hasta que se recoge con vaciar().
+    Al no tener tell() ni seek(), zipfile lo trata como un fichero no posicionable.
+    """
+
+    def __init__(self):
+        self.trozos = []
+
+    def write(self, datos):
+        self.trozos.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self.trozos)
+        self.trozos = []
+        return datos
+
+
+def nombre_entrada(factura):
+    return f'factura_{factura.numero_serie}.pdf'
+
+
+def generar_zip(facturas, pool, procesos, request=None):
+    """
+    Generador que devuelve el ZIP con los PDF de las facturas por trozos.
+
+    Args:
+        facturas (QuerySet): facturas a exportar (de facturas_filtradas()).
+        pool (Executor): pool de procesos en el que se ejecuta renderizar_pdf.
+        procesos (int): procesos del pool, para limitar los PDF encargados a la vez.
+        request (HttpRequest): petición para renderizar el template y resolver URLs relativas.
+
+    Yields:
+        bytes: el siguiente trozo del ZIP.
+    """
+    cache_pdf = obtener_cache_pdf()
+    base_url = request.build_absolute_uri('/') if request else None
+    buffer = BufferZip()
+    errores = []
+    pendientes = {}
+
+    def recoger(archivo, futuros):
+        for futuro in futuros:
+            factura, huella = pendientes.pop(futuro)
+            try:
+                pdf = futuro.result()
+            except Exception as e:
+                errores.append(f'{factura.numero_serie}: {e}')
+                continue
+            cache_pdf.guardar(factura.pk, huella, pdf)
+            archivo.writestr(nombre_entrada(factura), pdf)
+
+    try:
+        # Los PDF ya están comprimidos: ZIP_STORED evita gastar CPU en comprimirlos otra vez
+        with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_STORED) as archivo:
+            for factura in facturas.iterator(chunk_size=200):
+                huella = huella_factura(factura)
+                pdf = cache_pdf.obtener(factura.pk, huella)
+                if pdf is not None:
+                    archivo.writestr(nombre_entrada(factura), pdf)
+                else:
+                    futuro = pool.submit(renderizar_pdf, html_factura(factura, request), base_url)
+                    pendientes[futuro] = (factura, huella)
+
+                # Si ya hay bastantes encargados, se espera a que acabe alguno
+                if len(pendientes) >= procesos * EN_VUELO:
+                    terminados, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                    recoger(archivo, terminados)
+                if buffer.trozos:
+                    yield buffer.vaciar()
+
+            while pendientes:
+                terminados, _ = wait(pendientes, return_when=FIRST_COMPLETED)
+                recoger(archivo, terminados)
+                if buffer.trozos:
+                    yield buffer.vaciar()
+
+            if errores:
+                archivo.writestr('ERRORES.txt', '\n'.join(errores) + '\n')
+    finally:
+        # Si el cliente corta la descarga se cancelan los PDF que aún no han empezado
+        for futuro in pendientes:
+            futuro.cancel()
+
+    yield buffer.vaciar()
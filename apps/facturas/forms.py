@@ -1,6 +1,5 @@
 from django import forms
-from .models import Factura
-from decimal import Decimal, ROUND_HALF_UP
+from .models import Factura, Pago
 
 
 class FacturaForm(forms.ModelForm):
@@ -17,9 +16,10 @@ class FacturaForm(forms.ModelForm):
     class Meta:
         model = Factura
         # numero_serie se genera automáticamente en el save() del modelo.
-        # pagos se gestiona a través del metodo registrar_pago() del modelo.
+        # Los pagos se gestionan a través del metodo registrar_pago() del modelo.
         # total_pagado se actualiza automáticamente mediante F expressions en registrar_pago() del modelo.
-        exclude = ['numero_serie', 'pagos', 'total_pagado']
+        # total_con_impuestos y saldo_pendiente se calculan a partir del presupuesto y los pagos.
+        exclude = ['numero_serie', 'total_pagado', 'total_con_impuestos', 'saldo_pendiente']
 
 
         widgets = {
@@ -100,12 +100,8 @@ class PagoForm(forms.Form):
 
     # Como es un forms.Form y no un forms.ModelForm, los widgets deben ir como atributos
 
-    METODOS_PAGO = (
-        ('transferencia', 'Transferencia'),
-        ('tarjeta', 'Tarjeta'),
-        ('efectivo', 'Efectivo'),
-        ('bizum', 'Bizum'),
-    )
+    # Los metodos se definen en el modelo Pago para que formulario y base de datos coincidan
+    METODOS_PAGO = Pago.METODOS
 
 
     cantidad = forms.DecimalField(
@@ -153,9 +149,8 @@ class PagoForm(forms.Form):
         if cantidad <= 0:
             raise forms.ValidationError('La cantidad debe ser mayor que cero.')
         if self.factura:
-            total_con_impuestos = (self.factura.presupuesto.total * (1 + self.factura.presupuesto.impuestos / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            total_pagado = self.factura.total_pagado.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-            pendiente = (total_con_impuestos - total_pagado).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+            # saldo_pendiente lo mantiene la base de datos (total con impuestos - total pagado)
+            pendiente = self.factura.saldo_pendiente
             if cantidad > pendiente:
                 raise forms.ValidationError(f'La cantidad supera el total pendiente ({pendiente:.2f}).')
 
@@ -176,6 +171,58 @@ class PagoForm(forms.Form):
                 raise forms.ValidationError('La factura ya está completamente pagada.')
         return cleaned_data
 
+
+class ExtractoForm(forms.Form):
+    """
+    Formulario para subir un extracto bancario y conciliarlo con las facturas pendientes.
+
+    Validaciones:
+        - El fichero es obligatorio y debe ser .csv o .xml (CAMT.053).
+        - No puede superar TAMAÑO_MAXIMO.
+    La lectura y la conciliación se hacen en apps/facturas/conciliacion.py.
+    """
+    TAMAÑO_MAXIMO = 50 * 1024 * 1024
+
+    extracto = forms.FileField(
+        widget=forms.ClearableFileInput(attrs={
+            'class': 'form-control',
+            'accept': '.csv,.xml',
+        })
+    )
+    metodo = forms.ChoiceField(
+        choices=Pago.METODOS,
+        initial='transferencia',
+        widget=forms.Select(attrs={
+            'class': 'form-select',
+        })
+    )
+    simular = forms.BooleanField(
+        required=False,
+        label='Solo simular (no registrar los cobros)',
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input',
+        })
+    )
+    descargar_informe = forms.BooleanField(
+        required=False,
+        label='Descargar en CSV los movimientos para revisar',
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input',
+        })
+    )
+
+    def clean_extracto(self):
+        """
+        Raises:
+            ValidationError: Si la extensión no es .csv o .xml o el fichero es demasiado grande.
+        """
+        extracto = self.cleaned_data.get('extracto')
+        if not extracto.name.lower().endswith(('.csv', '.xml')):
+            raise forms.ValidationError('El extracto debe ser un fichero .csv o .xml (CAMT.053).')
+        if extracto.size > self.TAMAÑO_MAXIMO:
+            raise forms.ValidationError('El extracto no puede superar los 50 MB.')
+        return extracto
+
 """
 En la views.py hay que hacer lo siguiente:
 
@@ -0,0 +1,64 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.usuarios.models import Usuario
+from apps.facturas.exportar_zip import facturas_filtradas, generar_zip
+
+"""
+Comando: exportar_facturas_zip
+
+Genera en un fichero ZIP los PDF de las facturas de un usuario, con los mismos filtros
+que la descarga desde /facturas/exportar/zip/ (ver apps/facturas/exportar_zip.py).
+Los PDF se generan en paralelo en un pool de --procesos procesos y se reutilizan los
+que ya estén en la caché de PDF.
+
+Ejemplo (facturas pagadas de 2026 de un freelancer):
+    python manage.py exportar_facturas_zip hector --estado pagada --ejercicio 2026 --salida 2026.zip
+    Facturas: 412 | ZIP: 2026.zip (18.3 MB) en 21.40s
+"""
+
+
+class Command(BaseCommand):
+    help = 'Exporta a un ZIP los PDF de las facturas de un usuario, generándolos en paralelo.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Nombre de usuario (freelancer o cliente) cuyas facturas se exportan.')
+        parser.add_argument('--estado', help='Solo facturas en este estado.')
+        parser.add_argument('--ejercicio', type=int, help='Solo facturas emitidas este año.')
+        parser.add_argument('--cliente', type=int, help='Solo facturas de este cliente (id).')
+        parser.add_argument('--salida', default='facturas.zip', help='Fichero ZIP de salida.')
+        parser.add_argument('--procesos', type=int, default=multiprocessing.cpu_count(),
+                            help='Procesos que generan PDF a la vez.')
+
+    def handle(self, *args, **options):
+        try:
+            usuario = Usuario.objects.get(username=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f"No existe el usuario {options['usuario']}.")
+        if options['procesos'] < 1:
+            raise CommandError('--procesos debe ser mayor que cero.')
+
+        facturas = facturas_filtradas(
+            usuario, estado=options['estado'], año=options['ejercicio'], cliente=options['cliente']
+        )
+        total = facturas.count()
+        if not total:
+            self.stdout.write(self.style.WARNING('No hay facturas con esos filtros.'))
+            return
+
+        inicio = time.perf_counter()
+        tamaño = 0
+        with ProcessPoolExecutor(
+            max_workers=options['procesos'], mp_context=multiprocessing.get_context('spawn')
+        ) as pool, open(options['salida'], 'wb') as salida:
+            for trozo in generar_zip(facturas, pool, options['procesos']):
+                salida.write(trozo)
+                tamaño += len(trozo)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Facturas: {total} | ZIP: {options['salida']} ({tamaño / 1024 / 1024:.1f} MB) "
+            f"en {time.perf_counter() - inicio:.2f}s"
+        ))
@@ -0,0 +1,70 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.usuarios.models import Usuario
+from apps.facturas.conciliacion import ExtractoInvalido, conciliar, escribir_informe, leer_extracto
+
+"""
+Comando: importar_extracto
+
+Lo mismo que /facturas/importar-extracto/ (apps/facturas/conciliacion.py) para extractos grandes
+o tareas programadas. --informe escribe en un CSV los movimientos para revisar con su motivo.
+
+Ejemplo:
+    python manage.py importar_extracto ana extracto_marzo.xml --informe revision.csv
+    50.000 movimientos | conciliados: 46.812 (47.020 cobros, 1.843.220,50 €) | revisar: 3.188 | ...
+"""
+
+
+class Command(BaseCommand):
+    help = 'Importa un extracto bancario y concilia los cobros con las facturas pendientes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Nombre de usuario del freelancer.')
+        parser.add_argument('fichero', help='Extracto en CSV o CAMT.053 (.xml).')
+        parser.add_argument(
+            '--formato', choices=('csv', 'xml'),
+            help='Formato del extracto si no se deduce de la extensión.'
+        )
+        parser.add_argument('--metodo', default='transferencia', help='Método de los pagos creados.')
+        parser.add_argument('--simular', action='store_true', help='Conciliar sin registrar los cobros.')
+        parser.add_argument('--informe', help='CSV donde escribir los movimientos para revisar.')
+
+    def handle(self, *args, **options):
+        try:
+            freelancer = Usuario.objects.get(username=options['usuario'], perfil__tipo_cuenta='freelancer')
+        except Usuario.DoesNotExist:
+            raise CommandError(f'No existe el freelancer {options["usuario"]}.')
+
+        nombre = f'extracto.{options["formato"]}' if options['formato'] else options['fichero']
+        inicio = time.perf_counter()
+        try:
+            with open(options['fichero'], 'rb') as fichero:
+                lineas = leer_extracto(fichero, nombre)
+        except (OSError, ExtractoInvalido) as e:
+            raise CommandError(str(e))
+        leido = time.perf_counter()
+
+        resultado = conciliar(
+            freelancer, lineas, aplicar=not options['simular'], metodo=options['metodo']
+        )
+        fin = time.perf_counter()
+
+        if options['informe']:
+            with open(options['informe'], 'w', newline='', encoding='utf-8-sig') as salida:
+                escribir_informe(resultado, salida)
+
+        self.stdout.write(
+            f'{len(lineas)} movimientos | conciliados: {resultado.conciliadas} '
+            f'({len(resultado.cobros)} cobros, {resultado.importe_conciliado:.2f} €) | '
+            f'revisar: {len(resultado.revision)} | ya importados: {resultado.ya_importadas} | '
+            f'cargos: {resultado.ignoradas}'
+        )
+        if options['simular']:
+            mensaje, estilo = 'Simulación: no se ha registrado nada', self.style.WARNING
+        else:
+            mensaje, estilo = 'Cobros registrados', self.style.SUCCESS
+        self.stdout.write(estilo(
+            f'{mensaje} (lectura {leido - inicio:.2f}s, conciliación {fin - leido:.2f}s)'
+        ))
@@ -0,0 +1,76 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.usuarios.models import Usuario
+from apps.proyectos.models import Proyecto
+from apps.facturas.models import ResumenMensual
+from apps.facturas.resumen import reconstruir_resumen
+from apps.usuarios.cache_dashboard import invalidar_dashboard
+
+"""
+Comando: reconstruir_resumen
+
+Vuelve a calcular ResumenMensual desde las facturas, tras cargarlas con bulk_create o cambiarlas
+con un .update() que no pasa por cambios_resumen(). Cada freelancer se reconstruye en su
+transacción y se reparten entre --hilos hilos con su propia conexión.
+
+Ejemplo:
+    python manage.py reconstruir_resumen --hilos 8
+    Freelancers: 120 | filas: 35.812 en 14.20s
+"""
+
+
+class Command(BaseCommand):
+    help = 'Recalcula la tabla ResumenMensual desde las facturas, en paralelo por freelancer.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--freelancer', action='append', help='Solo este freelancer (se puede repetir).')
+        parser.add_argument('--hilos', type=int, default=4, help='Freelancers reconstruidos a la vez.')
+
+    def handle(self, *args, **options):
+        if options['hilos'] < 1:
+            raise CommandError('--hilos debe ser mayor que cero.')
+
+        if options['freelancer']:
+            freelancers = list(Usuario.objects.filter(
+                username__in=options['freelancer']
+            ).values_list('pk', flat=True))
+            if len(freelancers) != len(set(options['freelancer'])):
+                raise CommandError('Alguno de los freelancers indicados no existe.')
+        else:
+            # Los que tienen proyectos y los que tienen filas en el resumen (por si ya no tienen facturas)
+            freelancers = sorted(
+                set(Proyecto.objects.values_list('freelancer_id', flat=True).distinct())
+                | set(ResumenMensual.objects.values_list('freelancer_id', flat=True).distinct())
+            )
+
+        def reconstruir(freelancer_id):
+            try:
+                filas = reconstruir_resumen(freelancer_id)
+                invalidar_dashboard(freelancer_id)
+                return filas
+            finally:
+                # Cada hilo abre su propia conexión, hay que cerrarla al terminar
+                connection.close()
+
+        inicio = time.perf_counter()
+        filas = 0
+        errores = []
+        with ThreadPoolExecutor(max_workers=options['hilos']) as pool:
+            futuros = {pool.submit(reconstruir, pk): pk for pk in freelancers}
+            for futuro in as_completed(futuros):
+                try:
+                    filas += futuro.result()
+                except Exception as e:
+                    errores.append(f'{futuros[futuro]}: {e}')
+
+        self.stdout.write(
+            f'Freelancers: {len(freelancers)} | filas: {filas} en {time.perf_counter() - inicio:.2f}s'
+        )
+        if errores:
+            for error in errores[:10]:
+                self.stdout.write(f'  {error}')
+            raise CommandError(f'{len(errores)} freelancers no se han podido reconstruir.')
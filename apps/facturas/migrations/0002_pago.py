@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+"""
+Primer paso para pasar los pagos del JSONField a la tabla Pago:
+se renombra el JSONField a pagos_json para dejar libre el nombre 'pagos',
+que pasa a ser el related_name de Pago.factura.
+Los datos se copian en 0003 y el JSONField se elimina en 0004.
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='factura',
+            old_name='pagos',
+            new_name='pagos_json',
+        ),
+        migrations.CreateModel(
+            name='Pago',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(verbose_name='Fecha')),
+                ('cantidad', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Cantidad')),
+                ('metodo', models.CharField(choices=[('transferencia', 'Transferencia'), ('tarjeta', 'Tarjeta'), ('efectivo', 'Efectivo'), ('bizum', 'Bizum')], max_length=20, verbose_name='Metodo de pago')),
+                ('notas', models.TextField(blank=True, default='', verbose_name='Notas')),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pagos', related_query_name='pago', to='facturas.factura', verbose_name='Factura')),
+            ],
+            options={
+                'verbose_name': 'Pago',
+                'verbose_name_plural': 'Pagos',
+                'ordering': ('fecha', 'id'),
+                'indexes': [models.Index(fields=['factura', 'fecha'], name='pago_factura_fecha_idx'), models.Index(fields=['metodo', 'fecha'], name='pago_metodo_fecha_idx')],
+            },
+        ),
+    ]
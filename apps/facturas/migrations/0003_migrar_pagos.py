@@ -0,0 +1,71 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:40
+
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations
+
+"""
+Copia cada pago del antiguo JSONField (pagos_json) a una fila de Pago.
+Estructura de cada pago en el JSON:
+{"fecha": "2026-01-01", "cantidad": "500.00", "metodo": "transferencia", "notas": "primer pago"}
+
+Se hace en una migración aparte de la creación de la tabla y del borrado del
+JSONField para no mezclar inserciones y ALTER TABLE en la misma transacción.
+"""
+
+
+def copiar_pagos(apps, schema_editor):
+    Factura = apps.get_model('facturas', 'Factura')
+    Pago = apps.get_model('facturas', 'Pago')
+
+    lote = []
+    for factura in Factura.objects.exclude(pagos_json=[]).only('id', 'fecha_emision', 'pagos_json').iterator():
+        for pago in factura.pagos_json or []:
+            try:
+                cantidad = Decimal(str(pago.get('cantidad', '0'))).quantize(Decimal('0.01'))
+            except InvalidOperation:
+                continue
+            try:
+                fecha = date.fromisoformat(pago.get('fecha') or '')
+            except ValueError:
+                fecha = factura.fecha_emision
+            lote.append(Pago(
+                factura_id=factura.id,
+                fecha=fecha,
+                cantidad=cantidad,
+                metodo=pago.get('metodo') or 'transferencia',
+                notas=pago.get('notas') or '',
+            ))
+        if len(lote) >= 1000:
+            Pago.objects.bulk_create(lote)
+            lote = []
+    Pago.objects.bulk_create(lote)
+
+
+def restaurar_pagos(apps, schema_editor):
+    Factura = apps.get_model('facturas', 'Factura')
+    Pago = apps.get_model('facturas', 'Pago')
+
+    for factura in Factura.objects.filter(pago__isnull=False).distinct().iterator():
+        factura.pagos_json = [
+            {
+                'fecha': pago.fecha.isoformat(),
+                'cantidad': str(pago.cantidad),
+                'metodo': pago.metodo,
+                'notas': pago.notas,
+            }
+            for pago in Pago.objects.filter(factura=factura).order_by('fecha', 'id')
+        ]
+        factura.save(update_fields=['pagos_json'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0002_pago'),
+    ]
+
+    operations = [
+        migrations.RunPython(copiar_pagos, restaurar_pagos),
+    ]
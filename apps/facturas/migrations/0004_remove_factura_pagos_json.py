@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0003_migrar_pagos'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='factura',
+            name='pagos_json',
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:50
+
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import migrations, models
+
+"""
+Añade total_con_impuestos y lo rellena para las facturas existentes a partir
+del total y los impuestos de su presupuesto, con el mismo redondeo que
+calcular_total_con_impuestos() de models.py.
+"""
+
+
+def calcular_totales(apps, schema_editor):
+    Factura = apps.get_model('facturas', 'Factura')
+
+    lote = []
+    for factura in Factura.objects.select_related('presupuesto').only(
+        'id', 'presupuesto__total', 'presupuesto__impuestos'
+    ).iterator():
+        total = Decimal(factura.presupuesto.total or 0)
+        impuestos = Decimal(factura.presupuesto.impuestos or 0)
+        factura.total_con_impuestos = (total * (1 + impuestos / Decimal('100'))).quantize(
+            Decimal('0.01'), rounding=ROUND_HALF_UP
+        )
+        lote.append(factura)
+        if len(lote) >= 1000:
+            Factura.objects.bulk_update(lote, ['total_con_impuestos'])
+            lote = []
+    Factura.objects.bulk_update(lote, ['total_con_impuestos'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0004_remove_factura_pagos_json'),
+        ('presupuestos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='total_con_impuestos',
+            field=models.DecimalField(decimal_places=2, default=0, editable=False, max_digits=12, verbose_name='Total con impuestos'),
+        ),
+        migrations.RunPython(calcular_totales, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:50
+
+import django.db.models.expressions
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0005_factura_total_con_impuestos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factura',
+            name='saldo_pendiente',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.expressions.CombinedExpression(models.F('total_con_impuestos'), '-', models.F('total_pagado')), output_field=models.DecimalField(decimal_places=2, max_digits=12), verbose_name='Saldo pendiente'),
+        ),
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['estado', 'saldo_pendiente'], name='factura_estado_saldo_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:05
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0006_factura_saldo_pendiente'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoPDF',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('huella', models.CharField(max_length=64, verbose_name='Huella')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('en_proceso', 'En proceso'), ('terminado', 'Terminado'), ('error', 'Error')], default='pendiente', max_length=20, verbose_name='Estado')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('creado', models.DateTimeField(auto_now_add=True, verbose_name='Creado')),
+                ('actualizado', models.DateTimeField(auto_now=True, verbose_name='Actualizado')),
+                ('factura', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_pdf', related_query_name='trabajo_pdf', to='facturas.factura', verbose_name='Factura')),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trabajos_pdf', related_query_name='trabajo_pdf', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Trabajo PDF',
+                'verbose_name_plural': 'Trabajos PDF',
+                'indexes': [models.Index(fields=['factura', 'huella'], name='trabajopdf_factura_huella_idx')],
+            },
+        ),
+    ]
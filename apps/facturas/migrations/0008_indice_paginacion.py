@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0007_trabajopdf'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(fields=['fecha_emision', 'id'], name='factura_emision_id_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0008_indice_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='factura',
+            index=models.Index(condition=models.Q(('estado__in', ['pendiente', 'parcial', 'vencida'])), fields=['estado', 'fecha_vencimiento'], name='factura_abiertas_venc_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_indices_consultas'),
+        ('facturas', '0009_indices_consultas'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('año', models.PositiveSmallIntegerField(verbose_name='Año')),
+                ('mes', models.PositiveSmallIntegerField(verbose_name='Mes')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('parcial', 'Parcial'), ('pagada', 'Pagada'), ('vencida', 'Vencida'), ('anulada', 'Anulada')], max_length=20, verbose_name='Estado')),
+                ('facturado', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Facturado')),
+                ('cobrado', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Cobrado')),
+                ('pendiente', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Pendiente')),
+                ('num_facturas', models.PositiveIntegerField(default=0, verbose_name='Número de facturas')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_mensuales', related_query_name='resumen_mensual', to='clientes.cliente', verbose_name='Cliente')),
+                ('freelancer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes_mensuales', related_query_name='resumen_mensual', to=settings.AUTH_USER_MODEL, verbose_name='Freelancer')),
+            ],
+            options={
+                'verbose_name': 'Resumen mensual',
+                'verbose_name_plural': 'Resúmenes mensuales',
+                'indexes': [models.Index(fields=['freelancer', 'año', 'mes'], name='resumen_freelancer_mes_idx')],
+                'unique_together': {('freelancer', 'cliente', 'año', 'mes', 'estado')},
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:21
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+"""
+Rellena ResumenMensual con las facturas que ya existen, con un único GROUP BY por
+freelancer, cliente, año, mes y estado (lo mismo que resumen.reconstruir_resumen()
+para todos los freelancers a la vez).
+
+Se hace en una migración aparte de la creación de la tabla para no mezclar inserciones
+y ALTER TABLE en la misma transacción.
+"""
+
+
+def rellenar_resumen(apps, schema_editor):
+    Factura = apps.get_model('facturas', 'Factura')
+    ResumenMensual = apps.get_model('facturas', 'ResumenMensual')
+
+    grupos = Factura.objects.annotate(
+        año=ExtractYear('fecha_emision'), mes=ExtractMonth('fecha_emision')
+    ).values(
+        'año', 'mes', 'estado',
+        freelancer_id=F('presupuesto__proyecto__freelancer_id'),
+        cliente_id=F('presupuesto__proyecto__cliente_id'),
+    ).annotate(
+        facturado=Sum('total_con_impuestos'),
+        cobrado=Sum('total_pagado'),
+        pendiente=Sum('saldo_pendiente'),
+        num_facturas=Count('pk'),
+    ).order_by()
+
+    ResumenMensual.objects.bulk_create(
+        (ResumenMensual(**grupo) for grupo in grupos.iterator()),
+        batch_size=1000,
+    )
+
+
+def vaciar_resumen(apps, schema_editor):
+    apps.get_model('facturas', 'ResumenMensual').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0010_resumenmensual'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_resumen, vaciar_resumen),
+    ]
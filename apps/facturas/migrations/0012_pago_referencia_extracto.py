@@ -0,0 +1,22 @@
+# Generated by Django 6.0.2 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('facturas', '0011_rellenar_resumen_mensual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pago',
+            name='referencia_extracto',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Referencia del extracto'),
+        ),
+        migrations.AddConstraint(
+            model_name='pago',
+            constraint=models.UniqueConstraint(condition=models.Q(('referencia_extracto', ''), _negated=True), fields=('referencia_extracto',), name='pago_referencia_extracto_uniq'),
+        ),
+    ]
@@ -1,9 +1,15 @@
-from django.db import models
+import uuid
+
+from django.conf import settings
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from apps.clientes.models import Cliente
 from apps.presupuestos.models import Presupuesto
-from django.db.models import F
+from django.db.models import Case, F, Value, When
 from decimal import Decimal, ROUND_HALF_UP
+from apps.setup.secuencias import siguiente_numero, formatear_numero_serie
+from apps.setup.limite_consultas import limite_consultas
 
 """
 Creo el modelo Factura con los siguientes campos:
@@ -30,16 +36,25 @@ estado = un CharField con un choice para almacenar el estado de la factura. Sus
     - Vencida
     - Anulada
 
-pagos = un JSONField que almacena una lista de pagos realizados sobre la factura.
-Cada pago tiene la siguiente estructura:
-{"fecha": "2026-01-01", "cantidad": 500.00, "metodo": "transferencia", "notas": "primer pago"}
-Esta es la alternativa elegida (Opción A del enunciado) para cumplir el requisito ManyToMany
-sin crear un séptimo modelo. Permite registrar varios pagos por factura y calcular estadísticas.
+Los pagos ya no se guardan en un JSONField dentro de la factura, sino en el modelo Pago
+(más abajo), accesible desde la factura con factura.pagos. Con el JSONField cada pago copiaba
+y reescribía la lista entera, y no se podían consultar pagos por fecha o metodo sin cargar
+todas las facturas.
 
 total_pagado = un DecimalField que acumula el total abonado en la factura.
 Se actualiza automáticamente mediante F expressions en registrar_pago() y nunca se edita a mano.
-Permite realizar consultas ORM sobre el saldo (aggregates, annotates, filtros) cosa que no
-sería posible con el JSONField de pagos
+Permite realizar consultas ORM sobre el saldo (aggregates, annotates, filtros) sin tener que
+sumar los pagos de cada factura.
+
+total_con_impuestos = un DecimalField con el total del presupuesto con el IVA aplicado.
+Se calcula en save() con calcular_total_con_impuestos() y se recalcula desde signals.py cuando
+cambian el total o los impuestos del presupuesto. Nunca se edita a mano.
+
+saldo_pendiente = un GeneratedField (total_con_impuestos - total_pagado) que calcula y guarda
+la propia base de datos, así que siempre está al día cuando se registra un pago.
+
+Con estos dos campos el dashboard y los listados pueden filtrar, ordenar y sumar por importe
+con IVA y saldo pendiente en SQL, en lugar de repetir el cálculo en Python en cada vista.
 
 
 Se añade una restricción en "class Meta" para que no haya dos facturas con el mismo número de serie
@@ -51,17 +66,33 @@ Se verifica en clean que la fecha de vencimiento no sea anterior a la fecha de e
 y que el estado sea coherente con las reglas de negocio.
 (No viene en el enunciado pero lo añado para mayor seguridad)
 
-Se crea la función registrar_pago para registrar un pago en el JSONField y actualizar
+Se crea la función registrar_pago para registrar un Pago y actualizar
 automáticamente el estado de la factura según el total abonado.
 (No viene en el enunciado pero lo añado para mayor control sobre los pagos)
 
-La verificación de vencimiento se gestiona en signals.py mediante una señal post_save.
-
-Me he puesto a informame y para que fuera completamente automatica, deberia usar
-Celery, pero la verdad creo que sobrepasa mi nivel por bastante
+La verificación de vencimiento se hace con el comando actualizar_vencimientos
+(apps/setup/management/commands/actualizar_vencimientos.py), que se programa con cron y
+marca como vencidas todas las facturas caducadas con un UPDATE por lotes, aunque nadie las
+vuelva a guardar. Antes era una señal post_save que solo actuaba al guardar la factura.
 """
 
 
+def calcular_total_con_impuestos(total, impuestos):
+    """
+    Aplica el porcentaje de impuestos al total de un presupuesto y redondea a céntimos.
+
+    Args:
+        total (Decimal): Total sin impuestos.
+        impuestos (Decimal): Porcentaje de impuestos. Ejemplo: 21.
+
+    Returns:
+        Decimal: Total con impuestos redondeado a 2 decimales (ROUND_HALF_UP).
+    """
+    total = Decimal(str(total or 0))
+    impuestos = Decimal(str(impuestos or 0))
+    return (total * (1 + impuestos / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
 class Factura(models.Model):
     ESTADOS = (
         ('pendiente', 'Pendiente'),
@@ -85,14 +116,32 @@ class Factura(models.Model):
     fecha_emision = models.DateField(verbose_name='Fecha de emisión')
     fecha_vencimiento = models.DateField(verbose_name='Fecha de vencimiento')
     estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente', verbose_name='Estado')
-    pagos = models.JSONField(default=list, blank=True, verbose_name='Pagos')
-    # Estructura de cada pago:
-    # [{"fecha": "2026-01-01", "cantidad": 500.00, "metodo": "transferencia", "notas": "primer pago"}]
-
     total_pagado = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Total pagado')
+    total_con_impuestos = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, editable=False, verbose_name='Total con impuestos'
+    )
+    saldo_pendiente = models.GeneratedField(
+        expression=F('total_con_impuestos') - F('total_pagado'),
+        output_field=models.DecimalField(max_digits=12, decimal_places=2),
+        db_persist=True,
+        verbose_name='Saldo pendiente'
+    )
 
     class Meta:
         unique_together = ('presupuesto', 'numero_serie')
+        indexes = [
+            # Listados y sumas de lo pendiente de cobro por estado
+            models.Index(fields=['estado', 'saldo_pendiente'], name='factura_estado_saldo_idx'),
+            # Orden del listado paginado por cursor (apps/setup/paginacion.py)
+            models.Index(fields=['fecha_emision', 'id'], name='factura_emision_id_idx'),
+            # Parcial: solo las facturas sin cobrar, que son las que miran actualizar_vencimientos
+            # y las alertas del dashboard. Las pagadas y anuladas (la mayoría) no ocupan sitio.
+            models.Index(
+                fields=['estado', 'fecha_vencimiento'],
+                condition=models.Q(estado__in=['pendiente', 'parcial', 'vencida']),
+                name='factura_abiertas_venc_idx',
+            ),
+        ]
         verbose_name = 'Factura'
         verbose_name_plural = 'Facturas'
         permissions = [
@@ -111,15 +160,33 @@ class Factura(models.Model):
         de la fecha de emisión y NNN es el número correlativo de facturas de ese año.
         Ejemplo: 2026-001, 2026-002...
 
+        El número se reserva con siguiente_numero() (apps/setup/secuencias.py) dentro de
+        la misma transacción que el INSERT, así dos facturas simultáneas nunca reciben el
+        mismo número y, si el guardado falla, el número no se pierde.
+
+        También recalcula total_con_impuestos a partir del presupuesto, salvo que se
+        guarden solo otros campos con update_fields, y actualiza ResumenMensual en la
+        misma transacción (resumen.py).
+
         Args:
             *args: Argumentos posicionales del metodo save original.
             **kwargs: Argumentos keyword del metodo save original.
         """
-        if not self.numero_serie:
-            año = self.fecha_emision.year
-            ultimo = Factura.objects.filter(fecha_emision__year=año).count() + 1
-            self.numero_serie = f"{año}-{ultimo:03d}"
-        super().save(*args, **kwargs)
+        from .resumen import cambios_resumen
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'total_con_impuestos' in update_fields:
+            self.total_con_impuestos = calcular_total_con_impuestos(
+                self.presupuesto.total, self.presupuesto.impuestos
+            )
+        # cambios_resumen abre la transacción y actualiza ResumenMensual dentro de ella
+        with cambios_resumen([self.pk] if self.pk else []) as ids:
+            if not self.numero_serie:
+                año = self.fecha_emision.year
+                self.numero_serie = formatear_numero_serie(año, siguiente_numero('factura', año))
+            super().save(*args, **kwargs)
+            if self.pk not in ids:
+                ids.append(self.pk)
 
     def clean(self):
         """
@@ -141,9 +208,33 @@ class Factura(models.Model):
             if estado_actual == 'pagada' and self.estado in ('pendiente', 'parcial'):
                 raise ValidationError('Una factura pagada no puede volver a pendiente o parcial.')
 
+    @property
+    def pagos_list(self):
+        """
+        Devuelve los pagos de la factura como lista de diccionarios, con la misma
+        estructura que tenía el antiguo JSONField de pagos, para los templates
+        de detalle y PDF:
+        [{"fecha": "2026-01-01", "cantidad": Decimal('500.00'), "metodo": "transferencia", "notas": "primer pago"}]
+
+        Usa self.pagos.all(), así que aprovecha un prefetch_related('pagos') si la vista lo ha hecho.
+        """
+        return [
+            {
+                'fecha': pago.fecha.isoformat(),
+                'cantidad': pago.cantidad,
+                'metodo': pago.metodo,
+                'notas': pago.notas,
+            }
+            for pago in self.pagos.all()
+        ]
+
+    @limite_consultas(13)
     def registrar_pago(self, cantidad, metodo, notas=''):
         """
-        Registra un nuevo pago en el JSONField de pagos y actualiza el estado de la factura.
+        Registra un nuevo Pago y actualiza el estado de la factura.
+
+        Solo se inserta una fila en Pago y se actualizan total_pagado y estado de la
+        factura, en una única transacción, sin reescribir el resto de la fila.
 
         Args:
             cantidad (float): Cantidad abonada en el pago.
@@ -153,6 +244,8 @@ class Factura(models.Model):
         Raises:
             ValidationError: Si la cantidad no es válida o la factura no permite pagos.
         """
+        from .resumen import cambios_resumen
+
         if cantidad <= 0:
             raise ValidationError('La cantidad del pago debe ser mayor que cero.')
 
@@ -162,30 +255,237 @@ class Factura(models.Model):
         if self.estado == 'pagada':
             raise ValidationError('La factura ya está completamente pagada.')
 
-        total_con_impuestos = (self.presupuesto.total * (1 + self.presupuesto.impuestos / Decimal('100'))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        total_pagado = self.total_pagado.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-        pendiente = (total_con_impuestos - total_pagado).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        total_con_impuestos = self.total_con_impuestos
+        pendiente = total_con_impuestos - Decimal(self.total_pagado)
 
         if cantidad > pendiente:
             raise ValidationError(f'La cantidad supera el total pendiente ({pendiente:.2f})')
 
-        self.pagos = self.pagos + [{
-            'fecha': timezone.now().date().isoformat(),
-            'cantidad': str(cantidad),
-            'metodo': metodo,
-            'notas': notas
-        }]
+        with transaction.atomic():
+            Pago.objects.create(
+                factura=self,
+                fecha=timezone.now().date(),
+                cantidad=cantidad,
+                metodo=metodo,
+                notas=notas or '',
+            )
+
+            # total_pagado y estado en el mismo UPDATE: la BD decide si el pago salda la
+            # factura, y el Pago recién creado ya invalida el PDF y el dashboard en sus señales
+            with cambios_resumen([self.pk]):
+                Factura.objects.filter(pk=self.pk).update(
+                    total_pagado=F('total_pagado') + cantidad,
+                    estado=Case(
+                        When(total_pagado__gte=F('total_con_impuestos') - cantidad, then=Value('pagada')),
+                        default=Value('parcial'),
+                    ),
+                )
+
+            # Recargamos solo lo que ha cambiado (el saldo lo calcula la BD) para no machacar
+            # otros campos con refresh_from_db()
+            self.refresh_from_db(fields=['total_pagado', 'saldo_pendiente', 'estado'])
+
+
+"""
+Creo el modelo Pago, un libro de pagos en el que solo se añaden filas, con los siguientes campos:
+
+factura = una clave foránea porque una factura puede tener muchos pagos, pero un pago solo
+pertenece a una factura. Utilizo models.CASCADE porque un pago no tiene sentido sin su factura:
+al eliminar una factura también se borran sus pagos (es lo que avisa factura_confirm_delete.html).
+
+fecha = un DateField con la fecha en la que se registra el pago.
+cantidad = un DecimalField con la cantidad abonada.
+metodo = un CharField con un choice para el metodo de pago (transferencia, tarjeta, efectivo, bizum).
+notas = un TextField opcional con comentarios sobre el pago.
+referencia_extracto = la huella del movimiento bancario del que sale el pago, si se ha importado
+de un extracto (conciliacion.py). Vacía en los pagos registrados a mano.
+
+En "class Meta" se añaden dos índices:
+    - (factura, fecha): para listar los pagos de una factura en orden.
+    - (metodo, fecha): para sumar lo cobrado por metodo y periodo desde el dashboard o informes.
+Y una restricción única sobre referencia_extracto cuando no está vacía: importar dos veces el
+mismo extracto no puede registrar dos veces el mismo cobro.
+
+Los pagos no se editan ni se borran uno a uno: si hay un error se registra otro movimiento.
+Por eso save() impide modificar un pago ya guardado.
+"""
+
+
+class Pago(models.Model):
+    METODOS = (
+        ('transferencia', 'Transferencia'),
+        ('tarjeta', 'Tarjeta'),
+        ('efectivo', 'Efectivo'),
+        ('bizum', 'Bizum'),
+    )
+
+    factura = models.ForeignKey(
+        Factura,
+        # CASCADE: los pagos se borran junto con su factura.
+        on_delete=models.CASCADE,
+        related_name='pagos',
+        related_query_name='pago',
+        verbose_name='Factura'
+    )
+
+    fecha = models.DateField(verbose_name='Fecha')
+    cantidad = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Cantidad')
+    metodo = models.CharField(max_length=20, choices=METODOS, verbose_name='Metodo de pago')
+    notas = models.TextField(blank=True, default='', verbose_name='Notas')
+    referencia_extracto = models.CharField(
+        max_length=64, blank=True, default='', verbose_name='Referencia del extracto'
+    )
+
+    class Meta:
+        ordering = ('fecha', 'id')
+        indexes = [
+            models.Index(fields=['factura', 'fecha'], name='pago_factura_fecha_idx'),
+            models.Index(fields=['metodo', 'fecha'], name='pago_metodo_fecha_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['referencia_extracto'], condition=~models.Q(referencia_extracto=''),
+                name='pago_referencia_extracto_uniq',
+            ),
+        ]
+        verbose_name = 'Pago'
+        verbose_name_plural = 'Pagos'
+
+    def __str__(self):
+        return f"{self.factura_id} - {self.cantidad} ({self.metodo})"
+
+    def save(self, *args, **kwargs):
+        """
+        Impide modificar un pago ya registrado: el libro de pagos solo admite altas.
+
+        Raises:
+            ValidationError: Si el pago ya existe en la base de datos.
+        """
+        if self.pk:
+            raise ValidationError('Un pago registrado no se puede modificar.')
+        super().save(*args, **kwargs)
+
+
+"""
+Creo el modelo TrabajoPDF para generar los PDF de las facturas fuera de la petición
+(ver apps/facturas/trabajos_pdf.py). Cada fila es un encargo de renderizar el PDF de una
+factura con una huella concreta (pdf_cache.huella_factura):
+
+id = un UUIDField como clave primaria, que es el identificador que se devuelve al navegador
+para consultar el trabajo. Al ser aleatorio no se puede adivinar el de otro usuario.
 
-        Factura.objects.filter(pk=self.pk).update(
-            total_pagado=F('total_pagado') + cantidad
-        )
+factura = una ForeignKey a Factura con models.CASCADE: si se borra la factura sus trabajos
+ya no sirven para nada.
 
-        # Recargamos solo total_pagado desde la BD para no machacar pagos con refresh_from_db()
-        self.refresh_from_db(fields=['total_pagado'])
+usuario = quien pidió el PDF; solo él puede consultar el trabajo.
 
-        if self.total_pagado >= total_con_impuestos:
-            self.estado = 'pagada'
-        else:
-            self.estado = 'parcial'
+huella = la huella de los datos de la factura en el momento de pedirlo. El PDF terminado se
+guarda en la caché de PDF con esa huella, así que el trabajo no guarda el fichero.
 
-        self.save()
+estado = pendiente → en_proceso → terminado o error.
+
+intentos = cuántas veces se ha mandado a renderizar. Si el proceso que lo tenía se reinicia,
+el trabajo se queda en_proceso y se vuelve a lanzar al consultarlo pasado el TIMEOUT.
+
+Al estar en la base de datos, el estado se comparte entre todos los procesos del servidor
+y sobrevive a los reinicios.
+"""
+
+
+class TrabajoPDF(models.Model):
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('terminado', 'Terminado'),
+        ('error', 'Error'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    factura = models.ForeignKey(
+        Factura,
+        on_delete=models.CASCADE,
+        related_name='trabajos_pdf',
+        related_query_name='trabajo_pdf',
+        verbose_name='Factura'
+    )
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='trabajos_pdf',
+        related_query_name='trabajo_pdf',
+        verbose_name='Usuario'
+    )
+    huella = models.CharField(max_length=64, verbose_name='Huella')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente', verbose_name='Estado')
+    intentos = models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')
+    error = models.TextField(blank=True, default='', verbose_name='Error')
+    creado = models.DateTimeField(auto_now_add=True, verbose_name='Creado')
+    actualizado = models.DateTimeField(auto_now=True, verbose_name='Actualizado')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['factura', 'huella'], name='trabajopdf_factura_huella_idx'),
+        ]
+        verbose_name = 'Trabajo PDF'
+        verbose_name_plural = 'Trabajos PDF'
+
+    def __str__(self):
+        return f"{self.factura_id} - {self.estado} ({self.id})"
+
+
+"""
+Creo el modelo ResumenMensual, una tabla de totales de facturación ya agregados (ver
+apps/facturas/resumen.py). Cada fila suma las facturas de un freelancer y un cliente emitidas
+en un mes y que están en un estado:
+
+freelancer, cliente = ForeignKey con models.CASCADE: el resumen no tiene sentido sin ellos
+y se puede reconstruir en cualquier momento desde las facturas.
+año, mes = de la fecha de emisión de las facturas.
+estado = el estado actual de las facturas (los mismos choices que Factura).
+facturado = suma de total_con_impuestos.
+cobrado = suma de total_pagado.
+pendiente = suma de saldo_pendiente.
+num_facturas = número de facturas.
+
+Las filas se actualizan en la misma transacción que cada cambio de las facturas, sumando
+la diferencia, así que el dashboard lee unas decenas de filas en lugar de recorrer todas las
+facturas con sus JOIN hasta proyecto. Nunca se editan a mano.
+
+En "class Meta" se define la clave única (freelancer, cliente, año, mes, estado) y un índice
+(freelancer, año, mes) para las consultas por periodo sin filtrar por cliente.
+"""
+
+
+class ResumenMensual(models.Model):
+    freelancer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='resumenes_mensuales',
+        related_query_name='resumen_mensual',
+        verbose_name='Freelancer'
+    )
+    cliente = models.ForeignKey(
+        Cliente,
+        on_delete=models.CASCADE,
+        related_name='resumenes_mensuales',
+        related_query_name='resumen_mensual',
+        verbose_name='Cliente'
+    )
+    año = models.PositiveSmallIntegerField(verbose_name='Año')
+    mes = models.PositiveSmallIntegerField(verbose_name='Mes')
+    estado = models.CharField(max_length=20, choices=Factura.ESTADOS, verbose_name='Estado')
+    facturado = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Facturado')
+    cobrado = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Cobrado')
+    pendiente = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Pendiente')
+    num_facturas = models.PositiveIntegerField(default=0, verbose_name='Número de facturas')
+
+    class Meta:
+        unique_together = ('freelancer', 'cliente', 'año', 'mes', 'estado')
+        indexes = [
+            models.Index(fields=['freelancer', 'año', 'mes'], name='resumen_freelancer_mes_idx'),
+        ]
+        verbose_name = 'Resumen mensual'
+        verbose_name_plural = 'Resúmenes mensuales'
+
+    def __str__(self):
+        return f"{self.freelancer_id} - {self.cliente_id} {self.año}-{self.mes:02d} {self.estado}"
@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.loader import get_template
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+"""
+Caché de los PDF de las facturas.
+
+Cada PDF se guarda con la huella (SHA-256) de todos los datos que usa factura_pdf.html, así que
+nunca se sirve uno desactualizado aunque el cambio venga de un .update() sin señales. Backends
+(PDF_CACHE['BACKEND']): CacheArchivosPDF, un directorio con expulsión LRU por TAMAÑO_MAXIMO, y
+CacheDjangoPDF, una caché de Django. Los aciertos y fallos se cuentan en la caché 'default'.
+"""
+
+CONFIGURACION_POR_DEFECTO = {
+    'BACKEND': 'apps.facturas.pdf_cache.CacheArchivosPDF',
+    'DIRECTORIO': Path(settings.BASE_DIR) / 'cache_pdf',
+    'TAMAÑO_MAXIMO': 200 * 1024 * 1024,
+    'ALIAS': 'default',
+    'TIMEOUT': None,
+}
+
+CLAVE_ACIERTOS = 'pdf_cache:aciertos'
+CLAVE_FALLOS = 'pdf_cache:fallos'
+
+
+def huella_factura(factura):
+    """
+    Calcula la huella de todos los datos que se pintan en factura_pdf.html.
+
+    La factura debe venir con select_related('presupuesto__proyecto__cliente',
+    'presupuesto__proyecto__freelancer') y prefetch_related('pagos') para no
+    lanzar una consulta por cada relación.
+
+    Returns:
+        str: SHA-256 en hexadecimal.
+    """
+    presupuesto = factura.presupuesto
+    proyecto = presupuesto.proyecto
+    cliente = proyecto.cliente
+    freelancer = proyecto.freelancer
+    plantilla = get_template('apps/facturas/factura_pdf.html').origin.name
+
+    datos = [
+        factura.pk, factura.numero_serie, factura.estado, factura.fecha_emision, factura.fecha_vencimiento,
+        factura.total_pagado, factura.total_con_impuestos, factura.saldo_pendiente,
+        presupuesto.total, presupuesto.impuestos,
+        proyecto.nombre,
+        cliente.nombre, cliente.email, cliente.telefono, cliente.direccion,
+        freelancer.username, freelancer.first_name, freelancer.last_name, freelancer.email,
+        [(p['fecha'], p['cantidad'], p['metodo'], p['notas']) for p in factura.pagos_list],
+        # El pie del PDF lleva la fecha de generación y el template puede cambiar entre versiones
+        timezone.localdate(),
+        os.path.getmtime(plantilla) if os.path.exists(plantilla) else None,
+    ]
+    return hashlib.sha256(json.dumps(datos, default=str).encode('utf-8')).hexdigest()
+
+
+class CachePDFBase(ABC):
+    """
+    Interfaz común de los backends. Cada factura tiene como mucho un PDF guardado,
+    el de su última huella.
+    """
+
+    def __init__(self, opciones):
+        self.opciones = opciones
+
+    @abstractmethod
+    def obtener(self, factura_id, huella):
+        """Devuelve los bytes del PDF si hay uno guardado con esa huella, o None."""
+
+    @abstractmethod
+    def guardar(self, factura_id, huella, pdf):
+        """Guarda el PDF de la factura, sustituyendo al anterior si lo había."""
+
+    @abstractmethod
+    def invalidar(self, factura_id):
+        """Borra el PDF guardado de la factura, si existe."""
+
+    @abstractmethod
+    def vaciar(self):
+        """Borra todos los PDF guardados."""
+
+
+class CacheArchivosPDF(CachePDFBase):
+    """
+    Guarda cada PDF como <factura_id>-<huella>.pdf en DIRECTORIO.
+
+    La fecha de modificación del fichero se actualiza en cada acierto, así que al superar
+    TAMAÑO_MAXIMO se borran primero los PDF que hace más tiempo que no se descargan.
+    """
+
+    def __init__(self, opciones):
+        super().__init__(opciones)
+        self.directorio = Path(opciones['DIRECTORIO'])
+        self.tamaño_maximo = opciones['TAMAÑO_MAXIMO']
+
+    def _ruta(self, factura_id, huella):
+        return self.directorio / f'{factura_id}-{huella}.pdf'
+
+    def obtener(self, factura_id, huella):
+        ruta = self._ruta(factura_id, huella)
+        try:
+            pdf = ruta.read_bytes()
+            # Marcamos el acceso para el LRU (puede haberse expulsado justo ahora)
+            os.utime(ruta)
+        except FileNotFoundError:
+            return None
+        return pdf
+
+    def guardar(self, factura_id, huella, pdf):
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        self.invalidar(factura_id)
+        # Se escribe en un temporal y se renombra para que nadie lea un PDF a medias
+        fd, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fichero:
+            fichero.write(pdf)
+        os.replace(temporal, self._ruta(factura_id, huella))
+        self._expulsar()
+
+    def invalidar(self, factura_id):
+        for ruta in self.directorio.glob(f'{factura_id}-*.pdf'):
+            ruta.unlink(missing_ok=True)
+
+    def vaciar(self):
+        for ruta in self.directorio.glob('*.pdf'):
+            ruta.unlink(missing_ok=True)
+
+    def _expulsar(self):
+        """
+        Si el directorio supera TAMAÑO_MAXIMO borra los PDF menos usados
+        hasta dejarlo por debajo del 90 % del máximo.
+        """
+        ficheros = []
+        total = 0
+        for entrada in os.scandir(self.directorio):
+            if entrada.name.endswith('.pdf'):
+                estado = entrada.stat()
+                ficheros.append((estado.st_mtime, estado.st_size, entrada.path))
+                total += estado.st_size
+        if total <= self.tamaño_maximo:
+            return
+
+        objetivo = self.tamaño_maximo * 0.9
+        for _, tamaño, ruta in sorted(ficheros):
+            if total <= objetivo:
+                break
+            try:
+                os.unlink(ruta)
+                total -= tamaño
+            except FileNotFoundError:
+                pass
+
+
+class CacheDjangoPDF(CachePDFBase):
+    """
+    Guarda (huella, pdf) en la caché de Django CACHES[ALIAS] con la clave
+    pdf_factura:<generación>:<id>. La expulsión cuando se llena depende del
+    backend de caché configurado. vaciar() solo sube la generación, así las
+    claves antiguas dejan de usarse sin tener que borrar toda la caché.
+    """
+
+    def __init__(self, opciones):
+        super().__init__(opciones)
+        self.cache = caches[opciones['ALIAS']]
+        self.timeout = opciones['TIMEOUT']
+
+    def _clave(self, factura_id):
+        generacion = self.cache.get_or_set('pdf_factura:generacion', 1, None)
+        return f'pdf_factura:{generacion}:{factura_id}'
+
+    def obtener(self, factura_id, huella):
+        guardado = self.cache.get(self._clave(factura_id))
+        if guardado and guardado[0] == huella:
+            return guardado[1]
+        return None
+
+    def guardar(self, factura_id, huella, pdf):
+        self.cache.set(self._clave(factura_id), (huella, pdf), self.timeout)
+
+    def invalidar(self, factura_id):
+        self.cache.delete(self._clave(factura_id))
+
+    def vaciar(self):
+        self.cache.get_or_set('pdf_factura:generacion', 1, None)
+        self.cache.incr('pdf_factura:generacion')
+
+
+_cache_pdf = None
+
+
+def obtener_cache_pdf():
+    """
+    Devuelve el backend configurado en settings.PDF_CACHE (se crea una vez por proceso).
+    """
+    global _cache_pdf
+    if _cache_pdf is None:
+        opciones = {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'PDF_CACHE', {})}
+        _cache_pdf = import_string(opciones['BACKEND'])(opciones)
+    return _cache_pdf
+
+
+def registrar_resultado(acierto):
+    """Suma un acierto o un fallo a los contadores compartidos."""
+    cache = caches['default']
+    clave = CLAVE_ACIERTOS if acierto else CLAVE_FALLOS
+    cache.add(clave, 0, None)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        # La clave se ha expulsado entre el add y el incr
+        cache.set(clave, 1, None)
+
+
+def contadores_compartidos():
+    """
+    Returns:
+        bool: False si la caché 'default' es la de memoria de Django: cada proceso cuenta solo
+        lo suyo y un comando de gestión siempre ve los contadores a cero.
+    """
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def estadisticas():
+    """
+    Returns:
+        dict: aciertos, fallos y porcentaje de aciertos de la caché de PDF.
+    """
+    cache = caches['default']
+    aciertos = cache.get(CLAVE_ACIERTOS, 0)
+    fallos = cache.get(CLAVE_FALLOS, 0)
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'porcentaje_aciertos': round(aciertos * 100 / total, 1) if total else 0,
+    }
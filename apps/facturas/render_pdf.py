@@ -0,0 +1,42 @@
+"""
+Conversión HTML → PDF con WeasyPrint.
+
+Este módulo no importa nada de Django a propósito: es lo único que ejecutan los procesos
+del pool de trabajos_pdf.py, que se arrancan con 'spawn' y no tienen Django configurado.
+El HTML ya llega renderizado desde el proceso web.
+
+WeasyPrint (con Pango, fontTools, Pillow...) se importa la primera vez que se usa y no al
+cargar el módulo: views.py lo importa al cargar las URL, y así los procesos web que nunca
+generan un PDF no pagan su importación en el arranque ni en memoria. Los procesos del pool
+lo cargan al arrancar con precargar(). Ver python manage.py perfil_importaciones.
+"""
+
+
+def renderizar_pdf(html, base_url):
+    """
+    Args:
+        html (str): HTML completo de la factura (factura_pdf.html ya renderizado).
+        base_url (str): URL base para resolver rutas relativas (estilos, imágenes).
+
+    Returns:
+        bytes: el PDF generado.
+    """
+    import weasyprint
+
+    return weasyprint.HTML(string=html, base_url=base_url).write_pdf()
+
+
+def precargar():
+    """
+    Importa WeasyPrint y genera un PDF vacío para que Pango y fontconfig carguen las
+    fuentes. Es el initializer de los procesos del pool de trabajos_pdf.py: el primer PDF
+    de cada proceso ya no paga ese arranque.
+    """
+    try:
+        import weasyprint
+
+        weasyprint.HTML(string='<p></p>').write_pdf()
+    except Exception:
+        # Un initializer que falla rompe el pool entero: si WeasyPrint no funciona, que el
+        # error llegue con el primer PDF y quede en su TrabajoPDF
+        pass
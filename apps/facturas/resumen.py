@@ -0,0 +1,217 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+from .models import Factura, ResumenMensual
+
+"""
+Mantenimiento de la tabla ResumenMensual (totales por freelancer, cliente, mes y estado).
+
+cambios_resumen(ids) envuelve cualquier escritura sobre facturas: lee y bloquea lo que aportan
+antes, lo vuelve a leer después y suma la diferencia con F() en la misma transacción.
+reconstruir_resumen() recalcula desde cero el de un freelancer, tras cargas que no pasan por
+cambios_resumen(). Cada factura aporta (facturado, cobrado, pendiente, 1) a la fila de su
+(freelancer, cliente, año y mes de emisión, estado).
+"""
+
+RUTA_FREELANCER = 'presupuesto__proyecto__freelancer_id'
+RUTA_CLIENTE = 'presupuesto__proyecto__cliente_id'
+
+CERO = Decimal('0')
+
+# ids de facturas por consulta en aportaciones() y filas por escritura en aplicar_lote()
+LOTE_APORTACIONES = 2000
+
+
+def aportaciones(ids, bloquear=False):
+    """
+    Lee lo que aportan al resumen las facturas indicadas.
+
+    Args:
+        ids (iterable): ids de las facturas.
+        bloquear (bool): bloquea las filas de las facturas hasta el final de la transacción,
+            para que nadie las cambie entre esta lectura y la siguiente.
+
+    Returns:
+        dict: (freelancer_id, cliente_id, año, mes, estado) → [facturado, cobrado, pendiente, num_facturas]
+    """
+    ids = list(ids)
+    resultado = defaultdict(lambda: [CERO, CERO, CERO, 0])
+    if not ids:
+        return resultado
+
+    # Por lotes para no pasar de los parámetros que admite un IN en una sola consulta
+    for inicio in range(0, len(ids), LOTE_APORTACIONES):
+        facturas = Factura.objects.filter(pk__in=ids[inicio:inicio + LOTE_APORTACIONES])
+        if bloquear and connection.in_atomic_block:
+            facturas = facturas.select_for_update(of=('self',))
+        filas = facturas.values_list(
+            RUTA_FREELANCER, RUTA_CLIENTE, 'fecha_emision', 'estado',
+            'total_con_impuestos', 'total_pagado', 'saldo_pendiente',
+        )
+        for freelancer_id, cliente_id, fecha, estado, total, pagado, saldo in filas:
+            suma = resultado[(freelancer_id, cliente_id, fecha.year, fecha.month, estado)]
+            suma[0] += total
+            suma[1] += pagado
+            suma[2] += saldo
+            suma[3] += 1
+    return resultado
+
+
+def diferencia(antes, despues):
+    """
+    Returns:
+        dict: clave → lo que hay que sumar a cada fila del resumen (sin las claves que no cambian).
+    """
+    cambios = {}
+    for clave in set(antes) | set(despues):
+        viejo = antes.get(clave, (CERO, CERO, CERO, 0))
+        nuevo = despues.get(clave, (CERO, CERO, CERO, 0))
+        delta = [n - v for n, v in zip(nuevo, viejo)]
+        if any(delta):
+            cambios[clave] = delta
+    return cambios
+
+
+def aplicar(cambios):
+    """
+    Suma cada diferencia a su fila de ResumenMensual, creándola si no existe, y borra
+    las filas que se quedan sin facturas. Debe llamarse dentro de una transacción.
+
+    Una sola clave (un pago, editar una factura sin cambiar de estado) es un UPDATE. Con más se
+    usa aplicar_lote(), que hace las mismas consultas para cualquier número de claves: clave a
+    clave serían de una a cuatro por cada una.
+    """
+    if len(cambios) > 1:
+        aplicar_lote(cambios)
+        return
+    for (freelancer_id, cliente_id, año, mes, estado), delta in cambios.items():
+        clave = {
+            'freelancer_id': freelancer_id, 'cliente_id': cliente_id,
+            'año': año, 'mes': mes, 'estado': estado,
+        }
+        facturado, cobrado, pendiente, num_facturas = delta
+        incrementos = {
+            'facturado': F('facturado') + facturado,
+            'cobrado': F('cobrado') + cobrado,
+            'pendiente': F('pendiente') + pendiente,
+            'num_facturas': F('num_facturas') + num_facturas,
+        }
+        if not ResumenMensual.objects.filter(**clave).update(**incrementos):
+            try:
+                # Savepoint: si otra transacción crea la fila a la vez, se suma sobre la suya
+                with transaction.atomic():
+                    ResumenMensual.objects.create(
+                        **clave, facturado=facturado, cobrado=cobrado,
+                        pendiente=pendiente, num_facturas=num_facturas,
+                    )
+            except IntegrityError:
+                ResumenMensual.objects.filter(**clave).update(**incrementos)
+        if num_facturas < 0:
+            ResumenMensual.objects.filter(**clave, num_facturas=0).delete()
+
+
+def aplicar_lote(cambios):
+    """
+    Como aplicar(), pero con unas pocas consultas: lee y bloquea (SELECT ... FOR UPDATE) las
+    filas del resumen de los freelancers y años afectados, suma las diferencias en memoria,
+    borra las filas afectadas con un DELETE por lote y las vuelve a insertar con bulk_create
+    (sin las que se quedan sin facturas). Es mucho más rápido que un bulk_update, que construye
+    un CASE WHEN por fila. Debe llamarse dentro de una transacción.
+
+    Si otra transacción crea a la vez alguna de las filas nuevas, el bulk_create falla y se
+    repite clave a clave con aplicar(), que suma sobre la fila de la otra transacción.
+    """
+    freelancers = {clave[0] for clave in cambios}
+    años = {clave[2] for clave in cambios}
+    filas = ResumenMensual.objects.filter(freelancer_id__in=freelancers, año__in=años)
+    if connection.in_atomic_block:
+        filas = filas.select_for_update()
+    existentes = {
+        (fila.freelancer_id, fila.cliente_id, fila.año, fila.mes, fila.estado): fila
+        for fila in filas
+    }
+
+    borradas, nuevas = [], []
+    for clave, (facturado, cobrado, pendiente, num_facturas) in cambios.items():
+        fila = existentes.get(clave)
+        if fila is None:
+            freelancer_id, cliente_id, año, mes, estado = clave
+            fila = ResumenMensual(
+                freelancer_id=freelancer_id, cliente_id=cliente_id, año=año, mes=mes, estado=estado,
+            )
+        else:
+            borradas.append(fila.pk)
+            fila.pk = None
+        fila.facturado += facturado
+        fila.cobrado += cobrado
+        fila.pendiente += pendiente
+        fila.num_facturas += num_facturas
+        if fila.num_facturas > 0:
+            nuevas.append(fila)
+
+    for inicio in range(0, len(borradas), LOTE_APORTACIONES):
+        ResumenMensual.objects.filter(pk__in=borradas[inicio:inicio + LOTE_APORTACIONES]).delete()
+    try:
+        with transaction.atomic():
+            ResumenMensual.objects.bulk_create(nuevas, batch_size=LOTE_APORTACIONES)
+    except IntegrityError:
+        # Las filas propias ya están borradas: sus valores completos se suman como diferencia
+        for fila in nuevas:
+            clave = (fila.freelancer_id, fila.cliente_id, fila.año, fila.mes, fila.estado)
+            aplicar({clave: [fila.facturado, fila.cobrado, fila.pendiente, fila.num_facturas]})
+
+
+@contextmanager
+def cambios_resumen(ids=()):
+    """
+    Actualiza el resumen con lo que cambien las facturas indicadas dentro del bloque.
+
+    Ejemplo:
+        with cambios_resumen([factura.pk]):
+            Factura.objects.filter(pk=factura.pk).update(estado='vencida')
+
+    Para facturas nuevas se añade su id a la lista que devuelve:
+        with cambios_resumen() as ids:
+            factura.save()
+            ids.append(factura.pk)
+    """
+    ids = list(ids)
+    # Sin savepoint si ya hay una transacción: si algo falla, falla la de quien llama
+    with transaction.atomic(savepoint=False):
+        antes = aportaciones(ids, bloquear=True)
+        yield ids
+        aplicar(diferencia(antes, aportaciones(ids)))
+
+
+def reconstruir_resumen(freelancer_id):
+    """
+    Borra y vuelve a calcular todas las filas del resumen de un freelancer.
+
+    Returns:
+        int: filas creadas.
+    """
+    grupos = Factura.objects.filter(
+        presupuesto__proyecto__freelancer_id=freelancer_id
+    ).annotate(
+        año=ExtractYear('fecha_emision'), mes=ExtractMonth('fecha_emision')
+    ).values(
+        'año', 'mes', 'estado', cliente_id=F(RUTA_CLIENTE)
+    ).annotate(
+        facturado=Sum('total_con_impuestos'),
+        cobrado=Sum('total_pagado'),
+        pendiente=Sum('saldo_pendiente'),
+        num_facturas=Count('pk'),
+    ).order_by()
+
+    with transaction.atomic():
+        ResumenMensual.objects.filter(freelancer_id=freelancer_id).delete()
+        creadas = ResumenMensual.objects.bulk_create(
+            [ResumenMensual(freelancer_id=freelancer_id, **grupo) for grupo in grupos],
+            batch_size=1000,
+        )
+    return len(creadas)
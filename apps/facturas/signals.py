@@ -1,21 +1,132 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
-from django.utils import timezone
-from .models import Factura
+from apps.proyectos.models import Proyecto
+from apps.presupuestos.models import Presupuesto
+from .models import Factura, Pago, calcular_total_con_impuestos
+from .pdf_cache import obtener_cache_pdf
+from .resumen import aportaciones, aplicar, diferencia
+
+
+@receiver(post_save, sender=Presupuesto)
+def actualizar_total_factura(sender, instance, **kwargs):
+    """
+    Señal que mantiene al día el total con impuestos de la factura cuando se edita
+    el total o los impuestos de su presupuesto. El saldo pendiente lo recalcula
+    la propia base de datos al ser un GeneratedField.
+
+    Es un único UPDATE que no afecta a ninguna fila si el presupuesto no tiene factura.
+
+    Args:
+        sender: El modelo que envía la señal (Presupuesto).
+        instance: La instancia de Presupuesto que acaba de guardarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    total_con_impuestos = calcular_total_con_impuestos(instance.total, instance.impuestos)
+    Factura.objects.filter(presupuesto=instance).exclude(
+        total_con_impuestos=total_con_impuestos
+    ).update(total_con_impuestos=total_con_impuestos)
 
 
 @receiver(post_save, sender=Factura)
-def verificar_vencimiento(sender, instance, **kwargs):
+@receiver(post_delete, sender=Factura)
+def invalidar_pdf_factura(sender, instance, **kwargs):
+    """
+    Señal que borra el PDF guardado de una factura cuando se guarda o se elimina.
+    No es imprescindible para no servir PDF desactualizados (de eso se encarga la huella
+    de pdf_cache.py), pero libera el espacio en cuanto el PDF deja de ser válido.
+
+    Args:
+        sender: El modelo que envía la señal (Factura).
+        instance: La instancia de Factura que acaba de guardarse o eliminarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    obtener_cache_pdf().invalidar(instance.pk)
+
+
+@receiver(post_save, sender=Pago)
+def invalidar_pdf_pago(sender, instance, **kwargs):
+    """
+    Señal que borra el PDF guardado de la factura cuando se le registra un pago,
+    ya que el PDF incluye el historial de pagos y el saldo pendiente.
+
+    Args:
+        sender: El modelo que envía la señal (Pago).
+        instance: La instancia de Pago que acaba de guardarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    obtener_cache_pdf().invalidar(instance.factura_id)
+
+
+@receiver(pre_save, sender=Presupuesto)
+@receiver(pre_save, sender=Proyecto)
+def resumen_antes_de_guardar(sender, instance, **kwargs):
+    """
+    Señal que guarda lo que aportan a ResumenMensual las facturas que pueden cambiar al
+    guardar un presupuesto (su total con impuestos, o de cliente si cambia de proyecto) o un
+    proyecto que cambia de cliente o de freelancer. resumen_despues_de_guardar suma la diferencia.
+
+    Args:
+        sender: El modelo que envía la señal (Presupuesto o Proyecto).
+        instance: La instancia que va a guardarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    instance._resumen_facturas = []
+    if not instance.pk:
+        return
+    if sender is Proyecto:
+        anterior = Proyecto.objects.filter(pk=instance.pk).values_list('cliente_id', 'freelancer_id').first()
+        if anterior is None or anterior == (instance.cliente_id, instance.freelancer_id):
+            return
+        facturas = Factura.objects.filter(presupuesto__proyecto=instance)
+    else:
+        facturas = Factura.objects.filter(presupuesto=instance)
+    instance._resumen_facturas = list(facturas.values_list('pk', flat=True))
+    instance._resumen_antes = aportaciones(instance._resumen_facturas, bloquear=True)
+
+
+# Va después de actualizar_total_factura: las dos escuchan el post_save de Presupuesto
+# y se ejecutan en el orden en que se registran.
+@receiver(post_save, sender=Presupuesto)
+@receiver(post_save, sender=Proyecto)
+def resumen_despues_de_guardar(sender, instance, **kwargs):
+    """
+    Señal que suma a ResumenMensual la diferencia en las facturas guardadas por
+    resumen_antes_de_guardar.
+
+    Args:
+        sender: El modelo que envía la señal (Presupuesto o Proyecto).
+        instance: La instancia que acaba de guardarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    ids = getattr(instance, '_resumen_facturas', None)
+    if ids:
+        aplicar(diferencia(instance._resumen_antes, aportaciones(ids)))
+    instance._resumen_facturas = []
+
+
+@receiver(pre_delete, sender=Factura)
+def resumen_antes_de_borrar(sender, instance, **kwargs):
     """
-    Señal que se ejecuta automáticamente tras cada guardado de una factura.
-    Comprueba si la factura ha vencido y actualiza su estado en la BD.
+    Señal que guarda lo que aporta a ResumenMensual la factura que se va a borrar.
+    El borrado se hace dentro de una transacción, así que la fila queda bloqueada.
 
-    Reiterando lo dicho en el models.py, esto se deberia de hacer con Celery
+    Args:
+        sender: El modelo que envía la señal (Factura).
+        instance: La instancia de Factura que va a eliminarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    instance._resumen_antes = aportaciones([instance.pk], bloquear=True)
+
+
+@receiver(post_delete, sender=Factura)
+def resumen_despues_de_borrar(sender, instance, **kwargs):
+    """
+    Señal que resta de ResumenMensual lo que aportaba la factura borrada, en la misma
+    transacción que el borrado.
 
     Args:
         sender: El modelo que envía la señal (Factura).
-        instance: La instancia de Factura que acaba de guardarse.
+        instance: La instancia de Factura que acaba de eliminarse.
         **kwargs: Argumentos adicionales de la señal.
     """
-    if instance.estado not in ('pagada', 'anulada') and instance.fecha_vencimiento < timezone.now().date():
-        Factura.objects.filter(pk=instance.pk).update(estado='vencida')
\ No newline at end of file
+    aplicar(diferencia(getattr(instance, '_resumen_antes', {}), {}))
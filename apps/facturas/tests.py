@@ -1,3 +1,228 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.clientes.models import Cliente
+from apps.presupuestos.conversion import convertir_presupuestos
+from apps.presupuestos.models import Presupuesto
+from apps.proyectos.models import Proyecto
+from apps.setup.generador import generar
+from apps.usuarios.models import Usuario
+from . import conciliacion
+from .conciliacion import conciliar, leer_extracto
+from .models import Factura, Pago, ResumenMensual
+from .pdf_cache import estadisticas, registrar_resultado
+from .resumen import reconstruir_resumen
+
+
+def filas_resumen(freelancer):
+    """ResumenMensual del freelancer como dict (cliente, año, mes, estado) → importes."""
+    return {
+        (fila.cliente_id, fila.año, fila.mes, fila.estado):
+            (fila.facturado, fila.cobrado, fila.pendiente, fila.num_facturas)
+        for fila in ResumenMensual.objects.filter(freelancer=freelancer)
+    }
+
+
+class ResumenMensualTests(TestCase):
+    """
+    Después de cada forma de escribir facturas, ResumenMensual debe ser exactamente lo que
+    calcula reconstruir_resumen() desde cero.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.freelancer = generar('resumen', clientes=4, facturas=40, semilla=1)[0]
+
+    def assertResumenCoherente(self):
+        incremental = filas_resumen(self.freelancer)
+        reconstruir_resumen(self.freelancer.pk)
+        self.assertEqual(incremental, filas_resumen(self.freelancer))
+
+    def facturas(self):
+        return Factura.objects.filter(presupuesto__proyecto__freelancer=self.freelancer).order_by('pk')
+
+    def test_guardar_factura(self):
+        factura = self.facturas().filter(estado='pendiente').first()
+        factura.fecha_emision -= timedelta(days=40)
+        factura.estado = 'anulada'
+        factura.save()
+        self.assertResumenCoherente()
+
+    def test_cambiar_total_del_presupuesto(self):
+        presupuesto = self.facturas().first().presupuesto
+        presupuesto.total += Decimal('100')
+        presupuesto.save()
+        self.assertResumenCoherente()
+
+    def test_borrar_factura(self):
+        self.facturas().filter(estado='pagada').first().delete()
+        self.assertResumenCoherente()
+
+    def test_registrar_pago(self):
+        factura = self.facturas().filter(estado='pendiente').first()
+        factura.registrar_pago(Decimal('1.00'), 'bizum')
+        self.assertResumenCoherente()
+        factura.registrar_pago(factura.saldo_pendiente, 'transferencia')
+        self.assertEqual(factura.estado, 'pagada')
+        self.assertResumenCoherente()
+
+    def test_actualizar_vencimientos(self):
+        abiertas = self.facturas().filter(estado__in=['pendiente', 'parcial'])
+        ids = list(abiertas.values_list('pk', flat=True))
+        # fecha_vencimiento no está en el resumen: moverla no lo descuadra
+        abiertas.update(fecha_vencimiento=timezone.now().date() - timedelta(days=1))
+        call_command('actualizar_vencimientos', lote=2, stdout=StringIO())
+        self.assertFalse(Factura.objects.filter(pk__in=ids).exclude(estado='vencida').exists())
+        self.assertResumenCoherente()
+
+    def test_conversion_en_lote(self):
+        hoy = timezone.now().date()
+        proyectos = list(Proyecto.objects.filter(freelancer=self.freelancer).order_by('cliente_id', 'pk'))
+        presupuestos = Presupuesto.objects.bulk_create(
+            Presupuesto(
+                proyecto=proyectos[i % len(proyectos)], numero_serie=f'T-{i}', fecha=hoy,
+                validez=hoy + timedelta(days=400), estado='aceptado', total=Decimal(100 + i),
+            )
+            for i in range(12)
+        )
+        # Dos tandas en meses distintos, cada una con presupuestos de varios clientes
+        for tanda, fecha in enumerate([hoy - timedelta(days=62), hoy]):
+            ids = [presupuesto.pk for presupuesto in presupuestos[tanda::2]]
+            resultado = convertir_presupuestos(ids, freelancer=self.freelancer, fecha=fecha)
+            self.assertEqual(len(resultado.facturas), 6)
+            self.assertEqual(resultado.fallos, [])
+        self.assertResumenCoherente()
+
+
+class ContadoresCachePDFTests(TestCase):
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_aciertos_y_fallos(self):
+        for acierto in (True, True, True, False):
+            registrar_resultado(acierto)
+        self.assertEqual(estadisticas(), {'aciertos': 3, 'fallos': 1, 'porcentaje_aciertos': 75.0})
+
+    def test_el_comando_avisa_con_la_cache_de_cada_proceso(self):
+        registrar_resultado(True)
+        salida, errores = StringIO(), StringIO()
+        call_command('cache_pdf', stdout=salida, stderr=errores)
+        self.assertIn('Aciertos: 1 | Fallos: 0', salida.getvalue())
+        self.assertIn('REDIS_URL', errores.getvalue())
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_sin_aviso_con_otro_backend(self):
+        errores = StringIO()
+        call_command('cache_pdf', stdout=StringIO(), stderr=errores)
+        self.assertEqual(errores.getvalue(), '')
+
+
+class ConciliacionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.freelancer = Usuario.objects.create_user('conciliacion', password='x')
+        cls.hoy = timezone.now().date()
+        cls.acme = cls.factura('Acme Consulting', '100.00')
+        cls.beta = cls.factura('Beta Studio', '100.00')
+        cls.otra_acme = cls.factura('Acme Consulting', '250.00')
+
+    @classmethod
+    def factura(cls, cliente, total):
+        cliente, _ = Cliente.objects.get_or_create(
+            freelancer=cls.freelancer, nombre=cliente, defaults={'email': f'{len(cliente)}@example.com'},
+        )
+        proyecto = Proyecto.objects.create(
+            freelancer=cls.freelancer, cliente=cliente, nombre=f'Proyecto {total}', estado='activo',
+            fecha_inicio=cls.hoy,
+        )
+        presupuesto = Presupuesto.objects.create(
+            proyecto=proyecto, numero_serie=f'P-{Presupuesto.objects.count()}', fecha=cls.hoy,
+            validez=cls.hoy, estado='aceptado', total=Decimal(total), impuestos=0,
+        )
+        factura = Factura(presupuesto=presupuesto, fecha_emision=cls.hoy, fecha_vencimiento=cls.hoy)
+        factura.save()
+        return factura
+
+    def conciliar(self, *filas):
+        """Concilia un extracto CSV con una fila (importe, concepto) por movimiento."""
+        texto = 'fecha;importe;concepto\n' + ''.join(
+            f'{self.hoy:%d/%m/%Y};{importe};{concepto}\n' for importe, concepto in filas
+        )
+        return conciliar(self.freelancer, leer_extracto(StringIO(texto), 'extracto.csv'))
+
+    def estado(self, factura):
+        factura.refresh_from_db()
+        return factura.estado, factura.total_pagado
+
+    def test_cita_el_numero_de_serie(self):
+        # Las dos facturas de 100 € son candidatas por importe: decide el número citado
+        numero = self.beta.numero_serie.replace('-', '/')
+        resultado = self.conciliar(('100,00', f'Pago fra. {numero}'))
+        self.assertEqual([(c.factura.pk, c.motivo) for c in resultado.cobros], [(self.beta.pk, 'número de serie')])
+        self.assertEqual(self.estado(self.beta), ('pagada', Decimal('100.00')))
+        self.assertEqual(self.estado(self.acme), ('pendiente', Decimal('0')))
+
+    def test_varias_facturas_por_la_suma_exacta(self):
+        citadas = f'{self.acme.numero_serie} y {self.otra_acme.numero_serie}'
+        resultado = self.conciliar(('340,00', f'Fras {citadas}'), ('350,00', f'Fras {citadas}'))
+        self.assertEqual(len(resultado.revision), 1)
+        self.assertEqual(resultado.revision[0].linea.importe, Decimal('340.00'))
+        self.assertEqual({c.factura.pk for c in resultado.cobros}, {self.acme.pk, self.otra_acme.pk})
+        self.assertEqual(self.estado(self.acme), ('pagada', Decimal('100.00')))
+        self.assertEqual(self.estado(self.otra_acme), ('pagada', Decimal('250.00')))
+        # Un pago por factura, con huellas distintas
+        self.assertEqual(Pago.objects.filter(referencia_extracto__isnull=False).count(), 2)
+
+    def test_desempate_por_el_nombre_del_cliente(self):
+        resultado = self.conciliar(('100,00', 'Transferencia'), ('100,00', 'TRANSF. BETA STUDIO SL'))
+        self.assertEqual([c.factura.pk for c in resultado.cobros], [self.beta.pk])
+        self.assertEqual(resultado.cobros[0].motivo, 'importe y cliente')
+        self.assertEqual(resultado.revision[0].motivo, '2 facturas pendientes por ese importe')
+
+    def test_pago_parcial(self):
+        resultado = self.conciliar(('40,00', f'A cuenta {self.otra_acme.numero_serie}'))
+        self.assertTrue(resultado.aplicado)
+        self.assertEqual(self.estado(self.otra_acme), ('parcial', Decimal('40.00')))
+        # Lo que queda pendiente se puede cobrar después por importe
+        self.conciliar(('210,00', 'Resto'))
+        self.assertEqual(self.estado(self.otra_acme), ('pagada', Decimal('250.00')))
+
+    def test_volver_a_importar_el_extracto(self):
+        filas = (('40,00', f'A cuenta {self.otra_acme.numero_serie}'), ('-15,00', 'Comisión'))
+        self.conciliar(*filas)
+        pagos = Pago.objects.count()
+        resultado = self.conciliar(*filas)
+        self.assertEqual((resultado.ya_importadas, resultado.ignoradas, resultado.cobros), (1, 1, []))
+        self.assertEqual(Pago.objects.count(), pagos)
+        self.assertEqual(self.estado(self.otra_acme), ('parcial', Decimal('40.00')))
+
+    def test_importacion_simultanea_del_mismo_extracto(self):
+        texto = f'fecha;importe;concepto\n{self.hoy:%d/%m/%Y};100,00;Pago {self.acme.numero_serie}\n'
+        linea, = leer_extracto(StringIO(texto), 'extracto.csv')
+        # La otra importación ya ha insertado su pago, pero esta no lo ha visto al buscar las
+        # huellas: el INSERT choca con la restricción única y se concilia de nuevo
+        Pago.objects.create(
+            factura=self.acme, fecha=self.hoy, cantidad=Decimal('100.00'), metodo='transferencia',
+            referencia_extracto=linea.huella(self.freelancer.pk),
+        )
+        importadas = conciliacion._importadas
+        busquedas = []
+
+        def sin_ver_la_otra_la_primera_vez(huellas):
+            busquedas.append(huellas)
+            return importadas(huellas) if len(busquedas) > 1 else set()
+
+        with mock.patch.object(conciliacion, '_importadas', side_effect=sin_ver_la_otra_la_primera_vez):
+            resultado = conciliar(self.freelancer, [linea])
+        self.assertEqual(len(busquedas), 2)
+        self.assertEqual((resultado.ya_importadas, resultado.cobros, resultado.aplicado), (1, [], False))
+        self.assertEqual(self.acme.pagos.count(), 1)
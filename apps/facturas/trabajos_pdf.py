@@ -0,0 +1,195 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import Factura, TrabajoPDF
+from .pdf_cache import obtener_cache_pdf
+from .render_pdf import precargar, renderizar_pdf
+
+"""
+Generación de los PDF de las facturas fuera de la petición.
+
+El proceso web renderiza el HTML y lo manda a un ProcessPoolExecutor propio (procesos 'spawn'
+que solo importan render_pdf.py) que ejecuta WeasyPrint. Cada encargo es un TrabajoPDF que el
+navegador consulta hasta que el PDF está en la caché de pdf_cache.py; un trabajo que lleva más
+de TIMEOUT segundos en_proceso se relanza al consultarlo, hasta MAX_INTENTOS veces.
+"""
+
+CONFIGURACION_POR_DEFECTO = {
+    # False genera el PDF dentro de la petición
+    'ASINCRONO': True,
+    # Procesos del pool en cada proceso web
+    'TRABAJADORES': 2,
+    # Segundos sin terminar tras los que un trabajo se relanza
+    'TIMEOUT': 120,
+    # Veces que se lanza un trabajo antes de darlo por fallido
+    'MAX_INTENTOS': 2,
+    # Segundos entre consultas de la página de espera
+    'REFRESCO': 2,
+    # Cargar WeasyPrint y las fuentes al arrancar cada proceso del pool
+    'PRECALENTAR': True,
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def configuracion():
+    """Devuelve settings.PDF_TRABAJOS completado con los valores por defecto."""
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'PDF_TRABAJOS', {})}
+
+
+def obtener_pool(reiniciar=False):
+    """
+    Devuelve el pool de procesos de este proceso web (se crea la primera vez que se usa).
+
+    Args:
+        reiniciar (bool): descarta el pool actual, por ejemplo si uno de sus procesos ha muerto.
+    """
+    global _pool
+    with _pool_lock:
+        if reiniciar and _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        if _pool is None:
+            opciones = configuracion()
+            _pool = ProcessPoolExecutor(
+                max_workers=opciones['TRABAJADORES'],
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=precargar if opciones['PRECALENTAR'] else None,
+            )
+        return _pool
+
+
+def facturas_para_pdf():
+    """
+    Queryset de facturas con todo lo que usan factura_pdf.html y pdf_cache.huella_factura()
+    ya cargado, para no lanzar una consulta por cada relación.
+    """
+    return Factura.objects.select_related(
+        'presupuesto__proyecto__cliente', 'presupuesto__proyecto__freelancer'
+    ).prefetch_related('pagos')
+
+
+def html_factura(factura, request):
+    """
+    Renderiza factura_pdf.html. La factura debe venir de facturas_para_pdf().
+    """
+    context = {
+        'factura': factura,
+        'total_base': factura.presupuesto.total,
+        'total_con_impuestos': factura.total_con_impuestos,
+        'pagos_list': factura.pagos_list,
+        'saldo_pendiente': factura.saldo_pendiente,
+    }
+    return render_to_string('apps/facturas/factura_pdf.html', context, request=request)
+
+
+def encolar_pdf(factura, huella, request):
+    """
+    Devuelve el trabajo del usuario para esta factura y huella, creándolo y lanzándolo si no
+    existe. Si ya hay uno en marcha no se lanza otro: varias descargas seguidas del mismo PDF
+    comparten trabajo.
+
+    Returns:
+        TrabajoPDF: el trabajo, en cualquier estado salvo error.
+    """
+    trabajo = TrabajoPDF.objects.filter(
+        factura=factura, usuario=request.user, huella=huella
+    ).exclude(estado='error').order_by('-creado').first()
+
+    if trabajo is None:
+        trabajo = TrabajoPDF.objects.create(factura=factura, usuario=request.user, huella=huella)
+        lanzar_trabajo(trabajo, factura, request)
+    elif trabajo.estado == 'terminado':
+        # Terminado pero la caché ya no tiene el PDF (expulsado o invalidado): se repite
+        lanzar_trabajo(trabajo, factura, request)
+    else:
+        revisar_trabajo(trabajo, request)
+    trabajo.refresh_from_db()
+    return trabajo
+
+
+def lanzar_trabajo(trabajo, factura, request):
+    """
+    Marca el trabajo como en_proceso y manda el HTML de la factura al pool.
+
+    El UPDATE solo se aplica si el trabajo no ha cambiado desde que se leyó, así que si dos
+    peticiones intentan relanzar el mismo trabajo a la vez solo una lo consigue.
+
+    Returns:
+        bool: True si esta petición ha lanzado el trabajo.
+    """
+    reclamado = TrabajoPDF.objects.filter(
+        pk=trabajo.pk, estado=trabajo.estado, intentos=trabajo.intentos
+    ).update(
+        estado='en_proceso', intentos=F('intentos') + 1, error='', actualizado=timezone.now()
+    )
+    if not reclamado:
+        return False
+
+    html = html_factura(factura, request)
+    base_url = request.build_absolute_uri()
+    terminar = partial(_terminar, trabajo.pk, factura.pk, trabajo.huella, threading.get_ident())
+
+    def enviar():
+        try:
+            futuro = obtener_pool().submit(renderizar_pdf, html, base_url)
+        except BrokenProcessPool:
+            futuro = obtener_pool(reiniciar=True).submit(renderizar_pdf, html, base_url)
+        futuro.add_done_callback(terminar)
+
+    # Si la petición está dentro de una transacción, el trabajo se envía al confirmarla
+    transaction.on_commit(enviar)
+    return True
+
+
+def revisar_trabajo(trabajo, request):
+    """
+    Relanza un trabajo pendiente o en_proceso que lleva más de TIMEOUT segundos sin terminar
+    (el proceso que lo tenía se ha reiniciado o el render se ha colgado). Al llegar a
+    MAX_INTENTOS lo marca como error.
+    """
+    opciones = configuracion()
+    if trabajo.estado not in ('pendiente', 'en_proceso'):
+        return
+    if timezone.now() - trabajo.actualizado < timedelta(seconds=opciones['TIMEOUT']):
+        return
+
+    if trabajo.intentos >= opciones['MAX_INTENTOS']:
+        TrabajoPDF.objects.filter(pk=trabajo.pk, estado=trabajo.estado).update(
+            estado='error', error='Tiempo de espera agotado.', actualizado=timezone.now()
+        )
+    else:
+        lanzar_trabajo(trabajo, facturas_para_pdf().get(pk=trabajo.factura_id), request)
+
+
+def _terminar(trabajo_id, factura_id, huella, hilo_origen, futuro):
+    """
+    Callback del pool: guarda el PDF en la caché y actualiza el trabajo.
+
+    Se ejecuta en el hilo interno del ProcessPoolExecutor, que abre su propia conexión a
+    la base de datos; hay que cerrarla al terminar. Si el futuro ya había acabado al añadir
+    el callback se ejecuta en el hilo de la petición, y esa conexión no se toca.
+    """
+    try:
+        pdf = futuro.result()
+    except Exception as e:
+        TrabajoPDF.objects.filter(pk=trabajo_id).update(
+            estado='error', error=str(e) or e.__class__.__name__, actualizado=timezone.now()
+        )
+    else:
+        obtener_cache_pdf().guardar(factura_id, huella, pdf)
+        TrabajoPDF.objects.filter(pk=trabajo_id).update(estado='terminado', actualizado=timezone.now())
+    finally:
+        if threading.get_ident() != hilo_origen:
+            connection.close()
@@ -1,13 +1,17 @@
 from django.urls import path
+from apps.setup.asincrono import elegir_vista
 from . import views
 
 urlpatterns = [
-    path('', views.FacturaListView.as_view(), name='factura_list'),
+    path('', elegir_vista(views.FacturaListView.as_view(), views.FacturaListAsyncView.as_view()), name='factura_list'),
     path('create/', views.FacturaCreateView.as_view(), name='factura_create'),
-    path('<int:pk>/', views.FacturaDetailView.as_view(), name='factura_detail'),
+    path('<int:pk>/', elegir_vista(views.FacturaDetailView.as_view(), views.FacturaDetailAsyncView.as_view()), name='factura_detail'),
     path('<int:pk>/edit/', views.FacturaUpdateView.as_view(), name='factura_edit'),
     path('<int:pk>/eliminar/', views.FacturaDeleteView.as_view(), name='factura_delete'),
     path('<int:pk>/register-payment/', views.RegisterPaymentView.as_view(), name='factura_register_payment'),
     path('<int:pk>/pdf/', views.FacturaDescargarPDFView.as_view(), name='factura_pdf'),
+    path('pdf/trabajos/<uuid:trabajo_id>/', views.TrabajoPDFView.as_view(), name='factura_pdf_trabajo'),
+    path('importar-extracto/', views.ImportarExtractoView.as_view(), name='facturas_importar_extracto'),
     path('exportar/csv/', views.FacturaExportCSVView.as_view(), name='facturas_exportar_csv'),
+    path('exportar/zip/', views.FacturaExportZIPView.as_view(), name='facturas_exportar_zip'),
 ]
\ No newline at end of file
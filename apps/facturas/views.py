@@ -1,35 +1,47 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView, View
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib import messages
+from django.db.models import Count, OuterRef, Subquery
 
-from .models import Factura
-from .forms import FacturaForm, PagoForm
+from .models import Factura, Pago, TrabajoPDF
+from .conciliacion import ExtractoInvalido, conciliar, escribir_informe, leer_extracto
+from .forms import ExtractoForm, FacturaForm, PagoForm
+from apps.setup.asincrono import LecturaAsincronaMixin, respuesta_en_streaming
+from apps.setup.limite_consultas import LimiteConsultasMixin
 from apps.setup.mixins import FreelancerPropietarioMixin, ClientePropietarioMixin
+from apps.setup.paginacion import PaginacionKeysetMixin
+from apps.setup.roles import es_freelancer, es_cliente
 
 
 #Imprimir facturas como PDF
-from django.http import HttpResponse
-from django.template.loader import render_to_string
-import weasyprint
-from decimal import Decimal
+from django.http import HttpResponse, JsonResponse
+from .pdf_cache import obtener_cache_pdf, huella_factura, registrar_resultado
+from .render_pdf import renderizar_pdf
+from .trabajos_pdf import (
+    configuracion as configuracion_trabajos, encolar_pdf, facturas_para_pdf, html_factura, obtener_pool,
+    revisar_trabajo
+)
+from .exportar_zip import facturas_filtradas, generar_zip
 
 #Generacion del CSV
 import csv
 from django.utils import timezone
 
-class FacturaListView(LoginRequiredMixin, ListView):
+class FacturaListView(LimiteConsultasMixin, LoginRequiredMixin, PaginacionKeysetMixin, ListView):
+    limite_consultas = 9
     model = Factura
     template_name = 'apps/facturas/factura_list.html'
     context_object_name = 'facturas'
+    orden_paginacion = ('-fecha_emision', '-id')
 
     def get_queryset(self):
         qs = super().get_queryset()
         user = self.request.user
-        if user.groups.filter(name='FREELANCER').exists():
+        if es_freelancer(user):
             qs = qs.filter(presupuesto__proyecto__freelancer=user)
-        elif user.groups.filter(name='CLIENTE').exists():
+        elif es_cliente(user):
             qs = qs.filter(presupuesto__proyecto__cliente__usuario_cliente=user)
 
         # Manejo del filtro 'estado' similar a proyectos: si el formulario envía
@@ -48,42 +60,40 @@ class FacturaListView(LoginRequiredMixin, ListView):
         return qs
 
 
-class FacturaDetailView(LoginRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, DetailView):
+class FacturaDetailView(LimiteConsultasMixin, LoginRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, DetailView):
+    limite_consultas = 10
     model = Factura
     template_name = 'apps/facturas/factura_detail.html'
     context_object_name = 'factura'
 
+    def get_queryset(self):
+        # presupuesto y pagos se usan en get_context_data: se cargan junto con la factura
+        return super().get_queryset().select_related('presupuesto').prefetch_related('pagos')
+
     def get_context_data(self, **kwargs):
-        from decimal import Decimal
         context = super().get_context_data(**kwargs)
         factura = self.object
-        # calcular total con impuestos y saldo pendiente
-        impuestos = factura.presupuesto.impuestos or 0
-        total_base = Decimal(factura.presupuesto.total)
-        total_con_impuestos = (total_base * (Decimal('1') + Decimal(impuestos) / Decimal('100'))).quantize(Decimal('0.01'))
-        pagos_list = []
-        for pago in factura.pagos:
-            # pagos guardan la cantidad como string en algunos casos
-            cantidad = Decimal(pago.get('cantidad', '0'))
-            pagos_list.append({
-                'fecha': pago.get('fecha'),
-                'cantidad': cantidad.quantize(Decimal('0.01')),
-                'metodo': pago.get('metodo'),
-                'notas': pago.get('notas', ''),
-            })
-        total_pagado = factura.total_pagado or Decimal('0')
-        saldo = (total_con_impuestos - Decimal(total_pagado)).quantize(Decimal('0.01'))
+        # total con impuestos y saldo pendiente ya vienen calculados en la propia factura
         context.update({
-            'total_con_impuestos': total_con_impuestos,
-            'total_base': total_base.quantize(Decimal('0.01')),
-            'impuestos_percent': impuestos,
-            'pagos_list': pagos_list,
-            'saldo_pendiente': saldo,
+            'total_con_impuestos': factura.total_con_impuestos,
+            'total_base': factura.presupuesto.total,
+            'impuestos_percent': factura.presupuesto.impuestos or 0,
+            'pagos_list': factura.pagos_list,
+            'saldo_pendiente': factura.saldo_pendiente,
         })
         return context
 
 
-class FacturaCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
+class FacturaListAsyncView(LecturaAsincronaMixin, FacturaListView):
+    """FacturaListView para el perfil ASGI (apps/setup/asincrono.py)."""
+
+
+class FacturaDetailAsyncView(LecturaAsincronaMixin, FacturaDetailView):
+    """FacturaDetailView para el perfil ASGI (apps/setup/asincrono.py)."""
+
+
+class FacturaCreateView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, CreateView):
+    limite_consultas = {'GET': 7, 'POST': 20}
     model = Factura
     form_class = FacturaForm
     template_name = 'apps/facturas/factura_form.html'
@@ -93,17 +103,19 @@ class FacturaCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView)
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
         user = self.request.user
-        if user.groups.filter(name='FREELANCER').exists():
+        if es_freelancer(user):
+            # Presupuesto.__str__ lee proyecto.freelancer: sin select_related es una consulta por opción
             form.fields['presupuesto'].queryset = form.fields['presupuesto'].queryset.filter(
                 proyecto__freelancer=user
-            )
+            ).select_related('proyecto__freelancer')
         return form
 
     def form_valid(self, form):
         return super().form_valid(form)
 
 
-class FacturaUpdateView(LoginRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, PermissionRequiredMixin, UpdateView):
+class FacturaUpdateView(LimiteConsultasMixin, LoginRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, PermissionRequiredMixin, UpdateView):
+    limite_consultas = {'GET': 8, 'POST': 21}
     model = Factura
     form_class = FacturaForm
     template_name = 'apps/facturas/factura_form.html'
@@ -113,21 +125,24 @@ class FacturaUpdateView(LoginRequiredMixin, FreelancerPropietarioMixin, ClienteP
     def get_form(self, form_class=None):
         form = super().get_form(form_class)
         user = self.request.user
-        if user.groups.filter(name='FREELANCER').exists():
+        if es_freelancer(user):
+            # Presupuesto.__str__ lee proyecto.freelancer: sin select_related es una consulta por opción
             form.fields['presupuesto'].queryset = form.fields['presupuesto'].queryset.filter(
                 proyecto__freelancer=user
-            )
+            ).select_related('proyecto__freelancer')
         return form
 
 
-class FacturaDeleteView(LoginRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, PermissionRequiredMixin, DeleteView):
+class FacturaDeleteView(LimiteConsultasMixin, LoginRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, PermissionRequiredMixin, DeleteView):
+    limite_consultas = {'GET': 8, 'POST': 14}
     model = Factura
     template_name = 'apps/facturas/factura_confirm_delete.html'
     success_url = reverse_lazy('factura_list')
     permission_required = 'facturas.delete_factura'
 
 
-class RegisterPaymentView(LoginRequiredMixin, PermissionRequiredMixin, View):
+class RegisterPaymentView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, View):
+    limite_consultas = {'GET': 7, 'POST': 17}
     permission_required = 'facturas.puede_registrar_pago'
 
     def get(self, request, pk):
@@ -136,7 +151,8 @@ class RegisterPaymentView(LoginRequiredMixin, PermissionRequiredMixin, View):
         return render(request, 'apps/facturas/register_payment.html', {'form': form, 'factura': factura})
 
     def post(self, request, pk):
-        factura = get_object_or_404(Factura, pk=pk)
+        # Con el presupuesto y el proyecto cargados, las señales del Pago no consultan de quién es
+        factura = get_object_or_404(Factura.objects.select_related('presupuesto__proyecto'), pk=pk)
         form = PagoForm(request.POST, factura=factura)
         if form.is_valid():
             factura.registrar_pago(
@@ -149,73 +165,206 @@ class RegisterPaymentView(LoginRequiredMixin, PermissionRequiredMixin, View):
         return render(request, 'apps/facturas/register_payment.html', {'form': form, 'factura': factura})
 
 
+class ImportarExtractoView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, View):
+    """
+    Sube un extracto bancario (CSV o CAMT.053) y registra los cobros que se pueden conciliar
+    con las facturas pendientes del freelancer (ver apps/facturas/conciliacion.py). Muestra los
+    cobros registrados y los movimientos que hay que revisar, o los descarga en CSV.
+    """
+    # El POST no se limita: las consultas por lotes crecen con el tamaño del extracto
+    limite_consultas = {'GET': 5}
+    permission_required = 'facturas.puede_registrar_pago'
+    template_name = 'apps/facturas/importar_extracto.html'
+    # Filas de cada tabla que se muestran en la página (los movimientos para revisar, todos en el CSV)
+    filas_mostradas = 200
+
+    def has_permission(self):
+        # Los cobros se concilian con las facturas del propio freelancer
+        return super().has_permission() and es_freelancer(self.request.user)
+
+    def get(self, request):
+        return render(request, self.template_name, {'form': ExtractoForm()})
+
+    def post(self, request):
+        form = ExtractoForm(request.POST, request.FILES)
+        if not form.is_valid():
+            return render(request, self.template_name, {'form': form})
+
+        extracto = form.cleaned_data['extracto']
+        try:
+            lineas = leer_extracto(extracto, extracto.name)
+        except ExtractoInvalido as e:
+            form.add_error('extracto', str(e))
+            return render(request, self.template_name, {'form': form})
+
+        resultado = conciliar(
+            request.user, lineas, aplicar=not form.cleaned_data['simular'],
+            metodo=form.cleaned_data['metodo'],
+        )
+        if form.cleaned_data['descargar_informe']:
+            response = HttpResponse(content_type='text/csv; charset=utf-8')
+            response['Content-Disposition'] = 'attachment; filename="extracto_revision.csv"'
+            response.write('﻿')
+            escribir_informe(resultado, response)
+            return response
+
+        if resultado.aplicado:
+            messages.success(
+                request, f'{len(resultado.cobros)} cobros registrados por {resultado.importe_conciliado:.2f} €.'
+            )
+        return render(request, self.template_name, {
+            'form': ExtractoForm(),
+            'resultado': resultado,
+            'cobros': resultado.cobros[:self.filas_mostradas],
+            'revision': resultado.revision[:self.filas_mostradas],
+        })
+
+
 # Vista para imprimir la factura
 class FacturaDescargarPDFView(LoginRequiredMixin, View):
     """
     Vista para descargar una factura en formato PDF.
 
-    Renderiza el template factura_pdf.html a HTML y lo convierte a PDF
-    con WeasyPrint, devolviendo el fichero como descarga directa.
+    El PDF se guarda en la caché de pdf_cache.py con la huella de los datos de la
+    factura: mientras no cambien, las siguientes descargas no vuelven a pasar por WeasyPrint.
+
+    Si no está en la caché, el PDF se genera en el pool de procesos de trabajos_pdf.py y
+    la vista responde con el id del trabajo: el navegador va a la página de espera
+    (TrabajoPDFView) y un cliente que pida JSON recibe un 202 con el id y la URL a consultar.
+    Con PDF_TRABAJOS['ASINCRONO'] = False se genera aquí mismo, como antes.
     """
     def get(self, request, pk):
-        factura = get_object_or_404(Factura, pk=pk)
-        total_base = factura.presupuesto.total
-        impuestos = factura.presupuesto.impuestos
-        total_con_impuestos = (total_base * (Decimal('1') + impuestos / Decimal('100'))).quantize(Decimal('0.01'))
-        pagos_list = []
-        for pago in factura.pagos:
-            pago: dict
-            cantidad = Decimal(pago.get('cantidad', '0'))
-            pagos_list.append({
-                'fecha': pago.get('fecha'),
-                'cantidad': cantidad.quantize(Decimal('0.01')),
-                'metodo': pago.get('metodo'),
-                'notas': pago.get('notas', ''),
-            })
-        saldo_pendiente = (total_con_impuestos - factura.total_pagado).quantize(Decimal('0.01'))
-        context = {
-            'factura': factura,
-            'total_base': total_base,
-            'total_con_impuestos': total_con_impuestos,
-            'pagos_list': pagos_list,
-            'saldo_pendiente': saldo_pendiente,
-        }
-        html_string = render_to_string('apps/facturas/factura_pdf.html', context, request=request)
-        pdf_file = weasyprint.HTML(string=html_string, base_url=request.build_absolute_uri()).write_pdf()
-        response = HttpResponse(pdf_file, content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="factura_{factura.numero_serie}.pdf"'
-        return response
+        factura = get_object_or_404(facturas_para_pdf(), pk=pk)
+        cache_pdf = obtener_cache_pdf()
+        huella = huella_factura(factura)
+        pdf_file = cache_pdf.obtener(factura.pk, huella)
+        registrar_resultado(acierto=pdf_file is not None)
 
+        if pdf_file is None:
+            if configuracion_trabajos()['ASINCRONO']:
+                trabajo = encolar_pdf(factura, huella, request)
+                if request.accepts('text/html'):
+                    return redirect('factura_pdf_trabajo', trabajo_id=trabajo.pk)
+                return respuesta_trabajo_json(trabajo)
 
+            pdf_file = renderizar_pdf(html_factura(factura, request), request.build_absolute_uri())
+            cache_pdf.guardar(factura.pk, huella, pdf_file)
 
+        return respuesta_pdf(factura, pdf_file)
 
-class FacturaExportCSVView(LoginRequiredMixin, View):
+
+class TrabajoPDFView(LoginRequiredMixin, View):
+    """
+    Consulta de un trabajo de trabajos_pdf.py. Solo puede consultarlo quien lo pidió.
+
+    - Terminado: devuelve el PDF como descarga.
+    - Pendiente o en proceso: página que se recarga cada REFRESCO segundos (o un 202 en JSON).
+    - Error: página con el motivo (o el JSON del trabajo).
+    """
+    def get(self, request, trabajo_id):
+        trabajo = get_object_or_404(TrabajoPDF, pk=trabajo_id, usuario=request.user)
+        revisar_trabajo(trabajo, request)
+        trabajo.refresh_from_db()
+
+        if trabajo.estado == 'terminado':
+            pdf_file = obtener_cache_pdf().obtener(trabajo.factura_id, trabajo.huella)
+            if pdf_file is None:
+                # La factura ha cambiado o el PDF se ha expulsado: se pide otra vez
+                return redirect('factura_pdf', pk=trabajo.factura_id)
+            factura = Factura.objects.only('numero_serie').get(pk=trabajo.factura_id)
+            return respuesta_pdf(factura, pdf_file)
+
+        if not request.accepts('text/html'):
+            return respuesta_trabajo_json(trabajo)
+        return render(request, 'apps/facturas/trabajo_pdf.html', {
+            'trabajo': trabajo,
+            'refresco': configuracion_trabajos()['REFRESCO'],
+        }, status=200 if trabajo.estado == 'error' else 202)
+
+
+def respuesta_pdf(factura, pdf_file):
+    response = HttpResponse(pdf_file, content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="factura_{factura.numero_serie}.pdf"'
+    return response
+
+
+def respuesta_trabajo_json(trabajo):
+    return JsonResponse({
+        'trabajo': str(trabajo.pk),
+        'estado': trabajo.estado,
+        'error': trabajo.error,
+        'url': reverse('factura_pdf_trabajo', kwargs={'trabajo_id': trabajo.pk}),
+    }, status=200 if trabajo.estado == 'error' else 202)
+
+
+
+
+class EchoBuffer:
+    """
+    Pseudo-fichero para csv.writer: en lugar de acumular lo escrito,
+    write() devuelve la línea ya formateada para poder enviarla en streaming.
+    """
+    def write(self, value):
+        return value
+
+
+class FacturaExportCSVView(LimiteConsultasMixin, LoginRequiredMixin, View):
     """
     Exporta un resumen financiero de las facturas del usuario en formato CSV.
     Respeta el mismo filtro por estado que el ListView.
+
+    La respuesta es un StreamingHttpResponse: las filas se leen de la base de datos
+    con iterator(chunk_size=...) (cursor de servidor en PostgreSQL) y se envían al
+    navegador según se generan, así que la memoria usada es la misma exporte 100
+    facturas o 1.000.000. Con ASGI se recorre por trozos desde el bucle de eventos
+    (respuesta_en_streaming en apps/setup/asincrono.py).
     """
+    limite_consultas = 5
+    # Filas que se piden a la base de datos en cada viaje del cursor
+    chunk_size = 2000
+
     def get(self, request):
         # Construir el queryset igual que en FacturaListView
         user = request.user
         qs = Factura.objects.all()
 
-        if user.groups.filter(name='FREELANCER').exists():
+        if es_freelancer(user):
             qs = qs.filter(presupuesto__proyecto__freelancer=user)
-        elif user.groups.filter(name='CLIENTE').exists():
+        elif es_cliente(user):
             qs = qs.filter(presupuesto__proyecto__cliente__usuario_cliente=user)
 
         estado = request.GET.get('estado') or request.session.get('facturas_ultimo_filtro_estado')
         if estado:
             qs = qs.filter(estado=estado)
 
-        # Preparar la respuesta CSV
+        # El número de pagos y la fecha del último se calculan con subconsultas sobre
+        # el índice (factura, fecha) de Pago. Con un annotate(Count) habría que agrupar
+        # todas las facturas antes de poder enviar la primera fila.
+        pagos = Pago.objects.filter(factura=OuterRef('pk'))
+        qs = qs.select_related(
+            'presupuesto__proyecto__cliente',
+            'presupuesto__proyecto'
+        ).annotate(
+            num_pagos=Subquery(
+                pagos.order_by().values('factura').annotate(total=Count('id')).values('total')
+            ),
+            ultimo_pago=Subquery(pagos.order_by('-fecha').values('fecha')[:1]),
+        )
+
         filename = f"resumen_financiero_{timezone.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response = respuesta_en_streaming(request, self.filas_csv(qs), content_type='text/csv; charset=utf-8')
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.write('\ufeff') #Para compatibilidad con excel
+        return response
+
+    def filas_csv(self, qs):
+        """
+        Generador que devuelve el CSV línea a línea: primero el BOM y la cabecera
+        y después una línea por factura.
+        """
+        writer = csv.writer(EchoBuffer())
 
-        writer = csv.writer(response)
-        writer.writerow([
+        yield '\ufeff' #Para compatibilidad con excel
+        yield writer.writerow([
             'Nº Serie',
             'Cliente',
             'Proyecto',
@@ -227,19 +376,16 @@ class FacturaExportCSVView(LoginRequiredMixin, View):
             'Total con Impuestos (€)',
             'Total Pagado (€)',
             'Saldo Pendiente (€)',
+            'Nº Pagos',
+            'Último Pago',
         ])
 
-        for factura in qs.select_related(
-            'presupuesto__proyecto__cliente',
-            'presupuesto__proyecto'
-        ):
+        for factura in qs.iterator(chunk_size=self.chunk_size):
             presupuesto = factura.presupuesto
             base = presupuesto.total
             impuestos_pct = presupuesto.impuestos
-            total_con_impuestos = (base * (Decimal('1') + impuestos_pct / Decimal('100'))).quantize(Decimal('0.01'))
-            saldo = (total_con_impuestos - factura.total_pagado).quantize(Decimal('0.01'))
 
-            writer.writerow([
+            yield writer.writerow([
                 factura.numero_serie,
                 presupuesto.proyecto.cliente.nombre,
                 presupuesto.proyecto.nombre,
@@ -248,9 +394,39 @@ class FacturaExportCSVView(LoginRequiredMixin, View):
                 factura.get_estado_display(),
                 str(base),
                 str(impuestos_pct),
-                str(total_con_impuestos),
+                str(factura.total_con_impuestos),
                 str(factura.total_pagado),
-                str(saldo),
+                str(factura.saldo_pendiente),
+                factura.num_pagos or 0,
+                factura.ultimo_pago.strftime('%d/%m/%Y') if factura.ultimo_pago else '',
             ])
 
-        return response
\ No newline at end of file
+
+class FacturaExportZIPView(LoginRequiredMixin, View):
+    """
+    Descarga en un ZIP los PDF de todas las facturas que cumplen los filtros:
+    los del listado (rol y estado, también el guardado en la sesión) más
+    ?ejercicio=<año> y ?cliente=<id>.
+
+    Los PDF se generan en el pool de trabajos_pdf.py y el ZIP se envía según se van
+    terminando (ver exportar_zip.py), reutilizando los que ya estén en la caché.
+    """
+    def get(self, request):
+        estado = request.GET.get('estado') or request.session.get('facturas_ultimo_filtro_estado')
+        ejercicio = request.GET.get('ejercicio', '')
+        cliente = request.GET.get('cliente', '')
+
+        facturas = facturas_filtradas(
+            request.user,
+            estado=estado,
+            año=int(ejercicio) if ejercicio.isdigit() else None,
+            cliente=int(cliente) if cliente.isdigit() else None,
+        )
+        zip_stream = generar_zip(
+            facturas, obtener_pool(), configuracion_trabajos()['TRABAJADORES'], request=request
+        )
+
+        filename = f"facturas_{ejercicio or timezone.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        response = respuesta_en_streaming(request, zip_stream, content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
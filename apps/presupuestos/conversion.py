@@ -0,0 +1,164 @@
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.db import transaction
+from django.utils import timezone
+
+from apps.facturas.models import Factura, calcular_total_con_impuestos
+from apps.facturas.resumen import CERO, aplicar_lote
+from apps.setup.busqueda import indexar
+from apps.setup.secuencias import formatear_numero_serie, siguiente_numero
+from apps.usuarios.cache_dashboard import invalidar_dashboard
+from .models import Presupuesto
+
+"""
+Conversión en lote de presupuestos aceptados a facturas.
+
+convertir_presupuestos() bloquea y valida la selección, reserva un bloque de números con
+siguiente_numero() y crea las facturas con bulk_create en una transacción. Como bulk_create y
+update() no lanzan señales, actualiza aquí ResumenMensual, el buscador y la caché del dashboard.
+Los presupuestos que no se pueden convertir se devuelven en fallos con el motivo.
+Presupuesto.convertir_a_factura() la usa con un solo presupuesto.
+
+Ejemplo:
+    resultado = convertir_presupuestos([12, 15, 18], freelancer=request.user)
+    resultado.facturas   # [<Factura 2026-031>, <Factura 2026-032>]
+    resultado.fallos     # [FalloConversion(presupuesto_id=18, numero_serie='2026-040', motivo='...')]
+"""
+
+# Filas por consulta en las lecturas y escrituras por lotes
+LOTE = 1000
+
+MOTIVO_NO_EXISTE = 'El presupuesto no existe o no es tuyo'
+MOTIVO_NO_ACEPTADO = 'Solo se pueden convertir a factura presupuestos aceptados'
+MOTIVO_CADUCADO = 'El presupuesto ha caducado, no puede convertirse en factura'
+MOTIVO_CON_FACTURA = 'El presupuesto ya se ha convertido en factura'
+
+
+@dataclass
+class FalloConversion:
+    presupuesto_id: int
+    numero_serie: str
+    motivo: str
+
+
+@dataclass
+class ResultadoConversion:
+    facturas: list = field(default_factory=list)
+    fallos: list = field(default_factory=list)
+
+    @property
+    def rango(self):
+        """Primer y último número de serie de las facturas creadas, o None si no hay."""
+        if not self.facturas:
+            return None
+        return self.facturas[0].numero_serie, self.facturas[-1].numero_serie
+
+
+def _lotes(ids):
+    for inicio in range(0, len(ids), LOTE):
+        yield ids[inicio:inicio + LOTE]
+
+
+def _aportaciones_nuevas(filas, facturas):
+    """aportaciones() de las facturas recién creadas, sin leerlas de la base de datos."""
+    resultado = defaultdict(lambda: [CERO, CERO, CERO, 0])
+    for fila, factura in zip(filas, facturas):
+        fecha = factura.fecha_emision
+        suma = resultado[
+            (fila['proyecto__freelancer_id'], fila['proyecto__cliente_id'], fecha.year, fecha.month, factura.estado)
+        ]
+        suma[0] += factura.total_con_impuestos
+        suma[1] += factura.total_pagado
+        suma[2] += factura.total_con_impuestos - factura.total_pagado
+        suma[3] += 1
+    return resultado
+
+
+def convertir_presupuestos(ids, freelancer=None, fecha=None):
+    """
+    Convierte en factura los presupuestos indicados que se puedan convertir, en una
+    transacción, y devuelve los que no con el motivo.
+
+    Args:
+        ids (iterable): ids de los presupuestos.
+        freelancer (Usuario): si se indica, solo se convierten los suyos; los demás se
+            devuelven como fallo (MOTIVO_NO_EXISTE).
+        fecha (date): fecha de emisión de las facturas; por defecto, hoy.
+
+    Returns:
+        ResultadoConversion: las facturas creadas, en el orden de los números de serie
+        de sus presupuestos, y los fallos.
+    """
+    hoy = fecha or timezone.now().date()
+    ids = list(dict.fromkeys(int(pk) for pk in ids))
+    resultado = ResultadoConversion()
+    if not ids:
+        return resultado
+
+    with transaction.atomic():
+        presupuestos = {}
+        con_factura = set()
+        for lote in _lotes(ids):
+            consulta = Presupuesto.objects.filter(pk__in=lote).select_for_update(of=('self',))
+            if freelancer is not None:
+                consulta = consulta.filter(proyecto__freelancer=freelancer)
+            for fila in consulta.values(
+                'pk', 'numero_serie', 'estado', 'validez', 'total', 'impuestos',
+                'proyecto__freelancer_id', 'proyecto__cliente_id',
+            ):
+                presupuestos[fila['pk']] = fila
+            con_factura.update(
+                Factura.objects.filter(presupuesto_id__in=lote).values_list('presupuesto_id', flat=True)
+            )
+
+        validos = []
+        for pk in ids:
+            fila = presupuestos.get(pk)
+            if fila is None:
+                motivo = MOTIVO_NO_EXISTE
+            elif fila['estado'] != 'aceptado':
+                motivo = MOTIVO_NO_ACEPTADO
+            elif fila['validez'] < hoy:
+                motivo = MOTIVO_CADUCADO
+            elif pk in con_factura:
+                motivo = MOTIVO_CON_FACTURA
+            else:
+                validos.append(fila)
+                continue
+            resultado.fallos.append(FalloConversion(pk, fila['numero_serie'] if fila else '', motivo))
+
+        if not validos:
+            return resultado
+
+        # Numeración en el orden de los presupuestos, no en el de la selección
+        validos.sort(key=lambda fila: (fila['numero_serie'], fila['pk']))
+        primero = siguiente_numero('factura', hoy.year, cantidad=len(validos))
+        facturas = [
+            Factura(
+                presupuesto_id=fila['pk'],
+                numero_serie=formatear_numero_serie(hoy.year, primero + posicion),
+                fecha_emision=hoy,
+                fecha_vencimiento=fila['validez'],
+                total_con_impuestos=calcular_total_con_impuestos(fila['total'], fila['impuestos']),
+            )
+            for posicion, fila in enumerate(validos)
+        ]
+        Factura.objects.bulk_create(facturas, batch_size=LOTE)
+        ids_facturas = [factura.pk for factura in facturas]
+        # Las facturas son nuevas: lo que aportan es directamente lo que hay que sumar, y se
+        # calcula con lo que ya está en memoria. Siempre por lotes, para que el coste no
+        # dependa de cuántos clientes haya en la selección
+        aplicar_lote(_aportaciones_nuevas(validos, facturas))
+
+        convertidos = [fila['pk'] for fila in validos]
+        for lote in _lotes(convertidos):
+            Presupuesto.objects.filter(pk__in=lote).update(estado='enviado')
+        for lote in _lotes(ids_facturas):
+            indexar('factura', lote, nuevos=True)
+
+        freelancers = {fila['proyecto__freelancer_id'] for fila in validos}
+        transaction.on_commit(lambda: invalidar_dashboard(*freelancers))
+
+    resultado.facturas = facturas
+    return resultado
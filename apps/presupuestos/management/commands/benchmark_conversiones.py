@@ -0,0 +1,153 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.usuarios.models import Usuario, Perfil
+from apps.clientes.models import Cliente
+from apps.proyectos.models import Proyecto
+from apps.presupuestos.conversion import convertir_presupuestos
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura
+from apps.setup.models import Secuencia
+from apps.setup.secuencias import formatear_numero_serie
+
+"""
+Comando: benchmark_conversiones
+
+Convierte N presupuestos de prueba a la vez desde --hilos hilos (una conexión cada uno), o en
+grupos con --lote, y comprueba que la numeración no repite números ni deja huecos. Al terminar
+borra lo creado y devuelve el contador a su valor. Solo contra PostgreSQL y en desarrollo.
+
+Ejemplo:
+    python manage.py benchmark_conversiones --conversiones 500 --hilos 50
+"""
+
+
+class Command(BaseCommand):
+    help = 'Convierte presupuestos a factura en paralelo y comprueba que la numeración no se repite.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--conversiones', type=int, default=300, help='Número de presupuestos a convertir.')
+        parser.add_argument('--hilos', type=int, default=32, help='Número de conversiones simultáneas.')
+        parser.add_argument(
+            '--lote', type=int, default=1,
+            help='Presupuestos por conversión; con más de 1 se usa la conversión en lote.'
+        )
+        parser.add_argument('--conservar', action='store_true', help='No borrar los datos de prueba al terminar.')
+
+    def handle(self, *args, **options):
+        conversiones = options['conversiones']
+        hilos = options['hilos']
+        lote = options['lote']
+        if conversiones < 1 or hilos < 1 or lote < 1:
+            raise CommandError('--conversiones, --hilos y --lote deben ser mayores que cero.')
+
+        hoy = timezone.now().date()
+        freelancer, presupuestos_ids = self._crear_datos(conversiones, hoy)
+        contador_inicial = self._contador(hoy.year)
+
+        tiempos = []
+        errores = []
+
+        def convertir(grupo):
+            inicio = time.perf_counter()
+            try:
+                if lote == 1:
+                    Presupuesto.objects.get(pk=grupo[0]).convertir_a_factura()
+                else:
+                    resultado = convertir_presupuestos(grupo)
+                    errores.extend(f'{fallo.presupuesto_id}: {fallo.motivo}' for fallo in resultado.fallos)
+                tiempos.append(time.perf_counter() - inicio)
+            except Exception as e:
+                errores.append(f'{grupo[0]}: {e}')
+            finally:
+                # Cada hilo abre su propia conexión, hay que cerrarla al terminar
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            grupos = [presupuestos_ids[i:i + lote] for i in range(0, len(presupuestos_ids), lote)]
+            list(pool.map(convertir, grupos))
+        duracion = time.perf_counter() - inicio
+
+        numeros = list(Factura.objects.filter(
+            presupuesto__proyecto__freelancer=freelancer
+        ).values_list('numero_serie', flat=True))
+        duplicados = len(numeros) - len(set(numeros))
+        esperados = {
+            formatear_numero_serie(hoy.year, n) for n in range(contador_inicial + 1, contador_inicial + len(numeros) + 1)
+        }
+
+        self.stdout.write(f'Conversiones: {conversiones} con {hilos} hilos en {duracion:.2f}s '
+                          f'({conversiones / duracion:.0f}/s)')
+        if tiempos:
+            tiempos.sort()
+            p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+            self.stdout.write(f'Latencia por {"conversión" if lote == 1 else "lote"}: p50 {statistics.median(tiempos) * 1000:.1f} ms | '
+                              f'p95 {p95 * 1000:.1f} ms')
+        self.stdout.write(f'Facturas creadas: {len(numeros)} | errores: {len(errores)} | duplicados: {duplicados}')
+        for error in errores[:10]:
+            self.stdout.write(f'  {error}')
+
+        if not options['conservar']:
+            self._borrar_datos(freelancer, hoy.year, contador_inicial, len(numeros))
+
+        if duplicados:
+            raise CommandError('Se han asignado números de serie duplicados.')
+        if set(numeros) != esperados:
+            # Puede pasar si otra petición ha creado facturas mientras corría el benchmark
+            self.stdout.write(self.style.WARNING('La numeración no es contigua (¿otras facturas creadas a la vez?).'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Numeración única y sin huecos.'))
+
+    def _contador(self, ejercicio):
+        return Secuencia.objects.filter(
+            serie='factura', ejercicio=ejercicio
+        ).values_list('ultimo', flat=True).first() or 0
+
+    def _crear_datos(self, conversiones, hoy):
+        """
+        Crea el freelancer, cliente, proyecto y presupuestos aceptados de prueba.
+        Los presupuestos se crean con bulk_create y un número de serie propio para
+        no consumir números de la serie real de presupuestos.
+        """
+        sufijo = uuid.uuid4().hex[:8]
+        freelancer = Usuario.objects.create_user(
+            username=f'benchmark_{sufijo}', email=f'benchmark_{sufijo}@example.com'
+        )
+        Perfil.objects.create(perfil=freelancer, tipo_cuenta='freelancer')
+        cliente = Cliente.objects.create(
+            freelancer=freelancer, nombre=f'Cliente benchmark {sufijo}', email=f'cliente_{sufijo}@example.com'
+        )
+        proyecto = Proyecto.objects.create(
+            freelancer=freelancer, cliente=cliente, nombre=f'Proyecto benchmark {sufijo}',
+            descripcion='Datos de prueba de benchmark_conversiones', estado='activo', fecha_inicio=hoy
+        )
+        presupuestos = Presupuesto.objects.bulk_create([
+            Presupuesto(
+                proyecto=proyecto, numero_serie=f'B-{i:05d}', fecha=hoy,
+                validez=hoy + timedelta(days=30), estado='aceptado', total=100
+            )
+            for i in range(conversiones)
+        ])
+        return freelancer, [p.pk for p in presupuestos]
+
+    def _borrar_datos(self, freelancer, ejercicio, contador_inicial, creadas):
+        """
+        Borra los datos de prueba respetando el orden de los PROTECT y devuelve el
+        contador de facturas a su valor inicial si nadie más ha reservado números.
+        """
+        Factura.objects.filter(presupuesto__proyecto__freelancer=freelancer).delete()
+        Presupuesto.objects.filter(proyecto__freelancer=freelancer).delete()
+        Proyecto.objects.filter(freelancer=freelancer).delete()
+        Cliente.objects.filter(freelancer=freelancer).delete()
+        freelancer.delete()
+        Secuencia.objects.filter(
+            serie='factura', ejercicio=ejercicio, ultimo=contador_inicial + creadas
+        ).update(ultimo=contador_inicial)
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.usuarios.models import Usuario
+from apps.presupuestos.conversion import convertir_presupuestos
+from apps.presupuestos.models import Presupuesto
+
+"""
+Comando: convertir_presupuestos
+
+Convierte en factura, en una transacción, los presupuestos indicados de un freelancer o todos
+sus presupuestos aceptados que no han caducado (ver apps/presupuestos/conversion.py). Los que
+no se pueden convertir se listan con el motivo y no impiden convertir el resto.
+
+Ejemplo:
+    python manage.py convertir_presupuestos ana 12 15 18
+    python manage.py convertir_presupuestos ana --aceptados
+    48 facturas creadas (2026-120 a 2026-167) en 0.31s | 2 sin convertir
+"""
+
+
+class Command(BaseCommand):
+    help = 'Convierte en factura varios presupuestos aceptados de un freelancer de una vez.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Nombre de usuario del freelancer.')
+        parser.add_argument('ids', nargs='*', type=int, help='Ids de los presupuestos.')
+        parser.add_argument(
+            '--aceptados', action='store_true',
+            help='Convertir todos los presupuestos aceptados y vigentes del freelancer.'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            freelancer = Usuario.objects.get(username=options['usuario'], perfil__tipo_cuenta='freelancer')
+        except Usuario.DoesNotExist:
+            raise CommandError(f'No existe el freelancer {options["usuario"]}.')
+
+        ids = list(options['ids'])
+        if options['aceptados']:
+            ids += Presupuesto.objects.filter(
+                proyecto__freelancer=freelancer, estado='aceptado', validez__gte=timezone.now().date(),
+                factura__isnull=True,
+            ).order_by('numero_serie').values_list('pk', flat=True)
+        if not ids:
+            raise CommandError('Indica los ids de los presupuestos o usa --aceptados.')
+
+        inicio = time.perf_counter()
+        resultado = convertir_presupuestos(ids, freelancer=freelancer)
+        duracion = time.perf_counter() - inicio
+
+        for fallo in resultado.fallos:
+            self.stdout.write(self.style.WARNING(
+                f'  {fallo.numero_serie or fallo.presupuesto_id}: {fallo.motivo}'
+            ))
+        creadas = f'{len(resultado.facturas)} facturas creadas'
+        if resultado.rango:
+            creadas += ' ({} a {})'.format(*resultado.rango)
+        self.stdout.write(self.style.SUCCESS(
+            f'{creadas} en {duracion:.2f}s | {len(resultado.fallos)} sin convertir'
+        ))
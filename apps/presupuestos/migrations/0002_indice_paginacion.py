@@ -0,0 +1,17 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('presupuestos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['fecha', 'id'], name='presupuesto_fecha_id_idx'),
+        ),
+    ]
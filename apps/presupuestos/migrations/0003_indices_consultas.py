@@ -0,0 +1,21 @@
+# Generated by Django 6.0.2 on 2026-10-18 04:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('presupuestos', '0002_indice_paginacion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['proyecto', 'fecha'], name='presupuesto_proyecto_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['estado', 'validez'], name='presupuesto_estado_validez_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
 from apps.proyectos.models import Proyecto
+from apps.setup.secuencias import siguiente_numero, formatear_numero_serie
+from apps.setup.limite_consultas import limite_consultas
 
 """
 Creo la clase Presupuesto con los siguientes campos:
@@ -34,10 +36,8 @@ Se verifica en clean que la fecha de validez del presupuesto no sea inferior a l
 
 Se crea la funcion convertir_a_factura para convertir el presupuesto a factura si cumple una serie de requisitos
 
-La verificación de la validez se gestiona en signals.py mediante una señal post_save.
-
-Me he puesto a informame y para que fuera completamente automatica, deberia usar 
-Celery, pero la verdad creo que sobrepasa mi nivel por bastante
+La verificación de la validez se hace con el comando actualizar_vencimientos
+(apps/setup/management/commands/actualizar_vencimientos.py), igual que el vencimiento de las facturas.
 """
 class Presupuesto(models.Model):
     ESTADOS = (
@@ -68,6 +68,15 @@ class Presupuesto(models.Model):
 
     class Meta:
         unique_together = ('proyecto', 'numero_serie')
+        indexes = [
+            # Orden del listado paginado por cursor (apps/setup/paginacion.py)
+            models.Index(fields=['fecha', 'id'], name='presupuesto_fecha_id_idx'),
+            # Presupuestos de un proyecto por fecha (listados y dashboard filtrados por freelancer)
+            models.Index(fields=['proyecto', 'fecha'], name='presupuesto_proyecto_fecha_idx'),
+            # Presupuestos sin respuesta con la validez pasada (actualizar_vencimientos y dashboard).
+            # No es parcial: SQLite no usa índices parciales con estado IN (...).
+            models.Index(fields=['estado', 'validez'], name='presupuesto_estado_validez_idx'),
+        ]
         verbose_name = 'Presupuesto'
         verbose_name_plural = 'Presupuestos'
         #permisos personalizados para el grupo FREELANCER
@@ -88,15 +97,18 @@ class Presupuesto(models.Model):
         de la fecha del presupuesto y NNN es el número correlativo de presupuestos
         de ese año. Ejemplo: 2026-001, 2026-002...
 
+        El número se reserva con siguiente_numero() (apps/setup/secuencias.py) dentro de
+        la misma transacción que el INSERT, igual que en Factura.save().
+
         Args:
             *args: Argumentos posicionales del metodo save original.
             **kwargs: Argumentos keyword del metodo save original.
         """
-        if not self.numero_serie:
-            año = self.fecha.year
-            ultimo = Presupuesto.objects.filter(fecha__year=año).count() + 1
-            self.numero_serie = f"{año}-{ultimo:03d}"
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            if not self.numero_serie:
+                año = self.fecha.year
+                self.numero_serie = formatear_numero_serie(año, siguiente_numero('presupuesto', año))
+            super().save(*args, **kwargs)
 
     def clean(self):
         """
@@ -112,29 +124,31 @@ class Presupuesto(models.Model):
         if self.total is not None and self.total < 0:
             raise ValidationError('El total no puede ser negativo.')
 
+    @limite_consultas(16)
     def convertir_a_factura(self):
-        from django.utils import timezone
-        from apps.facturas.models import Factura
-
-        if self.estado != 'aceptado':
-            raise ValidationError('Solo se pueden convertir a factura presupuestos aceptados')
-        if self.validez < timezone.now().date():
-            raise ValidationError('El presupuesto ha caducado, no puede convertirse en factura')
-
-        factura = Factura.objects.create(
-            presupuesto=self,
-            fecha_emision=timezone.now().date(),
-            fecha_vencimiento=self.validez,
-            total=self.total,
-            impuestos=self.impuestos,
-            notas=self.notas,
-        )
-
-        # Cambiamos el estado del presupuesto a enviado una vez convertido a factura
-        self.estado = 'enviado'
-        self.save()
+        """
+        Convierte el presupuesto en factura si está aceptado y no ha caducado.
+
+        Usa la conversión en lote (apps/presupuestos/conversion.py) con un solo presupuesto:
+        la creación de la factura (y con ella la reserva de su número de serie) y el cambio
+        de estado del presupuesto se hacen en una única transacción, para que una conversión
+        a medias no deje números reservados ni presupuestos incoherentes.
 
-        return factura
+        Returns:
+            Factura: La factura creada.
+
+        Raises:
+            ValidationError: Si el presupuesto no está aceptado, ha caducado o ya tiene factura.
+        """
+        from .conversion import convertir_presupuestos
+
+        resultado = convertir_presupuestos([self.pk])
+        if resultado.fallos:
+            raise ValidationError(resultado.fallos[0].motivo)
+
+        # La conversión cambia el estado con un UPDATE: se refleja también en esta instancia
+        self.estado = 'enviado'
+        return resultado.facturas[0]
 
 
     """
@@ -1,3 +1,98 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.facturas.models import Factura
+from apps.proyectos.models import Proyecto
+from apps.setup.generador import generar
+from .conversion import (
+    MOTIVO_CADUCADO, MOTIVO_CON_FACTURA, MOTIVO_NO_ACEPTADO, MOTIVO_NO_EXISTE, convertir_presupuestos,
+)
+from .models import Presupuesto
+
+
+def asignar_permisos_grupos():
+    """
+    Los permisos se crean con post_migrate, después de la migración que los asigna a los grupos
+    FREELANCER y CLIENTE: en la base de datos de los tests los grupos se quedan sin ninguno.
+    """
+    import_module('apps.setup.migrations.0001_initial').crear_grupos(django_apps, None)
+
+
+@override_settings(LIMITE_CONSULTAS={'ACTIVO': True, 'ESTRICTO': True})
+class ConversionEnLoteTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        asignar_permisos_grupos()
+        cls.freelancer, cls.otro = generar('conversion', freelancers=2, clientes=8, facturas=20, semilla=2)
+        cls.hoy = timezone.now().date()
+
+    def aceptados(self, cuantos, freelancer=None, **campos):
+        """Presupuestos aceptados repartidos entre todos los proyectos (y clientes) del freelancer."""
+        proyectos = list(Proyecto.objects.filter(freelancer=freelancer or self.freelancer).order_by('pk'))
+        datos = {'estado': 'aceptado', 'validez': self.hoy + timedelta(days=30), **campos}
+        inicio = Presupuesto.objects.count()
+        return [
+            presupuesto.pk for presupuesto in Presupuesto.objects.bulk_create(
+                Presupuesto(
+                    proyecto=proyectos[i % len(proyectos)], numero_serie=f'T-{inicio + i}',
+                    fecha=self.hoy - timedelta(days=31 * (i % 4)), total=Decimal(50 + i), **datos,
+                )
+                for i in range(cuantos)
+            )
+        ]
+
+    def test_consultas_no_dependen_del_tamaño_de_la_seleccion(self):
+        # La primera conversión crea el contador del año y las filas de hoy en el resumen
+        convertir_presupuestos(self.aceptados(1), freelancer=self.freelancer)
+        with CaptureQueriesContext(connection) as pocos:
+            convertir_presupuestos(self.aceptados(2), freelancer=self.freelancer)
+        with CaptureQueriesContext(connection) as muchos:
+            resultado = convertir_presupuestos(self.aceptados(40), freelancer=self.freelancer)
+        self.assertEqual(len(resultado.facturas), 40)
+        self.assertEqual(len(pocos), len(muchos))
+
+    def test_vista_con_presupuestos_de_varios_clientes(self):
+        ids = self.aceptados(39)
+        self.client.force_login(self.freelancer)
+        respuesta = self.client.post(reverse('presupuesto_convertir_lote'), {'presupuestos': ids})
+        self.assertRedirects(respuesta, reverse('presupuesto_list'), fetch_redirect_response=False)
+        self.assertEqual(Factura.objects.filter(presupuesto_id__in=ids).count(), 39)
+
+    def test_numeracion_correlativa_en_el_orden_de_los_presupuestos(self):
+        ids = self.aceptados(5)
+        resultado = convertir_presupuestos(reversed(ids), freelancer=self.freelancer)
+        numeros = [int(factura.numero_serie.split('-')[1]) for factura in resultado.facturas]
+        self.assertEqual(numeros, list(range(numeros[0], numeros[0] + 5)))
+        self.assertEqual([factura.presupuesto_id for factura in resultado.facturas], ids)
+
+    def test_fallos_por_presupuesto_sin_abortar_el_lote(self):
+        buenos = self.aceptados(3)
+        rechazado, = self.aceptados(1, estado='rechazado')
+        caducado, = self.aceptados(1, validez=self.hoy - timedelta(days=1))
+        ajeno, = self.aceptados(1, freelancer=self.otro)
+        ya_convertido = Factura.objects.filter(presupuesto__proyecto__freelancer=self.freelancer).first().presupuesto_id
+        Presupuesto.objects.filter(pk=ya_convertido).update(validez=self.hoy)
+
+        resultado = convertir_presupuestos(
+            buenos + [rechazado, caducado, ajeno, ya_convertido, 0], freelancer=self.freelancer,
+        )
+        self.assertEqual([factura.presupuesto_id for factura in resultado.facturas], buenos)
+        self.assertEqual(
+            {fallo.presupuesto_id: fallo.motivo for fallo in resultado.fallos},
+            {
+                rechazado: MOTIVO_NO_ACEPTADO, caducado: MOTIVO_CADUCADO, ajeno: MOTIVO_NO_EXISTE,
+                ya_convertido: MOTIVO_CON_FACTURA, 0: MOTIVO_NO_EXISTE,
+            },
+        )
+        self.assertEqual(
+            set(Presupuesto.objects.filter(pk__in=buenos).values_list('estado', flat=True)), {'enviado'}
+        )
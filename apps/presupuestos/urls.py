@@ -1,10 +1,12 @@
 from django.urls import path
+from apps.setup.asincrono import elegir_vista
 from . import views
 
 urlpatterns = [
-    path('', views.PresupuestoListView.as_view(), name='presupuesto_list'),
+    path('', elegir_vista(views.PresupuestoListView.as_view(), views.PresupuestoListAsyncView.as_view()), name='presupuesto_list'),
     path('crear/', views.PresupuestoCreateView.as_view(), name='presupuesto_create'),
-    path('<int:pk>/', views.PresupuestoDetailView.as_view(), name='presupuesto_detail'),
+    path('convertir/', views.convertir_lote, name='presupuesto_convertir_lote'),
+    path('<int:pk>/', elegir_vista(views.PresupuestoDetailView.as_view(), views.PresupuestoDetailAsyncView.as_view()), name='presupuesto_detail'),
     path('<int:pk>/editar/', views.PresupuestoUpdateView.as_view(), name='presupuesto_update'),
     path('<int:pk>/eliminar/', views.PresupuestoDeleteView.as_view(), name='presupuesto_delete'),
     path('<int:pk>/convertir/', views.convertir_a_factura, name='presupuesto_convertir'),
@@ -4,32 +4,39 @@ from django.views.generic import ListView, DetailView, CreateView, UpdateView, D
 from django.shortcuts import get_object_or_404, redirect
 from django.contrib import messages
 from django.urls import reverse_lazy
-from django.db.models import Q
 from django.core.exceptions import ValidationError
+from .conversion import convertir_presupuestos
 from .models import Presupuesto
 from .forms import PresupuestoForm
-from apps.setup.mixins import FreelancerPropietarioMixin
+from apps.setup.busqueda import ids_coincidentes
+from apps.setup.asincrono import LecturaAsincronaMixin
+from apps.setup.limite_consultas import LimiteConsultasMixin, limite_consultas
+from apps.setup.mixins import FreelancerPropietarioMixin, ClientePropietarioMixin
+from apps.setup.paginacion import PaginacionKeysetMixin
 
 
-class PresupuestoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class PresupuestoListView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, PaginacionKeysetMixin, ListView):
     """
     Vista para listar los presupuestos del freelancer autenticado.
 
     Filtra por proyecto__freelancer para mostrar solo los presupuestos
     del freelancer propietario. Permite buscar por número de serie o
-    estado usando Q objects.
+    proyecto y filtrar por estado.
     """
+    limite_consultas = 7
     model = Presupuesto
     template_name = 'apps/presupuestos/presupuesto_list.html'
     context_object_name = 'presupuestos'
     permission_required = 'presupuestos.view_presupuesto'
+    orden_paginacion = ('-fecha', '-id')
 
     def get_queryset(self):
         """
         Filtra los presupuestos del freelancer autenticado.
         Usa select_related para evitar el problema N+1 al acceder
         a proyecto y cliente desde el template.
-        Permite buscar por número de serie o estado usando Q objects.
+        Permite buscar por número de serie o proyecto (apps/setup/busqueda.py)
+        y filtrar por estado.
         """
         queryset = Presupuesto.objects.filter(
             proyecto__freelancer=self.request.user
@@ -39,10 +46,9 @@ class PresupuestoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView)
         estado = self.request.GET.get('estado', '')
 
         if busqueda:
-            # Q objects: busca por número de serie O por nombre de proyecto
-            queryset = queryset.filter(
-                Q(numero_serie__icontains=busqueda) | Q(proyecto__nombre__icontains=busqueda)
-            )
+            # Busca en el índice del buscador global (número de serie, proyecto, cliente y notas)
+            # en lugar de hacer icontains sobre cada campo
+            queryset = queryset.filter(pk__in=ids_coincidentes(self.request.user, 'presupuesto', busqueda))
 
         if estado:
             queryset = queryset.filter(estado=estado)
@@ -61,14 +67,16 @@ class PresupuestoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView)
         return context
 
 
-class PresupuestoDetailView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, DetailView):
+class PresupuestoDetailView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, DetailView):
     """
     Vista para ver el detalle de un presupuesto.
 
     Aplica FreelancerPropietarioMixin para que solo el freelancer
-    propietario pueda ver sus presupuestos.
+    propietario pueda ver sus presupuestos, y ClientePropietarioMixin para
+    que un cliente solo vea los suyos.
     Usa select_related para evitar el problema N+1.
     """
+    limite_consultas = 8
     model = Presupuesto
     template_name = 'apps/presupuestos/presupuesto_detail.html'
     context_object_name = 'presupuesto'
@@ -84,13 +92,22 @@ class PresupuestoDetailView(LoginRequiredMixin, PermissionRequiredMixin, Freelan
         )
 
 
-class PresupuestoCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
+class PresupuestoListAsyncView(LecturaAsincronaMixin, PresupuestoListView):
+    """PresupuestoListView para el perfil ASGI (apps/setup/asincrono.py)."""
+
+
+class PresupuestoDetailAsyncView(LecturaAsincronaMixin, PresupuestoDetailView):
+    """PresupuestoDetailView para el perfil ASGI (apps/setup/asincrono.py)."""
+
+
+class PresupuestoCreateView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, CreateView):
     """
     Vista para crear un nuevo presupuesto.
 
     Filtra el campo proyecto para mostrar solo los proyectos
     del freelancer autenticado.
     """
+    limite_consultas = {'GET': 7, 'POST': 16}
     model = Presupuesto
     form_class = PresupuestoForm
     template_name = 'apps/presupuestos/presupuesto_form.html'
@@ -109,7 +126,7 @@ class PresupuestoCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateV
         return form
 
 
-class PresupuestoUpdateView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, UpdateView):
+class PresupuestoUpdateView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, UpdateView):
     """
     Vista para editar un presupuesto existente.
 
@@ -117,6 +134,7 @@ class PresupuestoUpdateView(LoginRequiredMixin, PermissionRequiredMixin, Freelan
     propietario pueda editar sus presupuestos.
     Filtra el campo proyecto para mostrar solo los proyectos del freelancer.
     """
+    limite_consultas = {'GET': 8, 'POST': 23}
     model = Presupuesto
     form_class = PresupuestoForm
     template_name = 'apps/presupuestos/presupuesto_form.html'
@@ -135,7 +153,7 @@ class PresupuestoUpdateView(LoginRequiredMixin, PermissionRequiredMixin, Freelan
         return form
 
 
-class PresupuestoDeleteView(LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, DeleteView):
+class PresupuestoDeleteView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, FreelancerPropietarioMixin, DeleteView):
     """
     Vista para eliminar un presupuesto.
 
@@ -147,12 +165,14 @@ class PresupuestoDeleteView(LoginRequiredMixin, PermissionRequiredMixin, Freelan
     Django impedirá el borrado si el presupuesto ya tiene factura asociada,
     manteniendo la trazabilidad proyecto → presupuesto → factura.
     """
+    limite_consultas = {'GET': 9, 'POST': 10}
     model = Presupuesto
     template_name = 'apps/presupuestos/presupuesto_confirm_delete.html'
     success_url = reverse_lazy('presupuesto_list')
     permission_required = 'presupuestos.delete_presupuesto'
 
 
+@limite_consultas(21)
 @login_required
 @permission_required('presupuestos.puede_convertir_presupuesto', raise_exception=True)
 def convertir_a_factura(request, pk):
@@ -183,4 +203,43 @@ def convertir_a_factura(request, pk):
             return redirect('presupuesto_detail', pk=pk)
 
     # Si alguien intenta acceder por GET lo redirigimos al detalle
-    return redirect('presupuesto_detail', pk=pk)
\ No newline at end of file
+    return redirect('presupuesto_detail', pk=pk)
+
+# Avisos de fallo que se muestran como mensaje; el resto se resume en uno
+FALLOS_MOSTRADOS = 10
+
+
+@limite_consultas(20)
+@login_required
+@permission_required('presupuestos.puede_convertir_presupuesto', raise_exception=True)
+def convertir_lote(request):
+    """
+    Vista FBV para convertir en factura los presupuestos marcados en el listado.
+
+    Solo acepta POST. Delega en convertir_presupuestos() (apps/presupuestos/conversion.py),
+    que solo convierte los del freelancer autenticado: los que no se pueden convertir se
+    avisan uno a uno con el motivo y no impiden convertir el resto.
+
+    Args:
+        request: La petición HTTP, con los ids en el campo 'presupuestos'.
+    """
+    if request.method != 'POST':
+        return redirect('presupuesto_list')
+
+    ids = [pk for pk in request.POST.getlist('presupuestos') if pk.isdigit()]
+    if not ids:
+        messages.error(request, 'No has seleccionado ningún presupuesto.')
+        return redirect('presupuesto_list')
+
+    resultado = convertir_presupuestos(ids, freelancer=request.user)
+    if resultado.facturas:
+        primera, ultima = resultado.rango
+        messages.success(
+            request, f'{len(resultado.facturas)} facturas creadas ({primera} a {ultima}).'
+            if len(resultado.facturas) > 1 else f'Factura {primera} creada.'
+        )
+    for fallo in resultado.fallos[:FALLOS_MOSTRADOS]:
+        messages.error(request, f'{fallo.numero_serie or fallo.presupuesto_id}: {fallo.motivo}')
+    if len(resultado.fallos) > FALLOS_MOSTRADOS:
+        messages.error(request, f'Y {len(resultado.fallos) - FALLOS_MOSTRADOS} presupuestos más sin convertir.')
+    return redirect('presupuesto_list')
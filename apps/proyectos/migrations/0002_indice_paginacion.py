@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 03:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('proyectos', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='proyecto',
+            index=models.Index(fields=['freelancer', 'fecha_inicio', 'id'], name='proyecto_freelancer_inicio_idx'),
+        ),
+    ]
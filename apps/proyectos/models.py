@@ -68,6 +68,12 @@ class Proyecto(models.Model):
 
     class Meta:
         unique_together = ('nombre', 'cliente')
+        indexes = [
+            # Listado paginado por cursor de cada freelancer (apps/setup/paginacion.py)
+            models.Index(fields=['freelancer', 'fecha_inicio', 'id'], name='proyecto_freelancer_inicio_idx'),
+            # Listado de proyectos filtrado por estado
+            models.Index(fields=['freelancer', 'estado'], name='proyecto_freelancer_estado_idx'),
+        ]
         verbose_name = 'Proyecto'
         verbose_name_plural = 'Proyectos'
 
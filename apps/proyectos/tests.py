@@ -1,3 +1,84 @@
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from apps.presupuestos.tests import asignar_permisos_grupos
+from apps.setup.busqueda import ids_coincidentes
+from apps.setup.generador import generar
+from apps.usuarios.models import Usuario
+from .models import Proyecto
+
+
+class ProyectosTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        asignar_permisos_grupos()
+        cls.freelancer, cls.otro = generar(
+            'proyectos', freelancers=2, clientes=20, facturas=60, usuarios_cliente=2, semilla=12,
+        )
+        cls.usuario_cliente = Usuario.objects.get(username='proyectos_0_cliente_0')
+        proyectos = Proyecto.objects.filter(freelancer=cls.freelancer)
+        cls.del_cliente = proyectos.filter(cliente__usuario_cliente=cls.usuario_cliente).first()
+        cls.de_otro_cliente = proyectos.exclude(cliente__usuario_cliente=cls.usuario_cliente).first()
+        cls.ajeno = Proyecto.objects.filter(freelancer=cls.otro).first()
+
+    def estado_detalle(self, usuario, proyecto):
+        self.client.force_login(usuario)
+        return self.client.get(reverse('proyecto_detail', args=[proyecto.pk])).status_code
+
+    def ids_listado(self, parametros=None):
+        respuesta = self.client.get(reverse('proyecto_list'), parametros)
+        return [proyecto.pk for proyecto in respuesta.context['proyectos']]
+
+    def test_detalle_solo_para_el_freelancer_y_el_cliente_propietarios(self):
+        self.assertEqual(self.estado_detalle(self.freelancer, self.de_otro_cliente), 200)
+        self.assertEqual(self.estado_detalle(self.freelancer, self.ajeno), 403)
+        self.assertEqual(self.estado_detalle(self.usuario_cliente, self.del_cliente), 200)
+        self.assertEqual(self.estado_detalle(self.usuario_cliente, self.de_otro_cliente), 403)
+
+    def test_no_se_puede_editar_un_proyecto_ajeno(self):
+        self.client.force_login(self.freelancer)
+        respuesta = self.client.post(reverse('proyecto_edit', args=[self.ajeno.pk]), {'nombre': 'Cambiado'})
+        self.assertEqual(respuesta.status_code, 403)
+        self.ajeno.refresh_from_db()
+        self.assertNotEqual(self.ajeno.nombre, 'Cambiado')
+
+    def test_el_cliente_solo_ve_sus_proyectos(self):
+        self.client.force_login(self.usuario_cliente)
+        self.assertEqual(
+            set(self.ids_listado()),
+            set(Proyecto.objects.filter(cliente__usuario_cliente=self.usuario_cliente).values_list('pk', flat=True)),
+        )
+
+    def test_paginas_por_cursor(self):
+        self.client.force_login(self.freelancer)
+        vistos, url = [], reverse('proyecto_list')
+        while url:
+            respuesta = self.client.get(url)
+            vistos += [proyecto.pk for proyecto in respuesta.context['proyectos']]
+            siguiente = respuesta.context['pagina'].siguiente_url
+            url = reverse('proyecto_list') + siguiente if siguiente else None
+        esperados = Proyecto.objects.filter(freelancer=self.freelancer).order_by('-fecha_inicio', '-id')
+        self.assertGreater(len(vistos), 25)
+        self.assertEqual(vistos, list(esperados.values_list('pk', flat=True)))
+
+    def test_el_filtro_de_estado_se_guarda_en_la_sesion(self):
+        self.client.force_login(self.freelancer)
+        activos = self.ids_listado({'estado': 'activo'})
+        self.assertEqual(set(Proyecto.objects.filter(pk__in=activos).values_list('estado', flat=True)), {'activo'})
+        self.assertEqual(self.ids_listado(), activos)
+        # "(todos)" envía el estado vacío y limpia el filtro
+        self.assertNotEqual(self.ids_listado({'estado': ''}), activos)
+
+    def test_renombrar_actualiza_el_buscador(self):
+        nombre = self.de_otro_cliente.nombre
+        self.de_otro_cliente.nombre = 'Rediseño de la tienda online'
+        self.de_otro_cliente.save()
+        self.assertEqual(
+            list(ids_coincidentes(self.freelancer, 'proyecto', 'rediseno tienda')),
+            [{'objeto_id': self.de_otro_cliente.pk}],
+        )
+        self.assertNotIn(
+            {'objeto_id': self.de_otro_cliente.pk}, list(ids_coincidentes(self.freelancer, 'proyecto', nombre)),
+        )
+        self.assertEqual(list(ids_coincidentes(self.otro, 'proyecto', 'rediseno tienda')), [])
@@ -1,10 +1,11 @@
 from django.urls import path
+from apps.setup.asincrono import elegir_vista
 from . import views
 
 urlpatterns = [
-    path('', views.ProyectoListView.as_view(), name='proyecto_list'),
+    path('', elegir_vista(views.ProyectoListView.as_view(), views.ProyectoListAsyncView.as_view()), name='proyecto_list'),
     path('create/', views.ProyectoCreateView.as_view(), name='proyecto_create'),
-    path('<int:pk>/', views.ProyectoDetailView.as_view(), name='proyecto_detail'),
+    path('<int:pk>/', elegir_vista(views.ProyectoDetailView.as_view(), views.ProyectoDetailAsyncView.as_view()), name='proyecto_detail'),
     path('<int:pk>/edit/', views.ProyectoUpdateView.as_view(), name='proyecto_edit'),
     path('<int:pk>/eliminar/', views.ProyectoDeleteView.as_view(), name='proyecto_delete'),
 ]
@@ -5,21 +5,27 @@ from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMix
 
 from .models import Proyecto
 from .forms import ProyectoForm
+from apps.setup.asincrono import LecturaAsincronaMixin
+from apps.setup.limite_consultas import LimiteConsultasMixin
 from apps.setup.mixins import FreelancerPropietarioMixin, ClientePropietarioMixin
+from apps.setup.paginacion import PaginacionKeysetMixin
+from apps.setup.roles import es_freelancer, es_cliente
 
 
-class ProyectoListView(LoginRequiredMixin, ListView):
+class ProyectoListView(LimiteConsultasMixin, LoginRequiredMixin, PaginacionKeysetMixin, ListView):
+    limite_consultas = 5
     model = Proyecto
     template_name = 'apps/proyectos/proyecto_list.html'
     context_object_name = 'proyectos'
+    orden_paginacion = ('-fecha_inicio', '-id')
 
     def get_queryset(self):
         qs = super().get_queryset()
         user = self.request.user
         # filtrar por propietario según rol
-        if user.groups.filter(name='FREELANCER').exists():
+        if es_freelancer(user):
             qs = qs.filter(freelancer=user)
-        elif user.groups.filter(name='CLIENTE').exists():
+        elif es_cliente(user):
             qs = qs.filter(cliente__usuario_cliente=user)
 
         # aplicar filtrado por estado y guardar en sesión para persistencia
@@ -41,37 +47,78 @@ class ProyectoListView(LoginRequiredMixin, ListView):
         return qs
 
 
-class ProyectoDetailView(LoginRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, DetailView):
+class ProyectoDetailView(LimiteConsultasMixin, LoginRequiredMixin, FreelancerPropietarioMixin, ClientePropietarioMixin, DetailView):
+    limite_consultas = 8
     model = Proyecto
     template_name = 'apps/proyectos/proyecto_detail.html'
     context_object_name = 'proyecto'
 
+    def get_queryset(self):
+        # cliente y freelancer se pintan en el template: se cargan en la misma consulta
+        return super().get_queryset().select_related('cliente', 'freelancer')
+
+
+class ProyectoListAsyncView(LecturaAsincronaMixin, ProyectoListView):
+    """ProyectoListView para el perfil ASGI (apps/setup/asincrono.py)."""
+
 
-class ProyectoCreateView(LoginRequiredMixin, PermissionRequiredMixin, CreateView):
+class ProyectoDetailAsyncView(LecturaAsincronaMixin, ProyectoDetailView):
+    """ProyectoDetailView para el perfil ASGI (apps/setup/asincrono.py)."""
+
+
+class ProyectoCreateView(LimiteConsultasMixin, LoginRequiredMixin, PermissionRequiredMixin, CreateView):
+    limite_consultas = {'GET': 8, 'POST': 15}
     model = Proyecto
     form_class = ProyectoForm
     template_name = 'apps/proyectos/proyecto_form.html'
     success_url = reverse_lazy('proyecto_list')
     permission_required = 'proyectos.add_proyecto'
 
+    def get_form(self, form_class=None):
+        """
+        Filtra el campo cliente del formulario para mostrar solo los clientes del
+        freelancer autenticado. Cliente.__str__ lee freelancer.username: se carga con
+        select_related para no hacer una consulta por cada opción del <select>.
+        """
+        form = super().get_form(form_class)
+        form.fields['cliente'].queryset = form.fields['cliente'].queryset.filter(
+            freelancer=self.request.user
+        ).select_related('freelancer')
+        return form
+
     def form_valid(self, form):
         form.instance.freelancer = self.request.user
         return super().form_valid(form)
 
 
-class ProyectoUpdateView(LoginRequiredMixin, FreelancerPropietarioMixin, PermissionRequiredMixin, UpdateView):
+class ProyectoUpdateView(LimiteConsultasMixin, LoginRequiredMixin, FreelancerPropietarioMixin, PermissionRequiredMixin, UpdateView):
+    # El POST no se limita: renombrar reindexa en el buscador todo lo que depende del objeto, por lotes
+    limite_consultas = {'GET': 9}
     model = Proyecto
     form_class = ProyectoForm
     template_name = 'apps/proyectos/proyecto_form.html'
     success_url = reverse_lazy('proyecto_list')
     permission_required = 'proyectos.change_proyecto'
 
+    def get_form(self, form_class=None):
+        """
+        Filtra el campo cliente del formulario para mostrar solo los clientes del
+        freelancer autenticado. Cliente.__str__ lee freelancer.username: se carga con
+        select_related para no hacer una consulta por cada opción del <select>.
+        """
+        form = super().get_form(form_class)
+        form.fields['cliente'].queryset = form.fields['cliente'].queryset.filter(
+            freelancer=self.request.user
+        ).select_related('freelancer')
+        return form
+
     def form_valid(self, form):
         # freelancer no debe cambiar
         return super().form_valid(form)
 
 
-class ProyectoDeleteView(LoginRequiredMixin, FreelancerPropietarioMixin, PermissionRequiredMixin, DeleteView):
+class ProyectoDeleteView(LimiteConsultasMixin, LoginRequiredMixin, FreelancerPropietarioMixin, PermissionRequiredMixin, DeleteView):
+    limite_consultas = {'GET': 7, 'POST': 9}
     model = Proyecto
     template_name = 'apps/proyectos/proyecto_confirm_delete.html'
     success_url = reverse_lazy('proyecto_list')
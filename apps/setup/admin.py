@@ -1,3 +1,61 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import EntradaBusqueda, RegistroAuditoria, Secuencia
+
+
+@admin.register(Secuencia)
+class SecuenciaAdmin(admin.ModelAdmin):
+    list_display = (
+        'serie',
+        'ejercicio',
+        'ultimo',
+    )
+
+    list_filter = ('serie', 'ejercicio')
+
+    # El contador solo lo modifica apps/setup/secuencias.py, editarlo a mano
+    # rompería la numeración correlativa.
+    readonly_fields = ('serie', 'ejercicio', 'ultimo')
+
+
+@admin.register(EntradaBusqueda)
+class EntradaBusquedaAdmin(admin.ModelAdmin):
+    list_display = (
+        'tipo',
+        'objeto_id',
+        'titulo',
+        'detalle',
+        'freelancer',
+        'fecha',
+    )
+
+    list_filter = ('tipo',)
+    search_fields = ('titulo',)
+
+    # Las entradas las mantienen las señales de apps/setup/signals.py; para corregirlas
+    # se usa el comando reconstruir_busqueda.
+    readonly_fields = ('tipo', 'objeto_id', 'freelancer', 'cliente', 'titulo', 'detalle', 'texto', 'fecha')
+    exclude = ('vector',)
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(RegistroAuditoria)
+class RegistroAuditoriaAdmin(admin.ModelAdmin):
+    """
+    Solo para consultar la auditoría: por usuario (búsqueda), acción y rango de fechas
+    (date_hierarchy), las tres con índice.
+    """
+
+    list_display = ('fecha', 'nombre_usuario', 'accion', 'metodo', 'ruta', 'codigo_respuesta')
+    list_filter = ('accion', 'metodo')
+    search_fields = ('nombre_usuario',)
+    date_hierarchy = 'fecha'
+    readonly_fields = ('usuario', 'nombre_usuario', 'accion', 'metodo', 'ruta', 'codigo_respuesta', 'fecha')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 
 class SetupConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField' #Lo he puesto porque es una buena practica y para que no salgan warnings de Django
     name = 'apps.setup'
+
+    def ready(self):
+        import apps.setup.signals
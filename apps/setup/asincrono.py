@@ -0,0 +1,206 @@
+import asyncio
+from contextlib import ExitStack
+from functools import partial
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.mixins import PermissionRequiredMixin
+from django.core.exceptions import PermissionDenied
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connections
+from django.http import StreamingHttpResponse
+from django.views.generic import View
+from django.views.generic.detail import SingleObjectMixin
+
+from .limite_consultas import arenderizar, avigilar_consultas, registro_activo
+from .mixins import PropietarioMixinBase
+from .paginacion import apaginar
+from .rendimiento import RegistroConsultas
+from .roles import roles_usuario
+
+"""
+Camino de lectura asíncrono (perfil ASGI) para el dashboard, los listados y los detalles.
+
+Con ASINCRONO['VISTAS'] las URL de elegir_vista() usan LecturaAsincronaMixin sobre las mismas
+clases, con request.auser(), ahas_perms(), aget() y apaginar(). en_paralelo() lanza las
+consultas independientes del dashboard a la vez, cada una en un hilo con su propia conexión: solo
+vale para lecturas, fuera de la transacción de la petición. respuesta_en_streaming() recorre por
+trozos los iteradores síncronos de las exportaciones para no leerlos enteros en memoria.
+
+Ejemplo:
+    class FacturaListAsyncView(LecturaAsincronaMixin, FacturaListView):
+        pass
+
+    path('', elegir_vista(FacturaListView.as_view(), FacturaListAsyncView.as_view()), name='factura_list')
+
+    datos = await en_paralelo(metricas=partial(calcular_metricas, usuario), años=partial(años_con_facturas, usuario))
+"""
+
+CONFIGURACION_POR_DEFECTO = {
+    # Servir el dashboard, los listados y los detalles con sus versiones async
+    'VISTAS': False,
+    # Con False en_paralelo() ejecuta las consultas una detrás de otra (bases de datos con pocas
+    # conexiones disponibles)
+    'PARALELO': True,
+}
+
+# Elementos del iterador síncrono que se leen en cada viaje al hilo de la petición
+TROZO_STREAMING = 100
+
+
+def configuracion():
+    """Devuelve settings.ASINCRONO completado con los valores por defecto."""
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'ASINCRONO', {})}
+
+
+def elegir_vista(sincrona, asincrona):
+    """
+    Para urls.py: la vista async si ASINCRONO['VISTAS'] está activo y la síncrona si no.
+    Las dos responden a la misma URL, con el mismo nombre y la misma plantilla.
+    """
+    return asincrona if configuracion()['VISTAS'] else sincrona
+
+
+def _en_hilo(funcion, registros):
+    """
+    Ejecuta funcion en un hilo del grupo de asgiref con su propia conexión. Si hay un límite
+    de consultas activo, las cuenta en un registro propio que en_paralelo() suma al terminar.
+    """
+    close_old_connections()
+    registro = RegistroConsultas() if registros is not None else None
+    try:
+        with ExitStack() as pila:
+            if registro is not None:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(registro))
+            return funcion()
+    finally:
+        if registro is not None:
+            registros.append(registro)
+        close_old_connections()
+
+
+async def en_paralelo(**consultas):
+    """
+    Ejecuta a la vez funciones síncronas independientes que leen de la base de datos.
+
+    Args:
+        **consultas: nombre → función sin argumentos (functools.partial para pasarle alguno).
+
+    Returns:
+        dict: nombre → lo que devuelve su función.
+
+    Raises:
+        Exception: la primera excepción de las funciones, si alguna falla.
+    """
+    if not configuracion()['PARALELO'] or len(consultas) < 2:
+        return {nombre: await sync_to_async(funcion)() for nombre, funcion in consultas.items()}
+
+    activo = registro_activo()
+    registros = [] if activo is not None else None
+    try:
+        resultados = await asyncio.gather(*(
+            sync_to_async(partial(_en_hilo, funcion, registros), thread_sensitive=False)()
+            for funcion in consultas.values()
+        ))
+    finally:
+        for registro in registros or ():
+            activo.sumar(registro)
+    return dict(zip(consultas, resultados))
+
+
+async def iterar_en_hilo(iterable, trozo=TROZO_STREAMING):
+    """
+    Recorre un iterable síncrono desde código async, leyendo trozo elementos en cada viaje
+    al hilo de la petición (el mismo en el que se abrió, como necesitan los cursores de
+    servidor de iterator()). Si el cliente se desconecta, cierra el generador.
+    """
+    iterador = iter(iterable)
+    siguiente_trozo = sync_to_async(lambda: list(islice(iterador, trozo)))
+    try:
+        while True:
+            elementos = await siguiente_trozo()
+            if not elementos:
+                return
+            for elemento in elementos:
+                yield elemento
+    finally:
+        if hasattr(iterador, 'close'):
+            await sync_to_async(iterador.close)()
+
+
+def respuesta_en_streaming(request, contenido, **kwargs):
+    """
+    StreamingHttpResponse que no carga el contenido entero en memoria con ASGI.
+
+    Args:
+        request (HttpRequest): la petición, para saber si llega por ASGI.
+        contenido (iterable): iterador síncrono con las partes de la respuesta.
+        **kwargs: los de StreamingHttpResponse (content_type, status...).
+
+    Returns:
+        StreamingHttpResponse
+    """
+    if isinstance(request, ASGIRequest):
+        contenido = iterar_en_hilo(contenido)
+    return StreamingHttpResponse(contenido, **kwargs)
+
+
+class LecturaAsincronaMixin:
+    """
+    Convierte en async un ListView o DetailView de la aplicación, con las mismas
+    comprobaciones, consultas y plantilla que la vista síncrona de la que hereda.
+
+    dispatch() sustituye al de LimiteConsultasMixin, LoginRequiredMixin,
+    PermissionRequiredMixin y los mixins de propiedad, que leen request.user y consultan de
+    forma síncrona (desde el bucle de eventos Django lo impide), por lo mismo con la API async:
+        - request.auser() carga la sesión y el usuario, que sustituye al request.user perezoso;
+        - user.ahas_perms() para permission_required;
+        - el rol (apps/setup/roles.py) se resuelve antes, así que es_freelancer() ya no consulta
+          y get_queryset() se puede llamar tal cual desde el bucle;
+        - el objeto se pide con aget_object() y el listado se pagina con apaginar().
+    La plantilla se renderiza en el hilo de la petición: el motor de plantillas es síncrono y
+    puede leer los permisos del usuario.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        maximo = self.maximo_consultas(request.method)
+        if maximo is None:
+            return await self._despachar(request, *args, **kwargs)
+
+        async with avigilar_consultas(maximo, f'{type(self).__name__} ({request.method} {request.path})'):
+            respuesta = await self._despachar(request, *args, **kwargs)
+            await arenderizar(respuesta)
+        return respuesta
+
+    async def _despachar(self, request, *args, **kwargs):
+        request.user = await request.auser()
+        if not request.user.is_authenticated:
+            return self.handle_no_permission()
+        if isinstance(self, PermissionRequiredMixin):
+            if not await request.user.ahas_perms(self.get_permission_required()):
+                return self.handle_no_permission()
+        await sync_to_async(roles_usuario)(request.user)
+
+        if isinstance(self, PropietarioMixinBase):
+            condiciones = self.condiciones_propiedad()
+            if condiciones:
+                objeto = await self.aget_object()
+                if not all(getattr(objeto, nombre) for nombre in condiciones):
+                    raise PermissionDenied
+
+        # Las comprobaciones de los mixins ya están hechas: directamente al método HTTP
+        return await View.dispatch(self, request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        if isinstance(self, SingleObjectMixin):
+            self.object = await self.aget_object()
+            context = self.get_context_data(object=self.object)
+        else:
+            self.object_list = self.get_queryset()
+            self.pagina = await apaginar(
+                self.object_list, self.orden_paginacion, self.tamaño_pagina, request.GET
+            )
+            context = self.get_context_data()
+        return self.render_to_response(context)
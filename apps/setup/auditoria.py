@@ -0,0 +1,189 @@
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+
+"""
+Manejador de logging que guarda la auditoría en la tabla RegistroAuditoria por lotes.
+
+emit() solo mete el registro en una cola (si está llena lo descarta y lo cuenta) y un hilo por
+proceso lo guarda con bulk_create cada LOTE registros o INTERVALO_MS milisegundos; close() guarda
+lo que quede. Se configura en settings.LOGGING (lote, intervalo_ms, capacidad, reintentos, eco) y
+los registros llevan los campos del modelo en extra={'auditoria': {...}}, ver
+apps/setup/middleware.py.
+"""
+
+# Segundos antes del primer reintento con la base de datos bloqueada; se dobla en cada uno
+ESPERA_REINTENTO = 0.1
+
+
+class ManejadorAuditoria(logging.handlers.QueueHandler):
+    """
+    QueueHandler con un hilo que guarda los registros en RegistroAuditoria por lotes.
+
+    Args:
+        lote (int): registros como máximo por bulk_create.
+        intervalo_ms (int): milisegundos como máximo que un registro espera en la cola.
+        capacidad (int): tamaño de la cola; con la cola llena se descartan los registros.
+        reintentos (int): veces que se repite un lote si la base de datos está bloqueada o se
+            ha perdido la conexión.
+        eco (bool): escribir también cada registro en stderr.
+    """
+
+    def __init__(self, lote=200, intervalo_ms=500, capacidad=10000, reintentos=3, eco=False):
+        super().__init__(queue.Queue(capacidad))
+        self.lote = lote
+        self.intervalo = intervalo_ms / 1000
+        self.reintentos = reintentos
+        self.eco = eco
+        self.descartados = 0
+        self._hilo = None
+        self._pid = None
+        self._parar = threading.Event()
+        self._arranque = threading.Lock()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+    def emit(self, record):
+        self._asegurar_hilo()
+        super().emit(record)
+
+    def _asegurar_hilo(self):
+        if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._arranque:
+            if self._pid == os.getpid() and self._hilo is not None and self._hilo.is_alive():
+                return
+            self._pid = os.getpid()
+            self._parar.clear()
+            self._hilo = threading.Thread(target=self._trabajar, name='auditoria', daemon=True)
+            self._hilo.start()
+
+    def _trabajar(self):
+        """Bucle del hilo: junta lotes de la cola y los guarda hasta que se pide parar."""
+        while not self._parar.is_set():
+            try:
+                primero = self.queue.get(timeout=self.intervalo)
+            except queue.Empty:
+                continue
+            registros = [primero]
+            limite = time.monotonic() + self.intervalo
+            while len(registros) < self.lote:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    registros.append(self.queue.get(timeout=restante))
+                except queue.Empty:
+                    break
+            self._guardar(registros)
+
+    def _vaciar(self):
+        """Guarda todo lo que queda en la cola, por lotes."""
+        registros = []
+        while True:
+            try:
+                registros.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(registros) >= self.lote:
+                self._guardar(registros)
+                registros = []
+        if registros:
+            self._guardar(registros)
+
+    def _con_reintentos(self, operacion):
+        """Ejecuta operacion() y la repite si la base de datos está bloqueada o se ha caído la conexión."""
+        from django.db import OperationalError, close_old_connections
+
+        for intento in range(self.reintentos + 1):
+            # Cierra la conexión si un error anterior la ha dejado inservible
+            close_old_connections()
+            try:
+                return operacion()
+            except OperationalError:
+                if intento == self.reintentos:
+                    raise
+                time.sleep(ESPERA_REINTENTO * 2 ** intento)
+
+    def _guardar(self, registros):
+        """
+        Guarda un lote en RegistroAuditoria con un único INSERT. Si una fila lo impide se guardan
+        las demás (ver _guardar_por_separado()); el resto de errores de base de datos se escriben
+        en stderr y el lote se pierde: la auditoría no debe tumbar el hilo ni el servidor.
+        """
+        # Importación tardía: LOGGING se configura antes de que las apps estén cargadas
+        from django.db import DatabaseError, IntegrityError
+        from .models import RegistroAuditoria
+
+        if self.eco:
+            for registro in registros:
+                sys.stderr.write(registro.getMessage() + '\n')
+
+        filas = [
+            RegistroAuditoria(**registro.auditoria)
+            for registro in registros if getattr(registro, 'auditoria', None)
+        ]
+        if not filas:
+            return
+        try:
+            self._con_reintentos(lambda: RegistroAuditoria.objects.bulk_create(filas))
+        except IntegrityError:
+            self._guardar_por_separado(filas)
+        except DatabaseError as e:
+            sys.stderr.write(f'[AUDITORIA] No se han podido guardar {len(filas)} registros: {e}\n')
+
+    def _guardar_por_separado(self, filas):
+        """
+        Para un lote que ha fallado por una fila: los usuarios borrados antes de guardarlo se
+        quitan (queda nombre_usuario) y se repite el lote; si vuelve a fallar, se guarda fila a fila
+        y solo se pierden las que fallan.
+        """
+        from django.contrib.auth import get_user_model
+        from django.db import DatabaseError, IntegrityError
+        from .models import RegistroAuditoria
+
+        usuarios = get_user_model().objects.filter(
+            pk__in={fila.usuario_id for fila in filas if fila.usuario_id is not None}
+        ).values_list('pk', flat=True)
+        try:
+            existentes = set(self._con_reintentos(lambda: list(usuarios)))
+            for fila in filas:
+                if fila.usuario_id not in existentes:
+                    fila.usuario_id = None
+            self._con_reintentos(lambda: RegistroAuditoria.objects.bulk_create(filas))
+            return
+        except IntegrityError:
+            pass
+        except DatabaseError as e:
+            sys.stderr.write(f'[AUDITORIA] No se han podido guardar {len(filas)} registros: {e}\n')
+            return
+
+        perdidos = 0
+        for fila in filas:
+            try:
+                self._con_reintentos(lambda: RegistroAuditoria.objects.bulk_create([fila]))
+            except DatabaseError as e:
+                perdidos += 1
+                error = e
+        if perdidos:
+            sys.stderr.write(f'[AUDITORIA] No se han podido guardar {perdidos} registros: {error}\n')
+
+    def close(self):
+        """Para el hilo y guarda lo que quede en la cola (lo llama logging.shutdown() al salir)."""
+        self._parar.set()
+        if self._hilo is not None and self._pid == os.getpid():
+            self._hilo.join(timeout=5)
+        try:
+            self._vaciar()
+        except Exception as e:
+            # Al salir del proceso puede que Django ya no esté configurado
+            sys.stderr.write(f'[AUDITORIA] No se ha podido vaciar la cola al cerrar: {e}\n')
+        super().close()
@@ -0,0 +1,312 @@
+import unicodedata
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramWordSimilarity
+from django.db import connection, transaction
+from django.db.models import F, FloatField, Q, Value
+from django.urls import reverse
+
+from apps.clientes.models import Cliente
+from apps.proyectos.models import Proyecto
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura
+from .models import EntradaBusqueda
+from .roles import es_freelancer, es_cliente
+
+"""
+Buscador global de clientes, proyectos, presupuestos y facturas.
+
+Cada objeto tiene una fila en EntradaBusqueda con su texto normalizado y, en PostgreSQL, un
+tsvector; buscar() usa el índice GIN del tsvector y el de trigramas del texto y ordena por
+SearchRank más la similitud. En otras bases de datos busca con LIKE por palabra. Las señales de
+apps/setup/signals.py mantienen las filas; reconstruir_busqueda() las rehace.
+
+Ejemplo:
+    for entrada in buscar(request.user, 'diseño web'):
+        entrada.tipo, entrada.titulo, entrada.url, entrada.rango
+"""
+
+CONFIGURACION_POR_DEFECTO = {
+    # Configuración de texto de PostgreSQL para el tsvector y las consultas
+    'IDIOMA': 'spanish',
+    # Resultados como máximo de buscar()
+    'LIMITE': 20,
+    # Objetos que se indexan por consulta al reconstruir
+    'LOTE': 2000,
+}
+
+# Con menos letras los trigramas no sirven y LIKE '%..%' recorrería las filas del freelancer
+MINIMO_TRIGRAMAS = 3
+
+# Tipos que puede ver un usuario cliente (no tiene acceso a las fichas de cliente)
+TIPOS_CLIENTE = ['proyecto', 'presupuesto', 'factura']
+
+URLS = {
+    'cliente': 'cliente_detail',
+    'proyecto': 'proyecto_detail',
+    'presupuesto': 'presupuesto_detail',
+    'factura': 'factura_detail',
+}
+
+
+def configuracion():
+    """Devuelve settings.BUSQUEDA completado con los valores por defecto."""
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'BUSQUEDA', {})}
+
+
+def normalizar(texto):
+    """
+    Pasa el texto a minúsculas, le quita las tildes y deja un solo espacio entre palabras.
+    Se aplica igual a lo que se guarda y a lo que se busca.
+
+    Ejemplo:
+        normalizar('  Diseño  Gráfico ')   # 'diseno grafico'
+    """
+    descompuesto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    sin_tildes = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_tildes.split())
+
+
+def _unir(*partes):
+    return normalizar(' '.join(str(parte) for parte in partes if parte))
+
+
+def _entradas_clientes(clientes):
+    filas = clientes.values_list('pk', 'freelancer_id', 'nombre', 'email', 'telefono', 'direccion')
+    for pk, freelancer_id, nombre, email, telefono, direccion in filas:
+        yield {
+            'tipo': 'cliente', 'objeto_id': pk, 'freelancer_id': freelancer_id, 'cliente_id': pk,
+            'titulo': nombre, 'detalle': email, 'fecha': None,
+            'texto': _unir(nombre, email, telefono, direccion),
+        }
+
+
+def _entradas_proyectos(proyectos):
+    filas = proyectos.values_list(
+        'pk', 'freelancer_id', 'cliente_id', 'nombre', 'descripcion', 'fecha_inicio', 'cliente__nombre',
+    )
+    for pk, freelancer_id, cliente_id, nombre, descripcion, fecha, cliente in filas:
+        yield {
+            'tipo': 'proyecto', 'objeto_id': pk, 'freelancer_id': freelancer_id, 'cliente_id': cliente_id,
+            'titulo': nombre, 'detalle': cliente, 'fecha': fecha,
+            'texto': _unir(nombre, cliente, descripcion),
+        }
+
+
+def _entradas_presupuestos(presupuestos):
+    filas = presupuestos.values_list(
+        'pk', 'proyecto__freelancer_id', 'proyecto__cliente_id', 'numero_serie', 'fecha', 'notas',
+        'proyecto__nombre', 'proyecto__cliente__nombre',
+    )
+    for pk, freelancer_id, cliente_id, numero_serie, fecha, notas, proyecto, cliente in filas:
+        yield {
+            'tipo': 'presupuesto', 'objeto_id': pk, 'freelancer_id': freelancer_id, 'cliente_id': cliente_id,
+            'titulo': numero_serie, 'detalle': f'{proyecto} · {cliente}', 'fecha': fecha,
+            'texto': _unir(numero_serie, proyecto, cliente, notas),
+        }
+
+
+def _entradas_facturas(facturas):
+    filas = facturas.values_list(
+        'pk', 'presupuesto__proyecto__freelancer_id', 'presupuesto__proyecto__cliente_id', 'numero_serie',
+        'fecha_emision', 'presupuesto__numero_serie', 'presupuesto__proyecto__nombre',
+        'presupuesto__proyecto__cliente__nombre',
+    )
+    for pk, freelancer_id, cliente_id, numero_serie, fecha, presupuesto, proyecto, cliente in filas:
+        yield {
+            'tipo': 'factura', 'objeto_id': pk, 'freelancer_id': freelancer_id, 'cliente_id': cliente_id,
+            'titulo': numero_serie, 'detalle': f'{proyecto} · {cliente}', 'fecha': fecha,
+            'texto': _unir(numero_serie, presupuesto, proyecto, cliente),
+        }
+
+
+# tipo: (modelo, función que lee sus entradas de un queryset, camino hasta el freelancer)
+FUENTES = {
+    'cliente': (Cliente, _entradas_clientes, 'freelancer'),
+    'proyecto': (Proyecto, _entradas_proyectos, 'freelancer'),
+    'presupuesto': (Presupuesto, _entradas_presupuestos, 'proyecto__freelancer'),
+    'factura': (Factura, _entradas_facturas, 'presupuesto__proyecto__freelancer'),
+}
+
+
+def entradas_de(tipo, queryset):
+    """
+    Lee con una consulta las entradas de búsqueda de los objetos del queryset. Solo usa
+    values_list(), así que sirve también con los modelos históricos de una migración.
+
+    Returns:
+        generator: dicts con los campos de EntradaBusqueda, sin vector.
+    """
+    return FUENTES[tipo][1](queryset)
+
+
+def expresion_vector():
+    """
+    Returns:
+        SearchVector: el tsvector de una fila calculado de sus columnas titulo y texto.
+    """
+    idioma = configuracion()['IDIOMA']
+    # titulo va con tildes (es lo que se muestra), pero también está normalizado dentro de
+    # texto: una consulta sin tildes lo encuentra por texto y una con tildes además por titulo
+    titulo = SearchVector('titulo', weight='A', config=idioma)
+    return titulo + SearchVector('texto', weight='B', config=idioma)
+
+
+def actualizar_vectores(entradas):
+    """Recalcula la columna vector de las entradas del queryset con un UPDATE (solo PostgreSQL)."""
+    if connection.vendor == 'postgresql':
+        entradas.update(vector=expresion_vector())
+
+
+def indexar(tipo, ids, nuevos=False):
+    """
+    Crea o vuelve a crear las entradas de búsqueda de los objetos indicados: una consulta
+    para leerlos, un DELETE, un INSERT y, en PostgreSQL, el UPDATE del vector. Los ids que
+    ya no existen se quedan sin entrada.
+
+    Args:
+        tipo (str): 'cliente', 'proyecto', 'presupuesto' o 'factura'.
+        ids (iterable): ids de los objetos.
+        nuevos (bool): los objetos se acaban de crear y no tienen entradas: sin el DELETE.
+
+    Returns:
+        int: entradas creadas.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    modelo = FUENTES[tipo][0]
+    with transaction.atomic(savepoint=False):
+        nuevas = [EntradaBusqueda(**datos) for datos in entradas_de(tipo, modelo.objects.filter(pk__in=ids))]
+        if not nuevos:
+            EntradaBusqueda.objects.filter(tipo=tipo, objeto_id__in=ids).delete()
+        EntradaBusqueda.objects.bulk_create(nuevas)
+        actualizar_vectores(EntradaBusqueda.objects.filter(tipo=tipo, objeto_id__in=ids))
+    return len(nuevas)
+
+
+def desindexar(tipo, ids):
+    """Borra las entradas de búsqueda de los objetos indicados."""
+    EntradaBusqueda.objects.filter(tipo=tipo, objeto_id__in=list(ids)).delete()
+
+
+def indexar_queryset(tipo, queryset):
+    """
+    Indexa todos los objetos de un queryset por lotes de LOTE ids.
+
+    Returns:
+        int: entradas creadas.
+    """
+    lote = configuracion()['LOTE']
+    ids = queryset.order_by('pk').values_list('pk', flat=True)
+    creadas = 0
+    ultimo = None
+    while True:
+        pagina = ids if ultimo is None else ids.filter(pk__gt=ultimo)
+        bloque = list(pagina[:lote])
+        if not bloque:
+            return creadas
+        creadas += indexar(tipo, bloque)
+        ultimo = bloque[-1]
+
+
+def reconstruir_busqueda(freelancer_id=None):
+    """
+    Borra y vuelve a crear las entradas de búsqueda de un freelancer, o de todos.
+
+    Returns:
+        int: entradas creadas.
+    """
+    entradas = EntradaBusqueda.objects.all()
+    if freelancer_id is not None:
+        entradas = entradas.filter(freelancer_id=freelancer_id)
+    entradas.delete()
+
+    creadas = 0
+    for tipo, (modelo, _, ruta_freelancer) in FUENTES.items():
+        objetos = modelo.objects.all()
+        if freelancer_id is not None:
+            objetos = objetos.filter(**{f'{ruta_freelancer}_id': freelancer_id})
+        creadas += indexar_queryset(tipo, objetos)
+    return creadas
+
+
+def entradas_visibles(usuario):
+    """
+    Returns:
+        QuerySet: las entradas de búsqueda que puede ver el usuario (ninguna si no tiene rol).
+    """
+    if es_freelancer(usuario):
+        return EntradaBusqueda.objects.filter(freelancer=usuario)
+    if es_cliente(usuario):
+        return EntradaBusqueda.objects.filter(cliente__usuario_cliente=usuario, tipo__in=TIPOS_CLIENTE)
+    return EntradaBusqueda.objects.none()
+
+
+def _filtrar(entradas, termino):
+    """
+    Returns:
+        tuple: (entradas que cumplen la búsqueda, SearchQuery o None si no es PostgreSQL)
+    """
+    normal = normalizar(termino)
+    if connection.vendor != 'postgresql':
+        for palabra in normal.split():
+            entradas = entradas.filter(texto__contains=palabra)
+        return entradas, None
+
+    consulta = SearchQuery(normal, config=configuracion()['IDIOMA'], search_type='websearch')
+    condicion = Q(vector=consulta)
+    if len(normal) >= MINIMO_TRIGRAMAS:
+        condicion |= Q(texto__contains=normal)
+    return entradas.filter(condicion), consulta
+
+
+def ids_coincidentes(usuario, tipo, termino):
+    """
+    Ids de los objetos de un tipo que cumplen la búsqueda, para filtrar un listado con
+    pk__in (una subconsulta, no una lista en memoria).
+
+    Ejemplo:
+        queryset.filter(pk__in=ids_coincidentes(request.user, 'cliente', busqueda))
+
+    Returns:
+        QuerySet: valores de objeto_id.
+    """
+    entradas, _ = _filtrar(entradas_visibles(usuario).filter(tipo=tipo), termino)
+    return entradas.values('objeto_id')
+
+
+def buscar(usuario, termino, tipos=None, limite=None):
+    """
+    Busca en las entradas que puede ver el usuario y las devuelve de más a menos relevante.
+
+    Args:
+        usuario (Usuario): normalmente request.user.
+        termino (str): lo escrito en el buscador. Admite la sintaxis de websearch_to_tsquery
+            en PostgreSQL ("frase exacta", -excluir, or).
+        tipos (list): limita los resultados a esos tipos, o None para todos.
+        limite (int): número máximo de resultados, por defecto LIMITE.
+
+    Returns:
+        list: EntradaBusqueda con los atributos rango (float, None si no es PostgreSQL) y url.
+    """
+    if not normalizar(termino):
+        return []
+    limite = limite or configuracion()['LIMITE']
+
+    entradas = entradas_visibles(usuario)
+    if tipos:
+        entradas = entradas.filter(tipo__in=tipos)
+    entradas, consulta = _filtrar(entradas, termino)
+
+    if consulta is not None:
+        entradas = entradas.annotate(
+            rango=SearchRank(F('vector'), consulta) + TrigramWordSimilarity(Value(normalizar(termino)), 'texto'),
+        ).order_by('-rango', '-fecha', '-pk')
+    else:
+        entradas = entradas.annotate(rango=Value(None, output_field=FloatField())).order_by('-fecha', '-pk')
+
+    resultados = list(entradas.defer('texto', 'vector')[:limite])
+    for entrada in resultados:
+        entrada.url = reverse(URLS[entrada.tipo], args=[entrada.objeto_id])
+    return resultados
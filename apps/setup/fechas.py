@@ -0,0 +1,39 @@
+from datetime import date
+
+"""
+Filtros por año como rango de fechas.
+
+Con un valor fijo, fecha__year=2026 ya se traduce a un BETWEEN, pero en cuanto el año
+viene de una expresión (annotate con ExtractYear, F(), subconsultas) queda como
+EXTRACT(year FROM fecha) = ..., que no puede usar un índice sobre fecha. El rango
+fecha >= 2026-01-01 AND fecha < 2027-01-01 lo usa siempre, así que todos los filtros
+por año del proyecto se escriben con filtro_año().
+"""
+
+
+def rango_año(año):
+    """
+    Args:
+        año (int | str): el año, tal cual llega de la URL o de la sesión.
+
+    Returns:
+        tuple: (1 de enero del año, 1 de enero del siguiente), o None si el año no es válido.
+    """
+    try:
+        año = int(año)
+        return date(año, 1, 1), date(año + 1, 1, 1)
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+def filtro_año(campo, año):
+    """
+    Returns:
+        dict: kwargs para filter() con el rango del año sobre el campo, vacío si el año no es válido.
+            filtro_año('fecha_emision', 2026) → {'fecha_emision__gte': date(2026, 1, 1),
+                                                 'fecha_emision__lt': date(2027, 1, 1)}
+    """
+    rango = rango_año(año)
+    if rango is None:
+        return {}
+    return {f'{campo}__gte': rango[0], f'{campo}__lt': rango[1]}
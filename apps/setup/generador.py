@@ -0,0 +1,276 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.usuarios.models import Usuario, Perfil
+from apps.clientes.models import Cliente
+from apps.proyectos.models import Proyecto
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura, Pago, ResumenMensual, TrabajoPDF, calcular_total_con_impuestos
+from apps.facturas.resumen import reconstruir_resumen
+from apps.usuarios.cache_dashboard import invalidar_dashboard
+from .busqueda import reconstruir_busqueda
+from .models import EntradaBusqueda
+
+"""
+Generador de datos de prueba con volúmenes y distribuciones realistas.
+
+generar() crea freelancers, clientes, proyectos, presupuestos, facturas y pagos con bulk_create
+por lotes de LOTE y reconstruye su resumen y su buscador. Los repartos siguen una ley de Zipf
+(pocos freelancers y clientes concentran la mayoría de las facturas) y con la misma semilla salen
+los mismos datos. borrar_datos() lo borra con DELETE ... WHERE id IN (SELECT ...), sin señales.
+Los números de serie son G<freelancer>-<n> para no tocar la numeración real.
+
+Ejemplo:
+    freelancers = generar('carga', freelancers=5, clientes=40, facturas=200_000, semilla=1)
+    borrar_datos(freelancers)
+"""
+
+LOTE = 5000
+SESGO = 1.1
+
+# Reparto de estados de las facturas antes de ajustarlos al vencimiento
+PESOS_ESTADO = {'pagada': 60, 'pendiente': 18, 'parcial': 10, 'vencida': 7, 'anulada': 5}
+# Estados de los presupuestos que no llegan a factura
+ESTADOS_SIN_FACTURA = ['borrador', 'enviado', 'rechazado']
+METODOS = [metodo for metodo, _ in Pago.METODOS]
+
+# Antigüedad máxima de los documentos generados
+DIAS = 3 * 365
+PLAZO_PAGO = 30
+
+
+def pesos_zipf(n, sesgo=SESGO):
+    """
+    Returns:
+        list: n pesos decrecientes, 1 / (i + 1) ** sesgo.
+    """
+    return [1 / (i + 1) ** sesgo for i in range(n)]
+
+
+def repartir(total, n, rng, sesgo=SESGO):
+    """
+    Reparte total elementos entre n grupos con pesos de Zipf.
+
+    Returns:
+        list: cuántos elementos le tocan a cada grupo (suman total).
+    """
+    cuentas = [0] * n
+    for grupo in rng.choices(range(n), weights=pesos_zipf(n, sesgo), k=total):
+        cuentas[grupo] += 1
+    return cuentas
+
+
+def generar(prefijo, freelancers=1, clientes=50, facturas=10_000, pagos=True,
+            presupuestos_extra=0.3, usuarios_cliente=1, semilla=0, progreso=None):
+    """
+    Crea los datos de prueba y reconstruye su resumen y su índice de búsqueda.
+
+    Args:
+        prefijo (str): prefijo de los nombres de usuario (prefijo_0, prefijo_1...). No debe existir.
+        freelancers (int): número de freelancers.
+        clientes (int): clientes de cada freelancer.
+        facturas (int): facturas en total, repartidas entre los freelancers con sesgo.
+        pagos (bool): crear los pagos de las facturas pagadas y parciales.
+        presupuestos_extra (float): presupuestos sin factura por cada factura (borradores,
+            enviados y rechazados).
+        usuarios_cliente (int): clientes de cada freelancer con cuenta de usuario, para poder
+            medir las vistas como cliente.
+        semilla (int): semilla del generador aleatorio.
+        progreso (callable): recibe un texto con el avance, o None.
+
+    Returns:
+        list: los freelancers creados (Usuario), de más a menos facturas.
+
+    Raises:
+        ValueError: Si ya existen usuarios con ese prefijo.
+    """
+    if Usuario.objects.filter(username__startswith=f'{prefijo}_').exists():
+        raise ValueError(f'Ya hay usuarios con el prefijo {prefijo}_: bórralos antes o usa otro prefijo.')
+
+    rng = random.Random(semilla)
+    hoy = timezone.now().date()
+    avisar = progreso or (lambda texto: None)
+
+    creados = []
+    for indice, num_facturas in enumerate(repartir(facturas, freelancers, rng)):
+        freelancer = Usuario.objects.create_user(
+            username=f'{prefijo}_{indice}', email=f'{prefijo}_{indice}@example.com', password=prefijo,
+        )
+        Perfil.objects.create(perfil=freelancer, tipo_cuenta='freelancer')
+        proyectos = _crear_clientes_y_proyectos(freelancer, indice, prefijo, clientes, usuarios_cliente, rng, hoy)
+        _crear_documentos(
+            freelancer, indice, proyectos, num_facturas, presupuestos_extra, pagos, rng, hoy, avisar,
+        )
+
+        reconstruir_resumen(freelancer.pk)
+        reconstruir_busqueda(freelancer.pk)
+        invalidar_dashboard(freelancer.pk)
+        avisar(f'{freelancer.username}: {num_facturas} facturas')
+        creados.append(freelancer)
+    return creados
+
+
+def _crear_clientes_y_proyectos(freelancer, indice, prefijo, clientes, usuarios_cliente, rng, hoy):
+    """
+    Returns:
+        list: los proyectos del freelancer, ordenados de más a menos peso (el primer cliente primero).
+    """
+    nuevos = []
+    for j in range(clientes):
+        cliente = Cliente(
+            freelancer=freelancer, nombre=f'Cliente {prefijo} {indice}-{j}',
+            email=f'{prefijo}_{indice}_cliente_{j}@example.com',
+            telefono=f'6{rng.randrange(10 ** 8):08d}', estado=rng.random() > 0.1,
+        )
+        if j < usuarios_cliente:
+            usuario = Usuario.objects.create_user(
+                username=f'{prefijo}_{indice}_cliente_{j}', email=cliente.email, password=prefijo,
+            )
+            Perfil.objects.create(perfil=usuario, tipo_cuenta='cliente')
+            # Cliente.clean() copia estos datos del usuario; bulk_create no lo llama
+            cliente.usuario_cliente, cliente.nombre, cliente.estado = usuario, usuario.username, True
+        nuevos.append(cliente)
+    nuevos = Cliente.objects.bulk_create(nuevos)
+
+    proyectos = []
+    for cliente in nuevos:
+        for k in range(rng.choices([1, 2, 3], weights=[60, 30, 10])[0]):
+            inicio = hoy - timedelta(days=rng.randrange(DIAS))
+            proyectos.append(Proyecto(
+                freelancer=freelancer, cliente=cliente, nombre=f'Proyecto {cliente.pk}-{k}',
+                descripcion=f'Proyecto de prueba {k} de {cliente.nombre}',
+                estado=rng.choices(['activo', 'pausado', 'finalizado'], weights=[50, 10, 40])[0],
+                fecha_inicio=inicio,
+            ))
+    return Proyecto.objects.bulk_create(proyectos)
+
+
+def _fecha_reciente(rng, hoy):
+    # Triangular con la moda en 0 días: la mayoría de los documentos son recientes
+    return hoy - timedelta(days=int(rng.triangular(0, DIAS, 0)))
+
+
+def _estado_factura(rng, vencimiento, hoy):
+    estado = rng.choices(list(PESOS_ESTADO), weights=list(PESOS_ESTADO.values()))[0]
+    if estado in ('pendiente', 'parcial') and vencimiento < hoy:
+        return 'vencida'
+    if estado == 'vencida' and vencimiento >= hoy:
+        return 'pendiente'
+    return estado
+
+
+def _crear_documentos(freelancer, indice, proyectos, num_facturas, presupuestos_extra, pagos, rng, hoy, avisar):
+    """Crea los presupuestos (con y sin factura), las facturas y los pagos por lotes de LOTE."""
+    pesos = pesos_zipf(len(proyectos))
+    num_presupuestos = num_facturas + int(num_facturas * presupuestos_extra)
+
+    for inicio in range(0, num_presupuestos, LOTE):
+        indices = range(inicio, min(inicio + LOTE, num_presupuestos))
+        elegidos = rng.choices(proyectos, weights=pesos, k=len(indices))
+        presupuestos = []
+        for i, proyecto in zip(indices, elegidos):
+            fecha = _fecha_reciente(rng, hoy)
+            con_factura = i < num_facturas
+            presupuestos.append(Presupuesto(
+                proyecto=proyecto, numero_serie=f'G{indice}-{i:07d}', fecha=fecha,
+                validez=fecha + timedelta(days=PLAZO_PAGO),
+                estado='aceptado' if con_factura else rng.choice(ESTADOS_SIN_FACTURA),
+                total=Decimal(f'{min(rng.lognormvariate(6.5, 0.9), 99_999_999):.2f}'),
+            ))
+        with transaction.atomic():
+            presupuestos = Presupuesto.objects.bulk_create(presupuestos)
+            nuevas = [
+                _factura(presupuesto, rng, hoy)
+                for i, presupuesto in zip(indices, presupuestos) if i < num_facturas
+            ]
+            nuevas = Factura.objects.bulk_create(nuevas)
+            if pagos:
+                Pago.objects.bulk_create(_pagos(nuevas, rng, hoy))
+        avisar(f'  {freelancer.username}: {indices[-1] + 1} de {num_presupuestos} presupuestos')
+
+
+def _factura(presupuesto, rng, hoy):
+    """bulk_create no llama a save(): el total con impuestos y lo pagado se calculan aquí."""
+    emision = presupuesto.fecha + timedelta(days=rng.randrange(15))
+    if emision > hoy:
+        emision = hoy
+    vencimiento = emision + timedelta(days=PLAZO_PAGO)
+    estado = _estado_factura(rng, vencimiento, hoy)
+    total = calcular_total_con_impuestos(presupuesto.total, presupuesto.impuestos)
+    if estado == 'pagada':
+        pagado = total
+    elif estado == 'parcial':
+        pagado = (total * Decimal(rng.randint(20, 80)) / 100).quantize(Decimal('0.01'))
+    else:
+        pagado = Decimal('0')
+    return Factura(
+        presupuesto=presupuesto, numero_serie=presupuesto.numero_serie, fecha_emision=emision,
+        fecha_vencimiento=vencimiento, estado=estado, total_con_impuestos=total, total_pagado=pagado,
+    )
+
+
+def _pagos(facturas, rng, hoy):
+    """Uno o dos pagos por factura que suman su total_pagado."""
+    for factura in facturas:
+        if not factura.total_pagado:
+            continue
+        fecha = min(factura.fecha_emision + timedelta(days=rng.randrange(PLAZO_PAGO + 10)), hoy)
+        metodo = rng.choices(METODOS, weights=[70, 15, 5, 10])[0]
+        if factura.estado == 'pagada' and rng.random() < 0.3:
+            primero = (factura.total_pagado / 2).quantize(Decimal('0.01'))
+            yield Pago(factura=factura, fecha=fecha, cantidad=primero, metodo=metodo)
+            yield Pago(factura=factura, fecha=fecha, cantidad=factura.total_pagado - primero, metodo=metodo)
+        else:
+            yield Pago(factura=factura, fecha=fecha, cantidad=factura.total_pagado, metodo=metodo)
+
+
+def _borrar_sin_señales(queryset):
+    """
+    DELETE FROM tabla WHERE id IN (SELECT id ... del queryset), sin cargar los objetos en memoria
+    ni lanzar pre_delete/post_delete por cada fila. Quien llama se encarga de lo que hacían las señales.
+
+    Returns:
+        int: filas borradas.
+    """
+    modelo = queryset.model
+    qn = connection.ops.quote_name
+    sql, params = queryset.values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {qn(modelo._meta.db_table)} WHERE {qn(modelo._meta.pk.column)} IN ({sql})', params
+        )
+        return cursor.rowcount
+
+
+def borrar_datos(freelancers):
+    """
+    Borra los freelancers y todo lo suyo (y los usuarios de sus clientes), respetando el orden
+    de los PROTECT. El resumen y las entradas del buscador se borran aparte, que es lo que
+    harían las señales de borrado de las facturas.
+
+    Args:
+        freelancers (iterable): usuarios freelancer.
+    """
+    for freelancer in freelancers:
+        with transaction.atomic():
+            facturas = Factura.objects.filter(presupuesto__proyecto__freelancer=freelancer)
+            _borrar_sin_señales(Pago.objects.filter(factura__in=facturas))
+            _borrar_sin_señales(TrabajoPDF.objects.filter(factura__in=facturas))
+            _borrar_sin_señales(facturas)
+            _borrar_sin_señales(Presupuesto.objects.filter(proyecto__freelancer=freelancer))
+            _borrar_sin_señales(Proyecto.objects.filter(freelancer=freelancer))
+            ResumenMensual.objects.filter(freelancer=freelancer).delete()
+            EntradaBusqueda.objects.filter(freelancer=freelancer).delete()
+
+            usuarios_cliente = list(
+                Cliente.objects.filter(freelancer=freelancer, usuario_cliente__isnull=False)
+                .values_list('usuario_cliente_id', flat=True)
+            )
+            Cliente.objects.filter(freelancer=freelancer).delete()
+            Usuario.objects.filter(pk__in=usuarios_cliente).delete()
+            freelancer.delete()
+        invalidar_dashboard(freelancer.pk)
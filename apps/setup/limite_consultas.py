@@ -0,0 +1,240 @@
+import logging
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections, transaction
+from django.template.response import SimpleTemplateResponse
+
+from .rendimiento import RegistroConsultas
+
+"""
+Límite de consultas por vista o por método.
+
+@limite_consultas(N) para funciones y métodos, o LimiteConsultasMixin con limite_consultas = N
+(o {'GET': 6, 'POST': 20}) como primera base de las vistas de clase. Las consultas se cuentan con
+RegistroConsultas en todas las conexiones, incluido el render de las TemplateResponse. Al
+superarlo, con ESTRICTO se lanza LimiteConsultasExcedido y se deshace lo escrito; si no, se avisa
+en el logger 'limite_consultas'.
+
+Ejemplo:
+    class FacturaListView(LimiteConsultasMixin, LoginRequiredMixin, ListView):
+        limite_consultas = 6
+"""
+
+CONFIGURACION_POR_DEFECTO = {
+    # Con False los decoradores y el mixin no hacen nada
+    'ACTIVO': True,
+    # Lanzar la excepción en lugar de registrar el aviso
+    'ESTRICTO': False,
+    # SQL distintos que se incluyen en el mensaje
+    'SQL_MOSTRADOS': 10,
+}
+
+logger = logging.getLogger('limite_consultas')
+
+# Registro de la medición en curso, para sumar las consultas hechas en otros hilos
+_registro_activo = ContextVar('registro_limite_consultas', default=None)
+
+
+def configuracion():
+    """Devuelve settings.LIMITE_CONSULTAS completado con los valores por defecto."""
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'LIMITE_CONSULTAS', {})}
+
+
+class LimiteConsultasExcedido(Exception):
+    """Se ha superado el límite de consultas de una vista o método con ESTRICTO activo."""
+
+
+def registro_activo():
+    """
+    Returns:
+        RegistroConsultas: el registro de la medición en curso en este contexto, o None.
+    """
+    return _registro_activo.get()
+
+
+def _mensaje(nombre, maximo, registro, mostrados):
+    """
+    Returns:
+        str: el resumen de la infracción con los SQL más repetidos, uno por línea.
+    """
+    sqls = sorted(registro.por_sql.items(), key=lambda par: par[1][0], reverse=True)
+    lineas = [f'{nombre}: {registro.total} consultas, el límite es {maximo}.']
+    lineas += [f'  {datos[0]}x {sql}' for sql, datos in sqls[:mostrados]]
+    if len(sqls) > mostrados:
+        lineas.append(f'  ... y {len(sqls) - mostrados} SQL distintos más')
+    return '\n'.join(lineas)
+
+
+def _comprobar(registro, maximo, nombre, opciones):
+    """Lanza LimiteConsultasExcedido o registra el aviso si el registro supera maximo."""
+    if registro.total <= maximo:
+        return
+    mensaje = _mensaje(nombre, maximo, registro, opciones['SQL_MOSTRADOS'])
+    if opciones['ESTRICTO']:
+        raise LimiteConsultasExcedido(mensaje)
+    logger.warning(mensaje)
+
+
+@contextmanager
+def vigilar_consultas(maximo, nombre):
+    """
+    Cuenta las consultas del bloque y, si son más de maximo, lanza LimiteConsultasExcedido o
+    registra un aviso según LIMITE_CONSULTAS['ESTRICTO'].
+
+    Con ESTRICTO el bloque se ejecuta en una transacción (si no lo está ya) y el límite se
+    comprueba antes de confirmarla, así que al superarlo no queda nada escrito. Las
+    transacciones del bloque pasan a ser savepoints, que también cuentan: los límites se miden
+    así, igual que en un TestCase.
+
+    Args:
+        maximo (int): consultas permitidas.
+        nombre (str): qué se está midiendo, para el mensaje.
+
+    Yields:
+        RegistroConsultas: el registro de las consultas, o None si no está activo.
+
+    Raises:
+        LimiteConsultasExcedido: Si se supera el límite con ESTRICTO activo.
+    """
+    opciones = configuracion()
+    if not opciones['ACTIVO']:
+        yield None
+        return
+
+    registro = RegistroConsultas()
+    token = _registro_activo.set(registro)
+    try:
+        with ExitStack() as transacciones:
+            if opciones['ESTRICTO']:
+                # Se comprueba antes de confirmar: lo que escriba el bloque se deshace si se
+                # supera el límite, en lugar de quedar guardado detrás de un error 500
+                for conexion in connections.all():
+                    if not conexion.in_atomic_block:
+                        transacciones.enter_context(transaction.atomic(using=conexion.alias))
+            with ExitStack() as pila:
+                for conexion in connections.all():
+                    pila.enter_context(conexion.execute_wrapper(registro))
+                yield registro
+            _comprobar(registro, maximo, nombre, opciones)
+    finally:
+        _registro_activo.reset(token)
+
+
+@asynccontextmanager
+async def avigilar_consultas(maximo, nombre):
+    """
+    vigilar_consultas() para código asíncrono: el registro se instala en las conexiones del
+    hilo en el que el ORM asíncrono ejecuta las consultas de la petición. No abre ninguna
+    transacción: las vistas asíncronas solo leen.
+
+    Args:
+        maximo (int): consultas permitidas.
+        nombre (str): qué se está midiendo, para el mensaje.
+
+    Yields:
+        RegistroConsultas: el registro de las consultas, o None si no está activo.
+
+    Raises:
+        LimiteConsultasExcedido: Si se supera el límite con ESTRICTO activo.
+    """
+    opciones = configuracion()
+    if not opciones['ACTIVO']:
+        yield None
+        return
+
+    registro = RegistroConsultas()
+    pila = ExitStack()
+
+    def instalar():
+        for conexion in connections.all():
+            pila.enter_context(conexion.execute_wrapper(registro))
+
+    await sync_to_async(instalar)()
+    token = _registro_activo.set(registro)
+    try:
+        yield registro
+    finally:
+        _registro_activo.reset(token)
+        await sync_to_async(pila.close)()
+
+    _comprobar(registro, maximo, nombre, opciones)
+
+
+def _renderizar(respuesta):
+    """Renderiza las TemplateResponse para que las consultas de la plantilla cuenten."""
+    if isinstance(respuesta, SimpleTemplateResponse) and not respuesta.is_rendered:
+        respuesta.render()
+
+
+async def arenderizar(respuesta):
+    """_renderizar() para vistas asíncronas: el motor de plantillas es síncrono."""
+    if isinstance(respuesta, SimpleTemplateResponse) and not respuesta.is_rendered:
+        await sync_to_async(respuesta.render)()
+
+
+def limite_consultas(maximo):
+    """
+    Decorador que limita las consultas de una función, un método o una vista de función.
+
+    Args:
+        maximo (int): consultas permitidas en cada llamada.
+
+    Returns:
+        callable: el decorador. La función decorada guarda el límite en .limite_consultas.
+    """
+    def decorador(funcion):
+        nombre = f'{funcion.__module__}.{funcion.__qualname__}'
+
+        if iscoroutinefunction(funcion):
+            @wraps(funcion)
+            async def envoltura(*args, **kwargs):
+                async with avigilar_consultas(maximo, nombre):
+                    resultado = await funcion(*args, **kwargs)
+                    await arenderizar(resultado)
+                return resultado
+        else:
+            @wraps(funcion)
+            def envoltura(*args, **kwargs):
+                with vigilar_consultas(maximo, nombre):
+                    resultado = funcion(*args, **kwargs)
+                    _renderizar(resultado)
+                return resultado
+
+        envoltura.limite_consultas = maximo
+        return envoltura
+    return decorador
+
+
+class LimiteConsultasMixin:
+    """
+    Mixin para vistas basadas en clases que limita las consultas de cada petición.
+
+    limite_consultas puede ser un entero (para todos los métodos HTTP) o un diccionario por
+    método, por ejemplo {'GET': 6, 'POST': 20}. Los métodos que no están en el diccionario, o
+    limite_consultas = None, no se comprueban.
+    """
+    limite_consultas = None
+
+    def maximo_consultas(self, metodo):
+        """
+        Returns:
+            int: consultas permitidas para el método HTTP, o None si no se comprueba.
+        """
+        maximo = self.limite_consultas
+        if isinstance(maximo, dict):
+            maximo = maximo.get(metodo)
+        return maximo
+
+    def dispatch(self, request, *args, **kwargs):
+        maximo = self.maximo_consultas(request.method)
+        if maximo is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        with vigilar_consultas(maximo, f'{type(self).__name__} ({request.method} {request.path})'):
+            respuesta = super().dispatch(request, *args, **kwargs)
+            _renderizar(respuesta)
+        return respuesta
@@ -0,0 +1,109 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from apps.facturas.models import Factura
+from apps.facturas.resumen import cambios_resumen
+from apps.presupuestos.models import Presupuesto
+from apps.setup.mixins import RUTAS_PROPIETARIO
+from apps.usuarios.cache_dashboard import invalidar_dashboard
+
+"""
+Comando: actualizar_vencimientos
+
+Marca como vencidas las facturas pendientes o parciales con fecha_vencimiento pasada y como
+rechazados los presupuestos en borrador o enviados con la validez pasada. Actualiza por lotes
+de --lote filas, cada uno en su transacción, y después invalida la caché del dashboard de los
+freelancers afectados (.update() no lanza señales).
+
+Ejemplo de crontab (todos los días a las 00:05):
+    5 0 * * * cd /app && python manage.py actualizar_vencimientos
+"""
+
+# Identificador del advisory lock de PostgreSQL, cualquier entero fijo sirve
+LOCK_ID = 72_616_001
+
+# (modelo, campo de fecha, estados que pueden caducar, nuevo estado, texto para la salida)
+REGLAS = (
+    (Factura, 'fecha_vencimiento', ('pendiente', 'parcial'), 'vencida', 'Facturas vencidas'),
+    (Presupuesto, 'validez', ('borrador', 'enviado'), 'rechazado', 'Presupuestos rechazados'),
+)
+
+
+class Command(BaseCommand):
+    help = 'Marca como vencidas las facturas y como rechazados los presupuestos caducados, por lotes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=5000, help='Filas actualizadas por sentencia.')
+        parser.add_argument('--pausa', type=float, default=0, help='Segundos de espera entre lotes.')
+        parser.add_argument('--dry-run', action='store_true', help='Solo cuenta las filas afectadas.')
+
+    def handle(self, *args, **options):
+        lote = options['lote']
+        if lote < 1:
+            raise CommandError('--lote debe ser mayor que cero.')
+
+        if not self._bloquear():
+            self.stdout.write(self.style.WARNING('Ya hay otra ejecución en marcha, se omite esta.'))
+            return
+
+        try:
+            hoy = timezone.now().date()
+            for modelo, campo_fecha, estados, nuevo_estado, texto in REGLAS:
+                caducados = modelo.objects.filter(**{f'{campo_fecha}__lt': hoy, 'estado__in': estados})
+
+                if options['dry_run']:
+                    self.stdout.write(f'{texto}: {caducados.count()} (dry-run)')
+                    continue
+
+                ruta_freelancer = RUTAS_PROPIETARIO[modelo._meta.label][0]
+                freelancers = set(caducados.values_list(f'{ruta_freelancer}_id', flat=True).distinct())
+
+                inicio = time.perf_counter()
+                total, lotes = self._actualizar_por_lotes(
+                    modelo, caducados, nuevo_estado, lote, options['pausa']
+                )
+                self.stdout.write(f'{texto}: {total} ({lotes} lotes, {time.perf_counter() - inicio:.2f}s)')
+                invalidar_dashboard(*freelancers)
+        finally:
+            self._desbloquear()
+
+    def _actualizar_por_lotes(self, modelo, caducados, nuevo_estado, lote, pausa):
+        """
+        Actualiza las filas de caducados en lotes de como mucho 'lote' filas:
+        se leen los ids del lote (ORDER BY id LIMIT lote) y se lanza
+        UPDATE ... WHERE id IN (...) AND <filtro de caducados>.
+
+        En las facturas cada lote va dentro de cambios_resumen(), que mueve sus importes
+        en ResumenMensual al estado vencida en la misma transacción que el UPDATE.
+
+        Returns:
+            tuple: (filas actualizadas, número de lotes ejecutados).
+        """
+        total = 0
+        lotes = 0
+        while True:
+            ids = list(caducados.order_by('pk').values_list('pk', flat=True)[:lote])
+            with cambios_resumen(ids if modelo is Factura else ()):
+                # Se repite el filtro por si alguna fila ha cambiado desde que se leyeron los ids
+                total += caducados.filter(pk__in=ids).update(estado=nuevo_estado)
+            lotes += 1
+            if len(ids) < lote:
+                return total, lotes
+            if pausa:
+                time.sleep(pausa)
+
+    def _bloquear(self):
+        if connection.vendor != 'postgresql':
+            return True
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_try_advisory_lock(%s)', [LOCK_ID])
+            return cursor.fetchone()[0]
+
+    def _desbloquear(self):
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [LOCK_ID])
@@ -0,0 +1,312 @@
+import json
+import logging
+import platform
+import statistics
+import time
+import tracemalloc
+from urllib.parse import urlencode
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from apps.clientes.models import Cliente
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura
+from apps.usuarios.cache_dashboard import invalidar_dashboard
+from apps.setup.generador import borrar_datos, generar
+from apps.setup.mixins import RUTAS_PROPIETARIO
+from apps.setup.rendimiento import RegistroConsultas, configuracion
+
+"""
+Comando: benchmark_vistas
+
+Genera datos con apps/setup/generador.py a cada --escalas y pide con GET todas las URL de la
+aplicación como freelancer y como cliente: la primera petición cuenta consultas, SQL repetidos y
+pico de memoria, y --repeticiones más dan el p50 y el p95. Con --base compara con un informe
+anterior y falla si una URL hace más consultas, cambia de código o empeora más de --tolerancia.
+Las vistas de PDF (EXCLUIDAS) solo se miden con --incluir. Solo en bases de datos de desarrollo.
+
+Ejemplo:
+    python manage.py benchmark_vistas --escalas 10000 100000 --salida nuevo.json --base base.json
+"""
+
+VERSION_INFORME = 1
+PREFIJO = 'benchvistas'
+
+EXCLUIDAS = {'factura_pdf', 'factura_pdf_trabajo', 'facturas_exportar_zip', 'set_theme'}
+
+# Vistas de función o sin atributo model cuyo <pk> es de este modelo
+MODELOS = {
+    'presupuesto_convertir': Presupuesto,
+    'factura_register_payment': Factura,
+    'factura_pdf': Factura,
+}
+
+# Casos adicionales de los listados con filtros: (nombre de la URL, parámetros GET)
+CASOS_EXTRA = [
+    ('cliente_list', {'busqueda': 'cliente'}),
+    ('presupuesto_list', {'busqueda': 'G0', 'estado': 'enviado'}),
+    ('factura_list', {'estado': 'vencida'}),
+    ('buscar', {'q': 'proyecto'}),
+]
+
+LOGGERS_SILENCIADOS = ['django.request', 'auditoria']
+
+MINIMO_MS = 5
+MINIMO_KB = 256
+
+
+def _percentil(valores, fraccion):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fraccion))]
+
+
+def urls_de_la_aplicacion():
+    """
+    Returns:
+        list: (nombre, patrón, modelo del <pk> o None) de las URL cuya vista está en apps.*
+    """
+    urls = []
+
+    def recorrer(resolver, prefijo):
+        for patron in resolver.url_patterns:
+            if hasattr(patron, 'url_patterns'):
+                recorrer(patron, prefijo + str(patron.pattern))
+                continue
+            vista = patron.callback
+            if not patron.name or not vista.__module__.startswith('apps.'):
+                continue
+            modelo = MODELOS.get(patron.name) or getattr(getattr(vista, 'view_class', None), 'model', None)
+            urls.append((patron.name, prefijo + str(patron.pattern), modelo))
+
+    recorrer(get_resolver(), '')
+    return urls
+
+
+class Command(BaseCommand):
+    help = 'Mide latencia, consultas y memoria de todas las vistas a varias escalas de datos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--escalas', type=int, nargs='+', default=[1_000, 10_000, 100_000],
+            help='Número de facturas en total en cada escala.'
+        )
+        parser.add_argument('--freelancers', type=int, default=3, help='Freelancers entre los que se reparten.')
+        parser.add_argument('--clientes', type=int, default=50, help='Clientes de cada freelancer.')
+        parser.add_argument('--repeticiones', type=int, default=10, help='Peticiones cronometradas por URL.')
+        parser.add_argument('--roles', nargs='+', choices=['freelancer', 'cliente'], default=['freelancer', 'cliente'])
+        parser.add_argument('--incluir', nargs='+', default=[], help='URL excluidas por defecto que sí se miden.')
+        parser.add_argument('--solo', nargs='+', default=[], help='Medir solo estas URL.')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla del generador de datos.')
+        parser.add_argument('--salida', help='Fichero JSON donde guardar el informe.')
+        parser.add_argument('--base', help='Informe JSON anterior con el que comparar.')
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.2,
+            help='Empeoramiento de p95 y memoria admitido respecto a la base (0.2 = 20%%).'
+        )
+        parser.add_argument('--conservar', action='store_true', help='No borrar los datos de la última escala.')
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1 or min(options['escalas']) < 1:
+            raise CommandError('--escalas y --repeticiones deben ser mayores que cero.')
+        base = None
+        if options['base']:
+            try:
+                with open(options['base'], encoding='utf-8') as fichero:
+                    base = json.load(fichero)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se puede leer el informe base: {e}')
+
+        informe = {
+            'version': VERSION_INFORME,
+            'fecha': timezone.now().isoformat(),
+            'entorno': {
+                'bd': connection.vendor,
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'freelancers': options['freelancers'],
+                'clientes': options['clientes'],
+                'semilla': options['semilla'],
+                'repeticiones': options['repeticiones'],
+            },
+            'resultados': {},
+        }
+
+        # Añade 'testserver' a ALLOWED_HOSTS y usa el backend de correo en memoria
+        setup_test_environment()
+        # Los 403 esperados (vistas que un rol no puede ver) no deben llenar la salida, y las
+        # peticiones del benchmark no son accesos reales que haya que auditar
+        silenciados = [logging.getLogger(nombre) for nombre in LOGGERS_SILENCIADOS]
+        for logger in silenciados:
+            logger.disabled = True
+        try:
+            escalas = sorted(options['escalas'])
+            for escala in escalas:
+                self.stdout.write(f'Generando {escala} facturas...')
+                freelancers = generar(
+                    f'{PREFIJO}{escala}', freelancers=options['freelancers'], clientes=options['clientes'],
+                    facturas=escala, semilla=options['semilla'],
+                )
+                try:
+                    informe['resultados'][str(escala)] = self._medir_escala(freelancers[0], options)
+                finally:
+                    if not (options['conservar'] and escala == escalas[-1]):
+                        borrar_datos(freelancers)
+        finally:
+            for logger in silenciados:
+                logger.disabled = False
+            teardown_test_environment()
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(informe, fichero, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Informe guardado en {options["salida"]}')
+
+        if base is not None:
+            regresiones = self._comparar(base, informe, options['tolerancia'])
+            if regresiones:
+                raise CommandError(f'{len(regresiones)} regresiones:\n  ' + '\n  '.join(regresiones))
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto al informe base.'))
+
+    def _medir_escala(self, freelancer, options):
+        """
+        Returns:
+            dict: 'rol:url' -> medición, de todas las URL y roles de una escala.
+        """
+        usuarios = {'freelancer': freelancer}
+        cliente = Cliente.objects.filter(freelancer=freelancer, usuario_cliente__isnull=False).first()
+        if cliente is not None:
+            usuarios['cliente'] = cliente.usuario_cliente
+
+        excluidas = EXCLUIDAS - set(options['incluir'])
+        casos = [
+            (nombre, '<' in patron, modelo, {}) for nombre, patron, modelo in urls_de_la_aplicacion()
+            if nombre not in excluidas and (not options['solo'] or nombre in options['solo'])
+        ]
+        casos += [
+            (nombre, False, None, parametros) for nombre, parametros in CASOS_EXTRA
+            if not options['solo'] or nombre in options['solo']
+        ]
+
+        peticiones = []
+        for rol in options['roles']:
+            usuario = usuarios.get(rol)
+            if usuario is None:
+                continue
+            cliente_http = Client()
+            cliente_http.force_login(usuario)
+            for nombre, con_pk, modelo, parametros in casos:
+                ruta = self._ruta(nombre, con_pk, modelo, parametros, rol, usuario)
+                if ruta is not None:
+                    clave = f'{rol}:{nombre}' + (f'?{urlencode(parametros)}' if parametros else '')
+                    peticiones.append((clave, cliente_http, ruta))
+
+        # Calentamiento: la primera petición a cada vista importa módulos y compila plantillas,
+        # y eso no es lo que se quiere medir. Después se vacía la caché del dashboard para que
+        # la petición instrumentada la encuentre fría.
+        for _, cliente_http, ruta in peticiones:
+            self._pedir(cliente_http, ruta)
+        invalidar_dashboard(freelancer.pk)
+
+        resultados = {}
+        for clave, cliente_http, ruta in peticiones:
+            fila = resultados[clave] = self._medir(cliente_http, ruta, options['repeticiones'])
+            self.stdout.write(
+                f'  {clave:<48} {fila["estado"]} | {fila["consultas"]:>4} consultas '
+                f'({fila["repetidas"]} N+1) | '
+                f'p50 {fila["p50_ms"]:7.1f} ms | p95 {fila["p95_ms"]:7.1f} ms | '
+                f'{fila["memoria_pico_kb"]:8.0f} KB'
+            )
+        return resultados
+
+    def _ruta(self, nombre, con_pk, modelo, parametros, rol, usuario):
+        """
+        Returns:
+            str: la ruta a pedir, o None si la URL necesita un <pk> y el usuario no tiene objetos.
+        """
+        if con_pk:
+            if modelo is None or modelo._meta.label not in RUTAS_PROPIETARIO:
+                return None
+            camino = RUTAS_PROPIETARIO[modelo._meta.label][0 if rol == 'freelancer' else 1]
+            pk = modelo.objects.filter(**{camino: usuario}).order_by('pk').values_list('pk', flat=True).first()
+            if pk is None:
+                return None
+            ruta = reverse(nombre, kwargs={'pk': pk})
+        else:
+            ruta = reverse(nombre)
+        return f'{ruta}?{urlencode(parametros)}' if parametros else ruta
+
+    def _medir(self, cliente_http, ruta, repeticiones):
+        """
+        Returns:
+            dict: ruta, estado, p50_ms, p95_ms, consultas, repetidas (SQL sospechosos de N+1,
+            ver apps/setup/rendimiento.py) y memoria_pico_kb de una URL.
+        """
+        registro = RegistroConsultas()
+        tracemalloc.start()
+        try:
+            with connection.execute_wrapper(registro):
+                respuesta = self._pedir(cliente_http, ruta)
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            self._pedir(cliente_http, ruta)
+            tiempos.append(time.perf_counter() - inicio)
+
+        return {
+            'ruta': ruta,
+            'estado': respuesta.status_code,
+            'p50_ms': round(statistics.median(tiempos) * 1000, 2),
+            'p95_ms': round(_percentil(tiempos, 0.95) * 1000, 2),
+            'consultas': registro.total,
+            'repetidas': len(registro.repetidas(configuracion()['UMBRAL_N_MAS_1'])),
+            'memoria_pico_kb': round(pico / 1024, 1),
+        }
+
+    def _pedir(self, cliente_http, ruta):
+        respuesta = cliente_http.get(ruta)
+        if respuesta.streaming:
+            for _ in respuesta.streaming_content:
+                pass
+        return respuesta
+
+    def _comparar(self, base, informe, tolerancia):
+        """
+        Returns:
+            list: descripción de cada regresión respecto al informe base.
+        """
+        regresiones = []
+        for escala, mediciones in informe['resultados'].items():
+            anteriores = base.get('resultados', {}).get(escala)
+            if anteriores is None:
+                self.stdout.write(f'La escala {escala} no está en el informe base: no se compara.')
+                continue
+            for clave, actual in mediciones.items():
+                anterior = anteriores.get(clave)
+                if anterior is None:
+                    continue
+                motivos = []
+                if actual['estado'] != anterior['estado']:
+                    motivos.append(f'estado {anterior["estado"]} -> {actual["estado"]}')
+                if actual['consultas'] > anterior['consultas']:
+                    motivos.append(f'consultas {anterior["consultas"]} -> {actual["consultas"]}')
+                if (actual['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia)
+                        and actual['p95_ms'] - anterior['p95_ms'] > MINIMO_MS):
+                    motivos.append(f'p95 {anterior["p95_ms"]:.1f} -> {actual["p95_ms"]:.1f} ms')
+                if (actual['memoria_pico_kb'] > anterior['memoria_pico_kb'] * (1 + tolerancia)
+                        and actual['memoria_pico_kb'] - anterior['memoria_pico_kb'] > MINIMO_KB):
+                    motivos.append(
+                        f'memoria {anterior["memoria_pico_kb"]:.0f} -> {actual["memoria_pico_kb"]:.0f} KB'
+                    )
+                if motivos:
+                    regresiones.append(f'{escala} facturas, {clave}: ' + ', '.join(motivos))
+        return regresiones
@@ -0,0 +1,296 @@
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+from importlib import import_module
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.usuarios.models import Usuario
+
+"""
+Comando: comparar_servidores
+
+Compara con carga real el perfil WSGI (gunicorn con hilos) y el perfil ASGI (uvicorn y las vistas
+async de apps/setup/asincrono.py). Arranca los dos en puertos libres, o mide los indicados con
+--wsgi y --asgi, y durante --duracion segundos lanza a la vez --lentos clientes que envían cada
+petición poco a poco y --rapidos clientes que piden las --rutas sin pausa. Informa de peticiones
+por segundo, latencias, errores y memoria de los rápidos, y de las peticiones lentas completadas.
+
+Ejemplo:
+    python manage.py comparar_servidores ana --lentos 100 --rapidos 10 --duracion 20
+    python manage.py comparar_servidores ana --wsgi http://localhost:8001 --asgi http://localhost:8002
+    wsgi: 1.8 pet/s | p50 5239.5 ms | p95 6879.1 ms | p99 6887.1 ms | errores 0 | lentos 400 | 133.1 MB
+    asgi: 24.7 pet/s | p50 257.7 ms | p95 720.6 ms | p99 1883.6 ms | errores 0 | lentos 319 | 192.0 MB
+"""
+
+RUTAS_POR_DEFECTO = ['dashboard', 'factura_list', 'presupuesto_list', 'cliente_list', 'proyecto_list']
+
+# Segundos que se espera a que un servidor arrancado por el comando acepte conexiones
+ARRANQUE = 30
+
+
+def _percentil(valores, fraccion):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fraccion))]
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb(pid):
+    """
+    Memoria residente del proceso y todos sus descendientes, leída de /proc.
+
+    Returns:
+        float: megabytes, o None si no hay /proc o no se conoce el proceso.
+    """
+    if pid is None or not os.path.isdir('/proc'):
+        return None
+    hijos = {}
+    for entrada in os.listdir('/proc'):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entrada}/stat') as fichero:
+                # El nombre va entre paréntesis y puede tener espacios: el ppid va después
+                ppid = int(fichero.read().rpartition(')')[2].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        hijos.setdefault(ppid, []).append(int(entrada))
+
+    total_kb = 0
+    pendientes = [pid]
+    while pendientes:
+        actual = pendientes.pop()
+        pendientes.extend(hijos.get(actual, []))
+        try:
+            with open(f'/proc/{actual}/status') as fichero:
+                for linea in fichero:
+                    if linea.startswith('VmRSS:'):
+                        total_kb += int(linea.split()[1])
+        except OSError:
+            continue
+    return round(total_kb / 1024, 1)
+
+
+async def _peticion(host, puerto, ruta, cookie, lentitud=0.0):
+    """
+    GET con HTTP/1.1 sobre un socket, enviado de golpe o línea a línea en lentitud segundos.
+
+    Returns:
+        int: el código de respuesta, después de leer la respuesta entera.
+    """
+    lineas = [
+        f'GET {ruta} HTTP/1.1', f'Host: {host}:{puerto}', f'Cookie: {cookie}',
+        'User-Agent: comparar_servidores', 'Accept: text/html', 'Connection: close',
+    ]
+    lector, escritor = await asyncio.open_connection(host, puerto)
+    try:
+        if lentitud:
+            pausa = lentitud / len(lineas)
+            for linea in lineas:
+                escritor.write(f'{linea}\r\n'.encode('latin-1'))
+                await escritor.drain()
+                await asyncio.sleep(pausa)
+            escritor.write(b'\r\n')
+        else:
+            escritor.write(('\r\n'.join(lineas) + '\r\n\r\n').encode('latin-1'))
+        await escritor.drain()
+        estado = await lector.readline()
+        while await lector.read(65536):
+            pass
+        return int(estado.split()[1])
+    finally:
+        escritor.close()
+
+
+class Command(BaseCommand):
+    help = 'Compara con clientes lentos el perfil WSGI (gunicorn) y el ASGI (uvicorn y vistas async).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usuario', help='Usuario con el que se hacen las peticiones.')
+        parser.add_argument('--lentos', type=int, default=100, help='Clientes que envían la petición despacio.')
+        parser.add_argument('--lentitud', type=float, default=5.0, help='Segundos que tarda un cliente lento en enviarla.')
+        parser.add_argument('--rapidos', type=int, default=10, help='Clientes que piden sin pausa.')
+        parser.add_argument('--duracion', type=float, default=20.0, help='Segundos de carga por servidor.')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Segundos tras los que una petición es un error.')
+        parser.add_argument('--trabajadores', type=int, default=2, help='Procesos de cada servidor.')
+        parser.add_argument('--hilos', type=int, default=4, help='Hilos por proceso de gunicorn.')
+        parser.add_argument(
+            '--rutas', nargs='+', default=RUTAS_POR_DEFECTO,
+            help='Nombres de URL (o rutas que empiezan por /) que piden los clientes.'
+        )
+        parser.add_argument('--wsgi', help='URL de un servidor WSGI ya arrancado, en lugar de arrancarlo.')
+        parser.add_argument('--asgi', help='URL de un servidor ASGI ya arrancado, en lugar de arrancarlo.')
+        parser.add_argument('--salida', help='Fichero JSON donde guardar el informe.')
+
+    def handle(self, *args, **options):
+        if options['rapidos'] < 1 or options['duracion'] <= 0:
+            raise CommandError('--rapidos y --duracion deben ser mayores que cero.')
+        try:
+            usuario = Usuario.objects.get(username=options['usuario'])
+        except Usuario.DoesNotExist:
+            raise CommandError(f'No existe el usuario {options["usuario"]}.')
+
+        rutas = [ruta if ruta.startswith('/') else reverse(ruta) for ruta in options['rutas']]
+        sesion = self._crear_sesion(usuario)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={sesion.session_key}'
+
+        informe = {
+            'fecha': timezone.now().isoformat(),
+            'carga': {clave: options[clave] for clave in (
+                'lentos', 'lentitud', 'rapidos', 'duracion', 'trabajadores', 'hilos',
+            )},
+            'rutas': rutas,
+            'resultados': {},
+        }
+        try:
+            for perfil in ('wsgi', 'asgi'):
+                self.stdout.write(f'Midiendo {perfil}...')
+                resultado = self._medir_perfil(perfil, options, rutas, cookie)
+                informe['resultados'][perfil] = resultado
+                self.stdout.write(self._linea(perfil, resultado))
+        finally:
+            sesion.delete()
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(informe, fichero, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Informe guardado en {options["salida"]}')
+
+    def _crear_sesion(self, usuario):
+        """Sesión iniciada del usuario, como la que deja login(), guardada en la base de datos."""
+        sesion = import_module(settings.SESSION_ENGINE).SessionStore()
+        sesion[SESSION_KEY] = usuario._meta.pk.value_to_string(usuario)
+        sesion[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        sesion[HASH_SESSION_KEY] = usuario.get_session_auth_hash()
+        sesion.save()
+        return sesion
+
+    def _medir_perfil(self, perfil, options, rutas, cookie):
+        proceso = None
+        url = options[perfil]
+        if url:
+            partes = urlsplit(url)
+            host, puerto = partes.hostname, partes.port or 80
+        else:
+            host, puerto = '127.0.0.1', _puerto_libre()
+            proceso = self._arrancar(perfil, puerto, options)
+        try:
+            if proceso is not None:
+                self._esperar(proceso, host, puerto)
+            resultado = asyncio.run(self._carga(host, puerto, rutas, cookie, options))
+            resultado['rss_mb'] = _rss_mb(proceso.pid if proceso else None)
+            return resultado
+        finally:
+            if proceso is not None:
+                proceso.send_signal(signal.SIGTERM)
+                try:
+                    proceso.wait(10)
+                except subprocess.TimeoutExpired:
+                    proceso.kill()
+
+    def _arrancar(self, perfil, puerto, options):
+        """Arranca el servidor del perfil con los mismos ajustes que el de docker-compose.yml."""
+        entorno = {**os.environ, 'VISTAS_ASINCRONAS': '1' if perfil == 'asgi' else '0'}
+        if perfil == 'wsgi':
+            orden = [
+                sys.executable, '-m', 'gunicorn', 'invoicerpg.wsgi:application',
+                '--bind', f'127.0.0.1:{puerto}', '--workers', str(options['trabajadores']),
+                '--worker-class', 'gthread', '--threads', str(options['hilos']), '--log-level', 'warning',
+            ]
+        else:
+            orden = [
+                sys.executable, '-m', 'uvicorn', 'invoicerpg.asgi:application',
+                '--host', '127.0.0.1', '--port', str(puerto), '--workers', str(options['trabajadores']),
+                '--log-level', 'warning', '--no-access-log',
+            ]
+        try:
+            return subprocess.Popen(orden, cwd=settings.BASE_DIR, env=entorno)
+        except OSError as e:
+            raise CommandError(f'No se puede arrancar el servidor {perfil}: {e}')
+
+    def _esperar(self, proceso, host, puerto):
+        limite = time.monotonic() + ARRANQUE
+        while time.monotonic() < limite:
+            if proceso.poll() is not None:
+                raise CommandError(
+                    f'El servidor ha terminado al arrancar (código {proceso.returncode}). '
+                    '¿Están instalados gunicorn y uvicorn (requirements.txt)?'
+                )
+            try:
+                with socket.create_connection((host, puerto), timeout=1):
+                    return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'El servidor no acepta conexiones en {host}:{puerto} tras {ARRANQUE}s.')
+
+    async def _carga(self, host, puerto, rutas, cookie, options):
+        for ruta in rutas:
+            estado = await asyncio.wait_for(_peticion(host, puerto, ruta, cookie), options['timeout'])
+            if estado != 200:
+                raise CommandError(f'{ruta} responde {estado} antes de empezar: ¿el usuario puede verla?')
+
+        bucle = asyncio.get_running_loop()
+        fin = bucle.time() + options['duracion']
+        latencias = []
+        contadores = {'errores': 0, 'lentos_completados': 0}
+
+        async def cliente(numero, lentitud):
+            siguiente = numero
+            while bucle.time() < fin:
+                ruta = rutas[siguiente % len(rutas)]
+                siguiente += 1
+                inicio = time.perf_counter()
+                try:
+                    estado = await asyncio.wait_for(
+                        _peticion(host, puerto, ruta, cookie, lentitud), options['timeout'] + lentitud
+                    )
+                except (OSError, ValueError, IndexError, asyncio.TimeoutError):
+                    estado = None
+                if estado != 200:
+                    contadores['errores'] += 1
+                elif lentitud:
+                    contadores['lentos_completados'] += 1
+                else:
+                    latencias.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        await asyncio.gather(
+            *(cliente(numero, options['lentitud']) for numero in range(options['lentos'])),
+            *(cliente(numero, 0.0) for numero in range(options['rapidos'])),
+        )
+        duracion = time.perf_counter() - inicio
+
+        resultado = {
+            'peticiones': len(latencias),
+            'por_segundo': round(len(latencias) / duracion, 1),
+            **contadores,
+        }
+        for nombre, fraccion in (('p50_ms', 0.5), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            resultado[nombre] = round(_percentil(latencias, fraccion) * 1000, 1) if latencias else None
+        return resultado
+
+    def _linea(self, perfil, resultado):
+        def ms(valor):
+            return '-' if valor is None else f'{valor} ms'
+
+        memoria = f' | {resultado["rss_mb"]} MB' if resultado['rss_mb'] is not None else ''
+        return (
+            f'{perfil}: {resultado["por_segundo"]} pet/s | p50 {ms(resultado["p50_ms"])} | '
+            f'p95 {ms(resultado["p95_ms"])} | p99 {ms(resultado["p99_ms"])} | '
+            f'errores {resultado["errores"]} | lentos {resultado["lentos_completados"]}{memoria}'
+        )
@@ -0,0 +1,154 @@
+import re
+from datetime import timedelta
+
+from django.contrib.postgres.search import SearchQuery
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from apps.clientes.models import Cliente
+from apps.proyectos.models import Proyecto
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura, Pago, ResumenMensual
+from apps.setup.busqueda import normalizar
+from apps.setup.fechas import filtro_año
+from apps.setup.models import EntradaBusqueda, RegistroAuditoria
+from apps.usuarios.models import Usuario
+
+"""
+Comando: comprobar_indices
+
+Lanza EXPLAIN sobre las consultas más frecuentes de las vistas y falla si alguna recorre una
+tabla entera (Seq Scan en PostgreSQL, SCAN sin índice en SQLite). En PostgreSQL se hace con
+SET LOCAL enable_seqscan = off, para que con pocas filas no elija el Seq Scan por ser más barato.
+
+Ejemplo (en CI después de migrate):
+    python manage.py comprobar_indices
+    FALLO presupuestos_busqueda: Seq Scan on presupuestos_presupuesto
+"""
+
+# Tablas pequeñas y de configuración que es normal leer enteras
+TABLAS_IGNORADAS = {'auth_group', 'django_content_type', 'setup_secuencia'}
+
+
+def consultas(freelancer_id, cliente_usuario_id):
+    """
+    Returns:
+        list: (nombre, queryset) con las consultas de las vistas que deben ir por índice.
+    """
+    hoy = timezone.now().date()
+    facturas = Factura.objects.filter(presupuesto__proyecto__freelancer_id=freelancer_id)
+    presupuestos = Presupuesto.objects.filter(proyecto__freelancer_id=freelancer_id)
+    return [
+        # FacturaListView, FacturaExportCSVView y exportación ZIP
+        ('facturas_freelancer', facturas.order_by('-fecha_emision', '-id')[:26]),
+        ('facturas_freelancer_estado', facturas.filter(estado='pendiente').order_by('-fecha_emision', '-id')[:26]),
+        ('facturas_cliente', Factura.objects.filter(
+            presupuesto__proyecto__cliente__usuario_cliente_id=cliente_usuario_id
+        ).order_by('-fecha_emision', '-id')[:26]),
+        ('facturas_año', facturas.filter(**filtro_año('fecha_emision', hoy.year))),
+        # ProyectoListView
+        ('proyectos_freelancer_estado', Proyecto.objects.filter(
+            freelancer_id=freelancer_id, estado='activo'
+        ).order_by('-fecha_inicio', '-id')[:26]),
+        ('proyectos_cliente', Proyecto.objects.filter(cliente__usuario_cliente_id=cliente_usuario_id)),
+        # PresupuestoListView
+        ('presupuestos_freelancer', presupuestos.order_by('-fecha', '-id')[:26]),
+        # ClienteListView y selector del dashboard
+        ('clientes_freelancer', Cliente.objects.filter(freelancer_id=freelancer_id).order_by('nombre', 'id')[:26]),
+        ('clientes_activos', Cliente.objects.filter(freelancer_id=freelancer_id, estado=True).order_by('nombre')),
+        # Dashboard
+        ('dashboard_resumen', ResumenMensual.objects.filter(
+            freelancer_id=freelancer_id, año=hoy.year
+        ).values('estado').annotate(total=Sum('pendiente'))),
+        ('ranking_clientes', ResumenMensual.objects.filter(freelancer_id=freelancer_id).exclude(
+            estado='anulada'
+        ).values('cliente_id').annotate(total=Sum('facturado')).order_by('-total')[:5]),
+        ('presupuestos_caducados', presupuestos.filter(validez__lt=hoy, estado__in=['borrador', 'enviado'])),
+        # actualizar_vencimientos
+        ('vencimientos_facturas', Factura.objects.filter(
+            fecha_vencimiento__lt=hoy, estado__in=['pendiente', 'parcial']
+        ).order_by('pk').values('pk')[:5000]),
+        ('vencimientos_presupuestos', Presupuesto.objects.filter(
+            validez__lt=hoy, estado__in=['borrador', 'enviado']
+        ).order_by('pk').values('pk')[:5000]),
+        # Buscador global (apps/setup/busqueda.py): en PostgreSQL van por los índices GIN de la
+        # migración 0004; en SQLite LIKE '%...%' no puede usar índices y no se comprueba
+        *([
+            ('busqueda_texto_completo', EntradaBusqueda.objects.filter(
+                freelancer_id=freelancer_id, vector=SearchQuery('diseno', config='spanish')
+            )),
+            ('busqueda_trigramas', EntradaBusqueda.objects.filter(
+                freelancer_id=freelancer_id, texto__contains=normalizar('2026-01')
+            )),
+        ] if connection.vendor == 'postgresql' else []),
+        ('busqueda_freelancer_tipo', EntradaBusqueda.objects.filter(
+            freelancer_id=freelancer_id, tipo='cliente'
+        ).order_by('-fecha')[:20]),
+        # Consultas de la auditoría (apps/setup/auditoria.py)
+        ('auditoria_usuario', RegistroAuditoria.objects.filter(
+            usuario_id=freelancer_id, fecha__gte=timezone.now() - timedelta(days=30)
+        ).order_by('-fecha')),
+        ('auditoria_accion', RegistroAuditoria.objects.filter(
+            accion='convertir', fecha__range=(timezone.now() - timedelta(days=1), timezone.now())
+        )),
+        # Detalle de factura con sus pagos
+        ('pagos_factura', Pago.objects.filter(factura_id=0)),
+    ]
+
+
+def recorridos_completos(plan):
+    """
+    Returns:
+        list: tablas que el plan recorre enteras.
+    """
+    if connection.vendor == 'postgresql':
+        tablas = re.findall(r'Seq Scan on (\w+)', plan)
+    else:
+        # SQLite: "SCAN tabla" sin "USING ... INDEX" es un recorrido completo
+        tablas = re.findall(r'\bSCAN (\w+)(?!.*USING)', plan)
+    return [tabla for tabla in tablas if tabla not in TABLAS_IGNORADAS]
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta EXPLAIN sobre las consultas frecuentes y falla si alguna recorre una tabla entera.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--freelancer', help='Usuario freelancer para construir las consultas.')
+        parser.add_argument('--cliente', help='Usuario cliente para construir las consultas.')
+
+    def handle(self, *args, **options):
+        freelancer_id = self._usuario(options['freelancer'], 'FREELANCER')
+        cliente_usuario_id = self._usuario(options['cliente'], 'CLIENTE')
+
+        fallos = []
+        for nombre, queryset in consultas(freelancer_id, cliente_usuario_id):
+            plan = self._explicar(queryset)
+            tablas = recorridos_completos(plan)
+            if tablas:
+                fallos.append(nombre)
+                self.stdout.write(self.style.ERROR(f"FALLO {nombre}: recorre entera {', '.join(tablas)}"))
+            else:
+                self.stdout.write(f'OK   {nombre}')
+            if options['verbosity'] > 1 or tablas:
+                self.stdout.write(f'{plan}\n')
+
+        if fallos:
+            raise CommandError(f'{len(fallos)} consultas sin índice: {", ".join(fallos)}')
+        self.stdout.write(self.style.SUCCESS('Todas las consultas usan índices.'))
+
+    def _usuario(self, username, grupo):
+        usuarios = Usuario.objects.all()
+        if username:
+            usuarios = usuarios.filter(username=username)
+        else:
+            usuarios = usuarios.filter(groups__name=grupo)
+        return usuarios.order_by('pk').values_list('pk', flat=True).first() or 0
+
+    def _explicar(self, queryset):
+        with transaction.atomic():
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return queryset.explain()
@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.usuarios.models import Usuario
+from apps.setup.generador import borrar_datos, generar
+
+"""
+Comando: generar_datos
+
+Crea datos de prueba con apps/setup/generador.py. Los usuarios son <prefijo>_0, <prefijo>_1...
+(los de los clientes <prefijo>_0_cliente_0...) con el prefijo como contraseña, y --borrar los
+elimina. Solo en bases de datos de desarrollo.
+
+Ejemplo:
+    python manage.py generar_datos --prefijo demo --freelancers 5 --facturas 200000 --semilla 1
+"""
+
+
+class Command(BaseCommand):
+    help = 'Crea (o borra) datos de prueba con distribuciones realistas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefijo', default='demo', help='Prefijo de los usuarios creados.')
+        parser.add_argument('--freelancers', type=int, default=3, help='Número de freelancers.')
+        parser.add_argument('--clientes', type=int, default=50, help='Clientes de cada freelancer.')
+        parser.add_argument('--facturas', type=int, default=10_000, help='Facturas en total.')
+        parser.add_argument(
+            '--presupuestos-extra', type=float, default=0.3,
+            help='Presupuestos sin factura por cada factura.'
+        )
+        parser.add_argument(
+            '--usuarios-cliente', type=int, default=1, help='Clientes de cada freelancer con cuenta de usuario.'
+        )
+        parser.add_argument('--sin-pagos', action='store_true', help='No crear pagos.')
+        parser.add_argument('--semilla', type=int, default=0, help='Semilla del generador aleatorio.')
+        parser.add_argument('--borrar', action='store_true', help='Borrar los datos de este prefijo.')
+
+    def handle(self, *args, **options):
+        prefijo = options['prefijo']
+        if options['borrar']:
+            freelancers = list(Usuario.objects.filter(
+                username__startswith=f'{prefijo}_', perfil__tipo_cuenta='freelancer'
+            ))
+            borrar_datos(freelancers)
+            self.stdout.write(f'Borrados {len(freelancers)} freelancers con el prefijo {prefijo}_')
+            return
+
+        if options['freelancers'] < 1 or options['clientes'] < 1 or options['facturas'] < 0:
+            raise CommandError('--freelancers y --clientes deben ser mayores que cero.')
+
+        inicio = time.perf_counter()
+        try:
+            freelancers = generar(
+                prefijo, freelancers=options['freelancers'], clientes=options['clientes'],
+                facturas=options['facturas'], pagos=not options['sin_pagos'],
+                presupuestos_extra=options['presupuestos_extra'],
+                usuarios_cliente=options['usuarios_cliente'], semilla=options['semilla'],
+                progreso=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(freelancers)} freelancers y {options["facturas"]} facturas creados en '
+            f'{time.perf_counter() - inicio:.1f}s (contraseña: {prefijo})'
+        ))
@@ -0,0 +1,255 @@
+import json
+import platform
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+"""
+Comando: perfil_importaciones
+
+Mide el arranque en frío de cada perfil de PERFILES (web: un worker listo para la primera
+petición; pdf: un proceso del pool de trabajos_pdf.py) con un intérprete nuevo y -X importtime.
+Informa de la ejecución mediana de --repeticiones: tiempo de arranque, RSS, tiempo por paquete y
+los --top módulos más lentos. Con --base falla si un perfil empeora más de --tolerancia respecto
+al informe indicado o importa un paquete nuevo que cuesta más de MINIMO_MS, así que sirve en CI.
+
+Ejemplo:
+    python manage.py perfil_importaciones --salida arranque.json
+    python manage.py perfil_importaciones --perfiles web --base arranque.json
+    web: arranque 0.62s | importación 431.8 ms en 1032 módulos | RSS 71.4 MB
+"""
+
+VERSION_INFORME = 1
+
+_WEB = '''
+from invoicerpg.wsgi import application
+from django.urls import get_resolver
+get_resolver().url_patterns
+'''
+
+_PDF = '''
+from apps.facturas import render_pdf
+# precargar() no lanza excepciones: sin WeasyPrint el perfil debe fallar, no medir un proceso vacío
+import weasyprint
+render_pdf.precargar()
+'''
+
+# Se añade al final de cada perfil: imprime en stdout el RSS en KB del proceso ya cargado
+_MEMORIA = '''
+import sys
+rss_kb = None
+try:
+    with open('/proc/self/status') as fichero:
+        for linea in fichero:
+            if linea.startswith('VmRSS:'):
+                rss_kb = int(linea.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss_kb //= 1024
+print(rss_kb)
+'''
+
+PERFILES = {'web': _WEB, 'pdf': _PDF}
+
+# 'import time:    1234 |      5678 |   django.urls': tiempo propio, acumulado (µs), sangría, módulo
+_LINEA = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)')
+
+MINIMO_MS = 20
+MINIMO_MB = 5
+
+
+def analizar_importtime(texto):
+    """
+    Lee la salida de python -X importtime.
+
+    Args:
+        texto (str): lo que el intérprete ha escrito en stderr.
+
+    Returns:
+        list: (módulo, tiempo propio en µs, tiempo acumulado en µs, nivel de anidamiento) por cada
+        módulo importado, en el orden en que terminó de importarse. Las demás líneas se ignoran.
+    """
+    modulos = []
+    for linea in texto.splitlines():
+        coincidencia = _LINEA.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, modulo = coincidencia.groups()
+            modulos.append((modulo, int(propio), int(acumulado), (len(sangria) - 1) // 2))
+    return modulos
+
+
+def resumir(modulos, top):
+    """
+    Args:
+        modulos (list): lo que devuelve analizar_importtime().
+        top (int): número de módulos que se listan.
+
+    Returns:
+        dict: importacion_ms, modulos, paquetes (ms por paquete de primer nivel, de más a menos),
+        lentos (los top módulos por tiempo propio) y aplicacion (tiempo acumulado de los top
+        módulos de apps e invoicerpg).
+    """
+    paquetes = defaultdict(int)
+    for modulo, propio, _, _ in modulos:
+        paquetes[modulo.split('.')[0]] += propio
+    lentos = sorted(modulos, key=lambda m: m[1], reverse=True)[:top]
+    aplicacion = sorted(
+        (m for m in modulos if m[0].split('.')[0] in ('apps', 'invoicerpg')), key=lambda m: m[2], reverse=True
+    )[:top]
+    return {
+        'importacion_ms': sum(m[1] for m in modulos) / 1000,
+        'modulos': len(modulos),
+        'paquetes': {
+            paquete: propio / 1000
+            for paquete, propio in sorted(paquetes.items(), key=lambda par: par[1], reverse=True)
+        },
+        'lentos': [
+            {'modulo': modulo, 'propio_ms': propio / 1000, 'acumulado_ms': acumulado / 1000}
+            for modulo, propio, acumulado, _ in lentos
+        ],
+        'aplicacion': {modulo: acumulado / 1000 for modulo, _, acumulado, _ in aplicacion},
+    }
+
+
+class Command(BaseCommand):
+    help = 'Mide el tiempo de importación y la memoria en frío de los procesos web y de PDF.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--perfiles', nargs='+', choices=sorted(PERFILES), default=['web', 'pdf'],
+            help='Procesos que se miden (por defecto web y pdf).'
+        )
+        parser.add_argument(
+            '--repeticiones', type=int, default=5, help='Arranques por perfil; se toma el mediano.'
+        )
+        parser.add_argument('--top', type=int, default=15, help='Módulos que se muestran en cada lista.')
+        parser.add_argument('--salida', help='Fichero JSON donde guardar el informe.')
+        parser.add_argument('--base', help='Informe JSON anterior con el que comparar.')
+        parser.add_argument(
+            '--tolerancia', type=float, default=0.2,
+            help='Empeoramiento de arranque y memoria admitido respecto a la base (0.2 = 20%%).'
+        )
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1 or options['top'] < 1:
+            raise CommandError('--repeticiones y --top deben ser mayores que cero.')
+        base = None
+        if options['base']:
+            try:
+                with open(options['base'], encoding='utf-8') as fichero:
+                    base = json.load(fichero)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'No se puede leer el informe base: {e}')
+
+        informe = {
+            'version': VERSION_INFORME,
+            'fecha': timezone.now().isoformat(),
+            'entorno': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'repeticiones': options['repeticiones'],
+            },
+            'perfiles': {},
+        }
+        for perfil in options['perfiles']:
+            resultado = self._medir(perfil, options['repeticiones'], options['top'])
+            informe['perfiles'][perfil] = resultado
+            self._mostrar(perfil, resultado)
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as fichero:
+                json.dump(informe, fichero, indent=2, ensure_ascii=False)
+            self.stdout.write(f'Informe guardado en {options["salida"]}')
+
+        if base is not None:
+            regresiones = self._comparar(base, informe, options['tolerancia'])
+            if regresiones:
+                raise CommandError(f'{len(regresiones)} regresiones:\n  ' + '\n  '.join(regresiones))
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto al informe base.'))
+
+    def _medir(self, perfil, repeticiones, top):
+        """
+        Returns:
+            dict: resumen de la ejecución mediana (ver resumir()) con arranque_s, rss_mb y los
+            arranques de todas las repeticiones.
+        """
+        ejecuciones = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            try:
+                proceso = subprocess.run(
+                    [sys.executable, '-X', 'importtime', '-c', PERFILES[perfil] + _MEMORIA],
+                    cwd=settings.BASE_DIR, capture_output=True, text=True, timeout=120,
+                )
+            except subprocess.TimeoutExpired:
+                raise CommandError(f'El perfil {perfil} no ha terminado en 120 s.')
+            arranque = time.perf_counter() - inicio
+            if proceso.returncode != 0:
+                error = [linea for linea in proceso.stderr.splitlines() if not _LINEA.match(linea)]
+                raise CommandError(f'El perfil {perfil} ha fallado:\n' + '\n'.join(error[-15:]))
+            rss_kb = proceso.stdout.strip().splitlines()[-1]
+            rss_kb = int(rss_kb) if rss_kb != 'None' else None
+            ejecuciones.append((arranque, rss_kb, proceso.stderr))
+
+        ejecuciones.sort(key=lambda ejecucion: ejecucion[0])
+        arranque, rss_kb, salida = ejecuciones[len(ejecuciones) // 2]
+        return {
+            'arranque_s': arranque,
+            'arranques_s': [ejecucion[0] for ejecucion in ejecuciones],
+            'rss_mb': rss_kb / 1024 if rss_kb is not None else None,
+            **resumir(analizar_importtime(salida), top),
+        }
+
+    def _mostrar(self, perfil, resultado):
+        rss = f'{resultado["rss_mb"]:.1f} MB' if resultado['rss_mb'] is not None else '-'
+        self.stdout.write(self.style.SUCCESS(
+            f'{perfil}: arranque {resultado["arranque_s"]:.2f}s | importación '
+            f'{resultado["importacion_ms"]:.1f} ms en {resultado["modulos"]} módulos | RSS {rss}'
+        ))
+        self.stdout.write('  Paquetes (tiempo propio):')
+        for paquete, ms in list(resultado['paquetes'].items())[:len(resultado['lentos'])]:
+            self.stdout.write(f'    {paquete:<40} {ms:8.1f} ms')
+        self.stdout.write('  Módulos más lentos (propio / acumulado):')
+        for modulo in resultado['lentos']:
+            self.stdout.write(
+                f'    {modulo["modulo"]:<40} {modulo["propio_ms"]:8.1f} / {modulo["acumulado_ms"]:8.1f} ms'
+            )
+        if resultado['aplicacion']:
+            self.stdout.write('  Módulos de la aplicación (acumulado):')
+            for modulo, ms in resultado['aplicacion'].items():
+                self.stdout.write(f'    {modulo:<40} {ms:8.1f} ms')
+
+    def _comparar(self, base, informe, tolerancia):
+        """
+        Returns:
+            list: descripción de cada regresión respecto al informe base.
+        """
+        regresiones = []
+        for perfil, actual in informe['perfiles'].items():
+            anterior = base.get('perfiles', {}).get(perfil)
+            if anterior is None:
+                self.stdout.write(f'El perfil {perfil} no está en el informe base: no se compara.')
+                continue
+            motivos = []
+            if (actual['arranque_s'] > anterior['arranque_s'] * (1 + tolerancia)
+                    and (actual['arranque_s'] - anterior['arranque_s']) * 1000 > MINIMO_MS):
+                motivos.append(f'arranque {anterior["arranque_s"]:.2f} -> {actual["arranque_s"]:.2f} s')
+            if (actual['rss_mb'] is not None and anterior['rss_mb'] is not None
+                    and actual['rss_mb'] > anterior['rss_mb'] * (1 + tolerancia)
+                    and actual['rss_mb'] - anterior['rss_mb'] > MINIMO_MB):
+                motivos.append(f'RSS {anterior["rss_mb"]:.1f} -> {actual["rss_mb"]:.1f} MB')
+            for paquete, ms in actual['paquetes'].items():
+                if paquete not in anterior['paquetes'] and ms > MINIMO_MS:
+                    motivos.append(f'importa {paquete} ({ms:.1f} ms)')
+            if motivos:
+                regresiones.append(f'{perfil}: ' + ', '.join(motivos))
+        return regresiones
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.usuarios.models import Usuario
+from apps.setup.busqueda import reconstruir_busqueda
+
+"""
+Comando: reconstruir_busqueda
+
+Vuelve a crear las entradas del buscador global por lotes de BUSQUEDA['LOTE'], tras cargar datos
+con bulk_create o .update() (que no lanzan señales) o al cambiar BUSQUEDA['IDIOMA'].
+
+Ejemplo:
+    python manage.py reconstruir_busqueda --freelancer ana
+    Entradas: 12.403 en 3.10s
+"""
+
+
+class Command(BaseCommand):
+    help = 'Vuelve a crear las entradas del buscador global.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--freelancer', action='append', help='Solo este freelancer (se puede repetir).')
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+        if options['freelancer']:
+            freelancers = list(Usuario.objects.filter(
+                username__in=options['freelancer']
+            ).values_list('pk', flat=True))
+            if len(freelancers) != len(set(options['freelancer'])):
+                raise CommandError('Alguno de los freelancers indicados no existe.')
+            entradas = sum(reconstruir_busqueda(pk) for pk in freelancers)
+        else:
+            entradas = reconstruir_busqueda()
+
+        self.stdout.write(f'Entradas: {entradas} en {time.perf_counter() - inicio:.2f}s')
@@ -1,77 +1,192 @@
 import logging
+import random
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.utils import timezone
 
+from .rendimiento import RegistroConsultas, cabecera_server_timing, configuracion, obtener_resumen
+
 """
 Middleware personalizado: AuditoriaMiddleware
 
 Problema que resuelve:
     Registrar automáticamente los accesos a rutas sensibles del sistema
-    (convertir presupuesto a factura, registrar pago, cambiar estado de factura)
+    (convertir presupuestos a factura, registrar pagos, editar facturas)
     para que quede trazabilidad de quién hizo qué y cuándo.
 
 Rutas que afecta:
-    - /presupuestos/<id>/convertir/   → conversión de presupuesto a factura
-    - /facturas/<id>/registrar-pago/  → registro de un pago en una factura
-    - /facturas/<id>/estado/          → cambio de estado de una factura
+    Las de RUTAS_SENSIBLES, por el nombre de la URL resuelta.
 
 Comportamiento esperado:
     - Si un usuario autenticado accede a /presupuestos/5/convertir/ mediante POST,
-      el middleware registra en el log: quién, qué ruta, qué método y a qué hora.
+      el middleware registra quién, qué ruta, qué método, a qué hora y qué respondió la vista.
     - Si un usuario no autenticado intenta acceder, se registra como 'anonimo'.
     - Las rutas no sensibles no generan ningún registro, el middleware las ignora.
+    - El registro va al logger 'auditoria', que lo guarda en RegistroAuditoria sin hacer
+      esperar a la petición (apps/setup/auditoria.py).
 
 Ejemplo de log generado:
-    [AUDITORIA] 2026-02-25 10:32:11 | usuario: admin | POST /presupuestos/5/convertir/
-    [AUDITORIA] 2026-02-25 11:05:44 | usuario: admin | POST /facturas/3/registrar-pago/
+    [AUDITORIA] 2026-02-25 10:32:11 | usuario: admin | POST /presupuestos/5/convertir/ | 302
 """
 
-# Logger propio para la auditoría, se puede redirigir a fichero en settings si se desea
+# Logger propio para la auditoría, se configura en settings.LOGGING
 logger = logging.getLogger('auditoria')
 
-# Rutas sensibles que deben auditarse
-RUTAS_SENSIBLES = [
-    '/convertir/',
-    '/registrar-pago/',
-    '/estado/',
-]
+# Nombre de la URL sensible: acción con la que se guarda (RegistroAuditoria.ACCIONES)
+RUTAS_SENSIBLES = {
+    'presupuesto_convertir': 'convertir',
+    'presupuesto_convertir_lote': 'convertir',
+    'factura_register_payment': 'registrar_pago',
+    'factura_edit': 'editar_factura',
+    'facturas_importar_extracto': 'registrar_pago',
+}
 
 
 class AuditoriaMiddleware:
     """
     Middleware de auditoría que registra los accesos a rutas sensibles.
 
-    Se ejecuta en cada petición y comprueba si la ruta actual coincide
-    con alguna de las rutas sensibles definidas. Si coincide, registra
-    en el log el usuario, la ruta, el método HTTP y la fecha y hora.
+    Se ejecuta en cada petición y, cuando la vista ha respondido, comprueba si el
+    nombre de la URL resuelta es una de las rutas sensibles. Si lo es, registra
+    el usuario, la ruta, el método HTTP, la fecha y hora y el código de respuesta.
+
+    Admite peticiones síncronas (WSGI) y asíncronas (ASGI): con ASGI, un middleware solo
+    síncrono obligaría a Django a ejecutar en un hilo toda la pila que va detrás, incluidas
+    las vistas async de apps/setup/asincrono.py.
     """
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         """
         Se ejecuta una sola vez al arrancar el servidor.
-        Recibe get_response, que es el siguiente middleware o la vista final.
+        Recibe get_response, que es el siguiente middleware o la vista final,
+        y que con ASGI es una corrutina.
         """
         self.get_response = get_response
+        self.asincrono = iscoroutinefunction(get_response)
+        if self.asincrono:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
         """
         Se ejecuta en cada petición HTTP.
 
-        Comprueba si la ruta actual es sensible y, si lo es,
-        registra el acceso antes de pasar la petición al siguiente middleware.
+        Pasa la petición al siguiente middleware y, si la ruta era sensible,
+        registra el acceso. El registro solo se encola: no espera a escribirlo.
         """
-        # Comprobamos si la ruta actual contiene alguna de las rutas sensibles
-        es_ruta_sensible = any(ruta in request.path for ruta in RUTAS_SENSIBLES)
-
-        if es_ruta_sensible:
-            # Obtenemos el nombre del usuario o 'anonimo' si no está autenticado
-            usuario = request.user.username if request.user.is_authenticated else 'anonimo'
-            ahora = timezone.now().strftime('%Y-%m-%d %H:%M:%S')
+        if self.asincrono:
+            return self.__acall__(request)
 
-            logger.warning(
-                f'[AUDITORIA] {ahora} | usuario: {usuario} | {request.method} {request.path}'
-            )
+        ahora = timezone.now()
 
         # Pasamos la petición al siguiente middleware o a la vista
         response = self.get_response(request)
 
-        return response
\ No newline at end of file
+        accion = self._accion(request)
+        if accion:
+            self._registrar(request, request.user, response, ahora, accion)
+        return response
+
+    async def __acall__(self, request):
+        """__call__() con ASGI: el usuario se lee con request.auser(), sin bloquear el bucle."""
+        ahora = timezone.now()
+        response = await self.get_response(request)
+
+        accion = self._accion(request)
+        if accion:
+            self._registrar(request, await request.auser(), response, ahora, accion)
+        return response
+
+    def _accion(self, request):
+        """Acción de RUTAS_SENSIBLES de la URL resuelta, o None si no es sensible."""
+        # resolver_match es None si la ruta no existe (404)
+        resolver_match = getattr(request, 'resolver_match', None)
+        return RUTAS_SENSIBLES.get(resolver_match.url_name) if resolver_match else None
+
+    def _registrar(self, request, user, response, ahora, accion):
+        # Obtenemos el usuario o 'anonimo' si no está autenticado
+        autenticado = user.is_authenticated
+        usuario = user.username if autenticado else 'anonimo'
+
+        logger.warning(
+            f'[AUDITORIA] {ahora:%Y-%m-%d %H:%M:%S} | usuario: {usuario} | '
+            f'{request.method} {request.path} | {response.status_code}',
+            extra={'auditoria': {
+                'usuario_id': user.pk if autenticado else None,
+                'nombre_usuario': usuario,
+                'accion': accion,
+                'metodo': request.method,
+                'ruta': request.path[:255],
+                'codigo_respuesta': response.status_code,
+                'fecha': ahora,
+            }},
+        )
+
+
+"""
+Middleware personalizado: RendimientoMiddleware
+
+Solo se instala con RENDIMIENTO['ACTIVO']. Mide cada petición (o la fracción MUESTREO) con
+RegistroConsultas (apps/setup/rendimiento.py), añade la cabecera Server-Timing y guarda la
+medición en el resumen por nombre de URL que el personal ve en /rendimiento/.
+
+Ejemplo de cabecera:
+    Server-Timing: total;dur=48.1, db;dur=12.7;desc="14 consultas", n1;desc="1 SQL repetidos"
+"""
+
+
+class RendimientoMiddleware:
+    """
+    Middleware opcional que mide consultas y tiempos de cada petición.
+
+    Va el primero de MIDDLEWARE para que la duración incluya al resto de middlewares.
+    Es solo síncrono: con ASGI y el middleware activo, Django ejecuta toda la petición en un
+    hilo, así que mide bien pero sin las ventajas del perfil ASGI (apps/setup/asincrono.py).
+    """
+
+    def __init__(self, get_response):
+        """
+        Se ejecuta una sola vez al arrancar el servidor.
+        Lee la configuración y lanza MiddlewareNotUsed si no está activo.
+        """
+        opciones = configuracion()
+        if not opciones['ACTIVO']:
+            raise MiddlewareNotUsed('RENDIMIENTO["ACTIVO"] es False')
+        self.get_response = get_response
+        self.muestreo = opciones['MUESTREO']
+        self.umbral = opciones['UMBRAL_N_MAS_1']
+        self.lentas = opciones['LENTAS']
+        self.resumen = obtener_resumen()
+
+    def __call__(self, request):
+        """
+        Se ejecuta en cada petición HTTP.
+
+        Instala el registro de consultas, pasa la petición al siguiente middleware
+        y, con la respuesta, añade la cabecera y actualiza el resumen.
+        """
+        if self.muestreo < 1 and random.random() >= self.muestreo:
+            return self.get_response(request)
+
+        registro = RegistroConsultas()
+        inicio = time.perf_counter()
+        with ExitStack() as pila:
+            for conexion in connections.all():
+                pila.enter_context(conexion.execute_wrapper(registro))
+            response = self.get_response(request)
+        # En las respuestas en streaming (exportar CSV y ZIP) solo se mide hasta que empieza el envío
+        duracion = time.perf_counter() - inicio
+
+        response['Server-Timing'] = cabecera_server_timing(duracion, registro, self.umbral)
+
+        # Peticiones que no resuelven ninguna URL (404) se agrupan juntas
+        resolver_match = getattr(request, 'resolver_match', None)
+        url = (resolver_match.view_name if resolver_match else None) or 'sin_resolver'
+        self.resumen.añadir(url, duracion, registro, self.umbral, self.lentas)
+
+        return response
@@ -0,0 +1,57 @@
+# Generated by Django 6.0.2 on 2026-10-18 02:29
+
+from django.db import migrations, models
+
+"""
+Crea la tabla Secuencia y la inicializa con el último número ya usado en cada
+serie y año, para que las nuevas facturas y presupuestos continúen la numeración
+existente en lugar de empezar otra vez por el 001.
+"""
+
+
+def inicializar_secuencias(apps, schema_editor):
+    Secuencia = apps.get_model('setup', 'Secuencia')
+    Factura = apps.get_model('facturas', 'Factura')
+    Presupuesto = apps.get_model('presupuestos', 'Presupuesto')
+
+    ultimos = {}
+    for serie, modelo in (('factura', Factura), ('presupuesto', Presupuesto)):
+        for numero_serie in modelo.objects.values_list('numero_serie', flat=True).iterator():
+            # Formato 'YYYY-NNN'. Se ignora cualquier número que no siga el formato.
+            año, _, numero = numero_serie.partition('-')
+            if not (año.isdigit() and numero.isdigit()):
+                continue
+            clave = (serie, int(año))
+            ultimos[clave] = max(ultimos.get(clave, 0), int(numero))
+
+    Secuencia.objects.bulk_create([
+        Secuencia(serie=serie, ejercicio=ejercicio, ultimo=ultimo)
+        for (serie, ejercicio), ultimo in ultimos.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('setup', '0001_initial'),
+        ('facturas', '0001_initial'),
+        ('presupuestos', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(max_length=20, verbose_name='Serie')),
+                ('ejercicio', models.PositiveIntegerField(verbose_name='Ejercicio')),
+                ('ultimo', models.PositiveIntegerField(default=0, verbose_name='Último número asignado')),
+            ],
+            options={
+                'verbose_name': 'Secuencia',
+                'verbose_name_plural': 'Secuencias',
+                'unique_together': {('serie', 'ejercicio')},
+            },
+        ),
+        migrations.RunPython(inicializar_secuencias, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:10
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clientes', '0003_indices_consultas'),
+        ('setup', '0002_secuencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EntradaBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('cliente', 'Cliente'), ('proyecto', 'Proyecto'), ('presupuesto', 'Presupuesto'), ('factura', 'Factura')], max_length=20, verbose_name='Tipo')),
+                ('objeto_id', models.PositiveBigIntegerField(verbose_name='Id del objeto')),
+                ('titulo', models.CharField(max_length=200, verbose_name='Título')),
+                ('detalle', models.CharField(blank=True, default='', max_length=300, verbose_name='Detalle')),
+                ('texto', models.TextField(verbose_name='Texto normalizado')),
+                ('fecha', models.DateField(blank=True, null=True, verbose_name='Fecha')),
+                ('vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Vector de búsqueda')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entradas_busqueda', related_query_name='entrada_busqueda', to='clientes.cliente', verbose_name='Cliente')),
+                ('freelancer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entradas_busqueda', related_query_name='entrada_busqueda', to=settings.AUTH_USER_MODEL, verbose_name='Freelancer')),
+            ],
+            options={
+                'verbose_name': 'Entrada de búsqueda',
+                'verbose_name_plural': 'Entradas de búsqueda',
+                'indexes': [models.Index(fields=['freelancer', 'tipo', 'fecha'], name='busqueda_freelancer_tipo_idx')],
+                'unique_together': {('tipo', 'objeto_id')},
+            },
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:11
+
+from django.db import migrations
+
+"""
+Índices del buscador (apps/setup/busqueda.py), solo en PostgreSQL: GIN sobre el tsvector y GIN de
+trigramas (pg_trgm) sobre el texto normalizado. No están en el "class Meta" de EntradaBusqueda
+porque no existen en SQLite; en el resto de bases de datos la migración no hace nada.
+
+CREATE EXTENSION necesita ser propietario de la base de datos: si no, hay que crear pg_trgm a mano
+antes de migrar.
+"""
+
+CREAR = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS busqueda_vector_gin ON setup_entradabusqueda USING gin (vector)',
+    'CREATE INDEX IF NOT EXISTS busqueda_texto_trgm ON setup_entradabusqueda USING gin (texto gin_trgm_ops)',
+]
+
+BORRAR = [
+    'DROP INDEX IF EXISTS busqueda_texto_trgm',
+    'DROP INDEX IF EXISTS busqueda_vector_gin',
+]
+
+
+def _ejecutar(sentencias):
+    def ejecutar(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sentencia in sentencias:
+            schema_editor.execute(sentencia)
+    return ejecutar
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('setup', '0003_entradabusqueda'),
+    ]
+
+    operations = [
+        migrations.RunPython(_ejecutar(CREAR), _ejecutar(BORRAR)),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:12
+
+from django.db import migrations
+
+"""
+Rellena EntradaBusqueda con los clientes, proyectos, presupuestos y facturas que ya existen,
+por lotes, con las mismas funciones que usa el buscador (busqueda.entradas_de(), que solo
+lee con values_list() y sirve con los modelos históricos). En PostgreSQL calcula después
+el tsvector de todas las filas con un único UPDATE.
+
+Se hace en una migración aparte de la creación de la tabla para no mezclar inserciones
+y ALTER TABLE en la misma transacción.
+"""
+
+LOTE = 2000
+
+MODELOS = [
+    ('cliente', 'clientes', 'Cliente'),
+    ('proyecto', 'proyectos', 'Proyecto'),
+    ('presupuesto', 'presupuestos', 'Presupuesto'),
+    ('factura', 'facturas', 'Factura'),
+]
+
+
+def rellenar_busqueda(apps, schema_editor):
+    from apps.setup.busqueda import entradas_de, expresion_vector
+
+    EntradaBusqueda = apps.get_model('setup', 'EntradaBusqueda')
+    for tipo, app, nombre in MODELOS:
+        objetos = apps.get_model(app, nombre).objects.order_by('pk')
+        ultimo = 0
+        while True:
+            ids = list(objetos.filter(pk__gt=ultimo).values_list('pk', flat=True)[:LOTE])
+            if not ids:
+                break
+            EntradaBusqueda.objects.bulk_create(
+                EntradaBusqueda(**datos) for datos in entradas_de(tipo, objetos.filter(pk__in=ids))
+            )
+            ultimo = ids[-1]
+
+    if schema_editor.connection.vendor == 'postgresql':
+        EntradaBusqueda.objects.update(vector=expresion_vector())
+
+
+def vaciar_busqueda(apps, schema_editor):
+    apps.get_model('setup', 'EntradaBusqueda').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('setup', '0004_indices_busqueda_postgresql'),
+        ('facturas', '0011_rellenar_resumen_mensual'),
+        ('presupuestos', '0003_indices_consultas'),
+        ('proyectos', '0003_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.RunPython(rellenar_busqueda, vaciar_busqueda),
+    ]
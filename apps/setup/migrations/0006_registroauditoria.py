@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('setup', '0005_rellenar_busqueda'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre_usuario', models.CharField(max_length=150, verbose_name='Nombre de usuario')),
+                ('accion', models.CharField(choices=[('convertir', 'Convertir presupuesto a factura'), ('registrar_pago', 'Registrar pago'), ('editar_factura', 'Editar factura')], max_length=30, verbose_name='Acción')),
+                ('metodo', models.CharField(max_length=10, verbose_name='Método')),
+                ('ruta', models.CharField(max_length=255, verbose_name='Ruta')),
+                ('codigo_respuesta', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Código de respuesta')),
+                ('fecha', models.DateTimeField(verbose_name='Fecha')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='registros_auditoria', related_query_name='registro_auditoria', to=settings.AUTH_USER_MODEL, verbose_name='Usuario')),
+            ],
+            options={
+                'verbose_name': 'Registro de auditoría',
+                'verbose_name_plural': 'Registros de auditoría',
+                'indexes': [models.Index(fields=['usuario', 'fecha'], name='auditoria_usuario_fecha_idx'), models.Index(fields=['accion', 'fecha'], name='auditoria_accion_fecha_idx'), models.Index(fields=['fecha'], name='auditoria_fecha_idx')],
+            },
+        ),
+    ]
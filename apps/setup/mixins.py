@@ -1,4 +1,9 @@
 from django.core.exceptions import PermissionDenied
+from django.db.models import BooleanField, ExpressionWrapper, Q
+from django.http import Http404
+from django.utils.translation import gettext as _
+
+from .roles import es_freelancer, es_cliente
 
 """
 IMPORTANTE:
@@ -7,7 +12,105 @@ las he puesto de cabeza.
 """
 
 
-class FreelancerPropietarioMixin:
+"""
+Cómo se comprueba la propiedad:
+    PropietarioMixinBase pide el objeto una sola vez, anotado con una condición por mixin (por
+    ejemplo presupuesto__proyecto__freelancer=user), y get() de la vista lo reutiliza. El camino
+    hasta el propietario de cada modelo está en RUTAS_PROPIETARIO; una vista puede cambiarlo con
+    ruta_freelancer y ruta_cliente.
+"""
+
+# modelo: (camino hasta el freelancer, camino hasta el usuario del cliente)
+RUTAS_PROPIETARIO = {
+    'clientes.Cliente': ('freelancer', 'usuario_cliente'),
+    'proyectos.Proyecto': ('freelancer', 'cliente__usuario_cliente'),
+    'presupuestos.Presupuesto': ('proyecto__freelancer', 'proyecto__cliente__usuario_cliente'),
+    'facturas.Factura': ('presupuesto__proyecto__freelancer', 'presupuesto__proyecto__cliente__usuario_cliente'),
+    'facturas.Pago': ('factura__presupuesto__proyecto__freelancer', 'factura__presupuesto__proyecto__cliente__usuario_cliente'),
+}
+
+
+class PropietarioMixinBase:
+    """
+    Base de FreelancerPropietarioMixin y ClientePropietarioMixin.
+
+    Cada mixin añade en condiciones_propiedad() una condición (Q) con la que el usuario es
+    propietario del objeto. dispatch() pide el objeto con todas las condiciones anotadas y
+    lanza PermissionDenied si alguna no se cumple.
+    """
+    ruta_freelancer = None
+    ruta_cliente = None
+
+    def condiciones_propiedad(self):
+        """
+        Returns:
+            dict: nombre de la anotación → Q que debe cumplir el objeto.
+        """
+        return {}
+
+    def ruta_propietario(self, posicion):
+        """Devuelve el camino hasta el freelancer (0) o el usuario del cliente (1) del modelo."""
+        return RUTAS_PROPIETARIO.get(self.model._meta.label, (None, None))[posicion]
+
+    def anotar_propiedad(self, queryset):
+        """Añade al queryset una anotación booleana por cada condición de propiedad."""
+        condiciones = self.condiciones_propiedad()
+        if not condiciones:
+            return queryset
+        return queryset.annotate(**{
+            nombre: ExpressionWrapper(condicion, output_field=BooleanField())
+            for nombre, condicion in condiciones.items()
+        })
+
+    def get_object(self, queryset=None):
+        """
+        Devuelve el objeto con las anotaciones de propiedad. Si se llama sin queryset
+        (como hacen get() y post() de las vistas genéricas) se consulta una sola vez.
+        """
+        if queryset is None and getattr(self, '_objeto_propietario', None) is not None:
+            return self._objeto_propietario
+
+        if queryset is None:
+            queryset = self.get_queryset()
+            guardar = True
+        else:
+            guardar = False
+
+        objeto = super().get_object(self.anotar_propiedad(queryset))
+        if guardar:
+            self._objeto_propietario = objeto
+        return objeto
+
+    async def aget_object(self):
+        """
+        get_object() con el ORM asíncrono, para las vistas de apps/setup/asincrono.py. Busca
+        por la pk de la URL, como las vistas de la aplicación, y guarda el objeto para que
+        get_object() no vuelva a consultar.
+        """
+        if getattr(self, '_objeto_propietario', None) is not None:
+            return self._objeto_propietario
+
+        queryset = self.anotar_propiedad(self.get_queryset())
+        try:
+            objeto = await queryset.aget(pk=self.kwargs.get(self.pk_url_kwarg))
+        except queryset.model.DoesNotExist:
+            raise Http404(_('No %(verbose_name)s found matching the query') % {
+                'verbose_name': queryset.model._meta.verbose_name
+            })
+        self._objeto_propietario = objeto
+        return objeto
+
+    def dispatch(self, request, *args, **kwargs):
+        condiciones = self.condiciones_propiedad()
+        if condiciones:
+            # Si no existe, get_object() lanza Http404 igual que lo haría la vista
+            objeto = self.get_object()
+            if not all(getattr(objeto, nombre) for nombre in condiciones):
+                raise PermissionDenied
+        return super().dispatch(request, *args, **kwargs)
+
+
+class FreelancerPropietarioMixin(PropietarioMixinBase):
     """
     Objetivo:
         Garantizar que solo el freelancer propietario puede acceder
@@ -30,34 +133,15 @@ class FreelancerPropietarioMixin:
         - FacturaDetailView
         - FacturaUpdateView
     """
-    def dispatch(self, request, *args, **kwargs):
-        # Evitar llamar a get_object si la view no lo implementa o falla.
-        if not hasattr(self, 'get_object') or not callable(getattr(self, 'get_object')):
-            return super().dispatch(request, *args, **kwargs)
-        try:
-            objeto = self.get_object()
-        except Exception:
-            return super().dispatch(request, *args, **kwargs)
-
-        if request.user.groups.filter(name='FREELANCER').exists():
-            owner = None
-            # distintos modelos exponen la relación con el freelancer de formas
-            # diferentes: algunos tienen 'freelancer' directo, otros via proyecto
-            try:
-                if hasattr(objeto, 'freelancer'):
-                    owner = objeto.freelancer
-                elif hasattr(objeto, 'proyecto') and hasattr(objeto.proyecto, 'freelancer'):
-                    owner = objeto.proyecto.freelancer
-                elif hasattr(objeto, 'presupuesto') and hasattr(objeto.presupuesto, 'proyecto'):
-                    owner = objeto.presupuesto.proyecto.freelancer
-            except Exception:
-                owner = None
-            if owner and owner != request.user:
-                raise PermissionDenied
-        return super().dispatch(request, *args, **kwargs)
+    def condiciones_propiedad(self):
+        condiciones = super().condiciones_propiedad()
+        ruta = self.ruta_freelancer or self.ruta_propietario(0)
+        if ruta and es_freelancer(self.request.user):
+            condiciones['es_freelancer_propietario'] = Q(**{ruta: self.request.user})
+        return condiciones
 
 
-class ClientePropietarioMixin:
+class ClientePropietarioMixin(PropietarioMixinBase):
     """
     Objetivo:
         Garantizar que el cliente solo puede acceder a documentos
@@ -72,32 +156,12 @@ class ClientePropietarioMixin:
         - PresupuestoDetailView
         - FacturaDetailView
     """
-    def dispatch(self, request, *args, **kwargs):
-        # Evitar llamar a get_object si la view no lo implementa o falla.
-        if not hasattr(self, 'get_object') or not callable(getattr(self, 'get_object')):
-            return super().dispatch(request, *args, **kwargs)
-        try:
-            objeto = self.get_object()
-        except Exception:
-            return super().dispatch(request, *args, **kwargs)
-
-        if request.user.groups.filter(name='CLIENTE').exists():
-            owner_user = None
-            try:
-                # si el objeto tiene 'cliente' directo
-                if hasattr(objeto, 'cliente') and hasattr(objeto.cliente, 'usuario_cliente'):
-                    owner_user = objeto.cliente.usuario_cliente
-                # si el objeto tiene 'proyecto' (ej. presupuesto, factura indirecta)
-                elif hasattr(objeto, 'proyecto') and hasattr(objeto.proyecto, 'cliente'):
-                    owner_user = objeto.proyecto.cliente.usuario_cliente
-                # si el objeto tiene 'presupuesto' -> proyecto -> cliente
-                elif hasattr(objeto, 'presupuesto') and hasattr(objeto.presupuesto, 'proyecto'):
-                    owner_user = objeto.presupuesto.proyecto.cliente.usuario_cliente
-            except Exception:
-                owner_user = None
-            if owner_user and owner_user != request.user:
-                raise PermissionDenied
-        return super().dispatch(request, *args, **kwargs)
+    def condiciones_propiedad(self):
+        condiciones = super().condiciones_propiedad()
+        ruta = self.ruta_cliente or self.ruta_propietario(1)
+        if ruta and es_cliente(self.request.user):
+            condiciones['es_cliente_propietario'] = Q(**{ruta: self.request.user})
+        return condiciones
 
 
 """
@@ -1,3 +1,154 @@
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
-# Create your models here.
+"""
+Modelos de infraestructura compartidos por el resto de apps.
+
+Secuencia = un contador por (serie, ejercicio) que sustituye al antiguo
+"count() + 1" de los save() de Factura y Presupuesto.
+
+    serie = un CharField con el nombre de la numeración. Ejemplo: 'factura', 'presupuesto'.
+    ejercicio = un PositiveIntegerField con el año al que pertenece la numeración.
+    ultimo = un PositiveIntegerField con el último número asignado en esa serie y año.
+
+Se añade una restricción en "class Meta" para que solo haya un contador por serie y año.
+Esa restricción es la que usa el INSERT ... ON CONFLICT de apps/setup/secuencias.py.
+"""
+
+
+class Secuencia(models.Model):
+    serie = models.CharField(max_length=20, verbose_name='Serie')
+    ejercicio = models.PositiveIntegerField(verbose_name='Ejercicio')
+    ultimo = models.PositiveIntegerField(default=0, verbose_name='Último número asignado')
+
+    class Meta:
+        unique_together = ('serie', 'ejercicio')
+        verbose_name = 'Secuencia'
+        verbose_name_plural = 'Secuencias'
+
+    def __str__(self):
+        return f"{self.serie} {self.ejercicio} - {self.ultimo}"
+
+
+"""
+EntradaBusqueda = una fila por cliente, proyecto, presupuesto y factura con el texto por el
+que se puede buscar, para que el buscador global (apps/setup/busqueda.py) lea una sola tabla
+en lugar de hacer icontains sobre cuatro.
+
+    tipo = un CharField con el modelo de la fila: cliente, proyecto, presupuesto o factura.
+    objeto_id = un PositiveBigIntegerField con el id del objeto en su tabla.
+    freelancer = una clave foránea al freelancer propietario, para filtrar sus resultados.
+    cliente = una clave foránea al cliente del objeto (el propio cliente en las filas de tipo
+    cliente). Los usuarios cliente ven los resultados de cliente__usuario_cliente.
+    Las dos usan CASCADE: la entrada es un índice, no tiene sentido sin su propietario.
+    titulo y detalle = lo que se muestra en los resultados (número de serie, nombre del proyecto...).
+    texto = todo el texto buscable en minúsculas y sin tildes (busqueda.normalizar()).
+    fecha = la fecha del objeto, para ordenar los resultados cuando no hay ranking.
+    vector = en PostgreSQL, el tsvector de titulo (peso A) y texto (peso B). En el resto de bases
+    de datos se queda a NULL.
+
+Se añade una restricción en "class Meta" para que solo haya una entrada por objeto. Los índices
+GIN sobre vector y de trigramas sobre texto solo existen en PostgreSQL, así que no están en
+"class Meta" sino en la migración 0004_indices_busqueda_postgresql.
+"""
+
+
+class EntradaBusqueda(models.Model):
+    TIPOS = (
+        ('cliente', 'Cliente'),
+        ('proyecto', 'Proyecto'),
+        ('presupuesto', 'Presupuesto'),
+        ('factura', 'Factura'),
+    )
+
+    tipo = models.CharField(max_length=20, choices=TIPOS, verbose_name='Tipo')
+    objeto_id = models.PositiveBigIntegerField(verbose_name='Id del objeto')
+    freelancer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='entradas_busqueda',
+        related_query_name='entrada_busqueda',
+        verbose_name='Freelancer',
+    )
+    cliente = models.ForeignKey(
+        'clientes.Cliente',
+        on_delete=models.CASCADE,
+        related_name='entradas_busqueda',
+        related_query_name='entrada_busqueda',
+        verbose_name='Cliente',
+    )
+    titulo = models.CharField(max_length=200, verbose_name='Título')
+    detalle = models.CharField(max_length=300, blank=True, default='', verbose_name='Detalle')
+    texto = models.TextField(verbose_name='Texto normalizado')
+    fecha = models.DateField(null=True, blank=True, verbose_name='Fecha')
+    vector = SearchVectorField(null=True, editable=False, verbose_name='Vector de búsqueda')
+
+    class Meta:
+        unique_together = ('tipo', 'objeto_id')
+        indexes = [
+            # Resultados de un freelancer por fecha (búsqueda sin ranking y filtro por tipo)
+            models.Index(fields=['freelancer', 'tipo', 'fecha'], name='busqueda_freelancer_tipo_idx'),
+        ]
+        verbose_name = 'Entrada de búsqueda'
+        verbose_name_plural = 'Entradas de búsqueda'
+
+    def __str__(self):
+        return f"{self.tipo} {self.objeto_id} - {self.titulo}"
+
+
+"""
+RegistroAuditoria = un acceso a una vista sensible (convertir un presupuesto, registrar un pago,
+editar una factura). Los crea por lotes el hilo de apps/setup/auditoria.py con lo que registra
+AuditoriaMiddleware (apps/setup/middleware.py).
+
+    usuario = una clave foránea al usuario, nula si era anónimo. SET_NULL: si se borra el usuario
+    el registro se conserva, con su nombre en nombre_usuario.
+    nombre_usuario = el username en el momento del acceso, o 'anonimo'.
+    accion = un CharField con la vista sensible (ver ACCIONES).
+    metodo = el método HTTP (GET, POST...).
+    ruta = la ruta completa, con los ids. Ejemplo: /presupuestos/5/convertir/.
+    codigo_respuesta = el código HTTP que devolvió la vista (302 si se hizo, 403 si no tenía permiso...).
+    fecha = un DateTimeField con el momento de la petición (no el de la inserción, que va por lotes).
+
+En "class Meta" se añaden tres índices para las consultas habituales de la auditoría:
+    - por usuario y rango de fechas: RegistroAuditoria.objects.filter(usuario=u, fecha__gte=...)
+    - por acción y rango de fechas: .filter(accion='convertir', fecha__range=(desde, hasta))
+    - por rango de fechas de todo el sistema (y para borrar los registros antiguos).
+"""
+
+
+class RegistroAuditoria(models.Model):
+    ACCIONES = (
+        ('convertir', 'Convertir presupuesto a factura'),
+        ('registrar_pago', 'Registrar pago'),
+        ('editar_factura', 'Editar factura'),
+    )
+
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='registros_auditoria',
+        related_query_name='registro_auditoria',
+        verbose_name='Usuario',
+    )
+    nombre_usuario = models.CharField(max_length=150, verbose_name='Nombre de usuario')
+    accion = models.CharField(max_length=30, choices=ACCIONES, verbose_name='Acción')
+    metodo = models.CharField(max_length=10, verbose_name='Método')
+    ruta = models.CharField(max_length=255, verbose_name='Ruta')
+    codigo_respuesta = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='Código de respuesta')
+    fecha = models.DateTimeField(verbose_name='Fecha')
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['usuario', 'fecha'], name='auditoria_usuario_fecha_idx'),
+            models.Index(fields=['accion', 'fecha'], name='auditoria_accion_fecha_idx'),
+            models.Index(fields=['fecha'], name='auditoria_fecha_idx'),
+        ]
+        verbose_name = 'Registro de auditoría'
+        verbose_name_plural = 'Registros de auditoría'
+
+    def __str__(self):
+        return f"{self.fecha:%Y-%m-%d %H:%M:%S} {self.nombre_usuario} {self.metodo} {self.ruta}"
@@ -0,0 +1,188 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+"""
+Paginación por cursor (keyset) para los listados.
+
+Cada vista se ordena por una clave con índice acabada en un campo único, por ejemplo
+(fecha_emision, id). ?despues= y ?antes= llevan la clave de la última o la primera fila mostrada
+y la página se pide con WHERE (clave) < (...) LIMIT tamaño + 1: sin COUNT(*) ni OFFSET, igual de
+rápida en cualquier página. Los enlaces conservan el resto de parámetros de la URL.
+"""
+
+
+class PaginaKeyset:
+    """
+    Resultado de paginar(): las filas de la página y las URL (solo la query string)
+    de las páginas vecinas, o None si no hay.
+    """
+
+    def __init__(self, objetos, primera_url, anterior_url, siguiente_url):
+        self.objetos = objetos
+        self.primera_url = primera_url
+        self.anterior_url = anterior_url
+        self.siguiente_url = siguiente_url
+
+    @property
+    def hay_otras_paginas(self):
+        return bool(self.anterior_url or self.siguiente_url)
+
+
+def codificar_cursor(valores):
+    datos = json.dumps(valores, default=str, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(datos).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Returns:
+        list: los valores de la clave, o None si no hay cursor o no es válido
+        (un cursor manipulado lleva a la primera página, nunca a un error).
+    """
+    if not cursor:
+        return None
+    try:
+        datos = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(datos)
+    except (binascii.Error, ValueError):
+        return None
+    return valores if isinstance(valores, list) else None
+
+
+def valores_cursor(queryset, orden, cursor):
+    """
+    Decodifica el cursor y convierte cada valor con to_python() del campo de la clave.
+
+    Returns:
+        list: los valores listos para el filtro, o None si el cursor no es válido: no se puede
+        decodificar, no tiene un valor por campo o alguno no es del tipo del campo.
+    """
+    valores = decodificar_cursor(cursor)
+    if valores is None or len(valores) != len(orden):
+        return None
+    convertidos = []
+    for campo, valor in zip(orden, valores):
+        if not isinstance(valor, (str, int, float)) or isinstance(valor, bool):
+            return None
+        try:
+            convertido = queryset.model._meta.get_field(campo.lstrip('-')).to_python(valor)
+        except (ValidationError, ValueError, TypeError):
+            return None
+        if convertido is None:
+            return None
+        convertidos.append(convertido)
+    return convertidos
+
+
+def condicion_cursor(orden, valores, hacia_delante):
+    """
+    Q de las filas que van detrás (hacia_delante) o delante de la fila con esos valores
+    según el orden dado. Para orden ('-fecha', '-id'):
+        fecha < f OR (fecha = f AND id < i)
+    """
+    condicion = Q()
+    iguales = Q()
+    for campo, valor in zip(orden, valores):
+        descendente = campo.startswith('-')
+        nombre = campo.lstrip('-')
+        operador = 'gt' if hacia_delante != descendente else 'lt'
+        condicion |= iguales & Q(**{f'{nombre}__{operador}': valor})
+        iguales &= Q(**{nombre: valor})
+    return condicion
+
+
+def invertir_orden(orden):
+    return tuple(campo[1:] if campo.startswith('-') else f'-{campo}' for campo in orden)
+
+
+def _preparar(queryset, orden, tamaño, parametros):
+    """
+    Parte de paginar() que no consulta: devuelve el queryset de la página (con una fila de
+    más) y la función que construye la PaginaKeyset con sus filas.
+    """
+    despues = valores_cursor(queryset, orden, parametros.get('despues'))
+    antes = valores_cursor(queryset, orden, parametros.get('antes'))
+    campos = [campo.lstrip('-') for campo in orden]
+    hacia_atras = antes is not None
+
+    if hacia_atras:
+        consulta = queryset.filter(condicion_cursor(orden, antes, False)).order_by(*invertir_orden(orden))
+    else:
+        if despues is not None:
+            queryset = queryset.filter(condicion_cursor(orden, despues, True))
+        consulta = queryset.order_by(*orden)
+
+    def url(**cursor):
+        query = parametros.copy()
+        query.pop('despues', None)
+        query.pop('antes', None)
+        query.update(cursor)
+        return f'?{query.urlencode()}'
+
+    def cursor_de(fila):
+        return codificar_cursor([getattr(fila, campo) for campo in campos])
+
+    def construir(filas):
+        if hacia_atras:
+            hay_anterior = len(filas) > tamaño
+            filas = filas[:tamaño][::-1]
+            hay_siguiente = True
+        else:
+            hay_siguiente = len(filas) > tamaño
+            filas = filas[:tamaño]
+            hay_anterior = despues is not None
+
+        en_primera = despues is None and antes is None
+        return PaginaKeyset(
+            objetos=filas,
+            primera_url=None if en_primera else url(),
+            anterior_url=url(antes=cursor_de(filas[0])) if hay_anterior and filas else None,
+            siguiente_url=url(despues=cursor_de(filas[-1])) if hay_siguiente and filas else None,
+        )
+
+    return consulta[:tamaño + 1], construir
+
+
+def paginar(queryset, orden, tamaño, parametros):
+    """
+    Args:
+        queryset (QuerySet): filas ya filtradas.
+        orden (tuple): campos de la clave, el último debe ser único (normalmente 'id').
+        tamaño (int): filas por página.
+        parametros (QueryDict): request.GET, con ?despues= o ?antes= si no es la primera página.
+
+    Returns:
+        PaginaKeyset
+    """
+    consulta, construir = _preparar(queryset, orden, tamaño, parametros)
+    return construir(list(consulta))
+
+
+async def apaginar(queryset, orden, tamaño, parametros):
+    """paginar() con el ORM asíncrono, para las vistas de apps/setup/asincrono.py."""
+    consulta, construir = _preparar(queryset, orden, tamaño, parametros)
+    return construir([fila async for fila in consulta])
+
+
+class PaginacionKeysetMixin:
+    """
+    Pagina un ListView con paginar(). La vista define orden_paginacion (clave con índice,
+    acabada en un campo único) y puede cambiar tamaño_pagina.
+
+    En el contexto la lista de la vista (context_object_name) pasa a ser solo la página
+    actual y 'pagina' tiene los enlaces para templates/apps/setup/paginacion.html.
+    Si la vista ya ha paginado (las asíncronas lo hacen con apaginar()) se usa self.pagina.
+    """
+    orden_paginacion = ('-id',)
+    tamaño_pagina = 25
+    pagina = None
+
+    def get_context_data(self, **kwargs):
+        pagina = self.pagina or paginar(self.object_list, self.orden_paginacion, self.tamaño_pagina, self.request.GET)
+        context = super().get_context_data(object_list=pagina.objetos, **kwargs)
+        context['pagina'] = pagina
+        return context
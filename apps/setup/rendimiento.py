@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+
+"""
+Medición de consultas y tiempos por petición para RendimientoMiddleware (apps/setup/middleware.py).
+
+RegistroConsultas se instala con connection.execute_wrapper() y cuenta las consultas, su tiempo y
+cuántas veces se repite cada SQL (con los parámetros aparte, el SQL ya es la forma de la consulta):
+uno repetido UMBRAL_N_MAS_1 veces es sospechoso de N+1. ResumenRendimiento guarda las últimas
+VENTANA peticiones por nombre de URL en la memoria de cada proceso.
+"""
+
+CONFIGURACION_POR_DEFECTO = {
+    # Instala el middleware; con False Django lo descarta al arrancar (MiddlewareNotUsed)
+    'ACTIVO': False,
+    # Fracción de peticiones que se miden (1 = todas)
+    'MUESTREO': 1.0,
+    # Peticiones que se guardan por nombre de URL
+    'VENTANA': 200,
+    # Veces que debe repetirse el mismo SQL en una petición para marcarlo
+    'UMBRAL_N_MAS_1': 5,
+    # Consultas más lentas que se guardan por petición
+    'LENTAS': 3,
+}
+
+
+def configuracion():
+    """Devuelve settings.RENDIMIENTO completado con los valores por defecto."""
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'RENDIMIENTO', {})}
+
+
+def _percentil(valores, fraccion):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * fraccion))]
+
+
+class RegistroConsultas:
+    """
+    Envoltorio para connection.execute_wrapper() que anota las consultas de una petición.
+
+    Ejemplo:
+        registro = RegistroConsultas()
+        with connection.execute_wrapper(registro):
+            ...
+        registro.total, registro.tiempo, registro.repetidas(5)
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.tiempo = 0.0
+        # sql: [veces, tiempo total, tiempo máximo]
+        self.por_sql = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.total += 1
+            self.tiempo += duracion
+            datos = self.por_sql.get(sql)
+            if datos is None:
+                self.por_sql[sql] = [1, duracion, duracion]
+            else:
+                datos[0] += 1
+                datos[1] += duracion
+                if duracion > datos[2]:
+                    datos[2] = duracion
+
+    def sumar(self, otro):
+        """Añade las consultas de otro registro, por ejemplo el de otro hilo de la misma petición."""
+        self.total += otro.total
+        self.tiempo += otro.tiempo
+        for sql, (veces, tiempo, maximo) in otro.por_sql.items():
+            datos = self.por_sql.get(sql)
+            if datos is None:
+                self.por_sql[sql] = [veces, tiempo, maximo]
+            else:
+                datos[0] += veces
+                datos[1] += tiempo
+                datos[2] = max(datos[2], maximo)
+
+    def lentas(self, cuantas):
+        """
+        Returns:
+            list: (sql, tiempo máximo en segundos) de las consultas más lentas.
+        """
+        return sorted(
+            ((sql, datos[2]) for sql, datos in self.por_sql.items()), key=lambda par: par[1], reverse=True
+        )[:cuantas]
+
+    def repetidas(self, umbral):
+        """
+        Returns:
+            list: (sql, veces) de los SQL ejecutados umbral veces o más, de más a menos veces.
+        """
+        return sorted(
+            ((sql, datos[0]) for sql, datos in self.por_sql.items() if datos[0] >= umbral),
+            key=lambda par: par[1], reverse=True,
+        )
+
+
+class ResumenRendimiento:
+    """
+    Resumen en memoria, por nombre de URL, de las últimas peticiones medidas.
+    Es seguro entre hilos: el servidor de desarrollo y gunicorn con hilos atienden
+    varias peticiones a la vez en el mismo proceso.
+    """
+
+    def __init__(self, ventana):
+        self.ventana = ventana
+        self._bloqueo = threading.Lock()
+        # url: deque de (duración, consultas, tiempo de base de datos)
+        self._peticiones = defaultdict(lambda: deque(maxlen=self.ventana))
+        # url: {sql: veces que se ha marcado como N+1}
+        self._sospechosas = defaultdict(lambda: defaultdict(int))
+        # url: {sql: tiempo máximo visto}
+        self._lentas = defaultdict(dict)
+
+    def añadir(self, url, duracion, registro, umbral, lentas):
+        with self._bloqueo:
+            self._peticiones[url].append((duracion, registro.total, registro.tiempo))
+            for sql, _ in registro.repetidas(umbral):
+                self._sospechosas[url][sql] += 1
+            peores = self._lentas[url]
+            for sql, tiempo in registro.lentas(lentas):
+                if tiempo > peores.get(sql, 0):
+                    peores[sql] = tiempo
+            if len(peores) > lentas:
+                # Solo se guardan las 'lentas' peores por URL
+                self._lentas[url] = dict(sorted(peores.items(), key=lambda par: par[1], reverse=True)[:lentas])
+
+    def resumen(self):
+        """
+        Returns:
+            list: un dict por nombre de URL, de la más lenta (p95) a la más rápida, con peticiones,
+            duración p50/p95 en ms, consultas media/máximo, ms de base de datos de media,
+            sospechosas de N+1 y consultas más lentas.
+        """
+        with self._bloqueo:
+            copia = {url: list(peticiones) for url, peticiones in self._peticiones.items()}
+            sospechosas = {url: dict(sqls) for url, sqls in self._sospechosas.items()}
+            lentas = {url: dict(sqls) for url, sqls in self._lentas.items()}
+
+        filas = []
+        for url, peticiones in copia.items():
+            duraciones = [p[0] for p in peticiones]
+            consultas = [p[1] for p in peticiones]
+            filas.append({
+                'url': url,
+                'peticiones': len(peticiones),
+                'p50_ms': _percentil(duraciones, 0.5) * 1000,
+                'p95_ms': _percentil(duraciones, 0.95) * 1000,
+                'consultas_media': sum(consultas) / len(consultas),
+                'consultas_max': max(consultas),
+                'db_media_ms': sum(p[2] for p in peticiones) / len(peticiones) * 1000,
+                'sospechosas_n_mas_1': sorted(
+                    sospechosas.get(url, {}).items(), key=lambda par: par[1], reverse=True
+                ),
+                'lentas': sorted(
+                    ((sql, tiempo * 1000) for sql, tiempo in lentas.get(url, {}).items()),
+                    key=lambda par: par[1], reverse=True,
+                ),
+            })
+        return sorted(filas, key=lambda fila: fila['p95_ms'], reverse=True)
+
+    def vaciar(self):
+        with self._bloqueo:
+            self._peticiones.clear()
+            self._sospechosas.clear()
+            self._lentas.clear()
+
+
+_resumen = None
+_resumen_bloqueo = threading.Lock()
+
+
+def obtener_resumen():
+    """Devuelve el ResumenRendimiento del proceso (se crea la primera vez)."""
+    global _resumen
+    if _resumen is None:
+        with _resumen_bloqueo:
+            if _resumen is None:
+                _resumen = ResumenRendimiento(configuracion()['VENTANA'])
+    return _resumen
+
+
+def cabecera_server_timing(duracion, registro, umbral):
+    """
+    Returns:
+        str: valor de la cabecera Server-Timing. Ejemplo:
+        'total;dur=48.1, db;dur=12.7;desc="14 consultas", n1;desc="1 SQL repetidos"'
+    """
+    partes = [
+        f'total;dur={duracion * 1000:.1f}',
+        f'db;dur={registro.tiempo * 1000:.1f};desc="{registro.total} consultas"',
+    ]
+    repetidas = registro.repetidas(umbral)
+    if repetidas:
+        partes.append(f'n1;desc="{len(repetidas)} SQL repetidos"')
+    return ', '.join(partes)
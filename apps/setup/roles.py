@@ -0,0 +1,92 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+"""
+Resolución del rol (grupo FREELANCER o CLIENTE) del usuario.
+
+roles_usuario() guarda los nombres de los grupos en el propio objeto usuario, así que el resto de
+preguntas de la petición (mixins de propiedad, get_queryset, get_form...) no consultan nada, y en
+la caché 'default' con la versión del usuario. La señal m2m_changed de apps/usuarios/signals.py
+incrementa la versión al confirmar cualquier cambio de sus grupos: la petición siguiente ya no
+encuentra los roles anteriores, en ningún proceso mientras la caché sea compartida (REDIS_URL).
+"""
+
+TIMEOUT = 300
+
+
+def _clave_version(usuario_id):
+    return f'roles:version:{usuario_id}'
+
+
+def _version(usuario_id):
+    clave = _clave_version(usuario_id)
+    valor = cache.get(clave)
+    if valor is None:
+        # Si la versión se ha expulsado de la caché, la nueva no coincide con ninguna anterior
+        cache.add(clave, int(time.time() * 1000), None)
+        valor = cache.get(clave)
+    return valor
+
+
+def roles_usuario(usuario):
+    """
+    Args:
+        usuario (Usuario): el usuario, normalmente request.user (puede ser anónimo).
+
+    Returns:
+        frozenset: nombres de los grupos del usuario, por ejemplo {'FREELANCER'}.
+    """
+    roles = getattr(usuario, '_roles', None)
+    if roles is not None:
+        return roles
+
+    if not usuario.is_authenticated:
+        return frozenset()
+
+    if getattr(usuario, '_roles_cambiados', False):
+        # Sus grupos han cambiado en esta transacción: la caché aún tiene los anteriores
+        roles = frozenset(usuario.groups.values_list('name', flat=True))
+    else:
+        clave = f'roles:{usuario.pk}:{_version(usuario.pk)}'
+        roles = cache.get(clave)
+        if roles is None:
+            roles = frozenset(usuario.groups.values_list('name', flat=True))
+            cache.set(clave, roles, TIMEOUT)
+    usuario._roles = roles
+    return roles
+
+
+def es_freelancer(usuario):
+    return 'FREELANCER' in roles_usuario(usuario)
+
+
+def es_cliente(usuario):
+    return 'CLIENTE' in roles_usuario(usuario)
+
+
+def olvidar_roles(usuario):
+    """Borra los roles guardados en el objeto usuario, para que se vuelvan a leer de la base de datos."""
+    usuario.__dict__.pop('_roles', None)
+    usuario._roles_cambiados = True
+
+
+def invalidar_roles(*usuario_ids):
+    """
+    Incrementa la versión de los roles de los usuarios al confirmar la transacción en curso
+    (o en el momento, si no hay ninguna). Antes no: una petición que leyera los grupos sin
+    confirmar los guardaría con la versión nueva.
+    """
+    ids = set(usuario_ids)
+    if not ids:
+        return
+
+    def incrementar():
+        for usuario_id in ids:
+            try:
+                cache.incr(_clave_version(usuario_id))
+            except ValueError:
+                cache.add(_clave_version(usuario_id), int(time.time() * 1000), None)
+
+    transaction.on_commit(incrementar)
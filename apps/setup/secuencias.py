@@ -0,0 +1,79 @@
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+
+from .models import Secuencia
+
+"""
+Numeración correlativa por serie y año, con un contador por fila en la tabla Secuencia.
+
+siguiente_numero() se llama en la misma transacción que guarda el documento: el UPDATE bloquea
+el contador hasta el commit y, si el guardado falla, el rollback deja el número libre.
+
+Ejemplo:
+    with transaction.atomic():
+        numero_serie = formatear_numero_serie(2026, siguiente_numero('factura', 2026))   # '2026-001'
+"""
+
+
+def siguiente_numero(serie, ejercicio, cantidad=1):
+    """
+    Reserva y devuelve el siguiente número de una serie para un año, o un bloque de
+    cantidad números consecutivos.
+
+    En PostgreSQL se hace con un único INSERT ... ON CONFLICT DO UPDATE ... RETURNING,
+    que crea el contador si no existe y lo incrementa si ya existe en la misma sentencia.
+    En el resto de bases de datos se usa el ORM: se incrementa el contador con una F
+    expression (o se crea si no existe) y se lee el valor dentro de la misma transacción.
+
+    Reservar un bloque cuesta lo mismo que reservar un número: el contador avanza cantidad
+    de una vez y, como la fila queda bloqueada hasta el final de la transacción, nadie puede
+    intercalar números dentro del bloque.
+
+    Args:
+        serie (str): Nombre de la numeración. Ejemplo: 'factura', 'presupuesto'.
+        ejercicio (int): Año de la numeración.
+        cantidad (int): Números consecutivos que se reservan.
+
+    Returns:
+        int: El primer número reservado, empezando en 1 para cada serie y año. El bloque
+        va de ese número a ese número + cantidad - 1.
+
+    Raises:
+        ValueError: Si cantidad es menor que 1.
+    """
+    if cantidad < 1:
+        raise ValueError('Hay que reservar al menos un número.')
+
+    if connection.vendor == 'postgresql':
+        tabla = connection.ops.quote_name(Secuencia._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {tabla} (serie, ejercicio, ultimo) VALUES (%s, %s, %s) "
+                f"ON CONFLICT (serie, ejercicio) DO UPDATE SET ultimo = {tabla}.ultimo + EXCLUDED.ultimo "
+                f"RETURNING ultimo",
+                [serie, ejercicio, cantidad],
+            )
+            return cursor.fetchone()[0] - cantidad + 1
+
+    contador = Secuencia.objects.filter(serie=serie, ejercicio=ejercicio)
+    with transaction.atomic(savepoint=False):
+        if not contador.update(ultimo=F('ultimo') + cantidad):
+            try:
+                # Savepoint: si otra transacción crea el contador a la vez, se suma sobre el suyo
+                with transaction.atomic():
+                    Secuencia.objects.create(serie=serie, ejercicio=ejercicio, ultimo=cantidad)
+                return 1
+            except IntegrityError:
+                contador.update(ultimo=F('ultimo') + cantidad)
+        return contador.values_list('ultimo', flat=True).get() - cantidad + 1
+
+
+def formatear_numero_serie(ejercicio, numero):
+    """
+    Devuelve el número de serie con el formato 'YYYY-NNN'. Ejemplo: 2026-001.
+
+    Args:
+        ejercicio (int): Año de la numeración.
+        numero (int): Número correlativo dentro del año.
+    """
+    return f"{ejercicio}-{numero:03d}"
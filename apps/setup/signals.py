@@ -0,0 +1,117 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from apps.clientes.models import Cliente
+from apps.proyectos.models import Proyecto
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura
+from .busqueda import desindexar, indexar, indexar_queryset
+
+TIPOS = {
+    Cliente: 'cliente',
+    Proyecto: 'proyecto',
+    Presupuesto: 'presupuesto',
+    Factura: 'factura',
+}
+
+# modelo: (campos que se copian en las entradas de otros objetos,
+#          [(tipo dependiente, modelo dependiente, camino hasta el modelo)])
+DEPENDIENTES = {
+    Cliente: (
+        ('nombre', 'freelancer_id'),
+        [('proyecto', Proyecto, 'cliente'), ('presupuesto', Presupuesto, 'proyecto__cliente'),
+         ('factura', Factura, 'presupuesto__proyecto__cliente')],
+    ),
+    Proyecto: (
+        ('nombre', 'cliente_id', 'freelancer_id'),
+        [('presupuesto', Presupuesto, 'proyecto'), ('factura', Factura, 'presupuesto__proyecto')],
+    ),
+    Presupuesto: (
+        ('numero_serie', 'proyecto_id'),
+        [('factura', Factura, 'presupuesto')],
+    ),
+}
+
+# modelo: campos propios que se copian en su entrada de búsqueda (incluye los de DEPENDIENTES)
+CAMPOS_INDEXADOS = {
+    Cliente: {'freelancer', 'nombre', 'email', 'telefono', 'direccion'},
+    Proyecto: {'freelancer', 'cliente', 'nombre', 'descripcion', 'fecha_inicio'},
+    Presupuesto: {'proyecto', 'numero_serie', 'fecha', 'notas'},
+    Factura: {'presupuesto', 'numero_serie', 'fecha_emision'},
+}
+
+
+def cambia_busqueda(sender, update_fields):
+    """
+    Returns:
+        bool: False si el guardado solo escribe campos (update_fields) que no están en ninguna
+        entrada de búsqueda, como el estado de una factura.
+    """
+    if update_fields is None:
+        return True
+    campos = {sender._meta.get_field(campo).name for campo in update_fields}
+    return bool(campos & CAMPOS_INDEXADOS[sender])
+
+
+@receiver(pre_save, sender=Cliente)
+@receiver(pre_save, sender=Proyecto)
+@receiver(pre_save, sender=Presupuesto)
+def busqueda_antes_de_guardar(sender, instance, **kwargs):
+    """
+    Señal que guarda los valores que otras entradas de búsqueda copian del objeto (el nombre
+    del cliente está en las entradas de sus proyectos, presupuestos y facturas) para que
+    indexar_objeto sepa si tiene que reindexarlas.
+
+    Args:
+        sender: El modelo que envía la señal (Cliente, Proyecto o Presupuesto).
+        instance: La instancia que va a guardarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    campos = DEPENDIENTES[sender][0]
+    instance._busqueda_anterior = None
+    if instance.pk and not kwargs.get('raw') and cambia_busqueda(sender, kwargs.get('update_fields')):
+        instance._busqueda_anterior = sender.objects.filter(pk=instance.pk).values_list(*campos).first()
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_save, sender=Proyecto)
+@receiver(post_save, sender=Presupuesto)
+@receiver(post_save, sender=Factura)
+def indexar_objeto(sender, instance, **kwargs):
+    """
+    Señal que crea o actualiza la entrada de búsqueda del objeto guardado y, si ha cambiado
+    algo que copian otras entradas, reindexa las de los objetos que dependen de él.
+
+    Args:
+        sender: El modelo que envía la señal.
+        instance: La instancia que acaba de guardarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    if kwargs.get('raw') or not cambia_busqueda(sender, kwargs.get('update_fields')):
+        return
+    indexar(TIPOS[sender], [instance.pk], nuevos=kwargs.get('created', False))
+
+    anterior = getattr(instance, '_busqueda_anterior', None)
+    instance._busqueda_anterior = None
+    if sender not in DEPENDIENTES or anterior is None:
+        return
+    campos, dependientes = DEPENDIENTES[sender]
+    if anterior == tuple(getattr(instance, campo) for campo in campos):
+        return
+    for tipo, modelo, camino in dependientes:
+        indexar_queryset(tipo, modelo.objects.filter(**{camino: instance}))
+
+
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Proyecto)
+@receiver(post_delete, sender=Presupuesto)
+@receiver(post_delete, sender=Factura)
+def desindexar_objeto(sender, instance, **kwargs):
+    """
+    Señal que borra la entrada de búsqueda del objeto eliminado.
+
+    Args:
+        sender: El modelo que envía la señal.
+        instance: La instancia que acaba de eliminarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    desindexar(TIPOS[sender], [instance.pk])
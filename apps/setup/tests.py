@@ -1,3 +1,334 @@
-from django.test import TestCase
+import logging
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.db import IntegrityError, OperationalError, connection
+from django.db.models import QuerySet
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.facturas.models import Factura, Pago
+from apps.facturas.views import RegisterPaymentView
+from apps.presupuestos.models import Presupuesto
+from apps.presupuestos.tests import asignar_permisos_grupos
+from apps.proyectos.models import Proyecto
+from apps.usuarios.models import Usuario
+from .auditoria import ManejadorAuditoria
+from .generador import generar
+from .limite_consultas import LimiteConsultasExcedido, limite_consultas
+from .models import RegistroAuditoria, Secuencia
+from .roles import es_cliente, es_freelancer, roles_usuario
+from .secuencias import formatear_numero_serie, siguiente_numero
+
+# Lo mismo que LIMITE_CONSULTAS_ESTRICTO=1 en el entorno
+ESTRICTO = {'ACTIVO': True, 'ESTRICTO': True}
+SOLO_AVISO = {'ACTIVO': True, 'ESTRICTO': False}
+
+
+@override_settings(LIMITE_CONSULTAS=ESTRICTO)
+class LimiteConsultasTests(TestCase):
+    """Las vistas que escriben caben en su límite de consultas en modo estricto."""
+
+    @classmethod
+    def setUpTestData(cls):
+        asignar_permisos_grupos()
+        cls.freelancer = generar('limite', clientes=3, facturas=20, semilla=5)[0]
+        cls.hoy = timezone.now().date()
+
+    def setUp(self):
+        self.client.force_login(self.freelancer)
+
+    def factura_pendiente(self):
+        return Factura.objects.filter(presupuesto__proyecto__freelancer=self.freelancer).exclude(
+            estado__in=['pagada', 'anulada']
+        ).first()
+
+    def test_registrar_pago(self):
+        factura = self.factura_pendiente()
+        pagos = factura.pagos.count()
+        url = reverse('factura_register_payment', args=[factura.pk])
+        self.client.post(url, {'cantidad': '1.00', 'metodo': 'bizum'})
+        factura.refresh_from_db()
+        self.assertEqual(factura.estado, 'parcial')
+
+        respuesta = self.client.post(url, {'cantidad': str(factura.saldo_pendiente), 'metodo': 'transferencia'})
+        self.assertRedirects(respuesta, reverse('factura_detail', args=[factura.pk]), fetch_redirect_response=False)
+        factura.refresh_from_db()
+        self.assertEqual(factura.estado, 'pagada')
+        self.assertEqual(factura.pagos.count(), pagos + 2)
+
+    def test_crear_presupuesto_y_convertirlo(self):
+        proyecto = Proyecto.objects.filter(freelancer=self.freelancer).first()
+        self.client.post(reverse('presupuesto_create'), {
+            'proyecto': proyecto.pk, 'fecha': self.hoy, 'validez': self.hoy + timedelta(days=30),
+            'estado': 'aceptado', 'total': '100', 'impuestos': '21',
+        })
+        presupuesto = Presupuesto.objects.filter(proyecto=proyecto).latest('pk')
+        self.client.post(reverse('presupuesto_convertir', args=[presupuesto.pk]))
+        self.assertTrue(Factura.objects.filter(presupuesto=presupuesto).exists())
+
+    def test_editar_factura(self):
+        factura = self.factura_pendiente()
+        respuesta = self.client.post(reverse('factura_edit', args=[factura.pk]), {
+            'presupuesto': factura.presupuesto_id, 'fecha_emision': factura.fecha_emision,
+            'fecha_vencimiento': factura.fecha_emision + timedelta(days=60), 'estado': factura.estado,
+        })
+        self.assertEqual(respuesta.status_code, 302)
+
+    def test_superar_el_limite(self):
+        @limite_consultas(1)
+        def dos_consultas():
+            Usuario.objects.count()
+            Factura.objects.count()
+
+        with self.assertRaisesMessage(LimiteConsultasExcedido, 'dos_consultas: 2 consultas, el límite es 1.'):
+            dos_consultas()
+
+    @override_settings(LIMITE_CONSULTAS=SOLO_AVISO)
+    def test_sin_modo_estricto_solo_avisa(self):
+        @limite_consultas(1)
+        def dos_consultas():
+            Usuario.objects.count()
+            return Factura.objects.count()
+
+        with self.assertLogs('limite_consultas', 'WARNING'):
+            self.assertEqual(dos_consultas(), Factura.objects.count())
+
+
+class LimiteConsultasTransaccionTests(TransactionTestCase):
+    """Fuera de una transacción, superar el límite en modo estricto no deja nada escrito."""
+
+    def setUp(self):
+        asignar_permisos_grupos()
+        freelancer = generar('limite', clientes=1, facturas=3, pagos=False, semilla=6)[0]
+        self.factura = Factura.objects.exclude(estado__in=['pagada', 'anulada']).first()
+        self.antes = (self.factura.total_pagado, self.factura.estado)
+        self.url = reverse('factura_register_payment', args=[self.factura.pk])
+        self.client.force_login(freelancer)
+
+    def pagar(self):
+        with mock.patch.object(RegisterPaymentView, 'limite_consultas', {'POST': 3}):
+            self.client.post(self.url, {'cantidad': '1.00', 'metodo': 'bizum'})
+        self.factura.refresh_from_db()
+
+    @override_settings(LIMITE_CONSULTAS=ESTRICTO)
+    def test_modo_estricto_deshace_el_pago(self):
+        with self.assertRaises(LimiteConsultasExcedido):
+            self.pagar()
+        self.assertFalse(Pago.objects.exists())
+        self.assertEqual((self.factura.total_pagado, self.factura.estado), self.antes)
+
+    @override_settings(LIMITE_CONSULTAS=SOLO_AVISO)
+    def test_sin_modo_estricto_el_pago_se_guarda(self):
+        with self.assertLogs('limite_consultas', 'WARNING'):
+            self.pagar()
+        self.assertEqual(Pago.objects.count(), 1)
+        self.assertEqual(self.factura.total_pagado, self.antes[0] + Decimal('1.00'))
+
+
+class SecuenciasTests(TestCase):
+
+    def test_numeros_correlativos_por_serie_y_año(self):
+        self.assertEqual([siguiente_numero('factura', 2030) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(siguiente_numero('presupuesto', 2030), 1)
+        self.assertEqual(siguiente_numero('factura', 2031), 1)
+        self.assertEqual(Secuencia.objects.get(serie='factura', ejercicio=2030).ultimo, 3)
+
+    def test_reservar_un_bloque(self):
+        siguiente_numero('factura', 2030)
+        self.assertEqual(siguiente_numero('factura', 2030, cantidad=50), 2)
+        self.assertEqual(siguiente_numero('factura', 2030), 52)
+        self.assertEqual(siguiente_numero('presupuesto', 2030, cantidad=10), 1)
+        with self.assertRaises(ValueError):
+            siguiente_numero('factura', 2030, cantidad=0)
+
+    @skipIf(connection.vendor == 'postgresql', 'En PostgreSQL el contador se crea con ON CONFLICT.')
+    def test_contador_creado_a_la_vez_por_otra_transaccion(self):
+        # La otra transacción crea el contador entre nuestro UPDATE (que no encuentra la fila)
+        # y nuestro INSERT, que falla: el número se suma sobre su contador
+        Secuencia.objects.create(serie='factura', ejercicio=2030, ultimo=5)
+        update = QuerySet.update
+        llamadas = []
+
+        def primer_update_sin_fila(queryset, **campos):
+            llamadas.append(campos)
+            return 0 if len(llamadas) == 1 else update(queryset, **campos)
+
+        with mock.patch.object(QuerySet, 'update', autospec=True, side_effect=primer_update_sin_fila):
+            self.assertEqual(siguiente_numero('factura', 2030, cantidad=2), 6)
+        self.assertEqual(Secuencia.objects.get(serie='factura', ejercicio=2030).ultimo, 7)
+
+    def test_formatear_numero_serie(self):
+        self.assertEqual(formatear_numero_serie(2026, 1), '2026-001')
+        self.assertEqual(formatear_numero_serie(2026, 1234), '2026-1234')
+
+
+class NumeracionFacturasTests(TransactionTestCase):
+    """La numeración de las facturas fuera de una transacción de test, como en producción."""
+
+    def setUp(self):
+        asignar_permisos_grupos()
+        generar('numeracion', clientes=1, facturas=1, pagos=False, semilla=7)
+        self.proyecto = Proyecto.objects.get()
+        self.hoy = timezone.now().date()
+
+    def presupuestos(self, cuantos):
+        return Presupuesto.objects.bulk_create(
+            Presupuesto(
+                proyecto=self.proyecto, numero_serie=f'N-{i}', fecha=self.hoy,
+                validez=self.hoy + timedelta(days=30), estado='aceptado', total=Decimal(100 + i),
+            )
+            for i in range(cuantos)
+        )
+
+    def nueva_factura(self, presupuesto):
+        factura = Factura(
+            presupuesto=presupuesto, fecha_emision=self.hoy, fecha_vencimiento=self.hoy + timedelta(days=30),
+        )
+        factura.save()
+        return factura
+
+    def numeros(self):
+        facturas = Factura.objects.filter(fecha_emision__year=self.hoy.year)
+        return sorted(int(numero.split('-')[1]) for numero in facturas.values_list('numero_serie', flat=True))
+
+    def test_guardado_fallido_no_consume_numero(self):
+        primero, segundo = self.presupuestos(2)
+        self.nueva_factura(primero)
+        # El presupuesto ya tiene factura: el INSERT falla y el incremento del contador se deshace
+        with self.assertRaises(IntegrityError):
+            self.nueva_factura(primero)
+        self.nueva_factura(segundo)
+        numeros = self.numeros()
+        self.assertEqual(numeros, list(range(numeros[0], numeros[0] + len(numeros))))
+
+    @skipUnlessDBFeature('test_db_allows_multiple_connections')
+    def test_altas_simultaneas(self):
+        presupuestos = self.presupuestos(8)
+        inicio = threading.Barrier(len(presupuestos))
+        errores = []
+
+        def alta(presupuesto):
+            try:
+                inicio.wait()
+                self.nueva_factura(presupuesto)
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=alta, args=(presupuesto,)) for presupuesto in presupuestos]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(errores, [])
+        numeros = self.numeros()
+        self.assertEqual(numeros, list(range(numeros[0], numeros[0] + len(numeros))))
+
+
+class RolesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        asignar_permisos_grupos()
+        cls.freelancer = generar('roles', clientes=1, facturas=1, semilla=8)[0]
+
+    def setUp(self):
+        caches['default'].clear()
+
+    def test_una_consulta_por_peticion(self):
+        usuario = Usuario.objects.get(pk=self.freelancer.pk)
+        with self.assertNumQueries(1):
+            self.assertTrue(es_freelancer(usuario))
+            self.assertFalse(es_cliente(usuario))
+            self.assertEqual(roles_usuario(usuario), {'FREELANCER'})
+        # La petición siguiente los encuentra en la caché
+        siguiente = Usuario.objects.get(pk=self.freelancer.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(es_freelancer(siguiente))
+
+    def test_cambiar_los_grupos_del_mismo_objeto(self):
+        usuario = Usuario.objects.get(pk=self.freelancer.pk)
+        self.assertTrue(es_freelancer(usuario))
+        usuario.groups.clear()
+        self.assertFalse(es_freelancer(usuario))
+
+    def test_un_rol_retirado_no_vale_en_la_peticion_siguiente(self):
+        self.client.force_login(self.freelancer)
+        self.assertEqual(self.client.get(reverse('cliente_list')).status_code, 200)
+        # Otro proceso (el admin, por ejemplo) le quita el grupo
+        with self.captureOnCommitCallbacks(execute=True):
+            Usuario.objects.get(pk=self.freelancer.pk).groups.clear()
+        self.assertEqual(self.client.get(reverse('cliente_list')).status_code, 403)
+
+    def test_quitar_el_usuario_desde_el_grupo(self):
+        self.assertTrue(es_freelancer(Usuario.objects.get(pk=self.freelancer.pk)))
+        grupo = Group.objects.get(name='FREELANCER')
+        with self.captureOnCommitCallbacks(execute=True):
+            grupo.user_set.remove(self.freelancer)
+        self.assertFalse(es_freelancer(Usuario.objects.get(pk=self.freelancer.pk)))
+        with self.captureOnCommitCallbacks(execute=True):
+            grupo.user_set.add(self.freelancer)
+        self.assertTrue(es_freelancer(Usuario.objects.get(pk=self.freelancer.pk)))
+        with self.captureOnCommitCallbacks(execute=True):
+            grupo.user_set.clear()
+        self.assertFalse(es_freelancer(Usuario.objects.get(pk=self.freelancer.pk)))
+
+    def test_sin_confirmar_no_se_invalida(self):
+        self.assertTrue(es_freelancer(Usuario.objects.get(pk=self.freelancer.pk)))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            Usuario.objects.get(pk=self.freelancer.pk).groups.clear()
+        # Hasta que se confirma, las demás peticiones siguen con la versión anterior
+        self.assertTrue(es_freelancer(Usuario.objects.get(pk=self.freelancer.pk)))
+        callbacks[0]()
+        self.assertFalse(es_freelancer(Usuario.objects.get(pk=self.freelancer.pk)))
+
+
+class ManejadorAuditoriaTests(TransactionTestCase):
+    """El guardado por lotes de la auditoría, sin el hilo: se llama a _guardar() directamente."""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user('auditado', email='auditado@example.com', password='x')
+        self.manejador = ManejadorAuditoria()
+
+    def registro(self, usuario_id):
+        registro = logging.makeLogRecord({'msg': 'auditoría'})
+        registro.auditoria = {
+            'usuario_id': usuario_id, 'nombre_usuario': f'usuario {usuario_id}', 'accion': 'registrar_pago',
+            'metodo': 'POST', 'ruta': '/facturas/1/register-payment/', 'codigo_respuesta': 302,
+            'fecha': timezone.now(),
+        }
+        return registro
+
+    def test_un_usuario_borrado_no_pierde_el_lote(self):
+        borrado = Usuario.objects.create_user('borrado', email='borrado@example.com', password='x')
+        id_borrado = borrado.pk
+        registros = [self.registro(self.usuario.pk), self.registro(id_borrado), self.registro(self.usuario.pk)]
+        borrado.delete()
+        self.manejador._guardar(registros)
+        self.assertEqual(RegistroAuditoria.objects.filter(usuario=self.usuario).count(), 2)
+        # El registro del usuario borrado se guarda sin usuario, con su nombre
+        self.assertTrue(RegistroAuditoria.objects.filter(usuario=None, nombre_usuario=f'usuario {id_borrado}').exists())
+
+    def test_con_la_base_de_datos_bloqueada_se_reintenta(self):
+        bulk_create = RegistroAuditoria.objects.bulk_create
+        intentos = []
+
+        def bloqueada_dos_veces(filas):
+            intentos.append(len(filas))
+            if len(intentos) <= 2:
+                raise OperationalError('database table is locked')
+            return bulk_create(filas)
+
+        with mock.patch.object(RegistroAuditoria.objects, 'bulk_create', side_effect=bloqueada_dos_veces), \
+                mock.patch('apps.setup.auditoria.time.sleep') as espera:
+            self.manejador._guardar([self.registro(self.usuario.pk) for _ in range(3)])
+        self.assertEqual(intentos, [3, 3, 3])
+        self.assertEqual(espera.call_count, 2)
+        self.assertEqual(RegistroAuditoria.objects.filter(usuario=self.usuario).count(), 3)
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path('buscar/', views.BuscarView.as_view(), name='buscar'),
+    path('rendimiento/', views.RendimientoView.as_view(), name='rendimiento'),
+]
@@ -1,3 +1,77 @@
-from django.shortcuts import render
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.views.generic import View
 
-# Create your views here.
+from .busqueda import buscar
+from .limite_consultas import LimiteConsultasMixin
+from .rendimiento import configuracion as configuracion_rendimiento, obtener_resumen
+from .models import EntradaBusqueda
+
+
+class BuscarView(LimiteConsultasMixin, LoginRequiredMixin, View):
+    """
+    Buscador global (apps/setup/busqueda.py): clientes, proyectos, presupuestos y facturas
+    del usuario autenticado, de más a menos relevante.
+
+    Parámetros GET:
+        q: lo que se busca.
+        tipo: limita los resultados a un tipo (cliente, proyecto, presupuesto o factura).
+
+    Devuelve la página de resultados, o JSON si el cliente no acepta HTML
+    (por ejemplo un buscador con autocompletado que pide Accept: application/json).
+    """
+    limite_consultas = 5
+    def get(self, request):
+        termino = request.GET.get('q', '').strip()
+        tipo = request.GET.get('tipo', '')
+        tipos = dict(EntradaBusqueda.TIPOS)
+        resultados = buscar(request.user, termino, tipos=[tipo] if tipo in tipos else None)
+
+        if not request.accepts('text/html'):
+            return JsonResponse({
+                'q': termino,
+                'resultados': [
+                    {
+                        'tipo': entrada.tipo,
+                        'id': entrada.objeto_id,
+                        'titulo': entrada.titulo,
+                        'detalle': entrada.detalle,
+                        'fecha': entrada.fecha.isoformat() if entrada.fecha else None,
+                        'rango': entrada.rango,
+                        'url': entrada.url,
+                    }
+                    for entrada in resultados
+                ],
+            })
+        return render(request, 'apps/setup/buscar.html', {
+            'q': termino,
+            'tipo': tipo,
+            'tipos': EntradaBusqueda.TIPOS,
+            'resultados': resultados,
+        })
+
+
+class RendimientoView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """
+    Resumen de RendimientoMiddleware (apps/setup/rendimiento.py) por nombre de URL: duración
+    p50/p95, consultas, tiempo de base de datos, sospechosos de N+1 y consultas más lentas.
+    Solo para el personal (is_staff). Es el resumen del proceso que atiende la petición.
+
+    Con POST se vacía el resumen. En JSON si el cliente no acepta HTML.
+    """
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request):
+        filas = obtener_resumen().resumen()
+        if not request.accepts('text/html'):
+            return JsonResponse({'urls': filas})
+        return render(request, 'apps/setup/rendimiento.html', {
+            'filas': filas,
+            'configuracion': configuracion_rendimiento(),
+        })
+
+    def post(self, request):
+        obtener_resumen().vaciar()
+        return redirect('rendimiento')
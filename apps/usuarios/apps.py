@@ -5,4 +5,6 @@ class UsuariosConfig(AppConfig):
     name = 'apps.usuarios'
 
     def ready(self):
-        import apps.usuarios.signals
\ No newline at end of file
+        import apps.usuarios.signals
+        from .cache_dashboard import comprobar_cache_compartida
+        comprobar_cache_compartida()
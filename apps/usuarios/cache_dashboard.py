@@ -0,0 +1,242 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from apps.setup.mixins import RUTAS_PROPIETARIO
+
+"""
+Caché del dashboard de cada freelancer.
+
+Los datos se guardan por (freelancer, año, cliente) con la generación del freelancer, un contador
+que las señales de apps/usuarios/signals.py incrementan al confirmar cualquier cambio suyo. Con la
+generación actual se sirven sin tocar la base de datos; si no, solo una petición recalcula y las
+demás reciben los datos anteriores hasta EDAD_MAXIMA_OBSOLETA segundos después de la invalidación.
+La caché tiene que ser compartida por todos los procesos web (comprobar_cache_compartida()).
+"""
+
+CONFIGURACION_POR_DEFECTO = {
+    # Caché de Django que se usa
+    'ALIAS': 'default',
+    # Segundos que se guardan los datos de cada combinación de filtros
+    'TIMEOUT': 600,
+    # Segundos desde la invalidación en los que se sirven datos de una generación anterior mientras
+    # otra petición los recalcula
+    'EDAD_MAXIMA_OBSOLETA': 60,
+    # Segundos tras los que se libera el bloqueo si la petición que recalculaba muere
+    'BLOQUEO': 30,
+}
+
+
+def configuracion():
+    """Devuelve settings.DASHBOARD_CACHE completado con los valores por defecto."""
+    return {**CONFIGURACION_POR_DEFECTO, **getattr(settings, 'DASHBOARD_CACHE', {})}
+
+
+def _cache():
+    return caches[configuracion()['ALIAS']]
+
+
+def comprobar_cache_compartida():
+    """
+    Se llama al arrancar (UsuariosConfig.ready()).
+
+    Raises:
+        ImproperlyConfigured: Si hay más de un proceso web (settings.PROCESOS_WEB) y la caché
+            del dashboard es la de memoria de cada proceso.
+    """
+    procesos = getattr(settings, 'PROCESOS_WEB', 1)
+    alias = configuracion()['ALIAS']
+    if procesos > 1 and isinstance(caches[alias], LocMemCache):
+        raise ImproperlyConfigured(
+            f"DASHBOARD_CACHE usa la caché '{alias}', que es la de memoria de cada proceso, con "
+            f'{procesos} procesos web: un cambio solo invalidaría el dashboard en uno de ellos. '
+            'Configura una caché compartida (REDIS_URL).'
+        )
+
+
+def _clave_generacion(freelancer_id):
+    return f'dashboard:generacion:{freelancer_id}'
+
+
+def _clave_invalidacion(freelancer_id, generacion):
+    """Guarda cuándo se pasó a esa generación: desde entonces la anterior está obsoleta."""
+    return f'dashboard:invalidacion:{freelancer_id}:{generacion}'
+
+
+def _entero(valor):
+    """Los filtros llegan de la URL y la sesión: solo se usan en la clave si son números."""
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return ''
+
+
+def generacion(freelancer_id):
+    """
+    Returns:
+        int: la generación actual de los datos del freelancer.
+    """
+    cache = _cache()
+    clave = _clave_generacion(freelancer_id)
+    valor = cache.get(clave)
+    if valor is None:
+        cache.add(clave, int(time.time() * 1000), None)
+        valor = cache.get(clave)
+    return valor
+
+
+async def ageneracion(freelancer_id):
+    """generacion() con la API async de la caché."""
+    cache = _cache()
+    clave = _clave_generacion(freelancer_id)
+    valor = await cache.aget(clave)
+    if valor is None:
+        await cache.aadd(clave, int(time.time() * 1000), None)
+        valor = await cache.aget(clave)
+    return valor
+
+
+def invalidar_dashboard(*freelancer_ids):
+    """
+    Incrementa la generación de los freelancers al confirmar la transacción en curso
+    (o en el momento, si no hay ninguna).
+    """
+    ids = {pk for pk in freelancer_ids if pk}
+    if not ids:
+        return
+
+    def incrementar():
+        cache = _cache()
+        for freelancer_id in ids:
+            clave = _clave_generacion(freelancer_id)
+            try:
+                nueva = cache.incr(clave)
+            except ValueError:
+                # No existía: la próxima lectura no encontrará ninguna entrada con esta generación
+                cache.add(clave, int(time.time() * 1000), None)
+                continue
+            # Las entradas no duran más que TIMEOUT: tampoco hace falta guardarlo más
+            cache.set(_clave_invalidacion(freelancer_id, nueva), time.time(), configuracion()['TIMEOUT'])
+
+    transaction.on_commit(incrementar)
+
+
+def freelancer_de(instancia):
+    """
+    Id del freelancer al que pertenece una instancia de los modelos de RUTAS_PROPIETARIO,
+    con como mucho una consulta, y ninguna si los objetos del camino ya están cargados (por
+    ejemplo con select_related). Funciona también en post_delete: solo lee claves foráneas
+    de objetos que siguen en memoria.
+
+    Returns:
+        int: id del freelancer, o None si no se encuentra.
+    """
+    objeto = instancia
+    campos = RUTAS_PROPIETARIO[instancia._meta.label][0].split('__')
+    for posicion, campo in enumerate(campos):
+        relacion = objeto._meta.get_field(campo)
+        valor = getattr(objeto, relacion.attname)
+        resto = '__'.join(campos[posicion + 1:])
+        if not resto or valor is None:
+            return valor
+        if not relacion.is_cached(objeto):
+            return relacion.related_model.objects.filter(pk=valor).values_list(f'{resto}_id', flat=True).first()
+        objeto = relacion.get_cached_value(objeto)
+
+
+def _obsoleta_servible(entrada, invalidada, opciones):
+    """
+    La entrada de una generación anterior se puede servir mientras otra petición recalcula si
+    se invalidó hace menos de EDAD_MAXIMA_OBSOLETA segundos. Si no se sabe cuándo (la hora de la
+    invalidación ha caducado), se cuenta desde que se creó.
+    """
+    if entrada is None:
+        return False
+    desde = invalidada if invalidada is not None else entrada['creado']
+    return time.time() - desde <= opciones['EDAD_MAXIMA_OBSOLETA']
+
+
+def datos_dashboard(usuario, año, cliente_id, calcular):
+    """
+    Devuelve los datos del dashboard desde la caché, o los calcula y los guarda.
+
+    Args:
+        usuario (Usuario): el freelancer.
+        año (str): filtro de año de la sesión.
+        cliente_id (str): filtro de cliente de la sesión.
+        calcular (callable): sin argumentos, devuelve los datos (deben poder guardarse en la caché).
+
+    Returns:
+        dict: lo que devuelve calcular(), de esta llamada o de una anterior.
+    """
+    opciones = configuracion()
+    cache = _cache()
+    clave = f'dashboard:{usuario.pk}:{_entero(año)}:{_entero(cliente_id)}'
+    clave_bloqueo = f'{clave}:bloqueo'
+
+    # La generación se lee antes de calcular: si cambia mientras tanto, lo guardado ya nace obsoleto
+    actual = generacion(usuario.pk)
+    entrada = cache.get(clave)
+    if entrada is not None and entrada['generacion'] == actual:
+        return entrada['datos']
+
+    invalidada = None
+    if entrada is not None:
+        invalidada = cache.get(_clave_invalidacion(usuario.pk, entrada['generacion'] + 1))
+    obsoleta_servible = _obsoleta_servible(entrada, invalidada, opciones)
+    bloqueo_propio = cache.add(clave_bloqueo, True, opciones['BLOQUEO'])
+    if not bloqueo_propio and obsoleta_servible:
+        # Otra petición está recalculando
+        return entrada['datos']
+
+    try:
+        datos = calcular()
+        cache.set(clave, {'generacion': actual, 'creado': time.time(), 'datos': datos}, opciones['TIMEOUT'])
+    finally:
+        if bloqueo_propio:
+            cache.delete(clave_bloqueo)
+    return datos
+
+
+async def adatos_dashboard(usuario, año, cliente_id, calcular):
+    """
+    datos_dashboard() para el dashboard asíncrono, con la misma clave, generación y bloqueo.
+
+    Args:
+        usuario (Usuario): el freelancer.
+        año (str): filtro de año de la sesión.
+        cliente_id (str): filtro de cliente de la sesión.
+        calcular (callable): sin argumentos, devuelve una corrutina con los datos.
+
+    Returns:
+        dict: lo que devuelve calcular(), de esta llamada o de una anterior.
+    """
+    opciones = configuracion()
+    cache = _cache()
+    clave = f'dashboard:{usuario.pk}:{_entero(año)}:{_entero(cliente_id)}'
+    clave_bloqueo = f'{clave}:bloqueo'
+
+    actual = await ageneracion(usuario.pk)
+    entrada = await cache.aget(clave)
+    if entrada is not None and entrada['generacion'] == actual:
+        return entrada['datos']
+
+    invalidada = None
+    if entrada is not None:
+        invalidada = await cache.aget(_clave_invalidacion(usuario.pk, entrada['generacion'] + 1))
+    obsoleta_servible = _obsoleta_servible(entrada, invalidada, opciones)
+    bloqueo_propio = await cache.aadd(clave_bloqueo, True, opciones['BLOQUEO'])
+    if not bloqueo_propio and obsoleta_servible:
+        return entrada['datos']
+
+    try:
+        datos = await calcular()
+        await cache.aset(clave, {'generacion': actual, 'creado': time.time(), 'datos': datos}, opciones['TIMEOUT'])
+    finally:
+        if bloqueo_propio:
+            await cache.adelete(clave_bloqueo)
+    return datos
@@ -0,0 +1,168 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.usuarios.models import Usuario, Perfil
+from apps.usuarios.metricas import calcular_metricas
+from apps.clientes.models import Cliente
+from apps.proyectos.models import Proyecto
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura, calcular_total_con_impuestos
+from apps.facturas.resumen import reconstruir_resumen
+from apps.setup.generador import borrar_datos
+
+"""
+Comando: benchmark_dashboard
+
+Crea un freelancer de prueba con el número de facturas de cada --facturas y mide las consultas
+y la latencia de calcular_metricas() sin filtros, por año y por año y cliente. Falla si alguna
+necesita más de CONSULTAS_ESPERADAS consultas y al terminar borra lo creado (salvo --conservar).
+Solo contra PostgreSQL y en una base de datos de desarrollo.
+
+Ejemplo:
+    python manage.py benchmark_dashboard --facturas 10000 100000 1000000 --repeticiones 20
+"""
+
+# Una consulta para las métricas de facturas y otra para las de presupuestos
+CONSULTAS_ESPERADAS = 2
+
+CLIENTES = 50
+LOTE = 5000
+ESTADOS = [estado for estado, _ in Factura.ESTADOS]
+
+
+class Command(BaseCommand):
+    help = 'Mide consultas y latencia de las métricas del dashboard con muchas facturas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--facturas', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+            help='Tamaños (número de facturas del freelancer) a medir, de menor a mayor.'
+        )
+        parser.add_argument('--repeticiones', type=int, default=20, help='Mediciones por tamaño y filtro.')
+        parser.add_argument('--conservar', action='store_true', help='No borrar los datos de prueba al terminar.')
+
+    def handle(self, *args, **options):
+        tamaños = sorted(options['facturas'])
+        repeticiones = options['repeticiones']
+        if tamaños[0] < 1 or repeticiones < 1:
+            raise CommandError('--facturas y --repeticiones deben ser mayores que cero.')
+
+        hoy = timezone.now().date()
+        freelancer, proyectos = self._crear_base(hoy)
+        creadas = 0
+        excedidas = []
+        try:
+            for tamaño in tamaños:
+                self._crear_facturas(proyectos, creadas, tamaño, hoy)
+                creadas = tamaño
+                # bulk_create no pasa por cambios_resumen(): el resumen se recalcula entero
+                reconstruir_resumen(freelancer.pk)
+                self._analizar()
+
+                casos = [
+                    ('sin filtros', {}),
+                    ('año', {'año': hoy.year}),
+                    ('año y cliente', {'año': hoy.year, 'cliente_id': proyectos[0].cliente_id}),
+                ]
+                for nombre, filtros in casos:
+                    consultas, tiempos = self._medir(freelancer, filtros, repeticiones)
+                    p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+                    self.stdout.write(
+                        f'{tamaño:>9} facturas | {nombre:<13} | {consultas} consultas | '
+                        f'p50 {statistics.median(tiempos) * 1000:.1f} ms | p95 {p95 * 1000:.1f} ms'
+                    )
+                    if consultas > CONSULTAS_ESPERADAS:
+                        excedidas.append(f'{tamaño} facturas, {nombre}: {consultas} consultas')
+        finally:
+            if not options['conservar']:
+                borrar_datos([freelancer])
+
+        if excedidas:
+            raise CommandError(
+                f'Más de {CONSULTAS_ESPERADAS} consultas por dashboard: ' + '; '.join(excedidas)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Métricas del dashboard en {CONSULTAS_ESPERADAS} consultas en todos los tamaños.'
+        ))
+
+    def _medir(self, freelancer, filtros, repeticiones):
+        """
+        Returns:
+            tuple: (consultas de una llamada, tiempos ordenados en segundos)
+        """
+        with CaptureQueriesContext(connection) as capturadas:
+            calcular_metricas(freelancer, **filtros)
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            calcular_metricas(freelancer, **filtros)
+            tiempos.append(time.perf_counter() - inicio)
+        return len(capturadas), sorted(tiempos)
+
+    def _analizar(self):
+        """Actualiza las estadísticas del planificador tras cargar las filas (solo PostgreSQL)."""
+        if connection.vendor != 'postgresql':
+            return
+        with connection.cursor() as cursor:
+            for modelo in (Cliente, Proyecto, Presupuesto, Factura):
+                cursor.execute(f'ANALYZE {modelo._meta.db_table}')
+
+    def _crear_base(self, hoy):
+        sufijo = uuid.uuid4().hex[:8]
+        freelancer = Usuario.objects.create_user(
+            username=f'benchmark_{sufijo}', email=f'benchmark_{sufijo}@example.com'
+        )
+        Perfil.objects.create(perfil=freelancer, tipo_cuenta='freelancer')
+        clientes = Cliente.objects.bulk_create([
+            Cliente(freelancer=freelancer, nombre=f'Cliente benchmark {sufijo} {i}',
+                    email=f'cliente_{sufijo}_{i}@example.com')
+            for i in range(CLIENTES)
+        ])
+        proyectos = Proyecto.objects.bulk_create([
+            Proyecto(freelancer=freelancer, cliente=cliente, nombre=f'Proyecto benchmark {sufijo} {i}',
+                     descripcion='Datos de prueba de benchmark_dashboard', estado='activo', fecha_inicio=hoy)
+            for i, cliente in enumerate(clientes)
+        ])
+        return freelancer, proyectos
+
+    def _crear_facturas(self, proyectos, desde, hasta, hoy):
+        """
+        Crea las facturas desde..hasta-1 (con su presupuesto) por lotes de LOTE. bulk_create
+        no llama a save(), así que total_con_impuestos y total_pagado se calculan aquí.
+        """
+        for inicio in range(desde, hasta, LOTE):
+            indices = range(inicio, min(inicio + LOTE, hasta))
+            presupuestos = Presupuesto.objects.bulk_create([
+                Presupuesto(
+                    proyecto=proyectos[i % len(proyectos)], numero_serie=f'B-{i:07d}',
+                    fecha=hoy - timedelta(days=i % 1095), validez=hoy - timedelta(days=i % 1095) + timedelta(days=30),
+                    estado='aceptado', total=Decimal(100 + i % 900)
+                )
+                for i in indices
+            ])
+            facturas = []
+            for i, presupuesto in zip(indices, presupuestos):
+                estado = ESTADOS[i % len(ESTADOS)]
+                total = calcular_total_con_impuestos(presupuesto.total, presupuesto.impuestos)
+                if estado == 'pagada':
+                    pagado = total
+                elif estado == 'parcial':
+                    pagado = (total / 2).quantize(Decimal('0.01'))
+                else:
+                    pagado = Decimal('0')
+                facturas.append(Factura(
+                    presupuesto=presupuesto, numero_serie=f'B-{i:07d}', fecha_emision=presupuesto.fecha,
+                    fecha_vencimiento=presupuesto.fecha + timedelta(days=30), estado=estado,
+                    total_con_impuestos=total, total_pagado=pagado,
+                ))
+            Factura.objects.bulk_create(facturas)
+            self.stdout.write(f'  ... {indices[-1] + 1} facturas creadas', ending='\r')
+        self.stdout.write('')
@@ -0,0 +1,138 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura, ResumenMensual
+from apps.setup.fechas import rango_año
+
+"""
+Métricas del dashboard del freelancer.
+
+Las de facturas salen de un único aggregate() con agregados condicionales sobre ResumenMensual
+(apps/facturas/resumen.py) y las de presupuestos de otro sobre su tabla. El filtro de periodo y
+cliente va dentro de cada agregado porque las alertas son del total del freelancer.
+
+Ejemplo:
+    metricas = calcular_metricas(request.user, año=2026)
+    metricas.facturas_por_estado['vencida']
+"""
+
+ESTADOS_FACTURA = [estado for estado, _ in Factura.ESTADOS]
+
+# Estados de las facturas que aún se deben cobrar (las vencidas también)
+ESTADOS_PENDIENTES = ['pendiente', 'parcial', 'vencida']
+
+CERO = Decimal('0')
+
+
+@dataclass(frozen=True)
+class MetricasDashboard:
+    """
+    Métricas financieras del freelancer para un periodo y cliente.
+
+    Los importes son del periodo filtrado; facturas_vencidas y presupuestos_caducados son
+    alertas de todo el freelancer, sin filtrar.
+    """
+    total_facturado: Decimal = CERO
+    total_cobrado: Decimal = CERO
+    total_pendiente: Decimal = CERO
+    facturas_por_estado: dict = field(default_factory=lambda: dict.fromkeys(ESTADOS_FACTURA, 0))
+    facturas_vencidas: int = 0
+    presupuestos_caducados: int = 0
+
+
+def _importe(campo, condicion):
+    return Coalesce(
+        Sum(campo, filter=condicion),
+        Value(CERO),
+        output_field=DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+def filtro_periodo(año=None, cliente_id=None):
+    """
+    Condición del periodo y cliente sobre ResumenMensual. Un año o cliente que no es válido
+    (se leen de la URL y de la sesión) se ignora, igual que si no se hubiera elegido.
+
+    Returns:
+        Q: condición para usar en el filter= de los agregados.
+    """
+    periodo = Q()
+
+    rango = rango_año(año) if año else None
+    if rango:
+        periodo &= Q(año=rango[0].year)
+
+    if cliente_id:
+        try:
+            cliente_id = int(cliente_id)
+        except (TypeError, ValueError):
+            cliente_id = None
+    if cliente_id:
+        periodo &= Q(cliente_id=cliente_id)
+
+    return periodo
+
+
+def _numero(condicion):
+    return Coalesce(Sum('num_facturas', filter=condicion), Value(0))
+
+
+def calcular_metricas(usuario, año=None, cliente_id=None):
+    """
+    Calcula las métricas del dashboard con dos consultas: una sobre ResumenMensual y otra
+    sobre los presupuestos.
+
+    Args:
+        usuario (Usuario): el freelancer.
+        año (int | str): año de emisión de las facturas, o None para todos.
+        cliente_id (int | str): id del Cliente, o None para todos.
+
+    Returns:
+        MetricasDashboard
+    """
+    periodo = filtro_periodo(año, cliente_id)
+    hoy = timezone.now().date()
+
+    agregados = {
+        'total_facturado': _importe('facturado', periodo & ~Q(estado='anulada')),
+        'total_cobrado': _importe('cobrado', periodo & ~Q(estado='anulada')),
+        # pendiente ya incluye los impuestos (total con impuestos - total pagado)
+        'total_pendiente': _importe('pendiente', periodo & Q(estado__in=ESTADOS_PENDIENTES)),
+        'facturas_vencidas': _numero(Q(estado='vencida')),
+    }
+    for estado in ESTADOS_FACTURA:
+        agregados[f'estado_{estado}'] = _numero(periodo & Q(estado=estado))
+
+    facturas = ResumenMensual.objects.filter(freelancer=usuario).aggregate(**agregados)
+
+    presupuestos = Presupuesto.objects.filter(
+        proyecto__freelancer=usuario
+    ).aggregate(
+        # No aceptados NI rechazados (aún pendientes de gestión) con la validez pasada
+        presupuestos_caducados=Count('pk', filter=Q(validez__lt=hoy, estado__in=['borrador', 'enviado'])),
+    )
+
+    return MetricasDashboard(
+        total_facturado=facturas['total_facturado'],
+        total_cobrado=facturas['total_cobrado'],
+        total_pendiente=facturas['total_pendiente'],
+        facturas_por_estado={estado: facturas[f'estado_{estado}'] for estado in ESTADOS_FACTURA},
+        facturas_vencidas=facturas['facturas_vencidas'],
+        presupuestos_caducados=presupuestos['presupuestos_caducados'],
+    )
+
+
+def años_con_facturas(usuario):
+    """
+    Returns:
+        list: años con alguna factura emitida, del más reciente al más antiguo.
+    """
+    return list(
+        ResumenMensual.objects.filter(freelancer=usuario)
+        .values_list('año', flat=True).distinct().order_by('-año')
+    )
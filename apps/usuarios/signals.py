@@ -1,7 +1,13 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import Group
-from .models import Perfil
+from apps.clientes.models import Cliente
+from apps.proyectos.models import Proyecto
+from apps.presupuestos.models import Presupuesto
+from apps.facturas.models import Factura, Pago
+from apps.setup.roles import invalidar_roles, olvidar_roles
+from .cache_dashboard import freelancer_de, invalidar_dashboard
+from .models import Perfil, Usuario
 
 @receiver(post_save, sender=Perfil)
 def asignar_grupo_perfil(sender, instance, created, **kwargs):
@@ -20,4 +26,54 @@ def asignar_grupo_perfil(sender, instance, created, **kwargs):
             grupo = Group.objects.get(name=instance.tipo_cuenta.upper())
             instance.perfil.groups.add(grupo)
         except Group.DoesNotExist:
-            pass
\ No newline at end of file
+            pass
+
+
+@receiver(m2m_changed, sender=Usuario.groups.through)
+def invalidar_roles_usuario(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Señal que invalida los roles en caché (apps/setup/roles.py) de los usuarios cuyos
+    grupos acaban de cambiar, ya sea por asignar_grupo_perfil, asignar_grupo_cliente o
+    desde el admin, y los borra del objeto modificado para que el resto de la petición
+    vea el grupo nuevo.
+
+    Args:
+        sender: La tabla intermedia Usuario.groups.through.
+        instance: El usuario modificado, o el grupo si el cambio se hace desde Group.user_set.
+        action: 'post_add', 'post_remove', 'post_clear'...
+        reverse: True si el cambio se hace desde el lado del grupo.
+        pk_set: ids de los grupos (o de los usuarios si reverse) añadidos o quitados.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidar_roles(instance.pk)
+            olvidar_roles(instance)
+    elif action in ('post_add', 'post_remove'):
+        invalidar_roles(*pk_set)
+    elif action == 'pre_clear':
+        # Después del clear ya no se sabe qué usuarios tenía el grupo
+        invalidar_roles(*instance.user_set.values_list('pk', flat=True))
+
+
+@receiver(post_save, sender=Cliente)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_save, sender=Proyecto)
+@receiver(post_delete, sender=Proyecto)
+@receiver(post_save, sender=Presupuesto)
+@receiver(post_delete, sender=Presupuesto)
+@receiver(post_save, sender=Factura)
+@receiver(post_delete, sender=Factura)
+@receiver(post_save, sender=Pago)
+@receiver(post_delete, sender=Pago)
+def invalidar_dashboard_freelancer(sender, instance, **kwargs):
+    """
+    Señal que marca como obsoletos los datos del dashboard en caché
+    (apps/usuarios/cache_dashboard.py) del freelancer dueño del objeto guardado o borrado.
+
+    Args:
+        sender: El modelo que envía la señal.
+        instance: La instancia que acaba de guardarse o eliminarse.
+        **kwargs: Argumentos adicionales de la señal.
+    """
+    invalidar_dashboard(freelancer_de(instance))
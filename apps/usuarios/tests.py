@@ -1,3 +1,101 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from apps.facturas.models import Factura, Pago
+from apps.setup.generador import generar
+from .cache_dashboard import comprobar_cache_compartida, datos_dashboard, freelancer_de
+
+REDIS = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost:6379/0'}}
+
+
+class CacheCompartidaTests(SimpleTestCase):
+
+    @override_settings(PROCESOS_WEB=2)
+    def test_varios_procesos_con_la_cache_en_memoria(self):
+        with self.assertRaisesMessage(ImproperlyConfigured, 'REDIS_URL'):
+            comprobar_cache_compartida()
+
+    @override_settings(PROCESOS_WEB=1)
+    def test_un_proceso_con_la_cache_en_memoria(self):
+        comprobar_cache_compartida()
+
+    @override_settings(PROCESOS_WEB=4, CACHES=REDIS)
+    def test_varios_procesos_con_redis(self):
+        comprobar_cache_compartida()
+
+
+class CacheDashboardTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.freelancer, cls.otro = generar('dashboard', freelancers=2, clientes=3, facturas=20, semilla=13)
+
+    def setUp(self):
+        caches['default'].clear()
+        self.calculos = []
+
+    def datos(self, freelancer=None, año='2026'):
+        def calcular():
+            self.calculos.append(año)
+            return {'calculo': len(self.calculos)}
+        return datos_dashboard(freelancer or self.freelancer, año, '', calcular)
+
+    def guardar_factura(self, freelancer):
+        factura = Factura.objects.filter(presupuesto__proyecto__freelancer=freelancer).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            factura.save()
+
+    def test_la_segunda_lectura_sale_de_la_cache(self):
+        self.assertEqual(self.datos(), {'calculo': 1})
+        self.assertEqual(self.datos(), {'calculo': 1})
+        # Cada combinación de filtros tiene su entrada
+        self.assertEqual(self.datos(año='2025'), {'calculo': 2})
+
+    def test_guardar_una_factura_invalida_su_dashboard(self):
+        self.datos()
+        self.guardar_factura(self.freelancer)
+        self.assertEqual(self.datos(), {'calculo': 2})
+
+    def test_los_cambios_de_otro_freelancer_no_invalidan(self):
+        self.datos()
+        self.guardar_factura(self.otro)
+        self.assertEqual(self.datos(), {'calculo': 1})
+
+    def test_sin_confirmar_la_transaccion_no_se_invalida(self):
+        self.datos()
+        with self.captureOnCommitCallbacks(execute=False):
+            Factura.objects.filter(presupuesto__proyecto__freelancer=self.freelancer).first().save()
+        self.assertEqual(self.datos(), {'calculo': 1})
+
+    def recalculando_otra_peticion(self):
+        """Toma el bloqueo de la entrada, como si otra petición la estuviera recalculando."""
+        caches['default'].add(f'dashboard:{self.freelancer.pk}:2026::bloqueo', True)
+
+    def test_sin_el_bloqueo_se_sirve_la_entrada_anterior_aunque_sea_vieja(self):
+        self.datos()
+        # La entrada tiene más de EDAD_MAXIMA_OBSOLETA segundos cuando se invalida: lo normal
+        # con un TIMEOUT de 600
+        with mock.patch('apps.usuarios.cache_dashboard.time.time', return_value=time.time() + 300):
+            self.guardar_factura(self.freelancer)
+            self.recalculando_otra_peticion()
+            self.assertEqual(self.datos(), {'calculo': 1})
+        self.assertEqual(len(self.calculos), 1)
+
+    def test_sin_el_bloqueo_se_recalcula_si_hace_mucho_de_la_invalidacion(self):
+        self.datos()
+        self.guardar_factura(self.freelancer)
+        self.recalculando_otra_peticion()
+        with mock.patch('apps.usuarios.cache_dashboard.time.time', return_value=time.time() + 61):
+            self.assertEqual(self.datos(), {'calculo': 2})
+
+    def test_freelancer_de_sin_consultas_si_el_camino_esta_cargado(self):
+        pago = Pago.objects.filter(factura__presupuesto__proyecto__freelancer=self.freelancer).first()
+        with self.assertNumQueries(1):
+            self.assertEqual(freelancer_de(pago), self.freelancer.pk)
+        pago = Pago.objects.select_related('factura__presupuesto__proyecto').get(pk=pago.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(freelancer_de(pago), self.freelancer.pk)
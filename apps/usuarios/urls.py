@@ -1,9 +1,10 @@
 from django.urls import path
+from apps.setup.asincrono import elegir_vista
 from . import views
 
 urlpatterns = [
     path('', views.landing, name='landing'),
     path('accounts/register/', views.RegistroView.as_view(), name='register'),
-    path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/', elegir_vista(views.dashboard, views.dashboard_async), name='dashboard'),
     path('set-theme/', views.set_theme, name='set_theme'),
 ]
\ No newline at end of file
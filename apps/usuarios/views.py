@@ -1,16 +1,20 @@
 # Create your views here.
+from functools import partial
+
 from django.shortcuts import render, redirect
+from django.template.response import TemplateResponse
 from django.views.generic import CreateView
 from django.urls import reverse_lazy
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Sum, Count, F
-from django.utils import timezone
 
 from .forms import UsuarioRegistroForm
 from .models import Perfil
+from .cache_dashboard import adatos_dashboard, datos_dashboard
+from .metricas import calcular_metricas, años_con_facturas
 from apps.clientes.models import Cliente
-from apps.presupuestos.models import Presupuesto
-from apps.facturas.models import Factura
+from apps.clientes.ranking import ranking_clientes
+from apps.setup.asincrono import en_paralelo
+from apps.setup.limite_consultas import limite_consultas
 
 def set_theme(request):
     """Establece cookies de preferencias de usuario.
@@ -38,19 +42,91 @@ def set_theme(request):
     return response
 
 
+def consultas_dashboard(usuario, año_filtro, cliente_id_filtro):
+    """
+    Las consultas del dashboard que se guardan en la caché, como funciones sin argumentos.
+    Son independientes entre sí: el dashboard síncrono las hace una detrás de otra y el
+    asíncrono a la vez (apps/setup/asincrono.py). Los querysets se convierten en listas para
+    que se guarde el resultado y no la consulta.
+
+    Returns:
+        dict: metricas, clientes_con_totales, años_disponibles y clientes_disponibles.
+    """
+    return {
+        # ---------------------------------------------------------------
+        # MÉTRICAS: una consulta para las facturas y otra para los presupuestos
+        # con agregados condicionales (ver metricas.py)
+        # ---------------------------------------------------------------
+        'metricas': partial(calcular_metricas, usuario, año=año_filtro, cliente_id=cliente_id_filtro),
+
+        # ---------------------------------------------------------------
+        # RANKING: los 5 clientes con más facturado, con su número de proyectos
+        # Subconsultas sobre ResumenMensual, sin JOIN con las facturas (ver ranking.py)
+        # ---------------------------------------------------------------
+        'clientes_con_totales': partial(ranking_clientes, usuario, medida='facturado', limite=5),
+
+        # ---------------------------------------------------------------
+        # DATOS para los selectores de filtro
+        # ---------------------------------------------------------------
+        'años_disponibles': partial(años_con_facturas, usuario),
+        'clientes_disponibles': lambda: list(Cliente.objects.filter(
+            freelancer=usuario,
+            estado=True
+        ).order_by('nombre')),
+    }
+
+
+def datos_dashboard_freelancer(usuario, año_filtro, cliente_id_filtro):
+    """
+    Calcula los datos del dashboard que se guardan en la caché.
+
+    Returns:
+        dict: metricas, clientes_con_totales, años_disponibles y clientes_disponibles.
+    """
+    consultas = consultas_dashboard(usuario, año_filtro, cliente_id_filtro)
+    return {nombre: consulta() for nombre, consulta in consultas.items()}
+
+
+def contexto_dashboard(datos, año_filtro, cliente_id_filtro):
+    """Contexto de la plantilla del dashboard a partir de los datos de la caché."""
+    metricas = datos['metricas']
+    return {
+        # Métricas financieras
+        'metricas': metricas,
+        'total_facturado': metricas.total_facturado,
+        'total_cobrado': metricas.total_cobrado,
+        'total_pendiente': metricas.total_pendiente,
+        'facturas_por_estado': metricas.facturas_por_estado,
+        # Ranking de clientes
+        'clientes_con_totales': datos['clientes_con_totales'],
+        # Alertas
+        'facturas_vencidas': metricas.facturas_vencidas,
+        'presupuestos_caducados': metricas.presupuestos_caducados,
+        # Filtros activos (leídos de sesión)
+        'año_filtro': año_filtro,
+        'cliente_id_filtro': cliente_id_filtro,
+        # Datos para los selectores
+        'años_disponibles': datos['años_disponibles'],
+        'clientes_disponibles': datos['clientes_disponibles'],
+    }
+
+
+@limite_consultas(10)
 @login_required
 def dashboard(request):
     """
     Vista FBV del dashboard financiero del freelancer.
 
-    Muestra métricas globales y por periodo usando aggregate y annotate.
+    Muestra métricas globales y por periodo usando aggregate con agregados
+    condicionales (metricas.calcular_metricas) y annotate.
     Los filtros de periodo y cliente se guardan en sesión para que persistan
-    entre visitas (requisito de sesión del enunciado).
+    entre visitas (requisito de sesión del enunciado). Los datos se sirven
+    desde la caché del freelancer mientras no cambie nada suyo.
 
     Métricas incluidas:
         - Total facturado, cobrado y pendiente (aggregate).
-        - Facturas por estado (aggregate + Q objects).
-        - Clientes con total facturado (annotate).
+        - Facturas por estado (Count con filter=Q, en la misma consulta).
+        - Clientes con más facturado (clientes.ranking, subconsultas).
         - Alertas de facturas vencidas y presupuestos caducados.
     """
 
@@ -75,124 +151,49 @@ def dashboard(request):
     cliente_id_filtro = request.session.get('dashboard_cliente_id', '')
 
     # ---------------------------------------------------------------
-    # BASE QUERYSETS del freelancer autenticado
-    # select_related para evitar N+1 al acceder a relaciones en el template
+    # CACHÉ: los datos se guardan por freelancer y filtros y solo se
+    # recalculan cuando cambia algo del freelancer (ver cache_dashboard.py)
     # ---------------------------------------------------------------
-    facturas_qs = Factura.objects.filter(
-        presupuesto__proyecto__freelancer=request.user
-    ).select_related('presupuesto__proyecto__cliente')
-
-    presupuestos_qs = Presupuesto.objects.filter(
-        proyecto__freelancer=request.user
-    ).select_related('proyecto__cliente')
+    datos = datos_dashboard(
+        request.user, año_filtro, cliente_id_filtro,
+        lambda: datos_dashboard_freelancer(request.user, año_filtro, cliente_id_filtro),
+    )
+    return render(request, 'apps/usuarios/dashboard.html', contexto_dashboard(datos, año_filtro, cliente_id_filtro))
 
-    # ---------------------------------------------------------------
-    # FILTROS opcionales por año y cliente (Q objects para combinarlos)
-    # ---------------------------------------------------------------
-    if año_filtro:
-        facturas_qs = facturas_qs.filter(fecha_emision__year=año_filtro)
-        presupuestos_qs = presupuestos_qs.filter(fecha__year=año_filtro)
 
-    if cliente_id_filtro:
-        facturas_qs = facturas_qs.filter(
-            presupuesto__proyecto__cliente__id=cliente_id_filtro
-        )
-        presupuestos_qs = presupuestos_qs.filter(
-            proyecto__cliente__id=cliente_id_filtro
-        )
-
-    # ---------------------------------------------------------------
-    # AGGREGATE: métricas globales del periodo filtrado
-    # ---------------------------------------------------------------
-    total_facturado = facturas_qs.exclude(
-        estado='anulada'
-    ).aggregate(
-        total=Sum('presupuesto__total')
-    )['total'] or 0
-
-    total_cobrado = facturas_qs.filter(
-        estado='pagada'
-    ).aggregate(
-        total=Sum('total_pagado')
-    )['total'] or 0
-
-    total_pendiente = facturas_qs.filter(
-        # Q objects: facturas pendientes O parcialmente pagadas
-        Q(estado='pendiente') | Q(estado='parcial')
-    ).aggregate(
-        total=Sum(F('presupuesto__total') - F('total_pagado'))
-    )['total'] or 0
-
-    # Conteo de facturas por estado (aggregate)
-    facturas_por_estado = {
-        'pendiente': facturas_qs.filter(estado='pendiente').count(),
-        'parcial':   facturas_qs.filter(estado='parcial').count(),
-        'pagada':    facturas_qs.filter(estado='pagada').count(),
-        'vencida':   facturas_qs.filter(estado='vencida').count(),
-        'anulada':   facturas_qs.filter(estado='anulada').count(),
-    }
-
-    # ---------------------------------------------------------------
-    # ANNOTATE: clientes con total facturado y número de proyectos
-    # Enriquece el queryset con datos calculados sin hacer N+1
-    # ---------------------------------------------------------------
-    clientes_con_totales = Cliente.objects.filter(
-        freelancer=request.user
-    ).annotate(
-        total_facturado=Sum(
-            'proyectos__presupuesto__factura__presupuesto__total',
-        ),
-        num_proyectos=Count('proyectos', distinct=True),
-    ).order_by('-total_facturado')[:5]
+@limite_consultas(10)
+@login_required
+async def dashboard_async(request):
+    """
+    dashboard() para el perfil ASGI (apps/setup/asincrono.py): los mismos filtros en la
+    sesión, la misma caché y la misma plantilla, con la API async de la sesión y de la caché.
+    Si hay que recalcular, las consultas de consultas_dashboard() se lanzan a la vez con
+    en_paralelo().
+    """
+    request.user = await request.auser()
 
-    # ---------------------------------------------------------------
-    # ALERTAS: facturas vencidas y presupuestos sin convertir caducados
-    # Q objects para combinar condiciones en una sola consulta
-    # ---------------------------------------------------------------
-    facturas_vencidas = Factura.objects.filter(
-        presupuesto__proyecto__freelancer=request.user,
-        estado='vencida'
-    ).count()
-
-    presupuestos_caducados = Presupuesto.objects.filter(
-        proyecto__freelancer=request.user,
-        validez__lt=timezone.now().date(),
-        # Q objects: no aceptados NI rechazados (aún pendientes de gestión)
-        estado__in=['borrador', 'enviado']
-    ).count()
+    if request.GET.get('limpiar'):
+        await request.session.apop('dashboard_año', None)
+        await request.session.apop('dashboard_cliente_id', None)
+        return redirect('dashboard')
 
-    # ---------------------------------------------------------------
-    # DATOS para los selectores de filtro
-    # ---------------------------------------------------------------
-    años_disponibles = Factura.objects.filter(
-        presupuesto__proyecto__freelancer=request.user
-    ).dates('fecha_emision', 'year', order='DESC')
+    if 'año' in request.GET:
+        await request.session.aset('dashboard_año', request.GET.get('año'))
+    if 'cliente_id' in request.GET:
+        await request.session.aset('dashboard_cliente_id', request.GET.get('cliente_id'))
 
-    clientes_disponibles = Cliente.objects.filter(
-        freelancer=request.user,
-        estado=True
-    ).order_by('nombre')
+    año_filtro = await request.session.aget('dashboard_año', '')
+    cliente_id_filtro = await request.session.aget('dashboard_cliente_id', '')
 
-    context = {
-        # Métricas financieras
-        'total_facturado': total_facturado,
-        'total_cobrado': total_cobrado,
-        'total_pendiente': total_pendiente,
-        'facturas_por_estado': facturas_por_estado,
-        # Ranking de clientes
-        'clientes_con_totales': clientes_con_totales,
-        # Alertas
-        'facturas_vencidas': facturas_vencidas,
-        'presupuestos_caducados': presupuestos_caducados,
-        # Filtros activos (leídos de sesión)
-        'año_filtro': año_filtro,
-        'cliente_id_filtro': cliente_id_filtro,
-        # Datos para los selectores
-        'años_disponibles': años_disponibles,
-        'clientes_disponibles': clientes_disponibles,
-    }
+    datos = await adatos_dashboard(
+        request.user, año_filtro, cliente_id_filtro,
+        lambda: en_paralelo(**consultas_dashboard(request.user, año_filtro, cliente_id_filtro)),
+    )
 
-    return render(request, 'apps/usuarios/dashboard.html', context)
+    # La plantilla se renderiza en el hilo de la petición, no en el bucle de eventos
+    return TemplateResponse(
+        request, 'apps/usuarios/dashboard.html', contexto_dashboard(datos, año_filtro, cliente_id_filtro)
+    )
 
 
 def landing(request):
@@ -55,8 +55,13 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    # Middleware propio y opcional: mide consultas y tiempos de cada petición (ver RENDIMIENTO).
+    # Va el primero para que la medición incluya a todos los demás; sin RENDIMIENTO['ACTIVO']
+    # Django lo descarta al arrancar.
+    'apps.setup.middleware.RendimientoMiddleware',
+
     # Seguridad general, protege contra ataques XSS, clickjacking, etc.
-    # Debe ir primero para ejecutarse antes que cualquier otro middleware.
+    # Va justo después de RendimientoMiddleware (que no toca la petición) y antes que el resto.
     'django.middleware.security.SecurityMiddleware',
 
     # Gestiona las sesiones de usuario, necesario para que el login funcione.
@@ -176,12 +181,118 @@ LOGGING = {
         'console': {
             'class': 'logging.StreamHandler',
         },
+        # Auditoría en la tabla RegistroAuditoria (apps/setup/auditoria.py): la petición solo
+        # encola el registro y un hilo lo guarda por lotes de 'lote' o cada 'intervalo_ms'.
+        'auditoria_bd': {
+            'class': 'apps.setup.auditoria.ManejadorAuditoria',
+            'lote': 200,
+            'intervalo_ms': 500,
+            'capacidad': 10000,
+            'reintentos': 3,
+            'eco': False,
+        },
     },
     'loggers': {
         'auditoria': {
+            'handlers': ['auditoria_bd'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        'limite_consultas': {
             'handlers': ['console'],
             'level': 'WARNING',
             'propagate': False,
         },
     },
-}
\ No newline at end of file
+}
+
+
+# Caché de Django, compartida por todos los procesos web y los comandos: guarda los contadores de
+# la caché de PDF y la caché del dashboard. Con REDIS_URL en el entorno (docker-compose.yml) se usa
+# Redis; sin él, la caché en memoria de Django, que es de cada proceso y solo sirve con uno.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+
+# Caché de los PDF de facturas (apps/facturas/pdf_cache.py)
+# BACKEND puede ser CacheArchivosPDF (ficheros en DIRECTORIO, con expulsión LRU al superar
+# TAMAÑO_MAXIMO bytes) o CacheDjangoPDF (usa la caché de Django indicada en ALIAS).
+PDF_CACHE = {
+    'BACKEND': 'apps.facturas.pdf_cache.CacheArchivosPDF',
+    'DIRECTORIO': BASE_DIR / 'cache_pdf',
+    'TAMAÑO_MAXIMO': 200 * 1024 * 1024,
+}
+
+
+# Generación de PDF en segundo plano (apps/facturas/trabajos_pdf.py)
+# TRABAJADORES procesos de WeasyPrint por cada proceso web; un trabajo que lleva más de
+# TIMEOUT segundos sin terminar se relanza hasta MAX_INTENTOS veces.
+PDF_TRABAJOS = {
+    'ASINCRONO': True,
+    'TRABAJADORES': int(os.getenv('PDF_TRABAJADORES', 2)),
+    'TIMEOUT': 120,
+    'MAX_INTENTOS': 2,
+}
+
+
+# Procesos web que atienden peticiones (WEB_TRABAJADORES de gunicorn o uvicorn en docker-compose).
+# Con más de uno la caché del dashboard tiene que ser compartida o la aplicación no arranca.
+PROCESOS_WEB = int(os.getenv('WEB_TRABAJADORES', 1))
+
+
+# Caché del dashboard de cada freelancer (apps/usuarios/cache_dashboard.py)
+# Los datos se recalculan al cambiar algo del freelancer; mientras una petición los recalcula
+# el resto reciben los anteriores si se invalidaron hace menos de EDAD_MAXIMA_OBSOLETA segundos.
+DASHBOARD_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 600,
+    'EDAD_MAXIMA_OBSOLETA': 60,
+}
+
+
+# Buscador global de clientes, proyectos, presupuestos y facturas (apps/setup/busqueda.py)
+# IDIOMA es la configuración de texto de PostgreSQL con la que se calcula el tsvector.
+BUSQUEDA = {
+    'IDIOMA': 'spanish',
+    'LIMITE': 20,
+}
+
+
+# Medición de consultas y tiempos por petición (apps/setup/rendimiento.py), resumen en /rendimiento/
+# para el personal. Desactivado salvo que se pida con RENDIMIENTO_ACTIVO=1 en el entorno.
+RENDIMIENTO = {
+    'ACTIVO': os.getenv('RENDIMIENTO_ACTIVO') == '1',
+    'MUESTREO': 1.0,
+    'VENTANA': 200,
+    'UMBRAL_N_MAS_1': 5,
+}
+
+
+# Límite de consultas de las vistas y métodos marcados con LimiteConsultasMixin o @limite_consultas
+# (apps/setup/limite_consultas.py). Con ESTRICTO se lanza una excepción al superarlo (desarrollo y
+# tests, con LIMITE_CONSULTAS_ESTRICTO=1); si no, solo se registra en el logger 'limite_consultas'.
+LIMITE_CONSULTAS = {
+    'ACTIVO': True,
+    'ESTRICTO': os.getenv('LIMITE_CONSULTAS_ESTRICTO') == '1',
+}
+
+
+# Vistas asíncronas de lectura (apps/setup/asincrono.py). VISTAS sirve el dashboard, los listados
+# y los detalles con sus versiones async; tiene sentido con el perfil ASGI (uvicorn, ver
+# docker-compose.yml), que lo activa con VISTAS_ASINCRONAS=1. Con PARALELO las consultas
+# independientes del dashboard se lanzan a la vez, cada una con su conexión.
+ASINCRONO = {
+    'VISTAS': os.getenv('VISTAS_ASINCRONAS') == '1',
+    'PARALELO': True,
+}
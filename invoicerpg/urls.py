@@ -25,4 +25,5 @@ urlpatterns = [
     path('proyectos/', include('apps.proyectos.urls')),
     path('presupuestos/', include('apps.presupuestos.urls')),
     path('facturas/', include('apps.facturas.urls')),
+    path('', include('apps.setup.urls')),
 ]
\ No newline at end of file